@@ -0,0 +1,278 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+Benchmarks for the parsing, request building and end-to-end paths of pyexchange. ::
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --sizes 10,100 --repeat 3 --only parse_event_properties,list_mails
+
+Every benchmark runs once per item count and ``--repeat`` times per count; the JSON written to ``--output``
+(or stdout) has the timings of every run, so results can be compared between commits. The responses come from
+the mailbox generated by :mod:`pyexchange.testing` with a fixed seed, so every run sees the same data, and the
+end-to-end benchmarks talk to a :class:`~pyexchange.testing.FakeExchangeServer` on localhost.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+from datetime import timedelta
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from lxml import etree  # noqa: E402
+
+from pyexchange import Exchange2010Service  # noqa: E402
+from pyexchange.base.soap import remove_control_characters  # noqa: E402
+from pyexchange.connection import ExchangeNTLMAuthConnection  # noqa: E402
+from pyexchange.exchange2010 import Exchange2010CalendarEvent, Exchange2010MailList, soap_request  # noqa: E402
+from pyexchange.recording import ExchangeRecordingConnection, ExchangeReplayConnection  # noqa: E402
+from pyexchange.testing import FakeExchangeServer, FakeMailbox  # noqa: E402
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+# A relative property map, like the ones the item classes use for each element of a list.
+EVENT_PROPERTY_MAP = {
+    u'id': {u'xpath': u't:ItemId/@Id'},
+    u'subject': {u'xpath': u't:Subject'},
+    u'location': {u'xpath': u't:Location'},
+    u'start': {u'xpath': u't:Start', u'cast': u'datetime'},
+    u'end': {u'xpath': u't:End', u'cast': u'datetime'},
+    u'html_body': {u'xpath': u't:Body[@BodyType="HTML"]'},
+    u'is_all_day': {u'xpath': u't:IsAllDayEvent', u'cast': u'bool'},
+}
+
+
+class Fixture(object):
+    """ The mailbox, server and responses one item count is benchmarked against. """
+
+    def __init__(self, size):
+        self.size = size
+        self.mailbox = FakeMailbox(events=size, messages=size, seed=size)
+        self.server = FakeExchangeServer(self.mailbox, max_page_size=size)
+        self.service = Exchange2010Service(connection=None)
+        self.events = self.mailbox.folder_items(u'calendar')
+        self.directory = None
+
+    def response(self, body):
+        request = etree.tostring(self.service._wrap_soap_xml_request(body), encoding='utf-8')
+        status, response = self.server.handle(request)
+        assert status == 200, response
+        return response
+
+    def tree(self, body):
+        return self.service._parse(self.response(body))
+
+    def archive(self, name):
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp()
+        return os.path.join(self.directory, name)
+
+    def close(self):
+        self.server.stop()
+        if self.directory is not None:
+            shutil.rmtree(self.directory)
+
+
+def bench_xpath_to_dict(fixture):
+    tree = fixture.tree(soap_request.get_item(exchange_id=[e.id for e in fixture.events], format=u'AllProperties'))
+    elements = tree.xpath(u'//t:CalendarItem', namespaces=soap_request.NAMESPACES)
+
+    def run():
+        for element in elements:
+            fixture.service._xpath_to_dict(element, EVENT_PROPERTY_MAP, soap_request.NAMESPACES)
+    return run
+
+
+def bench_parse_event_properties(fixture):
+    responses = [fixture.tree(soap_request.get_item(exchange_id=e.id, format=u'AllProperties')) for e in fixture.events]
+    event = Exchange2010CalendarEvent(service=fixture.service)
+
+    def run():
+        for response in responses:
+            event._parse_event_properties(response)
+    return run
+
+
+def bench_parse_mail_page(fixture):
+    tree = fixture.tree(soap_request.find_items(folder_id=u'inbox', limit=fixture.size, format=u'AllProperties'))
+    mail_list = Exchange2010MailList(service=fixture.service)
+
+    def run():
+        mail_list._parse_response_for_all_mails(tree)
+    return run
+
+
+def bench_build_new_event(fixture):
+    events = [_event(fixture, item) for item in fixture.events]
+
+    def run():
+        for event in events:
+            etree.tostring(soap_request.new_event(event))
+    return run
+
+
+def bench_build_update_item(fixture):
+    events = []
+    for item in fixture.events:
+        event = _event(fixture, item)
+        event._id, event._change_key = item.id, item.change_key
+        event._reset_dirty_attributes()
+        event.subject = event.subject + u' (moved)'
+        event.start += timedelta(hours=1)
+        event.end += timedelta(hours=1)
+        events.append(event)
+
+    def run():
+        for event in events:
+            etree.tostring(soap_request.update_item(event, event._dirty_attributes, u'SendToAllAndSaveCopy'))
+    return run
+
+
+def bench_remove_control_characters(fixture):
+    response = fixture.response(soap_request.get_item(exchange_id=[e.id for e in fixture.events], format=u'AllProperties'))
+    response = response.replace(u'</t:Subject>', u'\x0b&#x1f;</t:Subject>')
+
+    def run():
+        remove_control_characters(response)
+    return run
+
+
+def bench_list_events(fixture):
+    fixture.server.start()
+    service = _service(fixture)
+    # list_events asks for at most 1000 events, so larger counts only grow the mailbox it searches.
+    start, end = fixture.events[0].fields[u'Start'], fixture.events[-1].fields[u'End']
+
+    def run():
+        service.calendar().list_events(start=start, end=end, details=True)
+    return run
+
+
+def bench_list_mails(fixture):
+    fixture.server.start()
+    service = _service(fixture)
+
+    def run():
+        for _ in service.mail().list_mails().items:
+            pass
+    return run
+
+
+def bench_replay_list_mails(fixture):
+    # Replayed traffic leaves only the time spent in pyexchange: no sockets, no server.
+    fixture.server.start()
+    path = fixture.archive(u'list_mails.ews.gz')
+    with ExchangeRecordingConnection(_service(fixture).connection, path) as recording:
+        for _ in _service(fixture, recording).mail().list_mails().items:
+            pass
+    fixture.server.stop()
+    service = _service(fixture, ExchangeReplayConnection(path))
+
+    def run():
+        for _ in service.mail().list_mails().items:
+            pass
+    return run
+
+
+BENCHMARKS = (
+    (u'xpath_to_dict', bench_xpath_to_dict),
+    (u'parse_event_properties', bench_parse_event_properties),
+    (u'parse_mail_page', bench_parse_mail_page),
+    (u'build_new_event', bench_build_new_event),
+    (u'build_update_item', bench_build_update_item),
+    (u'remove_control_characters', bench_remove_control_characters),
+    (u'list_events', bench_list_events),
+    (u'list_mails', bench_list_mails),
+    (u'replay_list_mails', bench_replay_list_mails),
+)
+
+
+def _event(fixture, item):
+    fields = item.fields
+    return Exchange2010CalendarEvent(
+        service=fixture.service, subject=fields[u'Subject'], location=fields[u'Location'], html_body=fields[u'Body'],
+        start=fields[u'Start'], end=fields[u'End'], sensitivity=u'Normal',
+        attendees=[attendee[1] for attendee in fields[u'Attendees']],
+    )
+
+
+def _service(fixture, connection=None):
+    if connection is None:
+        connection = ExchangeNTLMAuthConnection(url=fixture.server.url, username=u'bench', password=u'bench')
+    service = Exchange2010Service(connection=connection)
+    service.batch_size = 100
+    return service
+
+
+def measure(name, setup, size, repeat):
+    fixture = Fixture(size)
+    try:
+        run = setup(fixture)
+        timings = []
+        for _ in range(repeat):
+            started = timeit.default_timer()
+            run()
+            timings.append(timeit.default_timer() - started)
+    finally:
+        fixture.close()
+
+    timings.sort()
+    return {
+        u'benchmark': name,
+        u'items': size,
+        u'runs': timings,
+        u'min': timings[0],
+        u'median': timings[len(timings) // 2],
+        u'per_item': timings[0] / size,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Benchmarks pyexchange against generated Exchange responses.')
+    parser.add_argument('--sizes', default=u','.join(str(size) for size in DEFAULT_SIZES),
+                        help=u'comma separated item counts (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help=u'runs per benchmark and item count (default: %(default)s)')
+    parser.add_argument('--only', help=u'comma separated benchmark names: %s' % u', '.join(name for name, _ in BENCHMARKS))
+    parser.add_argument('--output', help=u'file to write the JSON results to (default: stdout)')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(u',')]
+    only = set(args.only.split(u',')) if args.only else None
+    unknown = (only or set()) - set(name for name, _ in BENCHMARKS)
+    if unknown:
+        parser.error(u'unknown benchmarks: %s' % u', '.join(sorted(unknown)))
+
+    results = []
+    for name, setup in BENCHMARKS:
+        if only is not None and name not in only:
+            continue
+        for size in sizes:
+            result = measure(name, setup, size, args.repeat)
+            sys.stderr.write(u'%-26s %6d items  min %9.4fs  median %9.4fs\n' % (name, size, result[u'min'], result[u'median']))
+            results.append(result)
+
+    report = json.dumps({
+        u'python': platform.python_version(),
+        u'implementation': platform.python_implementation(),
+        u'platform': platform.platform(),
+        u'repeat': args.repeat,
+        u'results': results,
+    }, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report)
+    else:
+        sys.stdout.write(report + u'\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,9 @@ Unless required by applicable law or agreed to in writing, software?distributed
 """
 from collections import namedtuple
 
+from .serializable import SerializableItem
+from .tracking import ChangeTracking
+
 ExchangeExtendedProperty = namedtuple('ExchangeExtendedProperty', ['distinguished_property_set_id', 'property_name',
                                                                    'property_type', 'value'])
 ExchangeExtendedFieldURI = namedtuple('ExchangeExtendedFieldURI', ['distinguished_property_set_id', 'property_name',
@@ -39,7 +42,8 @@ class BaseExchangeCalendarService(object):
         raise NotImplementedError
 
 
-class BaseExchangeCalendarEvent(object):
+class BaseExchangeCalendarEvent(SerializableItem, ChangeTracking):
+    _item_type = u'event'
 
     _id = None  # Exchange identifier for the event
     _change_key = None  # Exchange requires a second key when updating/deleting the event
@@ -75,17 +79,6 @@ class BaseExchangeCalendarEvent(object):
 
     _conflicting_event_ids = []
 
-    _track_dirty_attributes = False
-    _dirty_attributes = set()  # any attributes that have changed, and we need to update in Exchange
-
-    # these attributes can be pickled, or output as JSON
-    DATA_ATTRIBUTES = [
-        u'_id', u'subject', u'start', u'end', u'location', u'html_body', u'text_body', u'organizer',
-        u'_attendees', u'_resources', u'reminder_minutes_before_start', u'is_all_day', 'recurrence_id', 'timezone',
-        'recurrence', 'recurrence_interval', 'recurrence_days', 'recurrence_day', 'created', '_extended_properties',
-        u'sensitivity'
-    ]
-
     RECURRENCE_ATTRIBUTES = [
         'recurrence', 'recurrence_end_date', 'recurrence_days', 'recurrence_interval',
         ]
@@ -95,6 +88,10 @@ class BaseExchangeCalendarEvent(object):
     def __init__(self, service, id=None, calendar_id=u'calendar', xml=None, additional_properties=None, **kwargs):
         self.service = service
         self.calendar_id = calendar_id
+        self._attendees = {}
+        self._resources = {}
+        self._extended_properties = []
+        self._conflicting_event_ids = []
 
         if xml is not None:
             self._init_from_xml(xml)
@@ -120,7 +117,7 @@ class BaseExchangeCalendarEvent(object):
     @extended_properties.setter
     def extended_properties(self, extended_properties):
         self._extended_properties = self._build_extended_properties(extended_properties)
-        self._dirty_attributes.add('extended_properties')
+        self._mark_dirty('extended_properties')
 
     @property
     def id(self):
@@ -190,7 +187,7 @@ class BaseExchangeCalendarEvent(object):
     @attendees.setter
     def attendees(self, attendees):
         self._attendees = self._build_resource_dictionary(attendees)
-        self._dirty_attributes.add(u'attendees')
+        self._mark_dirty(u'attendees')
 
     @property
     def required_attendees(self):
@@ -217,7 +214,7 @@ class BaseExchangeCalendarEvent(object):
         for email in required:
             self._attendees[email] = required[email]
 
-        self._dirty_attributes.add(u'attendees')
+        self._mark_dirty(u'attendees')
 
     @property
     def optional_attendees(self):
@@ -244,7 +241,7 @@ class BaseExchangeCalendarEvent(object):
         for email in optional:
             self._attendees[email] = optional[email]
 
-        self._dirty_attributes.add(u'attendees')
+        self._mark_dirty(u'attendees')
 
     def add_attendees(self, attendees, required=True):
         """
@@ -258,7 +255,7 @@ class BaseExchangeCalendarEvent(object):
         for email in new_attendees:
             self._attendees[email] = new_attendees[email]
 
-        self._dirty_attributes.add(u'attendees')
+        self._mark_dirty(u'attendees')
 
     def remove_attendees(self, attendees):
         """
@@ -272,7 +269,7 @@ class BaseExchangeCalendarEvent(object):
             if email in self._attendees:
                 del self._attendees[email]
 
-        self._dirty_attributes.add(u'attendees')
+        self._mark_dirty(u'attendees')
 
     @property
     def resources(self):
@@ -287,7 +284,7 @@ class BaseExchangeCalendarEvent(object):
     @resources.setter
     def resources(self, resources):
         self._resources = self._build_resource_dictionary(resources)
-        self._dirty_attributes.add(u'resources')
+        self._mark_dirty(u'resources')
 
     def add_resources(self, resources):
         """
@@ -299,7 +296,7 @@ class BaseExchangeCalendarEvent(object):
 
         for key in new_resources:
             self._resources[key] = new_resources[key]
-        self._dirty_attributes.add(u'resources')
+        self._mark_dirty(u'resources')
 
     def remove_resources(self, resources):
         """
@@ -313,7 +310,7 @@ class BaseExchangeCalendarEvent(object):
             if email in self._resources:
                 del self._resources[email]
 
-        self._dirty_attributes.add(u'resources')
+        self._mark_dirty(u'resources')
 
     @property
     def conference_room(self):
@@ -359,17 +356,6 @@ class BaseExchangeCalendarEvent(object):
     def conflicting_events(self):
         raise NotImplementedError
 
-    def as_json(self):
-        """ Output ourselves as JSON """
-        raise NotImplementedError
-
-    def __getstate__(self):
-        """ Implemented so pickle.dumps() and pickle.loads() work """
-        state = {}
-        for attribute in self.DATA_ATTRIBUTES:
-            state[attribute] = getattr(self, attribute, None)
-        return state
-
     def _build_extended_properties(self, extended_properties):
         result = []
 
@@ -408,19 +394,3 @@ class BaseExchangeCalendarEvent(object):
                     result[item] = ExchangeEventResponse(email=item, required=required, name=None, response=None, last_response=None)
 
         return result
-
-    def _update_properties(self, properties):
-        self._track_dirty_attributes = False
-        for key in properties:
-            setattr(self, key, properties[key])
-        self._track_dirty_attributes = True
-
-    def __setattr__(self, key, value):
-        """ Magically track public attributes, so we can track what we need to flush to the Exchange store """
-        if self._track_dirty_attributes and not key.startswith(u"_"):
-            self._dirty_attributes.add(key)
-
-        object.__setattr__(self, key, value)
-
-    def _reset_dirty_attributes(self):
-        self._dirty_attributes = set()
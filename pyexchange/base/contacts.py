@@ -1,3 +1,7 @@
+from .serializable import SerializableItem
+from .tracking import ChangeTracking
+
+
 class BaseExchangeContactService(object):
     def __init__(self, service, folder_id):
         self.service = service
@@ -10,16 +14,14 @@ class BaseExchangeContactService(object):
         raise NotImplementedError
 
 
-class BaseExchangeContactItem(object):
+class BaseExchangeContactItem(SerializableItem, ChangeTracking):
+    _item_type = u'contact'
     _id = None
     _change_key = None
 
     _service = None
     folder_id = None
 
-    _track_dirty_attributes = False
-    _dirty_attributes = set()  # any attributes that have changed, and we need to update in Exchange
-
     first_name = None
     last_name = None
     full_name = None
@@ -74,22 +76,6 @@ class BaseExchangeContactItem(object):
         """ **Read-only.** When you change a contact, Exchange makes you pass a change key to prevent overwriting a previous version. """
         return self._change_key
 
-    def _update_properties(self, properties):
-        self._track_dirty_attributes = False
-        for key in properties:
-            setattr(self, key, properties[key])
-        self._track_dirty_attributes = True
-
-    def __setattr__(self, key, value):
-        """ Magically track public attributes, so we can track what we need to flush to the Exchange store """
-        if self._track_dirty_attributes and not key.startswith(u"_"):
-            self._dirty_attributes.add(key)
-
-        object.__setattr__(self, key, value)
-
-    def _reset_dirty_attributes(self):
-        self._dirty_attributes = set()
-
     def validate(self):
         """ Validates that all required fields are present """
         if not self.display_name:
@@ -1,3 +1,6 @@
+from .tracking import ChangeTracking
+
+
 class BaseExchangeFolderService(object):
 
     def __init__(self, service):
@@ -7,7 +10,7 @@ class BaseExchangeFolderService(object):
         raise NotImplementedError
 
 
-class BaseExchangeFolder(object):
+class BaseExchangeFolder(ChangeTracking):
 
     _id = None
     _change_key = None
@@ -22,9 +25,7 @@ class BaseExchangeFolder(object):
     child_folder_count = None
     total_count = None
     unread_count = None
-
-    _track_dirty_attributes = False
-    _dirty_attributes = set()  # any attributes that have changed, and we need to update in Exchange
+    effective_rights = None
 
     FOLDER_TYPES = (u'Folder', u'CalendarFolder', u'ContactsFolder', u'SearchFolder', u'TasksFolder')
 
@@ -81,22 +82,6 @@ class BaseExchangeFolder(object):
         if value in self.FOLDER_TYPES:
             self._folder_type = value
 
-    def _update_properties(self, properties):
-        self._track_dirty_attributes = False
-        for key in properties:
-            setattr(self, key, properties[key])
-        self._track_dirty_attributes = True
-
-    def __setattr__(self, key, value):
-        """ Magically track public attributes, so we can track what we need to flush to the Exchange store """
-        if self._track_dirty_attributes and not key.startswith(u"_"):
-            self._dirty_attributes.add(key)
-
-        object.__setattr__(self, key, value)
-
-    def _reset_dirty_attributes(self):
-        self._dirty_attributes = set()
-
     def validate(self):
         """ Validates that all required fields are present """
         if not self.display_name:
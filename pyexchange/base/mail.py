@@ -3,6 +3,9 @@ from __future__ import absolute_import, unicode_literals
 
 import base64
 
+from .serializable import SerializableItem
+from .tracking import ChangeTracking
+
 
 class BaseExchangeMailService(object):
     def __init__(self, service, folder_id):
@@ -10,15 +13,13 @@ class BaseExchangeMailService(object):
         self.folder_id = folder_id
 
 
-class BaseExchangeMailItem(object):
+class BaseExchangeMailItem(SerializableItem, ChangeTracking):
+    _item_type = u'mail'
     _id = None
     _change_key = None
     _service = None
     folder_id = None
 
-    _track_dirty_attributes = False
-    _dirty_attributes = set()  # any attributes that have changed, and we need to update in Exchange
-
     subject = None
     email_address = None
     sender_name = None
@@ -76,22 +77,6 @@ class BaseExchangeMailItem(object):
         """ **Read-only.** When you change a contact, Exchange makes you pass a change key to prevent overwriting a previous version. """
         return self._change_key
 
-    def _update_properties(self, properties):
-        self._track_dirty_attributes = False
-        for key in properties:
-            setattr(self, key, properties[key])
-        self._track_dirty_attributes = True
-
-    def __setattr__(self, key, value):
-        """ Magically track public attributes, so we can track what we need to flush to the Exchange store """
-        if self._track_dirty_attributes and not key.startswith(u"_"):
-            self._dirty_attributes.add(key)
-
-        object.__setattr__(self, key, value)
-
-    def _reset_dirty_attributes(self):
-        self._dirty_attributes = set()
-
     def _format_email_address(self, name, email):
         if name and email:
             return "{} <{}>".format(name, email)
@@ -0,0 +1,45 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+
+
+class SerializableItem(object):
+    """
+    JSON, MessagePack and pickle support for items, using the schema named by ``_item_type`` in
+    :mod:`pyexchange.serialization`. The service is never stored: pickled and copied items come back with
+    ``service`` set to None, so set it again before talking to Exchange.
+    """
+
+    _item_type = None
+
+    def as_json(self):
+        """ Returns the item as a JSON string; load it again with :func:`pyexchange.serialization.from_json`. """
+        from ..serialization import to_json
+        return to_json(self)
+
+    def as_bytes(self):
+        """ Returns the item as MessagePack bytes; load them again with :func:`pyexchange.serialization.from_bytes`. """
+        from ..serialization import to_bytes
+        return to_bytes(self)
+
+    def __getstate__(self):
+        """ Implemented so pickle.dumps() and pickle.loads() work """
+        from ..serialization import SCHEMA_VERSION, item_values
+        item_type, values = item_values(self)
+        return item_type, SCHEMA_VERSION, values, sorted(self._dirty_attributes)
+
+    def __setstate__(self, state):
+        from ..serialization import _schema_for, restore_item
+
+        if isinstance(state, dict):  # pickled by pyexchange before schemas existed
+            self.__dict__.update(state)
+            self._track_dirty_attributes = True
+            return
+
+        item_type, version, values, dirty_attributes = state
+        restore_item(self, values, _schema_for(item_type, version))
+        for name in dirty_attributes:
+            self._mark_dirty(name)
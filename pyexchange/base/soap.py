@@ -6,6 +6,8 @@ Unless required by applicable law or agreed to in writing, software?distributed
 """
 import logging
 import re
+import timeit
+from collections import OrderedDict
 
 from lxml import etree
 from lxml.builder import ElementMaker
@@ -23,6 +25,10 @@ S = ElementMaker(namespace=SOAP_NS, nsmap=SOAP_NAMESPACES)
 
 log = logging.getLogger('pyexchange')
 
+ENVELOPE_END_RE = re.compile(b'</(?:[\\w.-]+:)?Envelope\\s*>')
+
+DATE_VALUE_RE = re.compile(u'^(\\d{4}-\\d{2}-\\d{2})(?:T\\d{2}:\\d{2}:\\d{2}(?:\\.\\d+)?)?(?:Z|[+-]\\d{2}:\\d{2})?$')
+
 if IS_PYTHON3:
     unichr = chr
 
@@ -40,19 +46,147 @@ def remove_control_characters(html):
     return html
 
 
+def _count_items_and_codes(tree):
+    """
+    Returns the number of items and folders in a response, and how often each ResponseCode appears in it, in the
+    order the codes first appear.
+    """
+    if tree is None:
+        return 0, OrderedDict()
+
+    items = len(tree.xpath(u'//*[local-name()="Items" or local-name()="Folders"]/*'))
+    response_codes = OrderedDict()
+    for code in tree.xpath(u'//*[local-name()="ResponseCode"]/text()'):
+        response_codes[code] = response_codes.get(code, 0) + 1
+    return items, response_codes
+
+
+def _response_length(response, encoding):
+    """ The size of a response body in bytes, as told by the connection; only encoded again when it can't tell. """
+    if response is None:
+        return 0
+    length = getattr(response, 'content_length', None)
+    return length if length is not None else len(response.encode(encoding))
+
+
 class ExchangeServiceSOAP(object):
 
     EXCHANGE_DATE_FORMAT = u"%Y-%m-%dT%H:%M:%SZ"
 
     def __init__(self, connection):
         self.connection = connection
+        # Optional callable given a pyexchange.metrics.SOAPCall after every send(), e.g. a MetricsRegistry.
+        self.metrics = None
+        # Parse responses while they download (decompressing on the way) instead of after; see _receive_parsed.
+        self.stream_responses = False
 
     def send(self, xml, headers=None, retries=4, timeout=30, encoding="utf-8", check_for_errors=True):
+        if self.metrics is not None:
+            return self._send_measured(xml, headers, retries, timeout, encoding, check_for_errors)
+
         request_xml = self._wrap_soap_xml_request(xml)
-        log.info(etree.tostring(request_xml, encoding=encoding, pretty_print=True))
+        if log.isEnabledFor(logging.INFO):
+            log.info(etree.tostring(request_xml, encoding=encoding, pretty_print=True))
+        if self.stream_responses:
+            tree, _ = self._receive_parsed(request_xml, headers, retries, timeout, encoding)
+            if check_for_errors:
+                self._check_for_errors(tree)
+            return tree
+
         response = self._send_soap_request(request_xml, headers=headers, retries=retries, timeout=timeout, encoding=encoding)
         return self._parse(response, encoding=encoding, check_for_errors=check_for_errors)
 
+    def _receive_parsed(self, request, headers, retries, timeout, encoding):
+        """
+        Sends ``request`` and feeds the response to the parser chunk by chunk as it arrives, already
+        decompressed by the connection. Returns the tree and the size of the response in bytes.
+        """
+        parser = etree.XMLParser()
+        chunks = iter(self._stream_soap_request(request, headers=headers, retries=retries, timeout=timeout,
+                                                encoding=encoding))
+        # Kept in case the response needs remove_control_characters: a parser can't be rewound.
+        received = []
+        try:
+            for chunk in chunks:
+                received.append(chunk)
+                parser.feed(chunk)
+            tree = parser.close()
+        except etree.XMLSyntaxError:
+            received.extend(chunks)
+            response = b''.join(received)
+            return self._parse(response.decode(encoding), encoding=encoding, check_for_errors=False), len(response)
+
+        if log.isEnabledFor(logging.INFO):
+            log.info(etree.tostring(tree, encoding=encoding, pretty_print=True))
+        return tree, sum(len(chunk) for chunk in received)
+
+    def _send_measured(self, xml, headers, retries, timeout, encoding, check_for_errors):
+        """ :meth:`send`, timing each phase and handing the figures to ``self.metrics``. """
+        from ..metrics import PHASE_BUILD, PHASE_CHECK, PHASE_NETWORK, PHASE_PARSE, PHASE_SERIALIZE, SOAPCall
+
+        clock = timeit.default_timer
+        phases = OrderedDict()
+        request_bytes = response_bytes = None
+        tree = None
+        error = None
+
+        started = clock()
+        try:
+            request_xml = self._wrap_soap_xml_request(xml)
+            phases[PHASE_BUILD], started = clock() - started, clock()
+
+            body = etree.tostring(request_xml, encoding=encoding)
+            request_bytes = len(body)
+            phases[PHASE_SERIALIZE], started = clock() - started, clock()
+
+            if self.stream_responses:
+                # Parsing happens while the response arrives, so it is part of the network phase.
+                tree, response_bytes = self._receive_parsed(body, headers, retries, timeout, encoding)
+                phases[PHASE_NETWORK], started = clock() - started, clock()
+            else:
+                response = self._send_soap_request(body, headers=headers, retries=retries, timeout=timeout, encoding=encoding)
+                response_bytes = _response_length(response, encoding)
+                phases[PHASE_NETWORK], started = clock() - started, clock()
+
+                tree = self._parse(response, encoding=encoding, check_for_errors=False)
+                phases[PHASE_PARSE], started = clock() - started, clock()
+
+            if check_for_errors:
+                self._check_for_errors(tree)
+                phases[PHASE_CHECK] = clock() - started
+            return tree
+        except Exception as err:
+            error = type(err).__name__
+            raise
+        finally:
+            items, response_codes = _count_items_and_codes(tree)
+            try:
+                self.metrics(SOAPCall(operation=etree.QName(xml).localname, phases=phases, request_bytes=request_bytes,
+                                      response_bytes=response_bytes, items=items, response_codes=response_codes,
+                                      error=error))
+            except Exception:
+                log.exception(u'Recording metrics failed')
+
+    def send_streaming(self, xml, headers=None, timeout=30, encoding="utf-8", check_for_errors=True, retries=4):
+        """
+        Like :meth:`send`, for responses made of several SOAP envelopes written one after another over a long-lived
+        connection. Yields the parsed tree of each envelope as soon as it has arrived in full.
+        """
+        request_xml = self._wrap_soap_xml_request(xml)
+        if log.isEnabledFor(logging.INFO):
+            log.info(etree.tostring(request_xml, encoding=encoding, pretty_print=True))
+
+        buffered = b''
+        for chunk in self._stream_soap_request(request_xml, headers=headers, retries=retries, timeout=timeout,
+                                               encoding=encoding):
+            buffered += chunk
+            start = 0
+            for end in ENVELOPE_END_RE.finditer(buffered):
+                yield self._parse(buffered[start:end.end()].strip().decode(encoding), encoding=encoding,
+                                  check_for_errors=check_for_errors)
+                start = end.end()
+            buffered = buffered[start:]
+
     def _parse(self, response, encoding="utf-8", check_for_errors=True):
 
         try:
@@ -66,7 +200,8 @@ class ExchangeServiceSOAP(object):
         if check_for_errors:
             self._check_for_errors(tree)
 
-        log.info(etree.tostring(tree, encoding=encoding, pretty_print=True))
+        if log.isEnabledFor(logging.INFO):
+            log.info(etree.tostring(tree, encoding=encoding, pretty_print=True))
         return tree
 
     def _check_for_errors(self, xml_tree):
@@ -83,11 +218,16 @@ class ExchangeServiceSOAP(object):
             raise FailedExchangeException(u"SOAP Fault from Exchange server", fault.text)
 
     def _send_soap_request(self, xml, headers=None, retries=2, timeout=30, encoding="utf-8"):
-        body = etree.tostring(xml, encoding=encoding)
+        body = xml if isinstance(xml, bytes) else etree.tostring(xml, encoding=encoding)
 
         response = self.connection.send(body, headers, retries, timeout)
         return response
 
+    def _stream_soap_request(self, xml, headers=None, retries=2, timeout=30, encoding="utf-8"):
+        body = xml if isinstance(xml, bytes) else etree.tostring(xml, encoding=encoding)
+
+        return self.connection.stream(body, headers, timeout, retries)
+
     def _wrap_soap_xml_request(self, exchange_xml):
         root = S.Envelope(S.Body(exchange_xml))
         return root
@@ -103,6 +243,17 @@ class ExchangeServiceSOAP(object):
 
         return date.date()
 
+    def _parse_date_value(self, date_string):
+        """
+        Parses an xs:date or xs:dateTime ("2014-05-14", "2014-05-14Z", "2014-05-14T00:00:00-07:00",
+        "2014-05-14T07:00:00.000Z") into a date. The date is taken as written, in whatever offset the
+        server used, since converting midnight to UTC would move it to another day.
+        """
+        match = DATE_VALUE_RE.match(date_string.strip())
+        if match is None:
+            raise ValueError(u'Not an Exchange date: %r' % date_string)
+        return datetime.strptime(match.group(1), u'%Y-%m-%d').date()
+
     def _xpath_to_dict(self, element, property_map, namespace_map):
         """
         property_map = {
@@ -118,12 +269,14 @@ class ExchangeServiceSOAP(object):
 
         result = {}
 
-        log.info(etree.tostring(element, pretty_print=True))
+        if log.isEnabledFor(logging.INFO):
+            log.info(etree.tostring(element, pretty_print=True))
 
         for key in property_map:
             item = property_map[key]
-            log.info(u'Pulling xpath {xpath} into key {key}'.format(key=key, xpath=item[u'xpath']))
-            nodes = element.xpath(item[u'xpath'], namespaces=namespace_map)
+            log.info(u'Pulling xpath %s into key %s', item[u'xpath'], key)
+            # Plain strings: lxml's "smart" strings keep a reference to the whole response tree.
+            nodes = element.xpath(item[u'xpath'], namespaces=namespace_map, smart_strings=False)
 
             if nodes:
                 result_for_node = []
@@ -139,6 +292,8 @@ class ExchangeServiceSOAP(object):
 
                     if cast_as == u'datetime':
                         result_for_node.append(self._parse_date(text))
+                    elif cast_as == u'date':
+                        result_for_node.append(self._parse_date_value(text))
                     elif cast_as == u'date_only_naive':
                         result_for_node.append(self._parse_date_only_naive(text))
                     elif cast_as == u'int':
@@ -0,0 +1,97 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import threading
+
+# Every attribute name that has ever been tracked gets one bit, the same for all classes.
+_DIRTY_BITS = {}
+_DIRTY_NAMES = []
+_DIRTY_BITS_LOCK = threading.Lock()
+
+
+def _dirty_bit(name):
+    bit = _DIRTY_BITS.get(name)
+    if bit is None:
+        with _DIRTY_BITS_LOCK:
+            bit = _DIRTY_BITS.get(name)
+            if bit is None:
+                bit = _DIRTY_BITS[name] = 1 << len(_DIRTY_NAMES)
+                _DIRTY_NAMES.append(name)
+    return bit
+
+
+# Values that can change in place, so comparing them with what was loaded says nothing.
+_MUTABLE_TYPES = (list, dict, set)
+
+
+def _same_value(a, b):
+    return type(a) is type(b) and a == b
+
+
+class ChangeTracking(object):
+    """
+    Tracks which public attributes of an item changed since it was loaded, so updates only send those.
+
+    Changes are kept per instance as a bitmask with one bit per attribute name. Setting an attribute to the value
+    it already has is not a change, and setting it back to the value it was loaded with undoes the change. Lists,
+    dicts and sets may have been changed in place before being assigned, so assigning one is always a change.
+    Properties that change state in place (e.g. adding attendees) call :meth:`_mark_dirty` themselves.
+    """
+
+    _track_dirty_attributes = False
+    _dirty_mask = 0
+    _original_values = None  # the loaded value of each changed attribute, created on the first change
+
+    @property
+    def _dirty_attributes(self):
+        """ The names of the attributes that changed, as a set. """
+        mask = self._dirty_mask
+        return set(name for index, name in enumerate(_DIRTY_NAMES) if mask >> index & 1)
+
+    def _is_dirty(self, name):
+        return bool(self._dirty_mask & _dirty_bit(name))
+
+    def _mark_dirty(self, name):
+        self._dirty_mask |= _dirty_bit(name)
+        if self._original_values is not None:
+            self._original_values.pop(name, None)
+
+    def _reset_dirty_attributes(self):
+        self._dirty_mask = 0
+        self._original_values = None
+
+    def _update_properties(self, properties):
+        self._track_dirty_attributes = False
+        for key in properties:
+            setattr(self, key, properties[key])
+        self._track_dirty_attributes = True
+
+    def __setattr__(self, key, value):
+        """ Magically track public attributes, so we can track what we need to flush to the Exchange store """
+        if self._track_dirty_attributes and not key.startswith(u"_") and key != u'service':
+            self._note_change(key, value)
+
+        object.__setattr__(self, key, value)
+
+    def _note_change(self, key, value):
+        bit = _dirty_bit(key)
+
+        if isinstance(value, _MUTABLE_TYPES):
+            self._mark_dirty(key)
+        elif not self._dirty_mask & bit:
+            current = getattr(self, key, None)
+            if _same_value(current, value):
+                return
+            if isinstance(current, _MUTABLE_TYPES):
+                self._dirty_mask |= bit
+                return
+            if self._original_values is None:
+                self._original_values = {}
+            self._original_values[key] = current
+            self._dirty_mask |= bit
+        elif key in (self._original_values or ()) and _same_value(self._original_values[key], value):
+            del self._original_values[key]
+            self._dirty_mask &= ~bit
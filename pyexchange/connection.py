@@ -5,134 +5,638 @@ Licensed under the Apache License, Version 2.0 (the "License");?you may not use
 Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 """
 import requests
+import six
 from requests_ntlm import HttpNtlmAuth
 from requests.auth import HTTPBasicAuth
+from urllib3.exceptions import ConnectTimeoutError
 
-import logging
+try:
+    from requests_kerberos import HTTPKerberosAuth, OPTIONAL
+except ImportError:
+    HTTPKerberosAuth = OPTIONAL = None
 
-from .exceptions import FailedExchangeException
+import logging
+import os
+import random
+import re
+import threading
+import time
+import warnings
+import zlib
+
+from .exceptions import ExchangeEndpointException, ExchangeServerBusyException, FailedExchangeException
+from .tracing import client_span, inject_context, note_attempt
+from .transport import RequestsTransport, TransportError
+from .utils import concurrent_map
 
 log = logging.getLogger('pyexchange')
 
+BACK_OFF_RE = re.compile(b'Name="BackOffMilliseconds"[^>]*>\\s*(\\d+)')
+SOAP_ENVELOPE_NS = b'http://schemas.xmlsoap.org/soap/envelope/'
+OPERATION_RE = re.compile(b'<(?:\\w+:)?Body[^>]*>\\s*<(?:\\w+:)?(\\w+)')
+# Operations that only read, so they can be sent again to another endpoint whatever happened to them.
+READ_ONLY_OPERATION_PREFIXES = (b'Get', b'Find', b'Sync')
+READ_ONLY_OPERATIONS = frozenset([b'ResolveNames', b'ExpandDL', b'ConvertId'])
+
+
+class ResponseText(six.text_type):
+    """ The text of a response, with the size of its (decompressed) body in bytes as ``content_length``. """
+    content_length = None
+
 
 class ExchangeBaseConnection(object):
     """ Base class for Exchange connections."""
 
+    # Optional tracer (see pyexchange.tracing) for a span around every HTTP request.
+    tracer = None
+    # Optional pyexchange.throttling.Governor limiting the requests sent.
+    governor = None
+    # Request bodies of at least this many bytes are sent gzipped; None never compresses. Only turn this on if
+    # the server decompresses requests (IIS dynamic request decompression), which Exchange doesn't by default.
+    compress_requests = None
+
     def send(self, body, headers=None, retries=2, timeout=30, encoding="utf-8"):
+        """
+        Sends ``body`` and returns the response text. An ``ErrorServerBusy`` answer is only retried (up to
+        ``retries`` times, after the back-off Exchange asks for) by a connection with a ``governor``; without one
+        it raises ExchangeServerBusyException straight away and ``retries`` has no effect.
+        """
         raise NotImplementedError
 
+    def stream(self, body, headers=None, timeout=30, retries=2):
+        """
+        Sends ``body`` and yields the response body in byte chunks as they arrive, for long-running responses
+        such as GetStreamingEvents. Connections that can't stream hand over the whole response at the end.
+        Like :meth:`send`, a busy server is retried up to ``retries`` times, but only before anything is yielded.
+        """
+        yield self.send(body, headers, retries, timeout).encode('utf-8')
 
-class ExchangeNTLMAuthConnection(ExchangeBaseConnection):
-    """ Connection to Exchange that uses NTLM authentication """
 
-    def __init__(self, url, username, password, verify_certificate=True, **kwargs):
-        self.url = url
-        self.username = username
-        self.password = password
-        self.verify_certificate = verify_certificate
-        self.handler = None
-        self.session = None
-        self.password_manager = None
+class ExchangeConnection(ExchangeBaseConnection):
+    """
+    Connection to Exchange that sends its requests with a :mod:`pyexchange.transport` and authenticates with a
+    ``requests`` auth object. ::
 
-    def build_password_manager(self):
-        if self.password_manager:
-            return self.password_manager
+        connection = ExchangeConnection(url, auth=HTTPBasicAuth(username, password), transport=Urllib3Transport())
 
-        log.debug(u'Constructing password manager')
+    Without a ``transport`` requests go through a ``requests`` session (:class:`~pyexchange.transport.RequestsTransport`)
+    that keeps up to ``pool_size`` sockets open (the ``requests`` default is 10), so handshakes done for one request
+    are reused by the next ones; :meth:`warm_up` authenticates them ahead of the first requests. A transport that is
+    passed in gets ``auth`` unless it has auth of its own. A process forked after the first request gets a
+    transport of its own on its next one, rather than sharing sockets with its parent.
 
-        self.password_manager = HttpNtlmAuth(self.username, self.password)
+    Subclasses for a given kind of authentication implement :meth:`build_auth`. Setting :attr:`session` sends
+    requests through that ``requests`` session from then on. ``password_manager``, ``build_password_manager()``
+    and ``handler`` are deprecated names for the auth object, :meth:`build_auth` and the session.
+    """
 
-        return self.password_manager
+    def __init__(self, url, auth=None, transport=None, verify_certificate=True, governor=None, compress_requests=None,
+                 pool_size=None):
+        self.url = url
+        self.auth = auth
+        self.verify_certificate = verify_certificate
+        self.governor = governor
+        self.compress_requests = compress_requests
+        self.pool_size = pool_size
+        self.transport = transport
+        self._owns_transport = transport is None
+        self._pid = None
+        self._transport_lock = threading.Lock()
+
+    def build_auth(self):
+        """ Returns the ``requests`` auth object for a new transport; called again in forked processes. """
+        return self.auth
+
+    def _auth(self):
+        # auth set on the connection (or through password_manager) wins over what subclasses would build.
+        return self.auth if self.auth is not None else self.build_auth()
+
+    def build_transport(self):
+        if self.transport is not None and self._pid == os.getpid():
+            return self.transport
+
+        with self._transport_lock:
+            if self._pid is not None and self._pid != os.getpid():
+                # Forked: the sockets (and NTLM state) belong to the parent.
+                log.debug(u'Process forked, rebuilding the transport')
+                if self._owns_transport:
+                    self.transport = None
+                else:
+                    self.transport.after_fork()
+
+            if self.transport is None:
+                log.debug(u'Constructing transport')
+                self.transport = RequestsTransport(self._auth(), self.verify_certificate, self.pool_size)
+            elif getattr(self.transport, 'auth', False) is None:
+                self.transport.auth = self._auth()
+
+            self._pid = os.getpid()
+
+        return self.transport
+
+    @property
+    def session(self):
+        """ The ``requests`` session of the default transport, once built. """
+        return getattr(self.transport, 'session', None)
+
+    @session.setter
+    def session(self, session):
+        with self._transport_lock:
+            if session is None:
+                self.transport = None
+                self._owns_transport = True
+            else:
+                self.transport = RequestsTransport(session.auth, self.verify_certificate, self.pool_size)
+                self.transport.session = session
+                self._owns_transport = False
+            self._pid = None
 
     def build_session(self):
-        if self.session:
-            return self.session
-
-        log.debug(u'Constructing opener')
+        return self.build_transport().build_session()
+
+    @property
+    def password_manager(self):
+        warnings.warn(u'password_manager is deprecated; use auth', DeprecationWarning, stacklevel=2)
+        return getattr(self.transport, 'auth', None) or self.auth
+
+    @password_manager.setter
+    def password_manager(self, auth):
+        warnings.warn(u'password_manager is deprecated; use auth', DeprecationWarning, stacklevel=2)
+        self.auth = auth
+        if self.transport is not None:
+            self.transport.auth = auth
+        if self.session is not None:
+            self.session.auth = auth
 
-        self.password_manager = self.build_password_manager()
-
-        self.session = requests.Session()
-        self.session.auth = self.password_manager
+    def build_password_manager(self):
+        warnings.warn(u'build_password_manager() is deprecated; use build_auth()', DeprecationWarning, stacklevel=2)
+        return self.build_auth()
 
+    @property
+    def handler(self):
+        warnings.warn(u'handler is deprecated; use session', DeprecationWarning, stacklevel=2)
         return self.session
 
+    @handler.setter
+    def handler(self, session):
+        warnings.warn(u'handler is deprecated; use session', DeprecationWarning, stacklevel=2)
+        self.session = session
+
+    def warm_up(self, connections=None, timeout=30):
+        """
+        Opens and authenticates ``connections`` sockets (default: ``pool_size``, or 1) at the same time, so the
+        first requests after startup or a fork don't each pay for a handshake. Returns how many authenticated.
+        """
+        transport = self.build_transport()
+        count = connections or self.pool_size or 1
+
+        def authenticate(_):
+            try:
+                response = transport.get(self.url, timeout=timeout)
+                response.close()
+            except (requests.exceptions.RequestException, TransportError) as err:
+                log.debug(u'Warming up a connection failed: %s', err)
+                return False
+            return response.status_code not in (401, 403)
+
+        return sum(concurrent_map(authenticate, range(count), max_workers=count))
+
     def send(self, body, headers=None, retries=2, timeout=30, encoding=u"utf-8"):
-        if not self.session:
-            self.session = self.build_session()
+        self.build_transport()
 
         try:
-            response = self.session.post(self.url, data=body, headers=headers,
-                                         verify=self.verify_certificate, timeout=timeout)
+            response = _post(self, body, headers, timeout, retries=retries)
             response.raise_for_status()
-        except requests.exceptions.RequestException as err:
+        except (requests.exceptions.RequestException, TransportError) as err:
             log.debug(u'Sent headers: {headers}'.format(headers=headers))
             log.debug(body)
             log.debug(getattr(err.response, 'headers', 'No headers.'))
             log.debug(getattr(err.response, 'content', 'No response.'))
 
-            raise FailedExchangeException(u'Unable to connect to Exchange: %s' % err)
+            raise _request_failed(u'Unable to connect to Exchange: %s' % err, err)
 
         log.info(u'Got response: {code}'.format(code=response.status_code))
         log.debug(u'Got response headers: {headers}'.format(headers=response.headers))
         log.debug(u'Got body: {body}'.format(body=response.text))
 
-        return response.text
+        text = ResponseText(response.text)
+        text.content_length = len(response.content)
+        return text
 
+    def stream(self, body, headers=None, timeout=30, retries=2):
+        self.build_transport()
 
-class ExchangeBasicAuthConnection(ExchangeBaseConnection):
-    """ Connection to Exchange that uses basic authentication """
+        return _stream_response(self, body, headers, timeout, retries)
+
+
+class ExchangeNTLMAuthConnection(ExchangeConnection):
+    """ Connection to Exchange that uses NTLM authentication """
 
     def __init__(self, url, username, password, verify_certificate=True, **kwargs):
-        self.url = url
+        super(ExchangeNTLMAuthConnection, self).__init__(url, verify_certificate=verify_certificate, **kwargs)
         self.username = username
         self.password = password
-        self.verify_certificate = verify_certificate
-        self.handler = None
-        self.session = None
-        self.password_manager = None
-
-    def build_password_manager(self):
-        if self.password_manager:
-            return self.password_manager
 
+    def build_auth(self):
         log.debug(u'Constructing password manager')
+        return HttpNtlmAuth(self.username, self.password)
 
-        self.password_manager = HTTPBasicAuth(self.username, self.password)
 
-        return self.password_manager
-
-    def build_session(self):
-        if self.session:
-            return self.session
+class ExchangeBasicAuthConnection(ExchangeConnection):
+    """ Connection to Exchange that uses basic authentication """
 
-        log.debug(u'Constructing opener')
+    def __init__(self, url, username, password, verify_certificate=True, **kwargs):
+        super(ExchangeBasicAuthConnection, self).__init__(url, verify_certificate=verify_certificate, **kwargs)
+        self.username = username
+        self.password = password
 
-        self.password_manager = self.build_password_manager()
+    def build_auth(self):
+        log.debug(u'Constructing password manager')
+        return HTTPBasicAuth(self.username, self.password)
 
-        self.session = requests.Session()
-        self.session.auth = self.password_manager
 
-        return self.session
+class ExchangeKerberosAuthConnection(ExchangeConnection):
+    """
+    Connection to Exchange that uses SPNEGO/Kerberos with the credentials in the current ticket cache (or of
+    ``principal``). The ticket goes out with the first request instead of waiting for a challenge, so there is no
+    extra round trip per socket. Needs ``requests-kerberos``.
+    """
 
-    def send(self, body, headers=None, retries=2, timeout=30, encoding=u"utf-8"):
-        if not self.session:
-            self.session = self.build_session()
+    def __init__(self, url, principal=None, verify_certificate=True, **kwargs):
+        if HTTPKerberosAuth is None:
+            raise ImportError(u'ExchangeKerberosAuthConnection needs requests-kerberos (pip install requests-kerberos)')
+        super(ExchangeKerberosAuthConnection, self).__init__(url, verify_certificate=verify_certificate, **kwargs)
+        self.principal = principal
 
-        try:
-            response = self.session.post(self.url, data=body, headers=headers,
-                                         verify=self.verify_certificate, timeout=timeout)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            log.debug(u'Sent headers: {headers}'.format(headers=headers))
-            log.debug(body)
-            log.debug(getattr(err.response, 'headers', 'No headers.'))
-            log.debug(getattr(err.response, 'content', 'No response.'))
-
-            raise FailedExchangeException(u'Unable to connect to Exchange: %s' % err)
-
-        log.info(u'Got response: {code}'.format(code=response.status_code))
-        log.debug(u'Got response headers: {headers}'.format(headers=response.headers))
-        log.debug(u'Got body: {body}'.format(body=response.text))
+    def build_auth(self):
+        log.debug(u'Constructing password manager')
+        return HTTPKerberosAuth(mutual_authentication=OPTIONAL, force_preemptive=True, principal=self.principal)
+
+
+class BearerAuth(requests.auth.AuthBase):
+    """
+    Sends ``Authorization: Bearer <token>``. The token from ``token_provider()`` is kept until Exchange answers
+    401, then fetched again and the request sent once more.
+    """
+
+    def __init__(self, token_provider):
+        self.token_provider = token_provider
+        self._token = None
+        self._lock = threading.Lock()
+
+    def token(self, refresh=False):
+        with self._lock:
+            if refresh or self._token is None:
+                self._token = self.token_provider()
+            return self._token
+
+    def __call__(self, request):
+        request.headers['Authorization'] = u'Bearer %s' % self.token()
+        request.register_hook('response', self._retry_unauthorized)
+        return request
+
+    def _retry_unauthorized(self, response, **kwargs):
+        if response.status_code != 401 or getattr(response.request, '_bearer_retried', False):
+            return response
+
+        response.content  # release the socket back to the pool
+        response.close()
+        request = response.request.copy()
+        request._bearer_retried = True
+        request.headers['Authorization'] = u'Bearer %s' % self.token(refresh=True)
+
+        retried = response.connection.send(request, **kwargs)
+        retried.history.append(response)
+        retried.request = request
+        return retried
+
+
+class ExchangeOAuthConnection(ExchangeConnection):
+    """
+    Connection to Exchange Online (or Exchange with OAuth set up) that sends a bearer token. Pass a fixed
+    ``token``, or a ``token_provider`` callable returning a current one (an MSAL ``acquire_token_*`` wrapper,
+    say); it is called again whenever Exchange rejects the token.
+    """
+
+    def __init__(self, url, token=None, token_provider=None, verify_certificate=True, **kwargs):
+        if (token is None) == (token_provider is None):
+            raise ValueError(u'Pass either token or token_provider')
+        super(ExchangeOAuthConnection, self).__init__(url, verify_certificate=verify_certificate, **kwargs)
+        self.token_provider = token_provider if token_provider is not None else (lambda: token)
+
+    def build_auth(self):
+        log.debug(u'Constructing password manager')
+        return BearerAuth(self.token_provider)
+
+
+class Endpoint(object):
+    """ The health of one connection of an :class:`ExchangeFailoverConnection`. """
+
+    CLOSED = u'closed'  # taking requests
+    OPEN = u'open'      # failing; no requests until reset_timeout has passed
+    PROBING = u'probing'  # one request is finding out whether it works again
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.state = self.CLOSED
+        self.latency = None  # moving average of successful requests, in seconds
+        self.error_rate = 0.0  # moving average, between 0 and 1
+        self.failures = 0  # in a row
+        self.in_flight = 0
+        self.opened_at = None
+
+    def score(self):
+        """
+        Lower is better: the expected latency given the requests already waiting on this endpoint, made worse by
+        its recent errors.
+        """
+        return (self.latency or 0.0) * (self.in_flight + 1) / max(1.0 - self.error_rate, 0.01) + self.error_rate
+
+    def __repr__(self):
+        return u'<Endpoint %s %s latency=%s error_rate=%.2f>' % (
+            getattr(self.connection, 'url', self.connection), self.state, self.latency, self.error_rate)
+
+
+class ExchangeFailoverConnection(ExchangeBaseConnection):
+    """
+    Spreads requests over several connections to the same Exchange organization (one per CAS node, say), and
+    fails over when one of them stops working. ::
+
+        connection = ExchangeFailoverConnection([
+            ExchangeNTLMAuthConnection(url=u'https://cas1.example.com/EWS/Exchange.asmx', username=..., password=...),
+            ExchangeNTLMAuthConnection(url=u'https://cas2.example.com/EWS/Exchange.asmx', username=..., password=...),
+        ])
+
+    Each request goes to the endpoint with the lowest expected latency (``routing=ROUTING_LEAST_LATENCY``), or to
+    the better of two picked at random (``ROUTING_P2C``, which spreads load better with many clients). If the
+    endpoint can't be reached or fails without a SOAP answer, the next best endpoint gets the request, until every
+    endpoint has been tried once; requests that change something only go to another endpoint if they never got to
+    the first one, since they may have been carried out. A stream fails over the same way until its first chunk
+    has arrived; losing the connection after that raises ExchangeEndpointException.
+
+    After ``failure_threshold`` failures in a row an endpoint's circuit opens and it gets no requests for
+    ``reset_timeout`` seconds. Then a single request probes it: if that works the endpoint is back, otherwise
+    the circuit opens again. When every circuit is open requests fail straight away instead of waiting for
+    timeouts. Errors Exchange answered with, such as ``ErrorServerBusy`` throttling, are passed on without failing
+    over or counting against the endpoint.
+    """
+
+    ROUTING_LEAST_LATENCY = u'least_latency'
+    ROUTING_P2C = u'p2c'
+
+    # How a request to an endpoint ended; None when it was cut short (e.g. the caller stopped reading a stream).
+    SUCCEEDED = u'succeeded'
+    FAILED = u'failed'
+    ANSWERED = u'answered'  # with an error from Exchange, so the endpoint works
+
+    def __init__(self, connections, routing=ROUTING_LEAST_LATENCY, failure_threshold=3, reset_timeout=30,
+                 smoothing=0.3, clock=None, random_seed=None):
+        if not connections:
+            raise ValueError(u'ExchangeFailoverConnection needs at least one connection')
+        if routing not in (self.ROUTING_LEAST_LATENCY, self.ROUTING_P2C):
+            raise ValueError(u'routing must be %r or %r' % (self.ROUTING_LEAST_LATENCY, self.ROUTING_P2C))
+
+        self.endpoints = [Endpoint(connection) for connection in connections]
+        self.routing = routing
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.smoothing = smoothing
+        self.clock = clock or getattr(time, 'monotonic', time.time)
+        self._random = random.Random(random_seed)
+        self._lock = threading.Lock()
+
+    @property
+    def tracer(self):
+        return self.endpoints[0].connection.tracer
+
+    @tracer.setter
+    def tracer(self, tracer):
+        for endpoint in self.endpoints:
+            endpoint.connection.tracer = tracer
 
-        return response.text
+    def send(self, body, headers=None, retries=2, timeout=30, encoding=u"utf-8"):
+        read_only = _is_read_only(body)
+        tried = []
+        while True:
+            endpoint = self._choose(tried)
+            tried.append(endpoint)
+            started = self.clock()
+            outcome = None
+            try:
+                response = endpoint.connection.send(body, headers, retries, timeout, encoding)
+                outcome = self.SUCCEEDED
+                return response
+            except ExchangeEndpointException as err:
+                outcome = self.FAILED
+                if len(tried) == len(self.endpoints) or (err.sent and not read_only):
+                    raise
+                log.warning(u'Exchange endpoint %r failed, trying another: %s', endpoint, err)
+            except FailedExchangeException:
+                outcome = self.ANSWERED
+                raise
+            finally:
+                self._finish(endpoint, outcome, self.clock() - started)
+
+    def stream(self, body, headers=None, timeout=30, retries=2):
+        read_only = _is_read_only(body)
+        tried = []
+        while True:
+            endpoint = self._choose(tried)
+            tried.append(endpoint)
+            started = self.clock()
+            outcome = None
+            received = False
+            try:
+                for chunk in endpoint.connection.stream(body, headers, timeout, retries):
+                    received = True
+                    yield chunk
+                outcome = self.SUCCEEDED
+                return
+            except ExchangeEndpointException as err:
+                outcome = self.FAILED
+                if received or len(tried) == len(self.endpoints) or (err.sent and not read_only):
+                    raise
+                log.warning(u'Exchange endpoint %r failed, trying another: %s', endpoint, err)
+            except FailedExchangeException:
+                outcome = self.ANSWERED
+                raise
+            finally:
+                self._finish(endpoint, outcome, self.clock() - started)
+
+    def _finish(self, endpoint, outcome, latency):
+        if outcome == self.SUCCEEDED:
+            self._succeeded(endpoint, latency)
+        elif outcome == self.FAILED:
+            self._failed(endpoint)
+        else:
+            self._release(endpoint, answered=outcome == self.ANSWERED)
+
+    def _choose(self, tried):
+        """ Picks the endpoint for the next attempt and counts the request as in flight there. """
+        with self._lock:
+            now = self.clock()
+            candidates = []
+            for endpoint in self.endpoints:
+                if endpoint in tried:
+                    continue
+                if endpoint.state == Endpoint.OPEN and now - endpoint.opened_at >= self.reset_timeout:
+                    # The first request after the timeout probes the endpoint; nothing else goes there meanwhile.
+                    endpoint.state = Endpoint.PROBING
+                    endpoint.in_flight += 1
+                    return endpoint
+                if endpoint.state == Endpoint.CLOSED:
+                    candidates.append(endpoint)
+
+            if not candidates:
+                raise FailedExchangeException(u'No healthy Exchange endpoint to send the request to')
+
+            if self.routing == self.ROUTING_P2C and len(candidates) > 2:
+                candidates = self._random.sample(candidates, 2)
+            endpoint = min(candidates, key=Endpoint.score)
+            endpoint.in_flight += 1
+            return endpoint
+
+    def _release(self, endpoint, answered):
+        with self._lock:
+            endpoint.in_flight -= 1
+            if endpoint.state == Endpoint.PROBING:
+                # A probe that told nothing leaves the circuit open, for the next request to probe again.
+                endpoint.state = Endpoint.CLOSED if answered else Endpoint.OPEN
+
+    def _succeeded(self, endpoint, latency):
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.failures = 0
+            endpoint.state = Endpoint.CLOSED
+            endpoint.latency = latency if endpoint.latency is None else \
+                endpoint.latency + self.smoothing * (latency - endpoint.latency)
+            endpoint.error_rate -= self.smoothing * endpoint.error_rate
+
+    def _failed(self, endpoint):
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.failures += 1
+            endpoint.error_rate += self.smoothing * (1 - endpoint.error_rate)
+            if endpoint.state == Endpoint.PROBING or endpoint.failures >= self.failure_threshold:
+                if endpoint.state != Endpoint.OPEN:
+                    log.warning(u'Opening the circuit of Exchange endpoint %r', endpoint)
+                endpoint.state = Endpoint.OPEN
+                endpoint.opened_at = self.clock()
+
+
+def _is_read_only(body):
+    if not isinstance(body, bytes):
+        body = body.encode('utf-8')
+    match = OPERATION_RE.search(body)
+    if match is None:
+        return False
+    operation = match.group(1)
+    return operation in READ_ONLY_OPERATIONS or operation.startswith(READ_ONLY_OPERATION_PREFIXES)
+
+
+def _request_failed(message, err):
+    """
+    The exception for a request that failed with ``err``: ExchangeEndpointException when Exchange didn't answer
+    it with a SOAP response, else FailedExchangeException.
+    """
+    response = getattr(err, 'response', None)
+    if response is None:
+        return ExchangeEndpointException(message, sent=_was_sent(err))
+    if response.status_code >= 500 and SOAP_ENVELOPE_NS not in (response.content or b''):
+        return ExchangeEndpointException(message)
+    return FailedExchangeException(message)
+
+
+def _was_sent(err):
+    """ False when ``err`` says the connection could not be made, so the request never got to the server. """
+    if isinstance(err, TransportError):
+        return err.sent
+    if isinstance(err, requests.exceptions.ConnectTimeout):
+        return False
+    if isinstance(err, requests.exceptions.ConnectionError) and err.args:
+        return not isinstance(getattr(err.args[0], 'reason', err.args[0]), ConnectTimeoutError)
+    return True
+
+
+def _post(connection, body, headers, timeout, stream=False, retries=0):
+    """
+    Posts ``body`` through the connection's governor, if it has one, retrying up to ``retries`` times when
+    Exchange is busy. Raises ExchangeServerBusyException if it stays busy, or at once without a governor.
+    """
+    governor = connection.governor
+    mailbox = (headers or {}).get('X-AnchorMailbox')
+    attempt = 0
+
+    if connection.compress_requests is not None and len(body) >= connection.compress_requests:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # gzip framing
+        body = compressor.compress(body) + compressor.flush()
+        headers = dict(headers or {})
+        headers['Content-Encoding'] = 'gzip'
+
+    while True:
+        if governor is None:
+            response = _post_once(connection, body, headers, timeout, stream)
+        else:
+            with governor.request(mailbox):
+                response = _post_once(connection, body, headers, timeout, stream)
+
+        back_off = _server_busy_back_off(response)
+        if back_off is False:
+            if governor is not None:
+                governor.succeeded(mailbox)
+            return response
+
+        response.close()
+        log.info(u'Exchange is busy, asked to back off for %s seconds', back_off)
+        if governor is None:
+            raise ExchangeServerBusyException(u'Exchange Fault (ErrorServerBusy) from Exchange server', back_off)
+
+        governor.throttled(mailbox, back_off or 0)
+        if attempt >= retries:
+            raise ExchangeServerBusyException(u'Exchange Fault (ErrorServerBusy) from Exchange server', back_off)
+        attempt += 1
+
+
+def _server_busy_back_off(response):
+    """ Returns False unless ``response`` is an ErrorServerBusy fault; then the back-off in seconds, or None. """
+    if response.status_code not in (500, 503):
+        return False
+    content = response.content or b''
+    if b'ErrorServerBusy' not in content:
+        return False
+    match = BACK_OFF_RE.search(content)
+    return int(match.group(1)) / 1000.0 if match else None
+
+
+def _post_once(connection, body, headers, timeout, stream):
+    note_attempt()
+    if connection.tracer is None:
+        return connection.transport.post(connection.url, body, headers, timeout, stream)
+
+    headers = dict(headers or {})
+    inject_context(headers)
+    attributes = {u'http.method': u'POST', u'http.url': connection.url, u'http.request_content_length': len(body)}
+    with client_span(connection.tracer, u'POST', attributes) as span:
+        response = connection.transport.post(connection.url, body, headers, timeout, stream)
+        span.set_attribute(u'http.status_code', response.status_code)
+        return response
+
+
+def _stream_response(connection, body, headers, timeout, retries):
+    try:
+        response = _post(connection, body, headers, timeout, stream=True, retries=retries)
+        response.raise_for_status()
+    except (requests.exceptions.RequestException, TransportError) as err:
+        log.debug(u'Sent headers: {headers}'.format(headers=headers))
+        log.debug(body)
+        raise _request_failed(u'Unable to connect to Exchange: %s' % err, err)
+
+    log.info(u'Got response: {code}'.format(code=response.status_code))
+
+    try:
+        for chunk in response.iter_content(chunk_size=None):
+            yield chunk
+    except (requests.exceptions.RequestException, TransportError) as err:
+        raise ExchangeEndpointException(u'Connection to Exchange lost: %s' % err)
+    finally:
+        response.close()
@@ -39,6 +39,44 @@ class ExchangeInternalServerTransientErrorException(FailedExchangeException):
     pass
 
 
+class ExchangeServerBusyException(FailedExchangeException):
+    """
+    Raised when Exchange is throttling the client (``ErrorServerBusy``). ``back_off`` is how many seconds Exchange
+    asked to wait before trying again, or None if it didn't say.
+    """
+
+    def __init__(self, message, back_off=None):
+        super(ExchangeServerBusyException, self).__init__(message)
+        self.back_off = back_off
+
+
+class ExchangeEndpointException(FailedExchangeException):
+    """
+    Raised when the Exchange server could not be reached or did not answer as EWS: a connection error, a timeout, or
+    an HTTP 5xx error without a SOAP body. ``sent`` is False when the request certainly never got to the server.
+    """
+
+    def __init__(self, message, sent=True):
+        super(ExchangeEndpointException, self).__init__(message)
+        self.sent = sent
+
+
+class ExchangeSubscriptionExpiredException(FailedExchangeException):
+    """
+    Raised when a notification subscription has expired or no longer exists on the server, so it has to be
+    subscribed again. ``subscription_ids`` lists the affected subscriptions when Exchange says which ones.
+    """
+
+    def __init__(self, message, subscription_ids=None):
+        super(ExchangeSubscriptionExpiredException, self).__init__(message)
+        self.subscription_ids = subscription_ids or []
+
+
+class ExchangeInvalidWatermarkException(FailedExchangeException):
+    """Raised when Exchange can't resume a subscription from the given watermark, usually because it is too old."""
+    pass
+
+
 class InvalidEventType(Exception):
     """Raised when a method for an event gets called on the wrong type of event."""
     pass
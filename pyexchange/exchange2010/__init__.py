@@ -7,6 +7,8 @@ Unless required by applicable law or agreed to in writing, software?distributed
 from __future__ import unicode_literals
 
 import logging
+import threading
+import time
 from ..base.calendar import BaseExchangeCalendarEvent, BaseExchangeCalendarService, ExchangeEventOrganizer, \
     ExchangeEventResponse, ExchangeExtendedProperty
 from ..base.contacts import BaseExchangeContactService, BaseExchangeContactItem
@@ -14,19 +16,25 @@ from ..base.rooms import BaseExchangeRoomService, BaseExchangeRoomItem
 from ..base.folder import BaseExchangeFolder, BaseExchangeFolderService
 from ..base.mail import BaseExchangeMailService, BaseExchangeMailItem
 from ..base.tasks import BaseExchangeTaskService, BaseExchangeTaskItem
-from ..base.soap import ExchangeServiceSOAP, S
-from ..exceptions import FailedExchangeException, ExchangeStaleChangeKeyException, ExchangeItemNotFoundException, ExchangeInternalServerTransientErrorException, ExchangeIrresolvableConflictException, InvalidEventType
+from ..base.soap import ExchangeServiceSOAP, S, _count_items_and_codes
+from ..exceptions import FailedExchangeException, ExchangeStaleChangeKeyException, ExchangeItemNotFoundException, ExchangeInternalServerTransientErrorException, ExchangeIrresolvableConflictException, ExchangeServerBusyException, ExchangeSubscriptionExpiredException, ExchangeInvalidWatermarkException, InvalidEventType
 from ..compat import BASESTRING_TYPES
+from ..export import iter_base64_decode
+from ..utils import BackgroundCall, concurrent_map
+from .. import tracing
 
 from . import soap_request
 
 from lxml import etree
 from copy import deepcopy
-from collections import namedtuple
-from datetime import date
+from collections import OrderedDict, deque, namedtuple
+from itertools import islice
+from datetime import date, datetime
+from pytz import utc
 import warnings
 import email
 import six
+import zlib
 
 log = logging.getLogger("pyexchange")
 
@@ -34,14 +42,93 @@ log = logging.getLogger("pyexchange")
 NotificationSubscription = namedtuple('NotificationSubscription',
                                       'id watermark')
 
+FolderOperationResult = namedtuple('FolderOperationResult',
+                                   'id change_key success response_code message')
+
+FolderHierarchyEntry = namedtuple('FolderHierarchyEntry',
+                                  'id change_key parent_id display_name folder_class folder_type')
+
+PushNotification = namedtuple('PushNotification',
+                              'subscription_id previous_watermark watermark more_events events')
+
+NotificationEvent = namedtuple('NotificationEvent',
+                               'subscription_id event_type watermark timestamp item_id change_key '
+                               'parent_folder_id old_item_id old_parent_folder_id is_folder')
+
+# Read-only records returned by the list APIs with compact=True, and by the items' as_record().
+CalendarEventRecord = namedtuple('CalendarEventRecord',
+                                 'id change_key calendar_id type subject start end location html_body text_body '
+                                 'organizer timezone reminder_minutes_before_start is_all_day created sensitivity '
+                                 'recurrence recurrence_end_date recurrence_days recurrence_interval attendees resources')
+
+MailRecord = namedtuple('MailRecord',
+                        'id change_key folder_id subject sender_name sender_email from_name from_email culture '
+                        'internet_message_id references in_reply_to has_attachments size importance received '
+                        'datetime_sent datetime_created is_read recipients_to recipients_cc recipients_bcc '
+                        'attachments text_body html_body')
+
+ContactRecord = namedtuple('ContactRecord',
+                           'id change_key folder_id first_name last_name full_name display_name sort_name '
+                           'email_address1 email_address2 email_address3 birthday job_title department company_name '
+                           'office_location primary_phone business_phone home_phone mobile_phone physical_addresses')
+
+TaskRecord = namedtuple('TaskRecord',
+                        'id change_key folder_id subject text_body html_body categories is_draft sent_at created_at '
+                        'due_date recurrence is_complete owner start_date complete_date status status_description '
+                        'percent_complete importance companies last_modified_by last_modified_at')
+
+
+def _as_record(record_class, item):
+    values = []
+    for field in record_class._fields:
+        value = getattr(item, field, None)
+        values.append(tuple(value) if isinstance(value, list) else value)
+    return record_class._make(values)
+
+
+# What calendar events keep of the response they were parsed from (Exchange2010Service event_xml).
+EVENT_XML_TREE = u'tree'              # the lxml tree, as event.xml
+EVENT_XML_NONE = u'none'              # nothing; event.xml is None
+EVENT_XML_COMPRESSED = u'compressed'  # zlib-compressed bytes, parsed again when event.xml is read
+EVENT_XML_MODES = (EVENT_XML_TREE, EVENT_XML_NONE, EVENT_XML_COMPRESSED)
+
+# Requests that change the items they name, so cached copies of those items are dropped.
+ITEM_WRITE_OPERATIONS = frozenset(u'{%s}%s' % (soap_request.MSG_NS, name) for name in (
+    u'UpdateItem', u'DeleteItem', u'MoveItem', u'SendItem', u'CreateItem', u'CreateAttachment',
+    u'DeleteAttachment', u'MarkAsJunk', u'ArchiveItem',
+))
+WRITTEN_ITEM_ID_TAGS = (
+    u'{%s}ItemId' % soap_request.TYPE_NS,
+    u'{%s}ReferenceItemId' % soap_request.TYPE_NS,
+    u'{%s}ParentItemId' % soap_request.MSG_NS,
+)
+
 
 class Exchange2010Service(ExchangeServiceSOAP):
-    def __init__(self, connection, batch_size=1000, impersonate_sid=None, impersonate_smtp=None):
+    def __init__(self, connection, batch_size=1000, impersonate_sid=None, impersonate_smtp=None, item_cache=None,
+                 event_xml=EVENT_XML_TREE, metrics=None, tracer=None, stream_responses=False):
+        if event_xml not in EVENT_XML_MODES:
+            raise ValueError(u'event_xml must be one of %s' % u', '.join(EVENT_XML_MODES))
+
         super(Exchange2010Service, self).__init__(connection)
         # The size of batches requested for paginated result sets.
         self.batch_size = batch_size
         self.impersonate_sid = impersonate_sid
         self.impersonate_smtp = impersonate_smtp
+        # Optional pyexchange.utils.ItemCache for get_event/get_mail/get_contact/get_task.
+        self.item_cache = item_cache
+        # How much of their response calendar events keep; see EVENT_XML_MODES.
+        self.event_xml = event_xml
+        # Optional callable given a pyexchange.metrics.SOAPCall for every request; see pyexchange.metrics.
+        self.metrics = metrics
+        # Parse responses as they download rather than once they are complete.
+        self.stream_responses = stream_responses
+        # Optional tracer for a span around every request; see pyexchange.tracing. The connection gets it too,
+        # unless it already has one.
+        self.tracer = tracer
+        if tracer is not None and getattr(connection, 'tracer', None) is None:
+            connection.tracer = tracer
+        self._folder_hierarchies = {}
 
     def calendar(self, id="calendar"):
         return Exchange2010CalendarService(service=self, calendar_id=id)
@@ -72,12 +159,147 @@ class Exchange2010Service(ExchangeServiceSOAP):
         return response.xpath(u'//m:ConvertIdResponseMessage/m:AlternateId/@Id',
                               namespaces=soap_request.NAMESPACES)
 
+    def send(self, xml, headers=None, retries=4, timeout=30, encoding="utf-8", check_for_errors=True):
+        if self.item_cache is None or xml.tag not in ITEM_WRITE_OPERATIONS:
+            return self._send_traced(xml, headers, retries, timeout, encoding, check_for_errors)
+
+        # Dropped once the write is done (or failed, as it may still have been applied); dropping them before
+        # would let a concurrent read cache the old version again.
+        written_ids = [node.get(u'Id') for node in xml.iter(*WRITTEN_ITEM_ID_TAGS)]
+        try:
+            return self._send_traced(xml, headers, retries, timeout, encoding, check_for_errors)
+        finally:
+            for item_id in written_ids:
+                self.item_cache.invalidate(item_id, self._mailbox())
+
+    def _send_traced(self, xml, headers, retries, timeout, encoding, check_for_errors):
+        if self.tracer is None:
+            return super(Exchange2010Service, self).send(xml, headers=headers, retries=retries, timeout=timeout,
+                                                         encoding=encoding, check_for_errors=check_for_errors)
+
+        operation = etree.QName(xml).localname
+        attributes = {tracing.ATTRIBUTE_OPERATION: operation, tracing.ATTRIBUTE_MAILBOX: self._mailbox()}
+        with tracing.client_span(self.tracer, u'EWS %s' % operation, attributes) as span, \
+                tracing.counting_attempts() as attempts:
+            try:
+                response = super(Exchange2010Service, self).send(xml, headers=headers, retries=retries,
+                                                                 timeout=timeout, encoding=encoding,
+                                                                 check_for_errors=check_for_errors)
+            finally:
+                span.set_attribute(tracing.ATTRIBUTE_RETRIES, max(attempts[0] - 1, 0))
+            items, response_codes = _count_items_and_codes(response)
+            span.set_attribute(tracing.ATTRIBUTE_ITEMS, items)
+            code = tracing.response_code(response_codes)
+            if code is not None:
+                span.set_attribute(tracing.ATTRIBUTE_RESPONSE_CODE, code)
+            return response
+
+    def _get_item(self, item_id, item_class, load):
+        """
+        Returns ``load()``, the item ``item_id`` of class ``item_class``, going through ``item_cache`` if there
+        is one. Cached items past their TTL are only loaded again if their change key moved on; callers always
+        get their own copy.
+        """
+        cache = self.item_cache
+        if cache is None or not isinstance(item_id, BASESTRING_TYPES):
+            return load()
+
+        mailbox = self._mailbox()
+        cached = cache.get(mailbox, item_id)
+        if cached is not None and isinstance(cached[1], item_class):
+            change_key, item, fresh = cached
+            if fresh:
+                return self._copy_item(item)
+            if change_key is not None and self._current_change_key(item_id) == change_key:
+                cache.revalidated(mailbox, item_id)
+                return self._copy_item(item)
+
+        item = load()
+        cache.put(mailbox, item_id, item.change_key, self._copy_item(item))
+        return item
+
+    def _current_change_key(self, item_id):
+        try:
+            response = self.send(soap_request.get_item(exchange_id=item_id, format=u'IdOnly'))
+        except ExchangeItemNotFoundException:
+            return None
+        change_keys = response.xpath(u'//m:Items/*/t:ItemId/@ChangeKey', namespaces=soap_request.NAMESPACES)
+        return change_keys[0] if change_keys else None
+
+    def _copy_item(self, item):
+        # Items are copied through their pickled state, which leaves out the service, so callers can change
+        # their item without touching the cache.
+        copied = deepcopy(item)
+        copied.service = item.service
+        return copied
+
+    def _mailbox(self):
+        return self.impersonate_smtp or self.impersonate_sid
+
+    def _send_paged(self, build_body, prefetch=0):
+        """
+        Yields the response of every page of an ``IndexedPageItemView``/``IndexedPageFolderView`` request, in order.
+        ``build_body(offset)`` must return the request for the page starting at ``offset``.
+
+        With ``prefetch=K``, up to K further pages are requested on background threads before the current page
+        is handed to the caller, so network time overlaps with processing. Once the first page reports
+        ``TotalItemsInView`` the remaining offsets are known and those K requests run concurrently; otherwise
+        the next page is fetched as soon as the current one says where it starts.
+        """
+        def send_page(offset):
+            return self.send(build_body(offset))
+
+        response_xml = send_page(0)
+        while True:
+            root_folder = response_xml.xpath(u'//m:RootFolder', namespaces=soap_request.NAMESPACES)[0]
+            if root_folder.get(u'IncludesLastItemInRange') == u'true':
+                yield response_xml
+                return
+
+            offset = int(root_folder.get(u'IndexedPagingOffset'))
+            total = root_folder.get(u'TotalItemsInView')
+
+            if not prefetch:
+                yield response_xml
+                response_xml = send_page(offset)
+            elif total is None or offset >= int(total):
+                pending = BackgroundCall(send_page, offset)
+                yield response_xml
+                response_xml = pending.result()
+            else:
+                offsets = iter(range(offset, int(total), self.batch_size))
+                in_flight = deque(BackgroundCall(send_page, page_offset) for page_offset in islice(offsets, prefetch))
+                yield response_xml
+
+                while in_flight:
+                    response_xml = in_flight.popleft().result()
+                    for page_offset in islice(offsets, 1):
+                        in_flight.append(BackgroundCall(send_page, page_offset))
+                    if in_flight:
+                        yield response_xml
+
+                # The last precomputed page decides whether the folder grew in the meantime; if so, the loop
+                # carries on from wherever it says the next page starts.
+
     def _send_soap_request(self, body, headers=None, retries=2, timeout=30, encoding="utf-8"):
-        headers = {
+        return super(Exchange2010Service, self)._send_soap_request(body, headers=self._request_headers(headers, encoding), retries=retries, timeout=timeout, encoding=encoding)
+
+    def _stream_soap_request(self, body, headers=None, retries=2, timeout=30, encoding="utf-8"):
+        return super(Exchange2010Service, self)._stream_soap_request(body, headers=self._request_headers(headers, encoding), retries=retries, timeout=timeout, encoding=encoding)
+
+    def _request_headers(self, headers, encoding):
+        """ The headers every request needs, with the caller's ``headers`` on top. """
+        request_headers = {
             "Accept": "text/xml",
+            "Accept-Encoding": "gzip, deflate",
             "Content-type": "text/xml; charset=%s " % encoding
         }
-        return super(Exchange2010Service, self)._send_soap_request(body, headers=headers, retries=retries, timeout=timeout, encoding=encoding)
+        if self.impersonate_smtp:
+            # Routes the request to the mailbox's server, and tells the connection's governor whose budget it uses.
+            request_headers["X-AnchorMailbox"] = self.impersonate_smtp
+        if headers:
+            request_headers.update(headers)
+        return request_headers
 
     def _wrap_soap_xml_request(self, exchange_xml):
         header = S.Header(
@@ -121,23 +343,39 @@ class Exchange2010Service(ExchangeServiceSOAP):
         # The full (massive) list of possible return responses is here.
         # http://msdn.microsoft.com/en-us/library/aa580757(v=exchg.140).aspx
         for code in response_codes:
-            if code.text == u"ErrorChangeKeyRequiredForWriteOperations":
-                # change key is missing or stale. we can fix that, so throw a special error
-                raise ExchangeStaleChangeKeyException(u"Exchange Fault (%s) from Exchange server" % code.text)
-            elif code.text == u"ErrorItemNotFound":
-                # exchange_invite_key wasn't found on the server
-                raise ExchangeItemNotFoundException(u"Exchange Fault (%s) from Exchange server" % code.text)
-            elif code.text == u"ErrorIrresolvableConflict":
-                # tried to update an item with an old change key
-                raise ExchangeIrresolvableConflictException(u"Exchange Fault (%s) from Exchange server" % code.text)
-            elif code.text == u"ErrorInternalServerTransientError":
-                # temporary internal server error. throw a special error so we can retry
-                raise ExchangeInternalServerTransientErrorException(u"Exchange Fault (%s) from Exchange server" % code.text)
-            elif code.text == u"ErrorCalendarOccurrenceIndexIsOutOfRecurrenceRange":
-                # just means some or all of the requested instances are out of range
-                pass
-            elif code.text != u"NoError":
-                raise FailedExchangeException(u"Exchange Fault (%s) from Exchange server" % code.text)
+            self._raise_for_response_code(code.text, xml_tree)
+
+    def _raise_for_response_code(self, code, xml_tree):
+        """ Raises the exception for an EWS ResponseCode from ``xml_tree``; does nothing for NoError. """
+        if code == u"ErrorChangeKeyRequiredForWriteOperations":
+            # change key is missing or stale. we can fix that, so throw a special error
+            raise ExchangeStaleChangeKeyException(u"Exchange Fault (%s) from Exchange server" % code)
+        elif code == u"ErrorItemNotFound":
+            # exchange_invite_key wasn't found on the server
+            raise ExchangeItemNotFoundException(u"Exchange Fault (%s) from Exchange server" % code)
+        elif code == u"ErrorIrresolvableConflict":
+            # tried to update an item with an old change key
+            raise ExchangeIrresolvableConflictException(u"Exchange Fault (%s) from Exchange server" % code)
+        elif code == u"ErrorServerBusy":
+            # throttled; Exchange may say how long to back off for
+            back_off = xml_tree.xpath(u'//t:MessageXml/t:Value[@Name="BackOffMilliseconds"]/text()', namespaces=soap_request.NAMESPACES)
+            raise ExchangeServerBusyException(u"Exchange Fault (%s) from Exchange server" % code,
+                                              int(back_off[0]) / 1000.0 if back_off else None)
+        elif code == u"ErrorInternalServerTransientError":
+            # temporary internal server error. throw a special error so we can retry
+            raise ExchangeInternalServerTransientErrorException(u"Exchange Fault (%s) from Exchange server" % code)
+        elif code in (u"ErrorExpiredSubscription", u"ErrorSubscriptionNotFound"):
+            # the subscription has to be made again; streaming responses say which ones
+            subscription_ids = [node.text for node in xml_tree.xpath(u'//m:ErrorSubscriptionIds/*', namespaces=soap_request.NAMESPACES)]
+            raise ExchangeSubscriptionExpiredException(u"Exchange Fault (%s) from Exchange server" % code, subscription_ids)
+        elif code == u"ErrorInvalidWatermark":
+            # the watermark is too old for Exchange to resume from
+            raise ExchangeInvalidWatermarkException(u"Exchange Fault (%s) from Exchange server" % code)
+        elif code == u"ErrorCalendarOccurrenceIndexIsOutOfRecurrenceRange":
+            # just means some or all of the requested instances are out of range
+            pass
+        elif code != u"NoError":
+            raise FailedExchangeException(u"Exchange Fault (%s) from Exchange server" % code)
 
 
 class Exchange2010CalendarService(BaseExchangeCalendarService):
@@ -148,15 +386,23 @@ class Exchange2010CalendarService(BaseExchangeCalendarService):
         return Exchange2010CalendarEvent(service=self.service, id=id, **kwargs)
 
     def get_event(self, id, additional_properties=None):
-        return Exchange2010CalendarEvent(service=self.service, id=id, additional_properties=additional_properties)
+        if additional_properties:
+            return Exchange2010CalendarEvent(service=self.service, id=id, additional_properties=additional_properties)
+        return self.service._get_item(id, Exchange2010CalendarEvent,
+                                      lambda: Exchange2010CalendarEvent(service=self.service, id=id))
 
     def new_event(self, **properties):
         return Exchange2010CalendarEvent(service=self.service, calendar_id=self.calendar_id, **properties)
 
-    def list_events(self, start=None, end=None, details=False, delegate_for=None, additional_properties=None):
+    def list_events(self, start=None, end=None, details=False, delegate_for=None, additional_properties=None,
+                    compact=False):
+        """
+        With ``compact=True`` the list holds :class:`CalendarEventRecord` tuples instead of events, which take a
+        fraction of the memory and keep no XML around.
+        """
         return Exchange2010CalendarEventList(service=self.service, calendar_id=self.calendar_id, start=start, end=end,
                                              details=details, delegate_for=delegate_for,
-                                             additional_properties=additional_properties)
+                                             additional_properties=additional_properties, compact=compact)
 
     def sync_events(self, delegate_for=None, sync_state=None):
         return Exchange2010SyncCalendarEventList(service=self.service, calendar_id=self.calendar_id,
@@ -237,14 +483,120 @@ class Exchange2010SyncCalendarEventList(object):
         return self
 
 
+class Exchange2010FolderSync(object):
+    """
+    Incremental sync of a single folder through ``SyncFolderItems``, for any kind of item.
+
+    ``item_type`` is the EWS element name of the items to build (``Message``, ``Contact``, ``Task``...) and
+    ``item_class`` the class they are built with. Changes are collected into ``created`` and ``updated`` (item
+    objects), ``deleted`` (ids) and ``read_flag_changes`` (``(id, is_read)`` tuples).
+
+    When a ``state_store`` (any dict-like object, e.g. :class:`pyexchange.utils.JSONFileStore`) is given, the
+    last sync state is loaded from and saved to it, so every call only returns what changed since the last one.
+    """
+
+    def __init__(self, service, folder_id, item_type, item_class, sync_state=None, state_store=None,
+                 format=u'AllProperties', max_changes_returned=512):
+        self.service = service
+        self.folder_id = folder_id
+        self.item_type = item_type
+        self.item_class = item_class
+        self.state_store = state_store
+        self.format = format
+        self.max_changes_returned = max_changes_returned
+
+        if sync_state is None and state_store is not None:
+            sync_state = state_store.get(self.state_key)
+        self.sync_state = sync_state
+
+        self.created = []
+        self.updated = []
+        self.deleted = []
+        self.read_flag_changes = []
+        self.last_sync_state = None
+        self.contains_all_items = None
+
+    @property
+    def state_key(self):
+        return u'sync:%s:%s' % (self.service.impersonate_smtp or self.service.impersonate_sid or u'', self.folder_id)
+
+    def sync(self, commit=True):
+        """
+        Fetches every change since the current sync state, a page at a time, until Exchange reports that
+        nothing is left.
+
+        With ``commit=False`` the new sync state is not written to the state store until :meth:`commit` is
+        called, so changes can be processed before they are acknowledged.
+        """
+        sync_state = self.sync_state
+        self.contains_all_items = False
+
+        while not self.contains_all_items:
+            body = soap_request.sync_folder_items(
+                self.folder_id, format=self.format, sync_state=sync_state,
+                max_changes_returned=self.max_changes_returned,
+            )
+            response_xml = self.service.send(body)
+            self._parse_response_for_changes(response_xml)
+
+            sync_state = response_xml.xpath(
+                u'//m:SyncFolderItemsResponseMessage/m:SyncState',
+                namespaces=soap_request.NAMESPACES,
+            )[0].text
+            self.contains_all_items = u'true' == response_xml.xpath(
+                u'//m:SyncFolderItemsResponseMessage/m:IncludesLastItemInRange',
+                namespaces=soap_request.NAMESPACES,
+            )[0].text
+
+        self.last_sync_state = sync_state
+
+        if commit:
+            self.commit()
+
+        return self
+
+    def commit(self):
+        """ Stores the sync state reached by :meth:`sync` so the next sync starts from there. """
+        self.sync_state = self.last_sync_state
+        if self.state_store is not None and self.last_sync_state is not None:
+            self.state_store[self.state_key] = self.last_sync_state
+
+    def _parse_response_for_changes(self, response):
+        changes = response.xpath(u'//m:SyncFolderItemsResponseMessage/m:Changes/*', namespaces=soap_request.NAMESPACES)
+
+        for change in changes:
+            change_type = etree.QName(change).localname
+
+            if change_type == u'Delete':
+                self.deleted.append(change.find(u't:ItemId', namespaces=soap_request.NAMESPACES).get(u'Id'))
+            elif change_type == u'ReadFlagChange':
+                item_id = change.find(u't:ItemId', namespaces=soap_request.NAMESPACES).get(u'Id')
+                is_read = change.findtext(u't:IsRead', namespaces=soap_request.NAMESPACES)
+                self.read_flag_changes.append((item_id, is_read == u'true'))
+            else:
+                item_xml = change.find(u't:%s' % self.item_type, namespaces=soap_request.NAMESPACES)
+                if item_xml is None:
+                    log.debug(u'Skipping %s change for an item that is not a %s', change_type, self.item_type)
+                    continue
+
+                item = self.item_class(service=self.service, folder_id=self.folder_id, xml=item_xml)
+                if change_type == u'Create':
+                    self.created.append(item)
+                else:
+                    self.updated.append(item)
+
+        return self
+
+
 class Exchange2010CalendarEventList(object):
     """
     Creates & Stores a list of Exchange2010CalendarEvent items in the "self.events" variable.
     """
 
     def __init__(self, service=None, calendar_id=u'calendar', start=None, end=None, details=False, delegate_for=None,
-                 additional_properties=None):
+                 additional_properties=None, compact=False):
         self.service = service
+        self.compact = compact
         self.count = 0
         self.start = start
         self.end = end
@@ -274,7 +626,7 @@ class Exchange2010CalendarEventList(object):
 
         # Populate the event ID list, for convenience reasons.
         for event in self.events:
-            self.event_ids.append(event._id)
+            self.event_ids.append(event.id)
 
         # If we have requested all the details, basically repeat the previous 3 steps,
         # but instead of start/stop, we have a list of ID fields.
@@ -305,7 +657,7 @@ class Exchange2010CalendarEventList(object):
         log.debug(u'Adding new event to all events list.')
         event = Exchange2010CalendarEvent(service=self.service, xml=xml)
         log.debug(u'Subject of new event is %s' % event.subject)
-        self.events.append(event)
+        self.events.append(event.as_record() if self.compact else event)
         return self
 
     def load_all_details(self):
@@ -333,6 +685,9 @@ class Exchange2010CalendarEventList(object):
 
 class Exchange2010CalendarEvent(BaseExchangeCalendarEvent):
 
+    _xml = None
+    _xml_compressed = None
+
     def _init_from_service(self, id, additional_properties=None):
         log.debug(u'Creating new Exchange2010CalendarEvent object from ID')
         body = soap_request.get_item(exchange_id=id, format=u'AllProperties',
@@ -342,6 +697,7 @@ class Exchange2010CalendarEvent(BaseExchangeCalendarEvent):
 
         self._update_properties(properties)
         self._id = id
+        self._change_key = self._parse_id_and_change_key_from_response(response_xml)[1]
         log.debug(u'Created new event object with ID: %s' % self._id)
 
         self._reset_dirty_attributes()
@@ -360,8 +716,9 @@ class Exchange2010CalendarEvent(BaseExchangeCalendarEvent):
 
         return self
 
-    def as_json(self):
-        raise NotImplementedError
+    def as_record(self):
+        """ Returns the event as a read-only :class:`CalendarEventRecord`. """
+        return _as_record(CalendarEventRecord, self)
 
     def validate(self):
 
@@ -667,10 +1024,29 @@ class Exchange2010CalendarEvent(BaseExchangeCalendarEvent):
 
         result['_conflicting_event_ids'] = self._parse_event_conflicts(response)
 
-        self.xml = response
+        self._keep_xml(response)
 
         return result
 
+    @property
+    def xml(self):
+        """
+        The response this event was parsed from, or None if the service's ``event_xml`` mode is ``none``.
+        In ``compressed`` mode the tree is rebuilt from compressed bytes on every read.
+        """
+        if self._xml_compressed is not None:
+            return etree.fromstring(zlib.decompress(self._xml_compressed))
+        return self._xml
+
+    def _keep_xml(self, response):
+        mode = getattr(self.service, 'event_xml', EVENT_XML_TREE)
+        self._xml = self._xml_compressed = None
+
+        if mode == EVENT_XML_TREE:
+            self._xml = response
+        elif mode == EVENT_XML_COMPRESSED:
+            self._xml_compressed = zlib.compress(etree.tostring(response))
+
     def _parse_event_properties(self, response):
 
         property_map = {
@@ -889,6 +1265,33 @@ class Exchange2010CalendarEvent(BaseExchangeCalendarEvent):
         return [id_element.get(u"Id") for id_element in conflicting_ids]
 
 
+# Precompiled, so parsing a large folder tree doesn't recompile the same expressions for every folder.
+FIND_FOLDER_NODES = etree.XPath(u'//t:Folders/t:*', namespaces=soap_request.NAMESPACES)
+GET_FOLDER_NODE = etree.XPath(u'|'.join(u'descendant-or-self::t:%s' % t for t in BaseExchangeFolder.FOLDER_TYPES),
+                              namespaces=soap_request.NAMESPACES)
+
+FOLDER_TAGS = frozenset(u'{%s}%s' % (soap_request.TYPE_NS, t) for t in BaseExchangeFolder.FOLDER_TYPES)
+FOLDER_ID_TAG = u'{%s}FolderId' % soap_request.TYPE_NS
+PARENT_FOLDER_ID_TAG = u'{%s}ParentFolderId' % soap_request.TYPE_NS
+EFFECTIVE_RIGHTS_TAG = u'{%s}EffectiveRights' % soap_request.TYPE_NS
+BULK_CREATE_BATCH_SIZE = 100
+FOLDER_PROPERTIES = {
+    u'{%s}FolderClass' % soap_request.TYPE_NS: ('folder_class', None),
+    u'{%s}DisplayName' % soap_request.TYPE_NS: ('display_name', None),
+    u'{%s}TotalCount' % soap_request.TYPE_NS: ('total_count', int),
+    u'{%s}ChildFolderCount' % soap_request.TYPE_NS: ('child_folder_count', int),
+    u'{%s}UnreadCount' % soap_request.TYPE_NS: ('unread_count', int),
+}
+EFFECTIVE_RIGHTS_PROPERTIES = {
+    u'{%s}Delete' % soap_request.TYPE_NS: 'delete',
+    u'{%s}Modify' % soap_request.TYPE_NS: 'modify',
+    u'{%s}Read' % soap_request.TYPE_NS: 'read',
+    u'{%s}CreateContents' % soap_request.TYPE_NS: 'create_contents',
+    u'{%s}CreateHierarchy' % soap_request.TYPE_NS: 'create_hierarchy',
+    u'{%s}CreateAssociated' % soap_request.TYPE_NS: 'create_associated',
+}
+
+
 class Exchange2010FolderService(BaseExchangeFolderService):
 
     def folder(self, id=None, **kwargs):
@@ -931,10 +1334,152 @@ class Exchange2010FolderService(BaseExchangeFolderService):
 
         return Exchange2010Folder(service=self.service, **properties)
 
-    def find_folder(self, parent_id, traversal='Shallow'):
+    def bulk_create(self, tree, parent_id, folder_type=u'Folder', max_workers=4, batch_size=BULK_CREATE_BATCH_SIZE):
+        """
+          Creates a whole tree of folders under ``parent_id``. ``tree`` maps display names to sub-trees
+          (another dict, or None for a leaf).
+
+          Folders are created a level at a time, siblings in one ``CreateFolder`` per ``batch_size`` folders
+          (creating a folder costs Exchange far more than reading one, so this is much smaller than the
+          service's batch_size), with up to ``max_workers`` requests in flight. Returns a dict mapping each
+          path (``/Projects/X``) to a :class:`FolderOperationResult`; sub-folders of a folder that could not
+          be created are not attempted and reported as failed.
+
+          **Examples**::
+
+            results = service.folder().bulk_create({
+              u'Projects': {u'Alpha': None, u'Beta': {u'Specs': None}},
+              u'Archive': None,
+            }, parent_id='inbox')
+            failed = [path for path, result in results.items() if not result.success]
+        """
+        results = {}
+        level = [(u'', parent_id, tree)]
+
+        while level:
+            batches = []
+            for parent_path, level_parent_id, subtree in level:
+                names = list(subtree)
+                for start in range(0, len(names), batch_size):
+                    batches.append((parent_path, level_parent_id, names[start:start + batch_size], subtree))
+
+            def create(batch):
+                return self._create_sibling_folders(batch[1], batch[2], folder_type)
+
+            level = []
+            for (parent_path, _, names, subtree), batch_results in zip(batches, concurrent_map(create, batches, max_workers)):
+                for name, result in zip(names, batch_results):
+                    path = u'%s/%s' % (parent_path, name)
+                    results[path] = result
+
+                    if not subtree[name]:
+                        continue
+                    if result.success:
+                        level.append((path, result.id, subtree[name]))
+                    else:
+                        self._skip_subtree(path, subtree[name], results)
+
+        return results
+
+    def _create_sibling_folders(self, parent_id, names, folder_type):
+        folders = [Exchange2010Folder(service=self.service, display_name=name, folder_type=folder_type,
+                                      parent_id=parent_id) for name in names]
+        return self._send_folder_operations(soap_request.new_folders(parent_id, folders), len(folders))
+
+    def _send_folder_operations(self, body, count):
+        """ Sends a request for ``count`` folders and returns a :class:`FolderOperationResult` for each. """
+        response_xml = self.service.send(body, check_for_errors=False)
+        self.service._check_for_SOAP_fault(response_xml)
+        results = self._parse_response_for_folder_operations(response_xml)
+        if len(results) != count:
+            # Results are matched to folders by position, which only works if there is one per folder.
+            raise FailedExchangeException(u'Expected %d response messages from Exchange, got %d' % (count, len(results)))
+        return results
+
+    def _skip_subtree(self, parent_path, tree, results):
+        for name, subtree in tree.items():
+            path = u'%s/%s' % (parent_path, name)
+            results[path] = FolderOperationResult(id=None, change_key=None, success=False, response_code=None,
+                                                  message=u'Parent folder was not created')
+            if subtree:
+                self._skip_subtree(path, subtree, results)
+
+    def delete_folders(self, folders, delete_type=u'HardDelete', batch_size=BULK_CREATE_BATCH_SIZE):
+        """
+          Deletes many folders (Exchange2010Folder objects or ids) with one ``DeleteFolder`` per ``batch_size``
+          folders. Returns a :class:`FolderOperationResult` per folder, in the same order.
+        """
+        ids = [getattr(folder, 'id', folder) for folder in folders]
+        results = []
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            results.extend(self._send_folder_operations(soap_request.delete_folders(batch, delete_type=delete_type),
+                                                        len(batch)))
+
+        for folder, result in zip(folders, results):
+            if result.success and isinstance(folder, Exchange2010Folder):
+                folder._id = None
+                folder._change_key = None
+        return [result._replace(id=folder_id) for folder_id, result in zip(ids, results)]
+
+    def move_folders(self, folders, folder_id, batch_size=BULK_CREATE_BATCH_SIZE):
+        """
+          Moves many folders (Exchange2010Folder objects or ids) under ``folder_id``, with one ``MoveFolder``
+          per ``batch_size`` folders. Returns a :class:`FolderOperationResult` per folder, in the same order,
+          holding the folder's id and change key after the move.
+        """
+        ids = [getattr(folder, 'id', folder) for folder in folders]
+        results = []
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            results.extend(self._send_folder_operations(soap_request.move_folders(batch, folder_id), len(batch)))
+
+        for folder, result in zip(folders, results):
+            if result.success and isinstance(folder, Exchange2010Folder):
+                folder._id, folder._change_key = result.id, result.change_key
+                folder.parent_id = folder_id
+        return results
+
+    def _parse_response_for_folder_operations(self, response):
+        results = []
+        for message in response.xpath(u'//m:ResponseMessages/*', namespaces=soap_request.NAMESPACES):
+            code = message.findtext(u'm:ResponseCode', namespaces=soap_request.NAMESPACES)
+            folder_id = message.find(u'm:Folders/*/t:FolderId', namespaces=soap_request.NAMESPACES)
+            results.append(FolderOperationResult(
+                id=folder_id.get(u'Id') if folder_id is not None else None,
+                change_key=folder_id.get(u'ChangeKey') if folder_id is not None else None,
+                success=code == u'NoError',
+                response_code=code,
+                message=message.findtext(u'm:MessageText', namespaces=soap_request.NAMESPACES),
+            ))
+        return results
+
+    def hierarchy(self, root_id=u'msgfolderroot', state_store=None, max_age=None):
+        """
+          Returns the cached folder tree of this mailbox below ``root_id`` (the top of the information store
+          by default). The same :class:`Exchange2010FolderHierarchy` is handed out for the lifetime of the
+          service to every call with the same arguments, and it is loaded from Exchange the first time it is needed.
+
+          **Examples**::
+
+            folders = service.folder().hierarchy(state_store=JSONFileStore('/var/lib/myapp/folders.json'))
+            projects = folders.get_by_path(u'/Inbox/Projects')
+            for child in folders.children(projects.id):
+              print(child.display_name)
+        """
+        # The hierarchy keeps a reference to its state store, so the id in the key can't be reused while cached.
+        key = (root_id, id(state_store), max_age)
+        if key not in self.service._folder_hierarchies:
+            self.service._folder_hierarchies[key] = Exchange2010FolderHierarchy(
+                service=self.service, root_id=root_id, state_store=state_store, max_age=max_age,
+            )
+        return self.service._folder_hierarchies[key]
+
+    def find_folder(self, parent_id, traversal='Shallow', prefetch=0):
         """
           find_folder(parent_id)
           :param str parent_id:  The parent folder to list.
+          :param int prefetch:  How many pages to request ahead of the one being iterated (0 disables read-ahead).
 
           This method will return a generator of sub-folders to a given
           parent folder.
@@ -951,41 +1496,21 @@ class Exchange2010FolderService(BaseExchangeFolderService):
             for folder in folders:
               folder.delete()
         """
-        offset = 0
-        last_batch = False
-
-        while not last_batch:
-            body = soap_request.find_folder(
+        def build_body(offset):
+            return soap_request.find_folder(
                 parent_id=parent_id, format=u'AllProperties',
                 traversal=traversal, limit=self.service.batch_size,
                 offset=offset,
             )
-            xml_result = self.service.send(body)
-            last_batch = "true" == xml_result.xpath(
-                '//m:RootFolder/@IncludesLastItemInRange',
-                namespaces=soap_request.NAMESPACES,
-            )[0]
-            offset = int(xml_result.xpath(
-                '//m:RootFolder/@IndexedPagingOffset',
-                namespaces=soap_request.NAMESPACES,
-            )[0])
+
+        for xml_result in self.service._send_paged(build_body, prefetch=prefetch):
             batch = self._parse_response_for_find_folder(xml_result)
             for f in batch:
                 yield f
 
     def _parse_response_for_find_folder(self, response):
-
-        result = []
-        folders = response.xpath(u'//t:Folders/t:*', namespaces=soap_request.NAMESPACES)
-        for folder in folders:
-            result.append(
-                Exchange2010Folder(
-                    service=self.service,
-                    xml=etree.fromstring(etree.tostring(folder))  # Might be a better way to do this
-                )
-            )
-
-        return result
+        # Folders are parsed in place; Exchange2010Folder only ever looks at the node's own children.
+        return [Exchange2010Folder(service=self.service, xml=folder) for folder in FIND_FOLDER_NODES(response)]
 
 
 class Exchange2010Folder(BaseExchangeFolder):
@@ -1018,7 +1543,8 @@ class Exchange2010Folder(BaseExchangeFolder):
         body = soap_request.new_folder(self)
 
         response_xml = self.service.send(body)
-        self._id, self._change_key = self._parse_id_and_change_key_from_response(response_xml)
+        result = self.service.folder()._parse_response_for_folder_operations(response_xml)[0]
+        self._id, self._change_key = result.id, result.change_key
 
         return self
 
@@ -1063,88 +1589,44 @@ class Exchange2010Folder(BaseExchangeFolder):
 
         response_xml = self.service.send(soap_request.move_folder(self, folder_id))  # noqa
 
-        result_id, result_key = self._parse_id_and_change_key_from_response(response_xml)
-        if self.id != result_id:
+        result = self.service.folder()._parse_response_for_folder_operations(response_xml)[0]
+        if self.id != result.id:
             raise ValueError(u"MoveFolder returned success but requested folder not moved")
 
         self.parent_id = folder_id
         return self
 
     def _parse_response_for_get_folder(self, response):
-        folder_xpath = '|'.join('descendant-or-self::t:%s' % t
-                                for t in self.FOLDER_TYPES)
-        path = response.xpath(folder_xpath, namespaces=soap_request.NAMESPACES)[0]
-        result = self._parse_folder_properties(path)
-        return result
+        if response.tag in FOLDER_TAGS:
+            path = response
+        else:
+            path = GET_FOLDER_NODE(response)[0]
+        return self._parse_folder_properties(path)
 
     def _parse_folder_properties(self, response):
+        """
+        Reads the folder's properties in one pass over its child elements, without copying the node or
+        running an XPath per property.
+        """
+        result = {}
+
+        for child in response:
+            tag = child.tag
+            if tag == FOLDER_ID_TAG:
+                self._id, self._change_key = child.get(u'Id'), child.get(u'ChangeKey')
+            elif tag == PARENT_FOLDER_ID_TAG:
+                self._parent_id = child.get(u'Id')
+            elif tag == EFFECTIVE_RIGHTS_TAG:
+                result['effective_rights'] = dict(
+                    (EFFECTIVE_RIGHTS_PROPERTIES[right.tag], right.text.lower() == u'true')
+                    for right in child if right.tag in EFFECTIVE_RIGHTS_PROPERTIES
+                )
+            elif tag in FOLDER_PROPERTIES:
+                key, cast = FOLDER_PROPERTIES[tag]
+                result[key] = cast(child.text) if cast is not None else child.text
 
-        property_map = {
-            'folder_class': {
-                'xpath': 't:FolderClass',
-            },
-            'display_name': {
-                'xpath': 't:DisplayName',
-            },
-            'total_count': {
-                'xpath': 't:TotalCount',
-                'cast': 'int',
-            },
-            'child_folder_count': {
-                'xpath': 't:ChildFolderCount',
-                'cast': 'int',
-            },
-            'unread_count': {
-                'xpath': 't:UnreadCount',
-                'cast': 'int',
-            },
-        }
-
-        self._id, self._change_key = self._parse_id_and_change_key_from_response(response)
-        self._parent_id = self._parse_parent_id_and_change_key_from_response(response)[0]
         self.folder_type = etree.QName(response).localname
 
-        result = self.service._xpath_to_dict(
-            element=response, property_map=property_map,
-            namespace_map=soap_request.NAMESPACES
-        )
-
-        effective_rights = {
-            'delete': {
-                'xpath': 't:Delete',
-                'cast': 'bool',
-            },
-            'modify': {
-                'xpath': 't:Modify',
-                'cast': 'bool',
-            },
-            'read': {
-                'xpath': 't:Read',
-                'cast': 'bool',
-            },
-            'create_contents': {
-                'xpath': 't:CreateContents',
-                'cast': 'bool',
-            },
-            'create_hierarchy': {
-                'xpath': 't:CreateHierarchy',
-                'cast': 'bool',
-            },
-            'create_associated': {
-                'xpath': 't:CreateAssociated',
-                'cast': 'bool',
-            }
-        }
-
-        effective_rights_element = response.xpath('t:EffectiveRights', namespaces=soap_request.NAMESPACES)[0]
-
-        result.update({
-            'effective_rights': self.service._xpath_to_dict(
-                element=effective_rights_element, property_map=effective_rights,
-                namespace_map=soap_request.NAMESPACES
-            )
-        })
-
         return result
 
     def _parse_id_and_change_key_from_response(self, response):
@@ -1170,6 +1652,196 @@ class Exchange2010Folder(BaseExchangeFolder):
             return None, None
 
 
+class Exchange2010FolderHierarchy(object):
+    """
+    In-memory copy of a mailbox's folder tree, kept up to date through ``SyncFolderHierarchy`` deltas rather
+    than repeated ``FindFolder``/``GetFolder`` calls. Folders are :class:`FolderHierarchyEntry` tuples.
+
+    Paths are made of display names below the root, e.g. ``/Inbox/Projects/X``, and are matched without
+    regard to case, like Exchange does. A path that is not found triggers a refresh before giving up, unless the
+    tree was refreshed less than ``max_age`` (or :attr:`MISS_REFRESH_INTERVAL`) seconds ago; with ``max_age``
+    lookups also refresh once the tree is older than that. A path shared by several folders is ambiguous, and
+    looking it up raises ValueError.
+
+    When a ``state_store`` (any dict-like object, e.g. :class:`pyexchange.utils.JSONFileStore`) is given, the
+    tree and its sync state are saved to it after each refresh, so a restarted process only asks for what
+    changed in between.
+    """
+
+    # Seconds between refreshes triggered by unknown paths when there is no max_age.
+    MISS_REFRESH_INTERVAL = 60
+
+    def __init__(self, service, root_id=u'msgfolderroot', state_store=None, max_age=None):
+        self.service = service
+        self.root_id = root_id
+        self.state_store = state_store
+        self.max_age = max_age
+
+        self.sync_state = None
+        self.last_refresh = None
+        self._folders = {}
+        self._paths = {}
+        self._path_index = {}
+        self._ambiguous_paths = set()
+        self._lock = threading.RLock()
+
+        saved = state_store.get(self.state_key) if state_store is not None else None
+        if saved:
+            self.sync_state = saved[u'sync_state']
+            for folder in saved[u'folders']:
+                self._folders[folder[0]] = FolderHierarchyEntry(*folder)
+            self._build_paths()
+
+    @property
+    def state_key(self):
+        return u'folders:%s:%s' % (self.service.impersonate_smtp or self.service.impersonate_sid or u'', self.root_id)
+
+    def refresh(self):
+        """ Applies every folder change since the last refresh (everything, the first time). """
+        with self._lock:
+            while True:
+                body = soap_request.sync_folder_hierarchy(folder_id=self.root_id, sync_state=self.sync_state)
+                response_xml = self.service.send(body)
+                self._parse_response_for_changes(response_xml)
+
+                self.sync_state = response_xml.xpath(
+                    u'//m:SyncFolderHierarchyResponseMessage/m:SyncState', namespaces=soap_request.NAMESPACES
+                )[0].text
+                last = response_xml.xpath(
+                    u'//m:SyncFolderHierarchyResponseMessage/m:IncludesLastFolderInRange',
+                    namespaces=soap_request.NAMESPACES,
+                )
+                if not last or last[0].text == u'true':
+                    break
+
+            self._build_paths()
+            self.last_refresh = time.time()
+
+            if self.state_store is not None:
+                self.state_store[self.state_key] = {
+                    u'sync_state': self.sync_state,
+                    u'folders': [list(folder) for folder in self._folders.values()],
+                }
+
+        return self
+
+    def _parse_response_for_changes(self, response):
+        changes = response.xpath(u'//m:SyncFolderHierarchyResponseMessage/m:Changes/*',
+                                 namespaces=soap_request.NAMESPACES)
+
+        for change in changes:
+            if etree.QName(change).localname == u'Delete':
+                folder_id = change.find(u't:FolderId', namespaces=soap_request.NAMESPACES).get(u'Id')
+                self._folders.pop(folder_id, None)
+                continue
+
+            for folder_xml in change:
+                id_element = folder_xml.find(u't:FolderId', namespaces=soap_request.NAMESPACES)
+                parent_element = folder_xml.find(u't:ParentFolderId', namespaces=soap_request.NAMESPACES)
+                self._folders[id_element.get(u'Id')] = FolderHierarchyEntry(
+                    id=id_element.get(u'Id'),
+                    change_key=id_element.get(u'ChangeKey'),
+                    parent_id=parent_element.get(u'Id') if parent_element is not None else None,
+                    display_name=folder_xml.findtext(u't:DisplayName', namespaces=soap_request.NAMESPACES),
+                    folder_class=folder_xml.findtext(u't:FolderClass', namespaces=soap_request.NAMESPACES),
+                    folder_type=etree.QName(folder_xml).localname,
+                )
+
+    def _ensure_fresh(self):
+        if self.sync_state is None:
+            self.refresh()
+        elif self.max_age is not None and (self.last_refresh is None or time.time() - self.last_refresh > self.max_age):
+            self.refresh()
+
+    def _normalize_path(self, path):
+        return u'/' + u'/'.join(part.lower() for part in path.split(u'/') if part)
+
+    def _build_paths(self):
+        """ Works out the path of every folder and the index of normalized paths. Called with the lock held. """
+        paths = {}
+
+        def path_of(folder_id):
+            if folder_id not in paths:
+                folder = self._folders[folder_id]
+                if folder.parent_id in self._folders:
+                    parent_path = path_of(folder.parent_id)
+                else:
+                    parent_path = u''
+                paths[folder_id] = parent_path + u'/' + (folder.display_name or u'')
+            return paths[folder_id]
+
+        index = {}
+        ambiguous = set()
+        for folder_id in self._folders:
+            key = self._normalize_path(path_of(folder_id))
+            if key in index:
+                log.warning(u'Folders %s and %s are both at %s', index[key], folder_id, paths[folder_id])
+                ambiguous.add(key)
+            index[key] = folder_id
+
+        self._paths = paths
+        self._path_index = index
+        self._ambiguous_paths = ambiguous
+
+    def _lookup_path(self, key):
+        with self._lock:
+            if key in self._ambiguous_paths:
+                raise ValueError(u'More than one folder is at %s' % key)
+            folder_id = self._path_index.get(key)
+            return self._folders[folder_id] if folder_id is not None else None
+
+    def _refresh_for_miss(self):
+        interval = self.max_age if self.max_age is not None else self.MISS_REFRESH_INTERVAL
+        with self._lock:
+            if self.last_refresh is not None and time.time() - self.last_refresh < interval:
+                return False
+            self.refresh()
+            return True
+
+    def get(self, folder_id):
+        """ Returns the cached entry for ``folder_id``, or None. """
+        self._ensure_fresh()
+        with self._lock:
+            return self._folders.get(folder_id)
+
+    def get_by_path(self, path):
+        """
+        Returns the entry for a path like ``/Inbox/Projects/X``, or None if there is no such folder. Raises
+        ValueError when more than one folder is at ``path``.
+        """
+        self._ensure_fresh()
+        key = self._normalize_path(path)
+
+        folder = self._lookup_path(key)
+        if folder is None and self._refresh_for_miss():
+            folder = self._lookup_path(key)
+        return folder
+
+    def path_of(self, folder_id):
+        """ Returns the path of ``folder_id`` below the root, or None if it is not in the tree. """
+        self._ensure_fresh()
+        with self._lock:
+            return self._paths.get(folder_id)
+
+    def children(self, folder_id=None):
+        """ Returns the direct sub-folders of ``folder_id``, or the top-level folders when it is None. """
+        self._ensure_fresh()
+        with self._lock:
+            if folder_id is None:
+                return [f for f in self._folders.values() if f.parent_id not in self._folders]
+            return [f for f in self._folders.values() if f.parent_id == folder_id]
+
+    def __iter__(self):
+        self._ensure_fresh()
+        with self._lock:
+            return iter(list(self._folders.values()))
+
+    def __len__(self):
+        self._ensure_fresh()
+        with self._lock:
+            return len(self._folders)
+
+
 class Exchange2010RoomService(BaseExchangeRoomService):
     def get_room_lists(self):
         return Exchange2010RoomLists(service=self.service)
@@ -1353,15 +2025,17 @@ class Exchange2010RoomItem(object):
 
 class Exchange2010ContactService(BaseExchangeContactService):
     def get_contact(self, id):
-        return Exchange2010ContactItem(service=self.service, id=id)
+        return self.service._get_item(id, Exchange2010ContactItem,
+                                      lambda: Exchange2010ContactItem(service=self.service, id=id))
 
     def find_contacts(self, query=None, initial_name=None, final_name=None,
-                      max_entries=100):
+                      max_entries=100, compact=False):
         """
         :param str query: AQS query string
         :param str initial_name: Lower bound on contact names (lexicographically)
         :param str final_name: Upper bound on contact names
         :param int max_entries: Maximum number of matches
+        :param bool compact: Return read-only :class:`ContactRecord` tuples instead of contact items
         """
         body = soap_request.find_contact_items(
             self.folder_id, query_string=query, initial_name=initial_name,
@@ -1370,14 +2044,30 @@ class Exchange2010ContactService(BaseExchangeContactService):
         response_xml = self.service.send(body)
         return Exchange2010ContactList(service=self.service,
                                        folder_id=self.folder_id,
-                                       xml_result=response_xml)
+                                       xml_result=response_xml,
+                                       compact=compact)
 
-    def get_all_contacts(self):
+    def get_all_contacts(self, prefetch=0, compact=False):
         """
         Return a list of all contacts in the current folder.
+
+        :param int prefetch: How many pages to request ahead of the one being iterated (0 disables read-ahead).
+        :param bool compact: Yield read-only :class:`ContactRecord` tuples instead of contact items, for
+          exports too large to hold as full objects.
         """
         return Exchange2010ContactList(service=self.service,
-                                       folder_id=self.folder_id)
+                                       folder_id=self.folder_id,
+                                       prefetch=prefetch,
+                                       compact=compact)
+
+    def sync_items(self, sync_state=None, state_store=None):
+        """
+        Returns the contacts created, updated and deleted in the current folder since ``sync_state``
+        (or the state saved in ``state_store``). See :class:`Exchange2010FolderSync`.
+        """
+        return Exchange2010FolderSync(service=self.service, folder_id=self.folder_id, item_type=u'Contact',
+                                      item_class=Exchange2010ContactItem, sync_state=sync_state,
+                                      state_store=state_store).sync()
 
 
 class Exchange2010ContactList(object):
@@ -1385,9 +2075,11 @@ class Exchange2010ContactList(object):
     Creates & Stores a list of Exchange2010ContactItem objects in the
     "self.items" variable.
     """
-    def __init__(self, service, folder_id=None, xml_result=None):
+    def __init__(self, service, folder_id=None, xml_result=None, prefetch=0, compact=False):
         self.service = service
         self.folder_id = folder_id
+        self.prefetch = prefetch
+        self.compact = compact
         self.count = None
         self._items = None
 
@@ -1408,34 +2100,23 @@ class Exchange2010ContactList(object):
                 yield item
             return
 
-        offset = 0
-        while True:
-            body = soap_request.find_items(
+        def build_body(offset):
+            return soap_request.find_items(
                 folder_id=self.folder_id, format=u'AllProperties',
                 limit=self.service.batch_size, offset=offset,
             )
-            xml_result = self.service.send(body)
-            last_batch = "true" == xml_result.xpath(
-                '//m:RootFolder/@IncludesLastItemInRange',
-                namespaces=soap_request.NAMESPACES,
-            )[0]
+
+        for xml_result in self.service._send_paged(build_body, prefetch=self.prefetch):
             self.count = int(xml_result.xpath(
                 '//m:RootFolder/@TotalItemsInView',
                 namespaces=soap_request.NAMESPACES,
             )[0])
-            offset = int(xml_result.xpath(
-                '//m:RootFolder/@IndexedPagingOffset',
-                namespaces=soap_request.NAMESPACES,
-            )[0])
 
             batch = self._parse_response_for_all_contacts(xml_result)
 
             for t in batch:
                 yield t
 
-            if last_batch:
-                return
-
     def _parse_response_for_all_contacts(self, xml):
         contacts = xml.xpath(u'//t:Items/t:Contact',
                              namespaces=soap_request.NAMESPACES)
@@ -1451,7 +2132,7 @@ class Exchange2010ContactList(object):
                                               xml=contact_xml)
             log.debug(u'Added contact with id %s and display name %s.',
                       contact.id, contact.display_name)
-            items.append(contact)
+            items.append(contact.as_record() if self.compact else contact)
 
         return items
 
@@ -1584,6 +2265,10 @@ class Exchange2010ContactItem(BaseExchangeContactItem):
             namespace_map=soap_request.NAMESPACES,
         )
 
+    def as_record(self):
+        """ Returns the contact as a read-only :class:`ContactRecord`. """
+        return _as_record(ContactRecord, self)
+
     def __repr__(self):
         return "<Exchange2010ContactItem: {}>".format(self.display_name.encode('utf-8'))
 
@@ -1595,10 +2280,57 @@ BODY_TYPES = [BODY_TYPE_HTML, BODY_TYPE_TEXT]
 
 class Exchange2010MailService(BaseExchangeMailService):
     def get_mail(self, id):
-        return Exchange2010MailItem(service=self.service, id=id)
+        return self.service._get_item(id, Exchange2010MailItem,
+                                      lambda: Exchange2010MailItem(service=self.service, id=id))
+
+    def list_mails(self, idonly=False, prefetch=0, compact=False):
+        """
+        With ``compact=True`` the list yields read-only :class:`MailRecord` tuples instead of mail items.
+        """
+        return Exchange2010MailList(service=self.service, folder_id=self.folder_id, idonly=idonly, prefetch=prefetch,
+                                    compact=compact)
+
+    def sync_items(self, sync_state=None, state_store=None):
+        """
+        Returns the messages created, updated and deleted in the current folder since ``sync_state``
+        (or the state saved in ``state_store``), plus read flag changes. See :class:`Exchange2010FolderSync`.
+
+        **Examples**::
+
+            store = JSONFileStore('/var/lib/myapp/sync.json')
+            changes = service.mail().sync_items(state_store=store)
+            for mail in changes.created:
+              print(mail.subject)
+        """
+        return Exchange2010FolderSync(service=self.service, folder_id=self.folder_id, item_type=u'Message',
+                                      item_class=Exchange2010MailItem, sync_state=sync_state,
+                                      state_store=state_store).sync()
+
+    def export(self, folder_id, sink, chunk_size=10, max_workers=4, checkpoint=None):
+        """
+          export(folder_id, sink)
+          :param str folder_id: The folder to export. Defaults to this service's folder when None.
+          :param sink: Where messages go - an :class:`pyexchange.export.MboxSink`, :class:`MaildirSink` or :class:`EMLSink`.
+          :param int chunk_size: How many messages to fetch per GetItem request.
+          :param int max_workers: How many GetItem requests to run at once.
+          :param checkpoint: Optional dict-like store (e.g. :class:`pyexchange.utils.JSONFileStore`) used to resume an
+            interrupted export.
+
+          Copies the raw MIME content of every message in the folder into the sink and returns how many messages
+          were written. Messages are exported oldest first; re-running with the same checkpoint picks up where the
+          last run stopped, including messages that arrived since.
 
-    def list_mails(self, idonly=False):
-        return Exchange2010MailList(service=self.service, folder_id=self.folder_id, idonly=idonly)
+          **Examples**::
+
+            from pyexchange.export import MboxSink
+            from pyexchange.utils import JSONFileStore
+
+            with MboxSink('/archive/jdoe.mbox') as sink:
+              service.mail().export('inbox', sink, checkpoint=JSONFileStore('/archive/jdoe.state'))
+
+        """
+        return Exchange2010MailExport(service=self.service, folder_id=folder_id or self.folder_id, sink=sink,
+                                      chunk_size=chunk_size, max_workers=max_workers, checkpoint=checkpoint).run()
 
     def get_attachment(self, attachment_id):
         """
@@ -1776,16 +2508,20 @@ class Exchange2010MailService(BaseExchangeMailService):
 
 
 class Exchange2010MailList(object):
-    def __init__(self, service=None, folder_id=u'inbox', xml_result=None, idonly=False):
+    def __init__(self, service=None, folder_id=u'inbox', xml_result=None, idonly=False, prefetch=0, compact=False):
         self.service = service
         self.folder_id = folder_id
         self.idonly = idonly
+        self.prefetch = prefetch
+        self.compact = compact
         self._items = None
         self.count = None
 
         if xml_result is not None:
             self._items = self._parse_response_for_all_mails(xml_result)
             self.load_extended_properties(self._items)
+            if compact:
+                self._items = [item.as_record() for item in self._items]
             self.count = len(self._items)
 
     @property
@@ -1797,39 +2533,28 @@ class Exchange2010MailList(object):
         Exchange on demand.
         """
         if self._items is not None:
-            for item in self._item:
+            for item in self._items:
                 yield item
             return
 
-        offset = 0
-        while True:
-            body = soap_request.find_items(
+        def build_body(offset):
+            return soap_request.find_items(
                 folder_id=self.folder_id, limit=self.service.batch_size,
                 offset=offset, format=u'IdOnly' if self.idonly else u'AllProperties'
             )
-            xml_result = self.service.send(body)
-            last_batch = "true" == xml_result.xpath(
-                '//m:RootFolder/@IncludesLastItemInRange',
-                namespaces=soap_request.NAMESPACES,
-            )[0]
+
+        for xml_result in self.service._send_paged(build_body, prefetch=self.prefetch):
             self.count = int(xml_result.xpath(
                 '//m:RootFolder/@TotalItemsInView',
                 namespaces=soap_request.NAMESPACES,
             )[0])
-            offset = int(xml_result.xpath(
-                '//m:RootFolder/@IndexedPagingOffset',
-                namespaces=soap_request.NAMESPACES,
-            )[0])
 
             batch = self._parse_response_for_all_mails(xml_result)
             if not self.idonly:
                 self.load_extended_properties(batch)
 
             for t in batch:
-                yield t
-
-            if last_batch:
-                return
+                yield t.as_record() if self.compact else t
 
     def load_extended_properties(self, items):
         """
@@ -1838,7 +2563,6 @@ class Exchange2010MailList(object):
         """
         if items:
             body = soap_request.get_mail_items(items)
-            logging.info(etree.tostring(body))
             xml_result = self.service.send(body)
 
             self._parse_response_for_extended_properties(items, xml_result)
@@ -1880,6 +2604,118 @@ class Exchange2010MailList(object):
         return items
 
 
+def _received_time(received):
+    """ Parses a DateTimeReceived for comparison; a missing one sorts first. """
+    if not received:
+        return datetime.min
+    return datetime.strptime(received[:19], u'%Y-%m-%dT%H:%M:%S')
+
+
+class Exchange2010MailExport(object):
+    """
+    Pages through a folder with ``FindItem IdOnly`` and pulls MIME content in concurrent, chunked ``GetItem``
+    requests. Only ``chunk_size * max_workers`` messages are held in memory at any time.
+    """
+
+    def __init__(self, service, folder_id, sink, chunk_size=10, max_workers=4, checkpoint=None):
+        self.service = service
+        self.folder_id = folder_id
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.checkpoint = checkpoint
+        self.checkpoint_key = u'export:%s' % folder_id
+
+    def run(self):
+        # Messages are exported oldest first. Every page is asked for the messages received at or after the last
+        # one exported, and the checkpoint keeps that DateTimeReceived and the ids exported at that exact time,
+        # so deleting older messages during or between runs doesn't shift the pages (an offset would then skip
+        # messages), and a resumed export doesn't list the folder again from the start.
+        last_received, last_ids = u'', set()
+        if self.checkpoint is not None:
+            state = self.checkpoint.get(self.checkpoint_key)
+            if state:
+                last_received, last_ids = state[u'received'], set(state[u'ids'])
+                # Drops whatever the sink got after the checkpoint, so an interrupted chunk isn't written twice.
+                self.sink.restore(state.get(u'sink'))
+                log.info(u'Resuming export of %s after messages received at %s', self.folder_id, last_received)
+            else:
+                self._save_checkpoint(last_received, last_ids)
+
+        exported = 0
+        offset = 0
+        while True:
+            since = last_received
+            body = soap_request.find_items(
+                folder_id=self.folder_id, format=u'IdOnly',
+                limit=self.service.batch_size, offset=offset,
+                sort_by=u'item:DateTimeReceived', additional_fields=[u'item:DateTimeReceived'],
+                received_since=since or None,
+            )
+            xml_result = self.service.send(body)
+            last_batch = "true" == xml_result.xpath(
+                '//m:RootFolder/@IncludesLastItemInRange',
+                namespaces=soap_request.NAMESPACES,
+            )[0]
+            items = [
+                (item.find(u't:ItemId', namespaces=soap_request.NAMESPACES).get(u'Id'),
+                 item.findtext(u't:DateTimeReceived', default=u'', namespaces=soap_request.NAMESPACES))
+                for item in xml_result.xpath(u'//t:Items/*', namespaces=soap_request.NAMESPACES)
+            ]
+            del xml_result
+
+            last_time = _received_time(last_received)
+            pending = []
+            for item_id, received in items:
+                received_time = _received_time(received)
+                if received_time > last_time or (received_time == last_time and item_id not in last_ids):
+                    pending.append((item_id, received))
+            chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+            ids = [[item_id for item_id, _ in chunk] for chunk in chunks]
+            for chunk, messages in zip(chunks, concurrent_map(self._fetch_mime_content, ids, self.max_workers)):
+                for item_id, mime_content in messages:
+                    self.sink.add_message(item_id, iter_base64_decode(mime_content))
+                    exported += 1
+
+                for item_id, received in chunk:
+                    if received != last_received:
+                        last_received, last_ids = received, set()
+                    last_ids.add(item_id)
+                self._save_checkpoint(last_received, last_ids)
+
+            if last_batch or not items:
+                return exported
+            # Only a page of messages all received at the same time leaves the restriction where it was; the
+            # offset then moves past them.
+            offset = offset + len(items) if last_received == since else 0
+
+    def _fetch_mime_content(self, ids):
+        # Messages deleted since the FindItem come back as ErrorItemNotFound; skip those instead of failing the
+        # batch. Any other error fails the export before the chunk is checkpointed, so no message is lost.
+        response_xml = self.service.send(soap_request.get_mime_content(ids), check_for_errors=False)
+        self.service._check_for_SOAP_fault(response_xml)
+
+        result = []
+        for message in response_xml.xpath(u'//m:GetItemResponseMessage', namespaces=soap_request.NAMESPACES):
+            code = message.findtext(u'm:ResponseCode', namespaces=soap_request.NAMESPACES)
+            if code == u'ErrorItemNotFound':
+                log.warning(u'Skipping message in export: %s', code)
+                continue
+            self.service._raise_for_response_code(code, response_xml)
+
+            for item in message.xpath(u'm:Items/*', namespaces=soap_request.NAMESPACES):
+                item_id = item.find(u't:ItemId', namespaces=soap_request.NAMESPACES).get(u'Id')
+                result.append((item_id, item.findtext(u't:MimeContent', namespaces=soap_request.NAMESPACES)))
+
+        return result
+
+    def _save_checkpoint(self, received, ids):
+        if self.checkpoint is None:
+            return
+        self.sink.flush()
+        self.checkpoint[self.checkpoint_key] = {u'received': received, u'ids': sorted(ids), u'sink': self.sink.state()}
+
+
 class Exchange2010MailItem(BaseExchangeMailItem):
     def _init_from_service(self, id):
         body = soap_request.get_item(exchange_id=id, format=u'AllProperties')
@@ -1933,6 +2769,10 @@ class Exchange2010MailItem(BaseExchangeMailItem):
 
         return self
 
+    def as_record(self):
+        """ Returns the message as a read-only :class:`MailRecord`. """
+        return _as_record(MailRecord, self)
+
     def init_from_aco(self, obj, attachment_url=None):
         self._id = obj['eid']
         for meta in obj['detail']['meta']:
@@ -1963,8 +2803,6 @@ class Exchange2010MailItem(BaseExchangeMailItem):
     def _parse_mail_properties(self, xml):
         # Use relative selectors here so that we can call this in the
         # context of each Contact element without deepcopying.
-        print(etree.tostring(xml))
-
         property_map = {
             u'id': {
                 u'xpath': u'descendant-or-self::t:Message/t:ItemId/@Id',
@@ -2085,16 +2923,45 @@ class Exchange2010MailItem(BaseExchangeMailItem):
         return "<Exchange2010MailItem: {}>".format(self.id)
 
 
+# Everything Exchange2010TaskItem parses except the body, which FindItem refuses to return.
+TASK_LIST_FIELDS = [
+    u'item:ParentFolderId', u'item:Subject', u'item:Categories', u'item:IsDraft', u'item:DateTimeSent',
+    u'item:DateTimeCreated', u'item:Importance', u'item:LastModifiedName', u'item:LastModifiedTime',
+    u'task:DueDate', u'task:IsComplete', u'task:Owner', u'task:StartDate', u'task:CompleteDate',
+    u'task:Status', u'task:StatusDescription', u'task:PercentComplete', u'task:Companies',
+]
+
+
 class Exchange2010TaskService(BaseExchangeTaskService):
     def get_task(self, id):
-        return Exchange2010TaskItem(service=self.service, id=id)
+        return self.service._get_item(id, Exchange2010TaskItem,
+                                      lambda: Exchange2010TaskItem(service=self.service, id=id))
 
-    def get_all_tasks(self):
+    def get_all_tasks(self, prefetch=0, load_bodies=False, compact=False):
         """
         Return a list of all tasks in the current folder.
+
+        Tasks are listed in a single FindItem per page carrying all task properties except the body,
+        which FindItem cannot return. Pass ``load_bodies=True`` to fetch bodies for each page with one
+        extra GetItem, or call :meth:`Exchange2010TaskItem.load_body` on the tasks that need it.
+
+        :param int prefetch: How many pages to request ahead of the one being iterated (0 disables read-ahead).
+        :param bool compact: Yield read-only :class:`TaskRecord` tuples instead of task items.
         """
         return Exchange2010TaskList(service=self.service,
-                                    folder_id=self.folder_id)
+                                    folder_id=self.folder_id,
+                                    prefetch=prefetch,
+                                    load_bodies=load_bodies,
+                                    compact=compact)
+
+    def sync_items(self, sync_state=None, state_store=None):
+        """
+        Returns the tasks created, updated and deleted in the current folder since ``sync_state``
+        (or the state saved in ``state_store``). See :class:`Exchange2010FolderSync`.
+        """
+        return Exchange2010FolderSync(service=self.service, folder_id=self.folder_id, item_type=u'Task',
+                                      item_class=Exchange2010TaskItem, sync_state=sync_state,
+                                      state_store=state_store).sync()
 
 
 class Exchange2010TaskList(object):
@@ -2102,15 +2969,20 @@ class Exchange2010TaskList(object):
     Creates an iterator over a list of Exchange2010TaskItem objects in
     "self.items".
     """
-    def __init__(self, service, folder_id=None, xml_result=None):
+    def __init__(self, service, folder_id=None, xml_result=None, prefetch=0, load_bodies=False, compact=False):
         self.service = service
         self.folder_id = folder_id
+        self.prefetch = prefetch
+        self.load_bodies = load_bodies
+        self.compact = compact
         self.count = None
         self._items = None
 
         if xml_result is not None:
             self._items = self._parse_response_for_all_tasks(xml_result)
             self.load_extended_properties(self._items)
+            if compact:
+                self._items = [item.as_record() for item in self._items]
             self.count = len(self._items)
 
     @property
@@ -2122,48 +2994,42 @@ class Exchange2010TaskList(object):
         Exchange on demand.
         """
         if self._items is not None:
-            for item in self._item:
+            for item in self._items:
                 yield item
             return
 
-        offset = 0
-        while True:
-            body = soap_request.find_items(
+        def build_body(offset):
+            return soap_request.find_items(
                 folder_id=self.folder_id, format=u'IdOnly',
                 limit=self.service.batch_size, offset=offset,
+                additional_fields=TASK_LIST_FIELDS,
             )
-            xml_result = self.service.send(body)
-            last_batch = "true" == xml_result.xpath(
-                '//m:RootFolder/@IncludesLastItemInRange',
-                namespaces=soap_request.NAMESPACES,
-            )[0]
+
+        for xml_result in self.service._send_paged(build_body, prefetch=self.prefetch):
             self.count = int(xml_result.xpath(
                 '//m:RootFolder/@TotalItemsInView',
                 namespaces=soap_request.NAMESPACES,
             )[0])
-            offset = int(xml_result.xpath(
-                '//m:RootFolder/@IndexedPagingOffset',
-                namespaces=soap_request.NAMESPACES,
-            )[0])
 
             batch = self._parse_response_for_all_tasks(xml_result)
-            self.load_extended_properties(batch)
+            if self.load_bodies:
+                self.load_extended_properties(batch, additional_fields=[u'item:Body'])
 
             for t in batch:
-                yield t
+                yield t.as_record() if self.compact else t
 
-            if last_batch:
-                return
-
-    def load_extended_properties(self, items):
+    def load_extended_properties(self, items, additional_fields=None):
         """
-        loads additional task info via soap
+        loads additional task info via soap; all properties by default, or only ``additional_fields``
         if there are no items, nothing is done (empty items would cause soap error 500)
         """
         if items:
-            body = soap_request.get_item([i.id for i in items],
-                                         format=u'AllProperties')
-            logging.info(etree.tostring(body))
+            if additional_fields:
+                body = soap_request.get_item([i.id for i in items], format=u'IdOnly',
+                                             additional_fields=additional_fields)
+            else:
+                body = soap_request.get_item([i.id for i in items],
+                                             format=u'AllProperties')
             xml_result = self.service.send(body)
 
             self._parse_response_for_extended_properties(items, xml_result)
@@ -2183,7 +3049,7 @@ class Exchange2010TaskList(object):
             id = task_xml.xpath(u'descendant-or-self::t:Task/t:ItemId/@Id',
                                 namespaces=soap_request.NAMESPACES)
             task = tasks_dict[id[0]]
-            task._init_from_xml(task_xml)
+            task._init_from_xml(task_xml, merge=True)
 
     def _parse_response_for_all_tasks(self, xml):
         tasks = xml.xpath(u'//t:Items/t:Task',
@@ -2219,16 +3085,31 @@ class Exchange2010TaskItem(BaseExchangeTaskItem):
 
         return self._init_from_xml(response_xml)
 
-    def _init_from_xml(self, xml):
+    def _init_from_xml(self, xml, merge=False):
         properties = self._parse_task_properties(xml)
 
         self._id = properties.pop('id')
         self._change_key = properties.pop('change_key')
 
+        if merge:
+            # A partial response (e.g. a body-only GetItem) leaves properties out; keep what we already have.
+            properties = dict((k, v) for k, v in properties.items() if v is not None)
+
         self._update_properties(properties)
 
         return self
 
+    def load_body(self):
+        """
+        Fetches the body of a task that came from a listing. Bodies are not part of
+        :meth:`Exchange2010TaskService.get_all_tasks` results unless asked for, since FindItem
+        cannot return them.
+        """
+        body = soap_request.get_item(exchange_id=self._id, format=u'IdOnly',
+                                     additional_fields=[u'item:Body'])
+        response_xml = self.service.send(body)
+        return self._init_from_xml(response_xml, merge=True)
+
     def _parse_task_properties(self, response):
         # Use relative selectors here so that we can call this in the
         # context of each Contact element without deepcopying.
@@ -2319,6 +3200,10 @@ class Exchange2010TaskItem(BaseExchangeTaskItem):
             namespace_map=soap_request.NAMESPACES,
         )
 
+    def as_record(self):
+        """ Returns the task as a read-only :class:`TaskRecord`. """
+        return _as_record(TaskRecord, self)
+
     def __repr__(self):
         return "<Exchange2010TaskItem: {}>".format(self.subject.encode('utf-8'))
 
@@ -2334,15 +3219,71 @@ class Exchange2010NotificationService(object):
     def subscribe_push(self, folder_ids, event_types, url, status_freq=None, watermark=None):
         # notify_svc.subscribe_push("Calendar", event_types='all', url="http://url.com", status_freq=1440)
         body = soap_request.subscribe_push(folder_ids, event_types, url,
-                                           status_freq)
+                                           status_freq, watermark)
+        return self._subscribe(body)
+
+    def subscribe_pull(self, folder_ids, event_types='all', timeout=30, watermark=None):
+        """
+        Creates a pull subscription, read with :meth:`get_events`. Exchange drops it after ``timeout`` minutes
+        without a read. Pass the last ``watermark`` seen to get the events that happened since then.
+        """
+        return self._subscribe(soap_request.subscribe_pull(folder_ids, event_types, timeout, watermark))
+
+    def subscribe_streaming(self, folder_ids, event_types='all'):
+        """ Creates a streaming subscription, read with :meth:`get_streaming_events`. """
+        return self._subscribe(soap_request.subscribe_streaming(folder_ids, event_types))
+
+    def _subscribe(self, body):
         response = self.service.send(body)
         sub_id = response.xpath('//m:SubscriptionId',
                                 namespaces=soap_request.NAMESPACES)[0]
         watermark = response.xpath('//m:Watermark',
-                                   namespaces=soap_request.NAMESPACES)[0]
-        return NotificationSubscription(sub_id.text, watermark.text)
+                                   namespaces=soap_request.NAMESPACES)
+        return NotificationSubscription(sub_id.text, watermark[0].text if watermark else None)
 
-    #TODO: implement UNSUBSCRIBE
+    def unsubscribe(self, subscription_id):
+        """ Ends a pull or streaming subscription. Subscriptions that already expired are ignored. """
+        try:
+            self.service.send(soap_request.unsubscribe_subscription_id(subscription_id))
+        except ExchangeSubscriptionExpiredException:
+            pass
+
+    def get_events(self, subscription_id, watermark):
+        """
+        Returns the :class:`PushNotification` holding the events of a pull subscription since ``watermark``.
+        If its ``more_events`` is set, call again with its ``watermark`` for the rest.
+
+        Raises :class:`ExchangeSubscriptionExpiredException` if the subscription is gone.
+        """
+        response = self.service.send(soap_request.get_events(subscription_id, watermark))
+        notifications = parse_notification(response)
+        return notifications[0] if notifications else PushNotification(subscription_id, watermark, watermark, False, [])
+
+    def get_streaming_events(self, subscription_ids, connection_timeout=1):
+        """
+        Yields :class:`PushNotification` records for any of ``subscription_ids`` as Exchange streams them, until
+        the connection closes after ``connection_timeout`` minutes.
+
+        Raises :class:`ExchangeSubscriptionExpiredException` (whose ``subscription_ids`` says which ones) if some
+        of the subscriptions are gone.
+        """
+        body = soap_request.get_streaming_events(subscription_ids, connection_timeout)
+
+        # Exchange keeps the connection quiet between notifications, so the read timeout must outlast it.
+        for response in self.service.send_streaming(body, timeout=connection_timeout * 60 + 30):
+            for notification in parse_notification(response):
+                yield notification
+
+            status = response.xpath(u'//m:ConnectionStatus', namespaces=soap_request.NAMESPACES)
+            if status and status[0].text == u'Closed':
+                return
+
+    def listen(self, handler, streaming=False, state_store=None, **kwargs):
+        """
+        Returns an :class:`Exchange2010NotificationLoop` running pull (or streaming) subscriptions, which hands
+        their events to ``handler(key, events)``.
+        """
+        return Exchange2010NotificationLoop(self.service, handler, streaming=streaming, state_store=state_store, **kwargs)
 
     def parse_push_notification(self, body):
         """
@@ -2350,29 +3291,295 @@ class Exchange2010NotificationService(object):
         :param str body: Bytestring containing the XML request.
 
         Returns a dict containing a list of EWS item IDs for each event
-        type.
-        """
-        xml_body = etree.XML(body)
-        log.debug(etree.tostring(xml_body, pretty_print=True))
-        events = dict()
-        for event_type, xml_event_type in soap_request.NOTIFICATION_EVENT_TYPES.items():
-            if event_type == 'moved':
-                if xml_body.xpath('//t:MovedEvent', namespaces=soap_request.NAMESPACES):
-                    events['moved'] = {
-                        'item_id': xml_body.xpath('//t:MovedEvent/t:ItemId/@Id',
-                                                  namespaces=soap_request.NAMESPACES),
-                        'old_item_id': xml_body.xpath('//t:MovedEvent/t:OldItemId/@Id',
-                                                      namespaces=soap_request.NAMESPACES),
-                        'parent_folder': xml_body.xpath('//t:MovedEvent/t:ParentFolderId/@Id',
-                                                        namespaces=soap_request.NAMESPACES),
-                        'old_parent_folder': xml_body.xpath('//t:MovedEvent/t:OldParentFolderId/@Id',
-                                                            namespaces=soap_request.NAMESPACES),
-                        }
-                else:
-                    events['moved'] = []
-            else:
-                events[event_type] = xml_body.xpath(
-                    '//t:{}/t:ItemId/@Id'.format(xml_event_type),
-                    namespaces=soap_request.NAMESPACES,
-                )
+        type. See :func:`parse_notification` for the events themselves, in
+        the order they happened, with their watermarks.
+        """
+        events = dict((event_type, []) for event_type in soap_request.NOTIFICATION_EVENT_TYPES)
+        moved = None
+
+        for notification in parse_notification(body):
+            for event in notification.events:
+                if event.event_type == u'moved':
+                    if moved is None:
+                        moved = events['moved'] = {'item_id': [], 'old_item_id': [], 'parent_folder': [],
+                                                   'old_parent_folder': []}
+                    if not event.is_folder:
+                        moved['item_id'].append(event.item_id)
+                        if event.old_item_id is not None:
+                            moved['old_item_id'].append(event.old_item_id)
+                    if event.parent_folder_id is not None:
+                        moved['parent_folder'].append(event.parent_folder_id)
+                    if event.old_parent_folder_id is not None:
+                        moved['old_parent_folder'].append(event.old_parent_folder_id)
+                elif event.event_type in events and not event.is_folder:
+                    events[event.event_type].append(event.item_id)
+
         return events
+
+
+class Exchange2010NotificationLoop(object):
+    """
+    Runs any number of pull or streaming subscriptions from a single thread, for workers that can't accept the
+    inbound connections push notifications need. ::
+
+        def handler(key, events):
+            ...
+
+        loop = service.notifications().listen(handler, state_store=JSONFileStore('/var/lib/myapp/subscriptions.json'))
+        loop.add(u'jdoe-inbox', [u'inbox'])
+        loop.add(u'jdoe-calendar', [u'calendar'], event_types=[u'created', u'modified', u'deleted'])
+        loop.run()
+
+    Pull subscriptions are read with ``GetEvents`` every ``poll_interval`` seconds, up to ``max_workers`` at a
+    time. With ``streaming=True`` all subscriptions share one ``GetStreamingEvents`` connection instead, reopened
+    every ``connection_timeout`` minutes.
+
+    ``handler`` gets the events of one subscription at a time, in the order they happened, without the status
+    (keep-alive) events. A pull subscription's watermark only moves on once the handler has returned, so events a
+    failing handler didn't finish are read again on the next poll.
+
+    The subscription id and last watermark of every key are kept in ``state_store`` (any dict-like object), so a
+    restarted loop picks up where it stopped. Subscriptions that expired are made again from their last watermark;
+    streaming subscriptions can't be resumed that way, so events between the expiry and the new subscription are
+    lost for those.
+    """
+
+    def __init__(self, service, handler, streaming=False, poll_interval=10, timeout=30, connection_timeout=1,
+                 max_workers=4, state_store=None):
+        self.service = service
+        self.notifications = service.notifications()
+        self.handler = handler
+        self.streaming = streaming
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.connection_timeout = connection_timeout
+        self.max_workers = max_workers
+        self.state_store = state_store if state_store is not None else {}
+
+        self._subscriptions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def add(self, key, folder_ids, event_types='all'):
+        """
+        Subscribes to ``folder_ids`` under ``key``, or carries on with the subscription stored for ``key``.
+        Events are kept by Exchange from this call on, even before the loop runs.
+        """
+        state = self.state_store.get(self._state_key(key)) or {}
+        subscription = {u'key': key, u'folder_ids': list(folder_ids), u'event_types': event_types,
+                        u'id': state.get(u'id'), u'watermark': state.get(u'watermark')}
+
+        if subscription[u'id'] is None:
+            self._subscribe(subscription)
+
+        with self._lock:
+            self._subscriptions[key] = subscription
+
+    def remove(self, key, unsubscribe=True):
+        """ Stops following ``key``, and unless ``unsubscribe`` is False, ends the subscription on the server. """
+        with self._lock:
+            subscription = self._subscriptions.pop(key, None)
+
+        if subscription is not None and unsubscribe and subscription[u'id'] is not None:
+            self.notifications.unsubscribe(subscription[u'id'])
+        self.state_store.pop(self._state_key(key), None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._subscriptions)
+
+    def poll(self):
+        """ Reads and handles whatever events are waiting, once. Returns the number of events handled. """
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+
+        if not subscriptions:
+            return 0
+        if self.streaming:
+            return self._poll_streaming(subscriptions)
+        return self._poll_pull(subscriptions)
+
+    def run(self):
+        """ Calls :meth:`poll` until :meth:`stop` is called. Connection errors are logged and retried. """
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except FailedExchangeException:
+                log.exception(u'Reading notifications failed, retrying in %s seconds', self.poll_interval)
+                self._stopped.wait(self.poll_interval)
+                continue
+
+            if not self.streaming or not self._subscriptions:
+                self._stopped.wait(self.poll_interval)
+
+    def stop(self):
+        """ Makes :meth:`run` return, once the request in flight (if any) has finished. """
+        self._stopped.set()
+
+    def _poll_pull(self, subscriptions):
+        handled = 0
+        for subscription, notifications in zip(subscriptions, concurrent_map(self._read, subscriptions,
+                                                                             self.max_workers)):
+            for notification in notifications:
+                count = self._handle(subscription, notification)
+                if count is None:
+                    break  # read again from the last handled watermark next time
+                handled += count
+        return handled
+
+    def _read(self, subscription):
+        notifications = []
+        watermark = subscription[u'watermark']
+        try:
+            while True:
+                notification = self.notifications.get_events(subscription[u'id'], watermark)
+                notifications.append(notification)
+                watermark = notification.watermark or watermark
+                if not notification.more_events:
+                    return notifications
+        except ExchangeSubscriptionExpiredException:
+            log.info(u'Pull subscription for %s expired, subscribing again', subscription[u'key'])
+            self._subscribe(subscription)
+            return notifications
+
+    def _poll_streaming(self, subscriptions):
+        by_id = dict((subscription[u'id'], subscription) for subscription in subscriptions)
+        handled = 0
+        try:
+            for notification in self.notifications.get_streaming_events(list(by_id), self.connection_timeout):
+                subscription = by_id.get(notification.subscription_id)
+                if subscription is not None:
+                    handled += self._handle(subscription, notification) or 0
+                if self._stopped.is_set():
+                    break
+        except ExchangeSubscriptionExpiredException as err:
+            expired = [by_id[i] for i in err.subscription_ids if i in by_id] or subscriptions
+            for subscription in expired:
+                log.warning(u'Streaming subscription for %s expired, subscribing again; events in between are lost',
+                            subscription[u'key'])
+                self._subscribe(subscription)
+        return handled
+
+    def _handle(self, subscription, notification):
+        if self.service.item_cache is not None:
+            self.service.item_cache.invalidate_events(notification.events)
+
+        events = [event for event in notification.events if event.event_type != u'status']
+        if events:
+            try:
+                self.handler(subscription[u'key'], events)
+            except Exception:
+                log.exception(u'Notification handler failed for %s', subscription[u'key'])
+                return None
+
+        if notification.watermark:
+            subscription[u'watermark'] = notification.watermark
+            self._save(subscription)
+        return len(events)
+
+    def _subscribe(self, subscription):
+        notifications = self.notifications
+        if self.streaming:
+            result = notifications.subscribe_streaming(subscription[u'folder_ids'], subscription[u'event_types'])
+        elif subscription[u'watermark']:
+            try:
+                result = notifications.subscribe_pull(subscription[u'folder_ids'], subscription[u'event_types'],
+                                                      self.timeout, subscription[u'watermark'])
+            except ExchangeInvalidWatermarkException:
+                log.warning(u'Could not resume %s from its watermark, subscribing from now', subscription[u'key'])
+                result = notifications.subscribe_pull(subscription[u'folder_ids'], subscription[u'event_types'],
+                                                      self.timeout)
+        else:
+            result = notifications.subscribe_pull(subscription[u'folder_ids'], subscription[u'event_types'],
+                                                  self.timeout)
+
+        subscription[u'id'] = result.id
+        subscription[u'watermark'] = result.watermark or subscription[u'watermark']
+        self._save(subscription)
+
+    def _save(self, subscription):
+        self.state_store[self._state_key(subscription[u'key'])] = {u'id': subscription[u'id'],
+                                                                   u'watermark': subscription[u'watermark']}
+
+    def _state_key(self, key):
+        return u'subscription:%s' % key
+
+
+EVENT_TYPES_BY_ELEMENT = dict((element, event_type) for event_type, element in soap_request.NOTIFICATION_EVENT_TYPES.items())
+EVENT_TYPES_BY_ELEMENT.update({u'StatusEvent': u'status', u'FreeBusyChangedEvent': u'free_busy_changed'})
+
+NOTIFICATION_NODES = etree.XPath(u'//m:Notification', namespaces=soap_request.NAMESPACES)
+T_PREFIX = u'{%s}' % soap_request.TYPE_NS
+
+
+def parse_notification(body):
+    """
+    Parses a push notification (or the notifications in a GetEvents or GetStreamingEvents response) into
+    :class:`PushNotification` records, one per ``Notification`` element.
+
+    Each record's ``events`` are :class:`NotificationEvent` tuples in document order, so they can be
+    applied in the order they happened. ``event_type`` uses the names of
+    ``soap_request.NOTIFICATION_EVENT_TYPES`` (plus ``status`` for the keep-alive status events), and
+    ``watermark`` is the point to resume from after that event.
+    """
+    xml_body = etree.XML(body) if isinstance(body, (bytes, six.text_type)) else body
+    notifications = []
+
+    for node in NOTIFICATION_NODES(xml_body):
+        subscription_id = previous_watermark = watermark = None
+        more_events = False
+        events = []
+
+        for child in node.iterchildren(etree.Element):
+            name = child.tag[len(T_PREFIX):] if child.tag.startswith(T_PREFIX) else None
+
+            if name == u'SubscriptionId':
+                subscription_id = child.text
+            elif name == u'PreviousWatermark':
+                previous_watermark = child.text
+            elif name == u'MoreEvents':
+                more_events = child.text == u'true'
+            elif name is not None and name.endswith(u'Event'):
+                event = _parse_notification_event(subscription_id, name, child)
+                watermark = event.watermark or watermark
+                events.append(event)
+
+        notifications.append(PushNotification(subscription_id, previous_watermark, watermark, more_events, events))
+
+    return notifications
+
+
+def _parse_notification_event(subscription_id, name, node):
+    values = {}
+    is_folder = False
+
+    for child in node.iterchildren(etree.Element):
+        field = child.tag[len(T_PREFIX):]
+        if field in (u'ItemId', u'FolderId'):
+            is_folder = field == u'FolderId'
+            values[u'item_id'] = child.get(u'Id')
+            values[u'change_key'] = child.get(u'ChangeKey')
+        elif field in (u'OldItemId', u'OldFolderId'):
+            values[u'old_item_id'] = child.get(u'Id')
+        elif field == u'ParentFolderId':
+            values[u'parent_folder_id'] = child.get(u'Id')
+        elif field == u'OldParentFolderId':
+            values[u'old_parent_folder_id'] = child.get(u'Id')
+        elif field == u'Watermark':
+            values[u'watermark'] = child.text
+        elif field == u'TimeStamp' and child.text:
+            values[u'timestamp'] = datetime.strptime(child.text[:19], u'%Y-%m-%dT%H:%M:%S').replace(tzinfo=utc)
+
+    return NotificationEvent(
+        subscription_id=subscription_id,
+        event_type=EVENT_TYPES_BY_ELEMENT.get(name, name),
+        watermark=values.get(u'watermark'),
+        timestamp=values.get(u'timestamp'),
+        item_id=values.get(u'item_id'),
+        change_key=values.get(u'change_key'),
+        parent_folder_id=values.get(u'parent_folder_id'),
+        old_item_id=values.get(u'old_item_id'),
+        old_parent_folder_id=values.get(u'old_parent_folder_id'),
+        is_folder=is_folder,
+    )
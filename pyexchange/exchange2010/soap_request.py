@@ -113,7 +113,7 @@ def convert_id(id_value, destination_format, format=u'EwsId',
     )
 
 
-def get_item(exchange_id, format=u"Default", additional_properties=None):
+def get_item(exchange_id, format=u"Default", additional_properties=None, additional_fields=None):
     """
       Requests a calendar item from the store.
 
@@ -154,6 +154,8 @@ def get_item(exchange_id, format=u"Default", additional_properties=None):
     else:
         additional_properties = []
 
+    additional_properties += [T.FieldURI(FieldURI=field) for field in additional_fields or []]
+
     shapes = [T.BaseShape(format)]
 
     if additional_properties:
@@ -235,11 +237,38 @@ def sync_calendar_items(calendar_id='calendar', format='Default', delegate_for=N
     else:
         target = M.SyncFolderId(T.FolderId(Id=calendar_id))
 
-    items = [M.ItemShape(T.BaseShape(format)), target, M.MaxChangesReturned('512')]
+    return _sync_folder_items(target, format=format, sync_state=sync_state)
+
+
+def sync_folder_items(folder_id, format=u'Default', sync_state=None, max_changes_returned=512):
+    """
+      Requests the changes to a folder since sync_state (or the full contents when sync_state is None).
+
+      http://msdn.microsoft.com/en-us/library/aa563967(v=exchg.140).aspx
+
+      <m:SyncFolderItems>
+        <m:ItemShape>
+          <t:BaseShape>{format}</t:BaseShape>
+        </m:ItemShape>
+        <m:SyncFolderId>
+          <t:DistinguishedFolderId Id="inbox"/>
+        </m:SyncFolderId>
+        <m:SyncState>{sync_state}</m:SyncState>
+        <m:MaxChangesReturned>512</m:MaxChangesReturned>
+      </m:SyncFolderItems>
+    """
+    return _sync_folder_items(M.SyncFolderId(folder_id_xml(folder_id)), format=format, sync_state=sync_state,
+                              max_changes_returned=max_changes_returned)
+
+
+def _sync_folder_items(target, format=u'Default', sync_state=None, max_changes_returned=512):
+    items = [M.ItemShape(T.BaseShape(format)), target]
 
     if sync_state:
         items.append(M.SyncState(sync_state))
 
+    items.append(M.MaxChangesReturned(str(max_changes_returned)))
+
     root = M.SyncFolderItems(
         *items
     )
@@ -270,9 +299,23 @@ def find_contact_items(folder_id, initial_name=None, final_name=None,
 
 
 def find_items(folder_id, query_string=None, format=u'Default',
-               limit=None, offset=0):
+               limit=None, offset=0, sort_by=None, sort_order=u'Ascending',
+               additional_fields=None, received_since=None):
+    """
+      sort_by is an optional FieldURI (e.g. ``item:DateTimeReceived``) to order the results by. A stable order
+      keeps offsets meaningful while new items arrive in the folder.
+
+      additional_fields is a list of FieldURIs (e.g. ``task:DueDate``) to return on top of the base shape,
+      so an ``IdOnly`` listing can carry just the properties the caller needs.
+
+      received_since is an Exchange datetime string; only items received at or after it are returned.
+    """
+    shapes = [T.BaseShape(format)]
+    if additional_fields:
+        shapes.append(T.AdditionalProperties(*[T.FieldURI(FieldURI=field) for field in additional_fields]))
+
     root = M.FindItem(
-        M.ItemShape(T.BaseShape(format)),
+        M.ItemShape(*shapes),
         Traversal=u'Shallow',
     )
     if offset or (limit is not None):
@@ -282,6 +325,17 @@ def find_items(folder_id, query_string=None, format=u'Default',
             Offset=str(offset),
             BasePoint='Beginning',
         ))
+    if received_since:
+        root.append(M.Restriction(
+            T.IsGreaterThanOrEqualTo(
+                T.FieldURI(FieldURI=u'item:DateTimeReceived'),
+                T.FieldURIOrConstant(T.Constant(Value=received_since)),
+            )
+        ))
+    if sort_by:
+        root.append(M.SortOrder(
+            T.FieldOrder(T.FieldURI(FieldURI=sort_by), Order=sort_order)
+        ))
     root.append(M.ParentFolderIds(folder_id_xml(folder_id)))
     if query_string:
         root.append(M.QueryString(query_string))
@@ -320,6 +374,27 @@ def get_mail_items(items, format=u'Default', include_mime_content=False):
     return root
 
 
+def get_mime_content(exchange_ids):
+    """
+      Requests only the raw MIME content of one or more items.
+
+      <m:GetItem>
+        <m:ItemShape>
+          <t:BaseShape>IdOnly</t:BaseShape>
+          <t:IncludeMimeContent>true</t:IncludeMimeContent>
+        </m:ItemShape>
+        <m:ItemIds>
+          <t:ItemId Id="{exchange_id}"/>
+        </m:ItemIds>
+      </m:GetItem>
+    """
+    return M.GetItem(
+        M.ItemShape(T.BaseShape(u'IdOnly'),
+                    T.IncludeMimeContent(u'true')),
+        M.ItemIds(*[T.ItemId(Id=exchange_id) for exchange_id in exchange_ids])
+    )
+
+
 def get_master(exchange_id, format=u"Default"):
     """
       Requests a calendar item from the store.
@@ -408,17 +483,30 @@ def get_folder(folder_id, format=u"Default"):
 
 
 def new_folder(folder):
+    return new_folders(folder.parent_id, [folder])
 
-    id = T.DistinguishedFolderId(Id=folder.parent_id) if folder.parent_id in DISTINGUISHED_IDS else T.FolderId(Id=folder.parent_id)
-
-    if folder.folder_type == u'Folder':
-        folder_node = T.Folder(T.DisplayName(folder.display_name))
-    elif folder.folder_type == u'CalendarFolder':
-        folder_node = T.CalendarFolder(T.DisplayName(folder.display_name))
 
+def new_folders(parent_id, folders):
+    """
+      Creates several sibling folders under parent_id in one request. Each folder needs a display_name and a
+      folder_type (Folder, CalendarFolder, ContactsFolder, SearchFolder or TasksFolder).
+
+      http://msdn.microsoft.com/en-us/library/aa566191(v=exchg.140).aspx
+
+      <m:CreateFolder>
+        <m:ParentFolderId>
+          <t:FolderId Id="{parent_id}"/>
+        </m:ParentFolderId>
+        <m:Folders>
+          <t:Folder>
+            <t:DisplayName>{folder.display_name}</t:DisplayName>
+          </t:Folder>
+        </m:Folders>
+      </m:CreateFolder>
+    """
     root = M.CreateFolder(
-        M.ParentFolderId(id),
-        M.Folders(folder_node)
+        M.ParentFolderId(folder_id_xml(parent_id)),
+        M.Folders(*[getattr(T, folder.folder_type)(T.DisplayName(folder.display_name)) for folder in folders])
     )
     return root
 
@@ -440,12 +528,51 @@ def find_folder(parent_id, format=u"Default", traversal='Shallow',
     return root
 
 
+def sync_folder_hierarchy(folder_id=u'msgfolderroot', format=u'IdOnly', sync_state=None,
+                          additional_fields=(u'folder:ParentFolderId', u'folder:DisplayName', u'folder:FolderClass')):
+    """
+      Requests the folders created, changed and deleted below folder_id since sync_state (or all of them when
+      sync_state is None).
+
+      http://msdn.microsoft.com/en-us/library/aa580990(v=exchg.140).aspx
+
+      <m:SyncFolderHierarchy>
+        <m:FolderShape>
+          <t:BaseShape>IdOnly</t:BaseShape>
+          <t:AdditionalProperties>
+            <t:FieldURI FieldURI="folder:ParentFolderId"/>
+          </t:AdditionalProperties>
+        </m:FolderShape>
+        <m:SyncFolderId>
+          <t:DistinguishedFolderId Id="msgfolderroot"/>
+        </m:SyncFolderId>
+        <m:SyncState>{sync_state}</m:SyncState>
+      </m:SyncFolderHierarchy>
+    """
+    shapes = [T.BaseShape(format)]
+    if additional_fields:
+        shapes.append(T.AdditionalProperties(*[T.FieldURI(FieldURI=field) for field in additional_fields]))
+
+    root = M.SyncFolderHierarchy(
+        M.FolderShape(*shapes),
+        M.SyncFolderId(folder_id_xml(folder_id)),
+    )
+    if sync_state:
+        root.append(M.SyncState(sync_state))
+
+    return root
+
+
 def delete_folder(folder):
+    return delete_folders([folder.id])
+
+
+def delete_folders(folder_ids, delete_type=u'HardDelete'):
 
     root = M.DeleteFolder(
-        {u'DeleteType': 'HardDelete'},
+        {u'DeleteType': delete_type},
         M.FolderIds(
-            T.FolderId(Id=folder.id)
+            *[T.FolderId(Id=folder_id) for folder_id in folder_ids]
         )
     )
     return root
@@ -638,13 +765,15 @@ def move_event(event, folder_id):
 
 
 def move_folder(folder, folder_id):
+    return move_folders([folder.id], folder_id)
 
-    id = T.DistinguishedFolderId(Id=folder_id) if folder_id in DISTINGUISHED_IDS else T.FolderId(Id=folder_id)
+
+def move_folders(folder_ids, to_folder_id):
 
     root = M.MoveFolder(
-        M.ToFolderId(id),
+        M.ToFolderId(folder_id_xml(to_folder_id)),
         M.FolderIds(
-            T.FolderId(Id=folder.id)
+            *[T.FolderId(Id=folder_id) for folder_id in folder_ids]
         )
     )
     return root
@@ -820,21 +949,80 @@ def update_item(event, updated_attributes, calendar_item_update_operation_type):
     return root
 
 
-def subscribe_push(folder_ids, event_types, url, status_freq=None):
+def _subscription_folders_and_events(folder_ids, event_types):
     folders = [folder_id_xml(folder) for folder in folder_ids]
     if event_types == 'all':
         event_types = NOTIFICATION_EVENT_TYPES.keys()
     events = [T.EventType(NOTIFICATION_EVENT_TYPES[e]) for e in event_types]
+    return T.FolderIds(*folders), T.EventTypes(*events)
+
+
+def subscribe_push(folder_ids, event_types, url, status_freq=None, watermark=None):
     if status_freq is None:
         status_freq = 30
 
+    request = M.PushSubscriptionRequest(*_subscription_folders_and_events(folder_ids, event_types))
+    if watermark:
+        request.append(T.Watermark(watermark))
+    request.append(T.StatusFrequency(str(status_freq)))
+    request.append(T.URL(str(url)))
+
+    return M.Subscribe(request)
+
+
+def subscribe_pull(folder_ids, event_types, timeout=30, watermark=None):
+    """
+    Pull subscription: Exchange keeps the events until they are read with GetEvents, and drops the
+    subscription after ``timeout`` minutes (1-1440) without a GetEvents call.
+
+    <m:Subscribe>
+      <m:PullSubscriptionRequest>
+        <t:FolderIds><t:DistinguishedFolderId Id="inbox"/></t:FolderIds>
+        <t:EventTypes><t:EventType>NewMailEvent</t:EventType></t:EventTypes>
+        <t:Watermark>AQAAAA...</t:Watermark>
+        <t:Timeout>30</t:Timeout>
+      </m:PullSubscriptionRequest>
+    </m:Subscribe>
+    """
+    request = M.PullSubscriptionRequest(*_subscription_folders_and_events(folder_ids, event_types))
+    if watermark:
+        request.append(T.Watermark(watermark))
+    request.append(T.Timeout(str(timeout)))
+
+    return M.Subscribe(request)
+
+
+def subscribe_streaming(folder_ids, event_types):
+    """
+    Streaming subscription, read with GetStreamingEvents. Exchange does not accept a watermark for these.
+    """
     return M.Subscribe(
-        M.PushSubscriptionRequest(
-            T.FolderIds(*folders),
-            T.EventTypes(*events),
-            T.StatusFrequency(str(status_freq)),
-            T.URL(str(url)),
-        ),
+        M.StreamingSubscriptionRequest(*_subscription_folders_and_events(folder_ids, event_types))
+    )
+
+
+def get_events(subscription_id, watermark):
+    return M.GetEvents(
+        M.SubscriptionId(subscription_id),
+        M.Watermark(watermark),
+    )
+
+
+def get_streaming_events(subscription_ids, connection_timeout=1):
+    """
+    Opens a streaming connection for up to ``connection_timeout`` minutes (1-30). Exchange writes one SOAP
+    envelope to the response for every batch of notifications, and a final one saying the connection closed.
+
+    <m:GetStreamingEvents>
+      <m:SubscriptionIds>
+        <t:SubscriptionId>...</t:SubscriptionId>
+      </m:SubscriptionIds>
+      <m:ConnectionTimeout>1</m:ConnectionTimeout>
+    </m:GetStreamingEvents>
+    """
+    return M.GetStreamingEvents(
+        M.SubscriptionIds(*[T.SubscriptionId(subscription_id) for subscription_id in subscription_ids]),
+        M.ConnectionTimeout(str(connection_timeout)),
     )
 
 
@@ -0,0 +1,179 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import base64
+import hashlib
+import os
+import socket
+import time
+
+# 64k of base64 text decodes to 48k of MIME.
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+def iter_base64_decode(text, chunk_size=BASE64_CHUNK_SIZE):
+    """
+    Decodes base64 ``text`` a slice at a time, so the decoded message never has to exist in memory in one piece.
+
+    Whitespace inside the encoded text (Exchange sometimes wraps long MIME content) is ignored.
+    """
+    if not text:
+        return
+
+    leftover = u''
+    for start in range(0, len(text), chunk_size):
+        piece = leftover + u''.join(text[start:start + chunk_size].split())
+        usable = len(piece) - (len(piece) % 4)
+        leftover = piece[usable:]
+        if usable:
+            yield base64.b64decode(piece[:usable])
+
+    if leftover:
+        yield base64.b64decode(leftover + u'=' * (-len(leftover) % 4))
+
+
+class BaseMessageSink(object):
+    """
+    Destination for exported messages. ``add_message`` is given the Exchange item id and an iterator of
+    MIME byte chunks; sinks must consume the chunks as they go rather than joining them.
+    """
+
+    def add_message(self, item_id, chunks):
+        raise NotImplementedError
+
+    def flush(self):
+        """ Makes everything written so far durable. Called before an export checkpoint is saved. """
+        pass
+
+    def state(self):
+        """ A JSON-serializable note of what has been written, saved with an export checkpoint. """
+        return None
+
+    def restore(self, state):
+        """ Called with the checkpointed :meth:`state` when an export resumes, to drop anything written since. """
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class MboxSink(BaseMessageSink):
+    """
+    Appends messages to a single mbox file (mboxrd flavour - lines starting with ``From `` are quoted). ::
+
+        with MboxSink('/archive/jdoe.mbox') as sink:
+            service.mail().export('inbox', sink)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'ab')
+
+    def add_message(self, item_id, chunks):
+        self._file.write(b'From MAILER-DAEMON ' + time.asctime(time.gmtime()).encode('ascii') + b'\n')
+
+        # Quote line by line; only the partial last line of each chunk is carried over.
+        partial = b''
+        for chunk in chunks:
+            lines = (partial + chunk).split(b'\n')
+            partial = lines.pop()
+            for line in lines:
+                self._write_line(line)
+
+        if partial:
+            self._write_line(partial)
+        self._file.write(b'\n')
+
+    def _write_line(self, line):
+        if line.endswith(b'\r'):
+            line = line[:-1]
+        if line.lstrip(b'>').startswith(b'From '):
+            line = b'>' + line
+        self._file.write(line + b'\n')
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def state(self):
+        return {u'size': self._file.tell()}
+
+    def restore(self, state):
+        # Messages appended after the checkpoint would be exported again; cut them off.
+        if state and self._file.tell() > state[u'size']:
+            self._file.truncate(state[u'size'])
+            self._file.seek(0, os.SEEK_END)
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class _DirectorySink(BaseMessageSink):
+    """ Writes each message into its own file through a temporary name, so readers never see partial files. """
+
+    def _write_file(self, tmp_path, final_path, chunks):
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.name == 'nt' and os.path.exists(final_path):
+            os.remove(final_path)
+        os.rename(tmp_path, final_path)
+
+
+class MaildirSink(_DirectorySink):
+    """
+    Delivers messages into the ``new`` directory of a Maildir, creating the Maildir if needed. File names carry a
+    hash of the Exchange item id, and messages already in ``new`` or ``cur`` are not delivered again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._hostname = socket.gethostname().replace(u'/', u'\\057').replace(u':', u'\\072')
+
+        self._delivered = set()
+        for subdir in (u'tmp', u'new', u'cur'):
+            directory = os.path.join(path, subdir)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            elif subdir != u'tmp':
+                self._delivered.update(name.split(u'.')[1] for name in os.listdir(directory) if name.count(u'.') >= 2)
+
+    def add_message(self, item_id, chunks):
+        digest = hashlib.sha1(item_id.encode('utf-8')).hexdigest()
+        if digest in self._delivered:
+            return
+        name = u'%d.%s.%s' % (time.time(), digest, self._hostname)
+        self._write_file(os.path.join(self.path, u'tmp', name), os.path.join(self.path, u'new', name), chunks)
+        self._delivered.add(digest)
+
+
+class EMLSink(_DirectorySink):
+    """
+    Writes one ``.eml`` file per message. Files are named after a hash of the Exchange item id, so exporting
+    the same message twice (e.g. after resuming) overwrites it instead of duplicating it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def filename_for(self, item_id):
+        return u'%s.eml' % hashlib.sha1(item_id.encode('utf-8')).hexdigest()
+
+    def add_message(self, item_id, chunks):
+        final_path = os.path.join(self.path, self.filename_for(item_id))
+        self._write_file(final_path + u'.tmp', final_path, chunks)
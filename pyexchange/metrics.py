@@ -0,0 +1,158 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+Timing and size metrics for every EWS call. Give the service a callable and it is called with a :class:`SOAPCall`
+after each request, successful or not::
+
+    registry = MetricsRegistry()
+    service = Exchange2010Service(connection, metrics=registry)
+    ...
+    print(registry.expose())  # OpenMetrics text, for a /metrics endpoint
+
+Any function taking a :class:`SOAPCall` works too, e.g. to feed an existing statsd or Prometheus client. Without
+``metrics`` nothing is measured and requests take the same path they always did.
+"""
+import threading
+from collections import defaultdict, namedtuple
+
+# The phases of ExchangeServiceSOAP.send, in order.
+PHASE_BUILD = u'build'          # wrapping the operation in the SOAP envelope
+PHASE_SERIALIZE = u'serialize'  # turning the request tree into bytes
+PHASE_NETWORK = u'network'      # sending the request and reading the response
+PHASE_PARSE = u'parse'          # parsing the response
+PHASE_CHECK = u'check'          # looking for SOAP faults and EWS error codes
+PHASES = (PHASE_BUILD, PHASE_SERIALIZE, PHASE_NETWORK, PHASE_PARSE, PHASE_CHECK)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SOAPCall = namedtuple('SOAPCall', [
+    'operation',       # the EWS operation, e.g. u'FindItem'
+    'phases',          # OrderedDict of phase name -> seconds, for the phases that ran
+    'request_bytes',
+    'response_bytes',  # None if no response arrived
+    'items',           # items and folders in the response
+    'response_codes',  # dict of EWS ResponseCode -> how many times it was returned
+    'error',           # the class name of the exception raised, or None
+])
+
+
+def _escape(value):
+    return u'%s' % value.replace(u'\\', u'\\\\').replace(u'"', u'\\"').replace(u'\n', u'\\n')
+
+
+def _labels(names, values):
+    return u','.join(u'%s="%s"' % (name, _escape(value)) for name, value in zip(names, values))
+
+
+class MetricsRegistry(object):
+    """
+    Aggregates :class:`SOAPCall` records into counters and per-phase latency histograms, labelled by operation,
+    and exposes them in the OpenMetrics text format:
+
+    ``pyexchange_requests_total{operation}``
+    ``pyexchange_request_duration_seconds{operation,phase}`` (histogram, ``phase="total"`` for the whole call)
+    ``pyexchange_request_bytes_total{operation}`` and ``pyexchange_response_bytes_total{operation}``
+    ``pyexchange_items_total{operation}``
+    ``pyexchange_response_codes_total{operation,code}``
+    ``pyexchange_errors_total{operation,error}``
+    """
+
+    COUNTERS = (
+        (u'pyexchange_requests', (u'operation',), u'EWS requests sent.'),
+        (u'pyexchange_request_bytes', (u'operation',), u'Bytes of EWS requests sent.'),
+        (u'pyexchange_response_bytes', (u'operation',), u'Bytes of EWS responses received.'),
+        (u'pyexchange_items', (u'operation',), u'Items and folders in EWS responses.'),
+        (u'pyexchange_response_codes', (u'operation', u'code'), u'EWS response codes returned.'),
+        (u'pyexchange_errors', (u'operation', u'error'), u'EWS requests that raised an exception.'),
+    )
+    HISTOGRAM = (u'pyexchange_request_duration_seconds', (u'operation', u'phase'), u'Time spent in each phase of EWS requests.')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counters = dict((name, defaultdict(int)) for name, _, _ in self.COUNTERS)
+        self._histogram = {}  # labels -> [bucket counts..., sum, count]
+
+    def __call__(self, call):
+        self.observe(call)
+
+    def observe(self, call):
+        operation = call.operation
+        total = sum(call.phases.values())
+
+        with self._lock:
+            counters = self._counters
+            counters[u'pyexchange_requests'][(operation,)] += 1
+            counters[u'pyexchange_request_bytes'][(operation,)] += call.request_bytes or 0
+            counters[u'pyexchange_response_bytes'][(operation,)] += call.response_bytes or 0
+            counters[u'pyexchange_items'][(operation,)] += call.items
+            for code, count in call.response_codes.items():
+                counters[u'pyexchange_response_codes'][(operation, code)] += count
+            if call.error is not None:
+                counters[u'pyexchange_errors'][(operation, call.error)] += 1
+
+            for phase, seconds in list(call.phases.items()) + [(u'total', total)]:
+                self._observe_duration((operation, phase), seconds)
+
+    def _observe_duration(self, labels, seconds):
+        values = self._histogram.get(labels)
+        if values is None:
+            values = self._histogram[labels] = [0] * (len(self.buckets) + 2)
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                values[index] += 1
+        values[-2] += seconds
+        values[-1] += 1
+
+    def value(self, name, **labels):
+        """
+        Returns the current value of a counter (without the ``_total`` suffix), or the ``(sum, count)`` of the
+        duration histogram, for the given labels. Labels left out are summed over.
+        """
+        with self._lock:
+            if name == self.HISTOGRAM[0]:
+                series = dict((key, (values[-2], values[-1])) for key, values in self._histogram.items())
+                label_names = self.HISTOGRAM[1]
+            else:
+                series = dict(self._counters[name])
+                label_names = dict((n, l) for n, l, _ in self.COUNTERS)[name]
+
+        matching = [value for key, value in series.items()
+                    if all(labels.get(n, v) == v for n, v in zip(label_names, key))]
+        if name == self.HISTOGRAM[0]:
+            return sum(s for s, _ in matching), sum(c for _, c in matching)
+        return sum(matching)
+
+    def expose(self):
+        """ Returns every metric in the OpenMetrics text format. """
+        lines = []
+        with self._lock:
+            for name, label_names, help_text in self.COUNTERS:
+                lines.append(u'# TYPE %s counter' % name)
+                lines.append(u'# HELP %s %s' % (name, help_text))
+                for key in sorted(self._counters[name]):
+                    lines.append(u'%s_total{%s} %s' % (name, _labels(label_names, key), self._counters[name][key]))
+
+            name, label_names, help_text = self.HISTOGRAM
+            lines.append(u'# TYPE %s histogram' % name)
+            lines.append(u'# HELP %s %s' % (name, help_text))
+            for key in sorted(self._histogram):
+                values = self._histogram[key]
+                labels = _labels(label_names, key)
+                for bound, count in zip(self.buckets, values):
+                    lines.append(u'%s_bucket{%s,le="%r"} %d' % (name, labels, bound, count))
+                lines.append(u'%s_bucket{%s,le="+Inf"} %d' % (name, labels, values[-1]))
+                lines.append(u'%s_sum{%s} %r' % (name, labels, values[-2]))
+                lines.append(u'%s_count{%s} %d' % (name, labels, values[-1]))
+
+        lines.append(u'# EOF')
+        return u'\n'.join(lines) + u'\n'
+
+    def reset(self):
+        with self._lock:
+            for counter in self._counters.values():
+                counter.clear()
+            self._histogram.clear()
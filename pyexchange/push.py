@@ -0,0 +1,290 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+from lxml import etree
+from six.moves import queue
+
+from .exchange2010 import NotificationEvent, PushNotification, parse_notification  # noqa
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+log = logging.getLogger('pyexchange')
+
+SEND_NOTIFICATION_RESULT = (
+    u'<?xml version="1.0" encoding="utf-8"?>'
+    u'<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+    u'<soap:Body>'
+    u'<SendNotificationResult xmlns="http://schemas.microsoft.com/exchange/services/2006/messages">'
+    u'<SubscriptionStatus>%s</SubscriptionStatus>'
+    u'</SendNotificationResult>'
+    u'</soap:Body>'
+    u'</soap:Envelope>'
+)
+
+# Stands in for the watermarks of a batch whose handler raised; nothing after it is saved.
+_FAILED = object()
+
+
+class PushNotificationReceiver(object):
+    """
+    Receives push notifications from Exchange and hands the events to ``handler`` in batches.
+
+    Events for the same item and event type that arrive within ``window`` seconds of each other are
+    coalesced into one (the latest wins), and at most ``max_batch_size`` events are passed to each
+    ``handler(events)`` call. Handlers run on a pool of ``max_workers`` threads, so a slow handler never
+    delays the answer Exchange is waiting for. ::
+
+        def handler(events):
+            ids = [e.item_id for e in events if e.event_type != u'deleted']
+            # one GetItem for the whole batch...
+
+        receiver = PushNotificationReceiver(handler, watermark_store=JSONFileStore('/var/lib/myapp/watermarks.json'))
+        app = receiver.wsgi_app  # mount under the URL given to subscribe_push
+
+    The last watermark of every subscription is kept in ``watermarks`` (or ``watermark_store``, any dict-like
+    object), to resubscribe from after the subscription is lost. A watermark is only saved once the handlers have
+    returned for every event up to it, so events that were received but not handled yet are sent again. Once a
+    handler raises, the watermarks stop where they were before its batch, so resubscribing sends that batch's
+    events again. Subscriptions passed to :meth:`unsubscribe`, or rejected by ``accept(subscription_id)``, are answered with ``Unsubscribe`` so Exchange stops sending them.
+    Items named in notifications are dropped from ``item_cache`` (the service's ``ItemCache``) straight away.
+    """
+
+    def __init__(self, handler, window=1.0, max_batch_size=100, max_workers=4, watermark_store=None, accept=None,
+                 item_cache=None):
+        self.handler = handler
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.watermarks = watermark_store if watermark_store is not None else {}
+        self.accept = accept
+        self.item_cache = item_cache
+
+        self._unsubscribed = set()
+        self._pending = OrderedDict()
+        self._pending_watermarks = {}
+        self._next_batch = 0
+        self._next_saved = 0
+        self._finished = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """ Starts the flusher and worker threads. Called automatically by the first notification. """
+        with self._lock:
+            if self._threads:
+                return
+            self._stopped.clear()
+            self._threads.append(self._start_thread(self._flush_periodically))
+            for _ in range(self.max_workers):
+                self._threads.append(self._start_thread(self._work))
+
+    def close(self):
+        """ Hands over everything still pending, waits for the handlers to finish, and stops the threads. """
+        self.flush()
+        if not self._threads:
+            return
+        self._stopped.set()
+        for _ in range(self.max_workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def unsubscribe(self, subscription_id):
+        """ Answers the next notification for ``subscription_id`` with ``Unsubscribe``. """
+        self._unsubscribed.add(subscription_id)
+
+    def receive(self, body):
+        """ Handles the body of a ``SendNotification`` request and returns the response body to send back. """
+        if not self._threads:
+            self.start()
+
+        status = u'OK'
+        for notification in parse_notification(body):
+            subscription_id = notification.subscription_id
+            if subscription_id in self._unsubscribed or (self.accept is not None and not self.accept(subscription_id)):
+                log.info(u'Unsubscribing push subscription %s', subscription_id)
+                self._unsubscribed.discard(subscription_id)
+                status = u'Unsubscribe'
+                continue
+
+            if self.item_cache is not None:
+                self.item_cache.invalidate_events(notification.events)
+            self._add(subscription_id, notification.events, notification.watermark)
+
+        return (SEND_NOTIFICATION_RESULT % status).encode('utf-8')
+
+    def _add(self, subscription_id, events, watermark):
+        with self._lock:
+            if watermark is not None:
+                self._pending_watermarks[subscription_id] = watermark
+            for event in events:
+                if event.item_id is None:
+                    continue  # status events only carry a watermark
+                key = (event.event_type, event.item_id)
+                self._pending.pop(key, None)
+                self._pending[key] = event
+
+            if len(self._pending) >= self.max_batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        """ Queues everything pending for the handlers now, instead of waiting for the window to pass. """
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        events = list(self._pending.values())
+        watermarks = self._pending_watermarks
+        self._pending.clear()
+        self._pending_watermarks = {}
+
+        # The watermarks travel with the last batch; a notification without item events still gets an empty one.
+        batches = [events[start:start + self.max_batch_size] for start in range(0, len(events), self.max_batch_size)]
+        if not batches and watermarks:
+            batches = [[]]
+        for i, batch in enumerate(batches):
+            self._queue.put((self._next_batch, batch, watermarks if i == len(batches) - 1 else None))
+            self._next_batch += 1
+
+    def _finish(self, number, watermarks):
+        """ Saves the watermarks of every batch whose handler returned, and whose predecessors' did too. """
+        with self._lock:
+            self._finished[number] = watermarks
+            while self._next_saved in self._finished and self._finished[self._next_saved] is not _FAILED:
+                for subscription_id, watermark in (self._finished.pop(self._next_saved) or {}).items():
+                    self.watermarks[subscription_id] = watermark
+                self._next_saved += 1
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self.window):
+            self.flush()
+
+    def _work(self):
+        while True:
+            work = self._queue.get()
+            if work is None:
+                return
+            number, batch, watermarks = work
+            try:
+                if batch:
+                    self.handler(batch)
+            except Exception:
+                log.exception(u'Push notification handler failed for %d events', len(batch))
+                watermarks = _FAILED
+            self._finish(number, watermarks)
+
+    def _start_thread(self, target):
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def wsgi_app(self, environ, start_response):
+        """ A WSGI application answering Exchange's ``SendNotification`` POSTs. """
+        if environ.get('REQUEST_METHOD') != 'POST':
+            start_response('405 Method Not Allowed', [('Allow', 'POST'), ('Content-Length', '0')])
+            return [b'']
+
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            log.warning(u'Ignoring push notification with Content-Length %r', environ.get('CONTENT_LENGTH'))
+            start_response('400 Bad Request', [('Content-Length', '0')])
+            return [b'']
+
+        try:
+            response = self.receive(environ['wsgi.input'].read(length))
+        except etree.XMLSyntaxError:
+            log.warning(u'Ignoring push notification that is not valid XML')
+            start_response('400 Bad Request', [('Content-Length', '0')])
+            return [b'']
+
+        start_response('200 OK', [('Content-Type', 'text/xml; charset=utf-8'), ('Content-Length', str(len(response)))])
+        return [response]
+
+    def create_asyncio_server(self, host='0.0.0.0', port=8080, loop=None):
+        """
+        Returns the asyncio ``create_server`` coroutine for a small HTTP server answering notifications. ::
+
+            loop = asyncio.get_event_loop()
+            server = loop.run_until_complete(receiver.create_asyncio_server(port=8080))
+            loop.run_forever()
+        """
+        if asyncio is None:
+            raise RuntimeError(u'asyncio is not available; use wsgi_app instead')
+
+        loop = loop or asyncio.get_event_loop()
+        return loop.create_server(lambda: _PushProtocol(self), host, port)
+
+
+if asyncio is not None:
+
+    class _PushProtocol(asyncio.Protocol):
+        """ Just enough HTTP/1.1 to receive a POST with a Content-Length body and answer it. """
+
+        def __init__(self, receiver):
+            self.receiver = receiver
+            self.transport = None
+            self.buffer = b''
+
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def data_received(self, data):
+            self.buffer += data
+
+            while True:
+                header_end = self.buffer.find(b'\r\n\r\n')
+                if header_end < 0:
+                    return
+
+                head = self.buffer[:header_end].decode('latin-1').split('\r\n')
+                headers = dict((k.strip().lower(), v.strip()) for k, _, v in (line.partition(':') for line in head[1:]))
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # Without a length there is no telling where the next request starts.
+                    self.buffer = b''
+                    self._write('400 Bad Request', b'', close=True)
+                    return
+                if len(self.buffer) < header_end + 4 + length:
+                    return
+
+                body = self.buffer[header_end + 4:header_end + 4 + length]
+                self.buffer = self.buffer[header_end + 4 + length:]
+                self._respond(head[0].split(' ')[0], body, headers.get('connection', '').lower() == 'close')
+
+        def _respond(self, method, body, close):
+            if method != 'POST':
+                status, response = '405 Method Not Allowed', b''
+            else:
+                try:
+                    status, response = '200 OK', self.receiver.receive(body)
+                except etree.XMLSyntaxError:
+                    status, response = '400 Bad Request', b''
+            self._write(status, response, close)
+
+        def _write(self, status, response, close):
+            self.transport.write((
+                'HTTP/1.1 %s\r\nContent-Type: text/xml; charset=utf-8\r\nContent-Length: %d\r\n%s\r\n'
+                % (status, len(response), 'Connection: close\r\n' if close else '')
+            ).encode('latin-1') + response)
+            if close:
+                self.transport.close()
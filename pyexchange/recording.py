@@ -0,0 +1,269 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+Recording EWS traffic and playing it back, to profile real workloads without Exchange. Record once, through a
+transport that passes requests on to a real one::
+
+    with RecordingTransport(RequestsTransport(), u'inbox.ews.gz') as transport:
+        run_workload(Exchange2010Service(ExchangeNTLMAuthConnection(url, username, password, transport=transport)))
+
+then replay as often as needed, with no network in the way::
+
+    run_workload(Exchange2010Service(ExchangeConnection(url, transport=ReplayTransport(u'inbox.ews.gz'))))
+
+Everything above the transport (governor, retries, parsing) runs at replay just as it did when recording.
+
+The archive is gzipped JSON lines, one per request. Before anything is written, requests and responses are
+redacted: e-mail addresses become pseudonyms at ``example.invalid`` and the text of ``redact_elements`` (subjects,
+bodies, names, ...) is replaced by ``x`` of the same length, so responses parse just like the real ones and take
+as long. The same redaction is applied to requests at replay, which is how they find their recorded responses.
+"""
+import gzip
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+import requests
+
+from .transport import CHARSET_RE, Transport, TransportError, TransportResponse
+
+ARCHIVE_FORMAT = u'pyexchange-recording'
+ARCHIVE_VERSION = 2
+
+# Elements whose text is personal rather than structural.
+DEFAULT_REDACTED_ELEMENTS = (
+    u'Subject', u'Body', u'TextBody', u'Location', u'Name', u'DisplayName', u'Preview', u'Notes',
+    u'GivenName', u'Surname', u'Initials', u'JobTitle', u'CompanyName', u'Department', u'Title',
+)
+
+REPLAY_FULL_SPEED = u'full_speed'
+REPLAY_ORIGINAL_TIMING = u'original'
+
+ADDRESS_RE = re.compile(u'[\\w.+-]+@[\\w-]+(?:\\.[\\w-]+)+', re.UNICODE)
+WHITESPACE_BETWEEN_TAGS_RE = re.compile(u'>\\s+<')
+OPERATION_RE = re.compile(u'<(?:\\w+:)?Body[^>]*>\\s*<(?:\\w+:)?(\\w+)')
+
+
+class Redactor(object):
+    """
+    Replaces e-mail addresses (if ``addresses``) and the text of ``elements`` in EWS XML. The result only
+    depends on the input, so a request redacted at recording and at replay comes out the same.
+    """
+
+    def __init__(self, elements=DEFAULT_REDACTED_ELEMENTS, addresses=True):
+        self.addresses = addresses
+        self.elements_re = None
+        if elements:
+            names = u'|'.join(re.escape(name) for name in elements)
+            self.elements_re = re.compile(u'(<((?:\\w+:)?(?:%s))(?:\\s[^>]*)?>)([^<]+)(</\\2>)' % names, re.UNICODE)
+
+    def __call__(self, text):
+        if self.elements_re is not None:
+            text = self.elements_re.sub(self._redact_element, text)
+        if self.addresses:
+            text = ADDRESS_RE.sub(self._redact_address, text)
+        return text
+
+    def _redact_element(self, match):
+        return match.group(1) + u'x' * len(match.group(3)) + match.group(4)
+
+    def _redact_address(self, match):
+        digest = hashlib.sha1(match.group(0).lower().encode('utf-8')).hexdigest()[:12]
+        return u'user-%s@example.invalid' % digest
+
+
+def normalize_request(body, redactor, mailbox=None, compressed=False):
+    """ Returns the request as recorded: decoded, redacted and without whitespace between tags. """
+    if compressed:
+        body = zlib.decompress(body, 31)
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    body = WHITESPACE_BETWEEN_TAGS_RE.sub(u'><', redactor(body.strip()))
+    if mailbox:
+        body = u'%s\n%s' % (redactor(mailbox), body)
+    return body
+
+
+def request_key(request):
+    return hashlib.sha1(request.encode('utf-8')).hexdigest()
+
+
+def read_archive(path):
+    """ Returns the recorded exchanges of the archive at ``path``, in the order they were recorded. """
+    with gzip.open(path, 'rb') as archive:
+        lines = io.TextIOWrapper(archive, encoding='utf-8')
+        header = json.loads(next(lines))
+        if header.get(u'format') != ARCHIVE_FORMAT or header.get(u'version') != ARCHIVE_VERSION:
+            raise ValueError(u'%s is not a pyexchange recording (version %s)' % (path, ARCHIVE_VERSION))
+        return [json.loads(line) for line in lines if line.strip()]
+
+
+def _normalize(body, headers, redactor):
+    headers = headers or {}
+    return normalize_request(body, redactor, headers.get('X-AnchorMailbox'),
+                             compressed=headers.get('Content-Encoding') == 'gzip')
+
+
+def _decode(content, headers):
+    match = CHARSET_RE.search(headers.get('Content-Type') or headers.get('content-type') or '')
+    return content.decode(match.group(1) if match else 'utf-8', 'replace')
+
+
+class RecordingTransport(Transport):
+    """
+    Passes requests on to ``transport`` and writes each request, the response status and body (or the error
+    that kept it from being answered) and how long it took to the archive at ``path``. Streamed responses are
+    passed on as they arrive and recorded with what the caller read of them. :meth:`close` (or leaving the
+    ``with`` block) finishes the archive. Redaction is done by ``redactor``, a :class:`Redactor` by default.
+    """
+
+    def __init__(self, transport, path, redactor=None, clock=None):
+        self.transport = transport
+        self.path = path
+        self.redactor = redactor or Redactor()
+        self.clock = clock or getattr(time, 'monotonic', time.time)
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._archive = io.TextIOWrapper(gzip.open(path, 'wb'), encoding='utf-8')
+        self._write({u'format': ARCHIVE_FORMAT, u'version': ARCHIVE_VERSION})
+
+    @property
+    def auth(self):
+        return getattr(self.transport, 'auth', False)
+
+    @auth.setter
+    def auth(self, auth):
+        self.transport.auth = auth
+
+    def post(self, url, body, headers=None, timeout=30, stream=False):
+        started = self.clock()
+        try:
+            response = self.transport.post(url, body, headers, timeout, stream)
+        except (requests.exceptions.RequestException, TransportError) as err:
+            self._record(body, headers, started, error=err)
+            raise
+
+        response_headers = dict(response.headers)
+        if not stream:
+            content = response.content
+            self._record(body, headers, started, status=response.status_code,
+                         response=_decode(content, response_headers))
+            return TransportResponse(response.status_code, response_headers, content=content, url=url)
+        return TransportResponse(response.status_code, response_headers, url=url, on_close=response.close,
+                                 chunks=self._tee(response, body, headers, started))
+
+    def _tee(self, response, body, headers, started):
+        received = []
+        try:
+            for chunk in response.iter_content(chunk_size=None):
+                received.append(chunk)
+                yield chunk
+        finally:
+            # A stream the caller stopped reading early is recorded with what it had received by then.
+            self._record(body, headers, started, status=response.status_code,
+                         response=_decode(b''.join(received), dict(response.headers)))
+
+    def _record(self, body, headers, started, status=None, response=None, error=None):
+        elapsed = self.clock() - started
+        request = _normalize(body, headers, self.redactor)
+        operation = OPERATION_RE.search(request)
+        record = {
+            u'key': request_key(request),
+            u'operation': operation.group(1) if operation else None,
+            u'request': request,
+            u'elapsed': round(elapsed, 6),
+        }
+        if error is None:
+            record[u'status'] = status
+            record[u'response'] = self.redactor(response)
+        else:
+            record[u'error'] = self.redactor(u'%s' % error)
+            record[u'sent'] = getattr(error, 'sent', True)
+
+        with self._lock:
+            if self._archive is None:
+                raise ValueError(u'The recording at %s is closed' % self.path)
+            self._write(record)
+            self.recorded += 1
+
+    def _write(self, record):
+        self._archive.write(json.dumps(record, sort_keys=True, separators=(',', ':')) + u'\n')
+
+    def get(self, url, timeout=30):
+        return self.transport.get(url, timeout)
+
+    def after_fork(self):
+        self.transport.after_fork()
+
+    def close(self):
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayTransport(Transport):
+    """
+    Answers requests with the responses recorded in the archive at ``path``, without any network. A request gets
+    the responses recorded for the same (redacted) request in the order they came, then the last one again, so
+    workloads can be replayed any number of times and in any order. A request that was never recorded, or whose
+    recording ended in an error, raises TransportError.
+
+    With ``timing=REPLAY_ORIGINAL_TIMING`` every response takes as long as it did when it was recorded, divided
+    by ``speed``; by default (``REPLAY_FULL_SPEED``) responses come back straight away, so only the time spent
+    in pyexchange and the code using it is measured.
+    """
+
+    def __init__(self, path, timing=REPLAY_FULL_SPEED, speed=1.0, redactor=None, sleep=time.sleep):
+        if timing not in (REPLAY_FULL_SPEED, REPLAY_ORIGINAL_TIMING):
+            raise ValueError(u'timing must be %r or %r' % (REPLAY_FULL_SPEED, REPLAY_ORIGINAL_TIMING))
+
+        self.path = path
+        self.timing = timing
+        self.speed = speed
+        self.redactor = redactor or Redactor()
+        self.sleep = sleep
+        self.stats = defaultdict(int)
+
+        self._records = defaultdict(list)
+        self._served = defaultdict(int)
+        for record in read_archive(path):
+            self._records[record[u'key']].append(record)
+        self._lock = threading.Lock()
+
+    def post(self, url, body, headers=None, timeout=30, stream=False):
+        key = request_key(_normalize(body, headers, self.redactor))
+
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                self.stats[u'missing'] += 1
+                raise TransportError(u'No recorded response for request %s' % key)
+            record = records[min(self._served[key], len(records) - 1)]
+            self._served[key] += 1
+            self.stats[record[u'operation']] += 1
+
+        if self.timing == REPLAY_ORIGINAL_TIMING and record[u'elapsed'] > 0:
+            self.sleep(record[u'elapsed'] / self.speed)
+
+        if u'error' in record:
+            raise TransportError(record[u'error'], sent=record[u'sent'])
+        return TransportResponse(record[u'status'], {'Content-Type': 'text/xml; charset=utf-8'},
+                                 content=record[u'response'].encode('utf-8'), url=url)
+
+    def get(self, url, timeout=30):
+        return TransportResponse(200, {}, content=b'', url=url)
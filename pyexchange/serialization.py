@@ -0,0 +1,483 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+Turns calendar events, mail, contacts and tasks into JSON or compact bytes and back, so they can be kept in a
+cache or handed to another process without loading them from Exchange again. ::
+
+    redis.set(key, event.as_bytes())
+    ...
+    event = from_bytes(redis.get(key), service=service)
+
+Both formats carry the item type and the schema version they were written with. Fields are only ever added to
+the end of a schema, and every addition bumps :data:`SCHEMA_VERSION`; data written by an older version loads
+with the new fields left empty, while data from a newer version is refused with a ``ValueError``.
+
+The bytes are MessagePack. The ``msgpack`` package is used when it is installed, and a small pure Python
+encoder writing the same format otherwise, so either side can read what the other wrote.
+
+Date-times are stored in UTC (naive ones are taken to be UTC already, as everywhere else in pyexchange), so they
+come back as UTC-aware ``datetime`` objects. The service is never stored; pass the one to use when loading.
+"""
+import json
+import struct
+from datetime import date, datetime, timedelta
+
+import six
+from pytz import utc
+
+from .base.calendar import ExchangeEventOrganizer, ExchangeEventResponse, ExchangeExtendedProperty
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SCHEMA_VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=utc)
+_JSON_DATETIME_FORMAT = u'%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def _plain(value, binary):
+    return value
+
+
+def _list(value, binary):
+    return list(value) if value is not None else None
+
+
+def _unlist(value, binary):
+    return list(value) if value is not None else []
+
+
+def _encode_datetime(value, binary):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = utc.localize(value)
+    delta = value - _EPOCH
+    if binary:
+        return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return (_EPOCH + delta).strftime(_JSON_DATETIME_FORMAT)
+
+
+def _decode_datetime(value, binary):
+    if value is None:
+        return None
+    if binary:
+        return _EPOCH + timedelta(microseconds=value)
+    return datetime.strptime(value, _JSON_DATETIME_FORMAT).replace(tzinfo=utc)
+
+
+def _encode_date(value, binary):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() if binary else value.isoformat()
+
+
+def _decode_date(value, binary):
+    if value is None:
+        return None
+    if binary:
+        return date.fromordinal(value)
+    return datetime.strptime(value, u'%Y-%m-%d').date()
+
+
+def _encode_organizer(value, binary):
+    return [value.name, value.email] if value is not None else None
+
+
+def _decode_organizer(value, binary):
+    return ExchangeEventOrganizer(*value) if value is not None else None
+
+
+def _encode_responses(value, binary):
+    if value is None:
+        return None
+    return [[r.email, r.name, r.response, _encode_datetime(r.last_response, binary), r.required]
+            for r in value.values()]
+
+
+def _decode_responses(value, binary):
+    result = {}
+    for email, name, response, last_response, required in value or ():
+        result[email] = ExchangeEventResponse(name=name, email=email, response=response, required=required,
+                                              last_response=_decode_datetime(last_response, binary))
+    return result
+
+
+def _encode_extended_properties(value, binary):
+    return [list(p) for p in value] if value is not None else None
+
+
+def _decode_extended_properties(value, binary):
+    return [ExchangeExtendedProperty(*p) for p in value or ()]
+
+
+PLAIN = (_plain, _plain)
+LIST = (_list, _unlist)
+DATETIME = (_encode_datetime, _decode_datetime)
+DATE = (_encode_date, _decode_date)
+ORGANIZER = (_encode_organizer, _decode_organizer)
+RESPONSES = (_encode_responses, _decode_responses)
+EXTENDED_PROPERTIES = (_encode_extended_properties, _decode_extended_properties)
+
+# (name in the data, attribute on the item, codec). Append only, and bump SCHEMA_VERSION when you do.
+SCHEMAS = {
+    u'event': (
+        (u'id', u'_id', PLAIN),
+        (u'change_key', u'_change_key', PLAIN),
+        (u'calendar_id', u'calendar_id', PLAIN),
+        (u'type', u'_type', PLAIN),
+        (u'subject', u'subject', PLAIN),
+        (u'start', u'start', DATETIME),
+        (u'end', u'end', DATETIME),
+        (u'location', u'location', PLAIN),
+        (u'html_body', u'html_body', PLAIN),
+        (u'text_body', u'text_body', PLAIN),
+        (u'organizer', u'organizer', ORGANIZER),
+        (u'timezone', u'timezone', PLAIN),
+        (u'reminder_minutes_before_start', u'reminder_minutes_before_start', PLAIN),
+        (u'reminder_is_set', u'reminder_is_set', PLAIN),
+        (u'is_all_day', u'is_all_day', PLAIN),
+        (u'availability', u'availability', PLAIN),
+        (u'cancelled', u'cancelled', PLAIN),
+        (u'sensitivity', u'sensitivity', PLAIN),
+        (u'created', u'created', DATETIME),
+        (u'date_time_created', u'date_time_created', DATETIME),
+        (u'last_modified_at', u'last_modified_at', DATETIME),
+        (u'conversation_id', u'conversation_id', PLAIN),
+        (u'recurrence_id', u'recurrence_id', PLAIN),
+        (u'recurrence', u'recurrence', PLAIN),
+        (u'recurrence_end_date', u'recurrence_end_date', DATE),
+        (u'recurrence_days', u'recurrence_days', PLAIN),
+        (u'recurrence_interval', u'recurrence_interval', PLAIN),
+        (u'attendees', u'_attendees', RESPONSES),
+        (u'resources', u'_resources', RESPONSES),
+        (u'extended_properties', u'_extended_properties', EXTENDED_PROPERTIES),
+        (u'conflicting_event_ids', u'_conflicting_event_ids', LIST),
+    ),
+    u'mail': (
+        (u'id', u'_id', PLAIN),
+        (u'change_key', u'_change_key', PLAIN),
+        (u'folder_id', u'folder_id', PLAIN),
+        (u'subject', u'subject', PLAIN),
+        (u'sender_name', u'sender_name', PLAIN),
+        (u'sender_email', u'sender_email', PLAIN),
+        (u'from_name', u'from_name', PLAIN),
+        (u'from_email', u'from_email', PLAIN),
+        (u'culture', u'culture', PLAIN),
+        (u'internet_message_id', u'internet_message_id', PLAIN),
+        (u'references', u'references', PLAIN),
+        (u'in_reply_to', u'in_reply_to', PLAIN),
+        (u'has_attachments', u'has_attachments', PLAIN),
+        (u'size', u'size', PLAIN),
+        (u'importance', u'importance', PLAIN),
+        (u'is_read', u'is_read', PLAIN),
+        (u'received', u'received', DATETIME),
+        (u'datetime_sent', u'datetime_sent', DATETIME),
+        (u'datetime_created', u'datetime_created', DATETIME),
+        (u'recipients_to', u'recipients_to', LIST),
+        (u'recipients_cc', u'recipients_cc', LIST),
+        (u'recipients_bcc', u'recipients_bcc', LIST),
+        (u'attachments', u'attachments', LIST),
+        (u'text_body', u'text_body', PLAIN),
+        (u'html_body', u'html_body', PLAIN),
+        (u'mimecontent', u'mimecontent', PLAIN),
+    ),
+    u'contact': (
+        (u'id', u'_id', PLAIN),
+        (u'change_key', u'_change_key', PLAIN),
+        (u'folder_id', u'folder_id', PLAIN),
+        (u'first_name', u'first_name', PLAIN),
+        (u'last_name', u'last_name', PLAIN),
+        (u'full_name', u'full_name', PLAIN),
+        (u'display_name', u'display_name', PLAIN),
+        (u'sort_name', u'sort_name', PLAIN),
+        (u'email_address1', u'email_address1', PLAIN),
+        (u'email_address2', u'email_address2', PLAIN),
+        (u'email_address3', u'email_address3', PLAIN),
+        (u'birthday', u'birthday', DATE),
+        (u'job_title', u'job_title', PLAIN),
+        (u'department', u'department', PLAIN),
+        (u'company_name', u'company_name', PLAIN),
+        (u'office_location', u'office_location', PLAIN),
+        (u'primary_phone', u'primary_phone', PLAIN),
+        (u'business_phone', u'business_phone', PLAIN),
+        (u'home_phone', u'home_phone', PLAIN),
+        (u'mobile_phone', u'mobile_phone', PLAIN),
+        (u'physical_addresses', u'physical_addresses', LIST),
+    ),
+    u'task': (
+        (u'id', u'_id', PLAIN),
+        (u'change_key', u'_change_key', PLAIN),
+        (u'folder_id', u'folder_id', PLAIN),
+        (u'subject', u'subject', PLAIN),
+        (u'text_body', u'text_body', PLAIN),
+        (u'html_body', u'html_body', PLAIN),
+        (u'categories', u'categories', PLAIN),
+        (u'is_draft', u'is_draft', PLAIN),
+        (u'sent_at', u'sent_at', DATETIME),
+        (u'created_at', u'created_at', DATETIME),
+        (u'due_date', u'due_date', DATE),
+        (u'recurrence', u'recurrence', PLAIN),
+        (u'is_complete', u'is_complete', PLAIN),
+        (u'owner', u'owner', PLAIN),
+        (u'start_date', u'start_date', DATE),
+        (u'complete_date', u'complete_date', DATE),
+        (u'status', u'status', PLAIN),
+        (u'status_description', u'status_description', PLAIN),
+        (u'percent_complete', u'percent_complete', PLAIN),
+        (u'importance', u'importance', PLAIN),
+        (u'companies', u'companies', PLAIN),
+        (u'last_modified_by', u'last_modified_by', PLAIN),
+        (u'last_modified_at', u'last_modified_at', DATETIME),
+    ),
+}
+
+
+def _item_classes():
+    from .exchange2010 import Exchange2010CalendarEvent, Exchange2010ContactItem, Exchange2010MailItem, Exchange2010TaskItem
+    return {
+        u'event': Exchange2010CalendarEvent,
+        u'mail': Exchange2010MailItem,
+        u'contact': Exchange2010ContactItem,
+        u'task': Exchange2010TaskItem,
+    }
+
+
+def _schema_for(item_type, version):
+    if item_type not in SCHEMAS:
+        raise ValueError(u'Unknown item type %r' % item_type)
+    if version > SCHEMA_VERSION:
+        raise ValueError(u'Item was written with schema version %s, this pyexchange only reads up to %s'
+                         % (version, SCHEMA_VERSION))
+    return SCHEMAS[item_type]
+
+
+def item_values(item, binary=True):
+    """ Returns ``(item_type, values)``, the values of the item's schema fields in order. """
+    item_type = item._item_type
+    values = [codec[0](getattr(item, attribute, None), binary) for _, attribute, codec in SCHEMAS[item_type]]
+    return item_type, values
+
+
+def restore_item(item, values, schema, binary=True):
+    """ Sets the fields in ``values`` (a dict, or a list in schema order) on ``item``, and starts tracking changes. """
+    if isinstance(values, dict):
+        values = [values.get(name) for name, _, _ in schema]
+    else:
+        values = list(values) + [None] * (len(schema) - len(values))
+
+    for (_, attribute, codec), value in zip(schema, values):
+        object.__setattr__(item, attribute, codec[1](value, binary))
+
+    item._reset_dirty_attributes()
+    item._track_dirty_attributes = True
+    return item
+
+
+def _new_item(item_type, service):
+    item_class = _item_classes()[item_type]
+    item = item_class.__new__(item_class)
+    item.service = service
+    return item
+
+
+def to_json(item):
+    """ Returns the item as a JSON string. """
+    item_type, values = item_values(item, binary=False)
+    data = dict((name, value) for (name, _, _), value in zip(SCHEMAS[item_type], values))
+    return json.dumps({u'type': item_type, u'version': SCHEMA_VERSION, u'data': data}, separators=(',', ':'))
+
+
+def from_json(data, service=None):
+    """ Loads an item written by :func:`to_json`. """
+    if isinstance(data, six.binary_type):
+        data = data.decode('utf-8')
+    document = json.loads(data)
+    schema = _schema_for(document[u'type'], document[u'version'])
+    return restore_item(_new_item(document[u'type'], service), document[u'data'], schema, binary=False)
+
+
+def to_bytes(item):
+    """ Returns the item as MessagePack bytes. """
+    item_type, values = item_values(item)
+    return packb([item_type, SCHEMA_VERSION, values])
+
+
+def from_bytes(data, service=None):
+    """ Loads an item written by :func:`to_bytes`. """
+    item_type, version, values = unpackb(data)
+    return restore_item(_new_item(item_type, service), values, _schema_for(item_type, version))
+
+
+def _pack(obj, out):
+    if obj is None:
+        out.append(b'\xc0')
+    elif obj is True:
+        out.append(b'\xc3')
+    elif obj is False:
+        out.append(b'\xc2')
+    elif isinstance(obj, six.integer_types):
+        if 0 <= obj < 0x80:
+            out.append(struct.pack('B', obj))
+        elif -32 <= obj < 0:
+            out.append(struct.pack('b', obj))
+        elif obj >= 0:
+            for marker in (0xcc, 0xcd, 0xce, 0xcf):
+                fmt, size = _NUMBERS[marker]
+                if obj < 1 << (size * 8):
+                    out.append(struct.pack('>B' + fmt[1], marker, obj))
+                    break
+            else:
+                raise ValueError(u'Integer out of range: %r' % obj)
+        else:
+            for marker in (0xd0, 0xd1, 0xd2, 0xd3):
+                fmt, size = _NUMBERS[marker]
+                if obj >= -(1 << (size * 8 - 1)):
+                    out.append(struct.pack('>B' + fmt[1], marker, obj))
+                    break
+            else:
+                raise ValueError(u'Integer out of range: %r' % obj)
+    elif isinstance(obj, float):
+        out.append(struct.pack('>Bd', 0xcb, obj))
+    elif isinstance(obj, six.text_type):
+        encoded = obj.encode('utf-8')
+        length = len(encoded)
+        if length < 32:
+            out.append(struct.pack('B', 0xa0 | length))
+        elif length <= 0xff:
+            out.append(struct.pack('>BB', 0xd9, length))
+        elif length <= 0xffff:
+            out.append(struct.pack('>BH', 0xda, length))
+        else:
+            out.append(struct.pack('>BI', 0xdb, length))
+        out.append(encoded)
+    elif isinstance(obj, six.binary_type):
+        length = len(obj)
+        if length <= 0xff:
+            out.append(struct.pack('>BB', 0xc4, length))
+        elif length <= 0xffff:
+            out.append(struct.pack('>BH', 0xc5, length))
+        else:
+            out.append(struct.pack('>BI', 0xc6, length))
+        out.append(obj)
+    elif isinstance(obj, (list, tuple)):
+        length = len(obj)
+        if length < 16:
+            out.append(struct.pack('B', 0x90 | length))
+        elif length <= 0xffff:
+            out.append(struct.pack('>BH', 0xdc, length))
+        else:
+            out.append(struct.pack('>BI', 0xdd, length))
+        for value in obj:
+            _pack(value, out)
+    elif isinstance(obj, dict):
+        length = len(obj)
+        if length < 16:
+            out.append(struct.pack('B', 0x80 | length))
+        elif length <= 0xffff:
+            out.append(struct.pack('>BH', 0xde, length))
+        else:
+            out.append(struct.pack('>BI', 0xdf, length))
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(u'Cannot pack %r' % type(obj))
+
+
+# marker -> (struct format, size) for the fixed-size MessagePack numbers.
+_NUMBERS = {
+    0xca: ('>f', 4), 0xcb: ('>d', 8),
+    0xcc: ('>B', 1), 0xcd: ('>H', 2), 0xce: ('>I', 4), 0xcf: ('>Q', 8),
+    0xd0: ('>b', 1), 0xd1: ('>h', 2), 0xd2: ('>i', 4), 0xd3: ('>q', 8),
+}
+# marker -> (kind, struct format of the length, size of the length)
+_SIZED = {
+    0xc4: ('bin', '>B', 1), 0xc5: ('bin', '>H', 2), 0xc6: ('bin', '>I', 4),
+    0xd9: ('str', '>B', 1), 0xda: ('str', '>H', 2), 0xdb: ('str', '>I', 4),
+    0xdc: ('array', '>H', 2), 0xdd: ('array', '>I', 4),
+    0xde: ('map', '>H', 2), 0xdf: ('map', '>I', 4),
+}
+
+
+def _unpack(data, offset):
+    marker = six.indexbytes(data, offset)
+    offset += 1
+
+    if marker <= 0x7f:
+        return marker, offset
+    if marker >= 0xe0:
+        return marker - 0x100, offset
+    if marker == 0xc0:
+        return None, offset
+    if marker == 0xc2:
+        return False, offset
+    if marker == 0xc3:
+        return True, offset
+    if marker in _NUMBERS:
+        fmt, size = _NUMBERS[marker]
+        return struct.unpack_from(fmt, data, offset)[0], offset + size
+
+    if 0xa0 <= marker <= 0xbf:
+        kind, length = 'str', marker & 0x1f
+    elif 0x90 <= marker <= 0x9f:
+        kind, length = 'array', marker & 0x0f
+    elif 0x80 <= marker <= 0x8f:
+        kind, length = 'map', marker & 0x0f
+    elif marker in _SIZED:
+        kind, fmt, size = _SIZED[marker]
+        length = struct.unpack_from(fmt, data, offset)[0]
+        offset += size
+    else:
+        raise ValueError(u'Unsupported MessagePack type 0x%02x' % marker)
+
+    if kind == 'str':
+        return data[offset:offset + length].decode('utf-8'), offset + length
+    if kind == 'bin':
+        return data[offset:offset + length], offset + length
+    if kind == 'array':
+        result = []
+        for _ in range(length):
+            value, offset = _unpack(data, offset)
+            result.append(value)
+        return result, offset
+
+    result = {}
+    for _ in range(length):
+        key, offset = _unpack(data, offset)
+        result[key], offset = _unpack(data, offset)
+    return result, offset
+
+
+def _packb(obj):
+    out = []
+    _pack(obj, out)
+    return b''.join(out)
+
+
+def _unpackb(data):
+    value, offset = _unpack(data, 0)
+    if offset != len(data):
+        raise ValueError(u'Extra data after MessagePack value')
+    return value
+
+
+if msgpack is not None:
+
+    def packb(obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def unpackb(data):
+        return msgpack.unpackb(data, raw=False)
+
+else:
+    packb = _packb
+    unpackb = _unpackb
@@ -0,0 +1,789 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+A fake Exchange Web Services endpoint, for load testing and benchmarking pyexchange without an Exchange server. ::
+
+    mailbox = FakeMailbox(events=1000, messages=5000, contacts=200, tasks=200)
+    with FakeExchangeServer(mailbox, latency=0.02, max_concurrent=8) as url:
+        service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(url=url, username=u'u', password=u'p'))
+        ...
+
+or from the command line: ``python -m pyexchange.testing --messages 5000 --port 8080``.
+
+It answers FindItem (``IndexedPageItemView``, ``CalendarView`` and ``ContactsView`` paging, and an
+``IsGreaterThanOrEqualTo`` restriction on a date), GetItem, SyncFolderItems, CreateItem and GetUserAvailability
+from an in-memory mailbox, and can add latency, throttle with ``ErrorServerBusy`` and inject faults. It is not a validating server: anything else is answered with a
+SOAP fault, and additional properties are answered with the full item.
+"""
+import base64
+import logging
+import random
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape, quoteattr
+
+from lxml import etree
+from pytz import utc
+from six.moves import BaseHTTPServer, socketserver
+
+from .exchange2010 import soap_request
+
+log = logging.getLogger('pyexchange')
+
+DATETIME_FORMAT = u'%Y-%m-%dT%H:%M:%SZ'
+
+# The folder each kind of item lives in unless another one is named.
+DEFAULT_FOLDERS = {
+    u'CalendarItem': u'calendar',
+    u'Message': u'inbox',
+    u'Contact': u'contacts',
+    u'Task': u'tasks',
+}
+
+# Faults the server can inject: ErrorServerBusy with a SOAP fault and HTTP 500, a transient per-item error,
+# a bare HTTP 500, and a connection dropped without any answer.
+FAULT_SERVER_BUSY = u'server_busy'
+FAULT_TRANSIENT = u'transient'
+FAULT_HTTP_500 = u'http_500'
+FAULT_DISCONNECT = u'disconnect'
+FAULTS = (FAULT_SERVER_BUSY, FAULT_TRANSIENT, FAULT_HTTP_500, FAULT_DISCONNECT)
+
+_WORDS = (
+    u'quarterly', u'review', u'planning', u'sync', u'budget', u'roadmap', u'launch', u'design', u'offsite',
+    u'hiring', u'status', u'update', u'retro', u'lunch', u'customer', u'demo', u'security', u'migration',
+    u'report', u'follow-up', u'interview', u'training', u'release', u'incident', u'ünïcödé', u'café',
+)
+_NAMES = (
+    u'Ada Lovelace', u'Grace Hopper', u'Marie Curie', u'Emmy Noether', u'Lise Meitner', u'Rosalind Franklin',
+    u'Amelia Earhart', u'Hedy Lamarr', u'Katherine Johnson', u'Barbara Liskov', u'Margaret Hamilton',
+)
+
+_ENVELOPE = (
+    u'<?xml version="1.0" encoding="utf-8"?>'
+    u'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">'
+    u'<s:Header><h:ServerVersionInfo MajorVersion="14" MinorVersion="3" MajorBuildNumber="210" MinorBuildNumber="2"'
+    u' Version="Exchange2010_SP2" xmlns:h="http://schemas.microsoft.com/exchange/services/2006/types"/></s:Header>'
+    u'<s:Body xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">'
+    u'%s</s:Body></s:Envelope>'
+)
+_RESPONSE = (
+    u'<m:%(operation)sResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"'
+    u' xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">'
+    u'<m:ResponseMessages>%(messages)s</m:ResponseMessages></m:%(operation)sResponse>'
+)
+_SUCCESS = u'<m:%sResponseMessage ResponseClass="Success"><m:ResponseCode>NoError</m:ResponseCode>%s</m:%sResponseMessage>'
+_ERROR = (
+    u'<m:%(operation)sResponseMessage ResponseClass="Error"><m:MessageText>%(text)s</m:MessageText>'
+    u'<m:ResponseCode>%(code)s</m:ResponseCode><m:DescriptiveLinkKey>0</m:DescriptiveLinkKey>'
+    u'</m:%(operation)sResponseMessage>'
+)
+_FAULT = (
+    u'<s:Fault><faultcode xmlns:a="http://schemas.microsoft.com/exchange/services/2006/types">a:%(code)s</faultcode>'
+    u'<faultstring xml:lang="en-US">%(text)s</faultstring><detail>'
+    u'<e:ResponseCode xmlns:e="http://schemas.microsoft.com/exchange/services/2006/errors">%(code)s</e:ResponseCode>'
+    u'<e:Message xmlns:e="http://schemas.microsoft.com/exchange/services/2006/errors">%(text)s</e:Message>'
+    u'%(extra)s</detail></s:Fault>'
+)
+_BACK_OFF = (
+    u'<t:MessageXml xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">'
+    u'<t:Value Name="BackOffMilliseconds">%d</t:Value></t:MessageXml>'
+)
+
+
+def _format_date(value):
+    return value.strftime(DATETIME_FORMAT)
+
+
+def _text(tag, value):
+    if value is None:
+        return u''
+    return u'<t:%s>%s</t:%s>' % (tag, escape(value), tag)
+
+
+def _mailbox(tag, name, email):
+    return u'<t:%s><t:Mailbox><t:Name>%s</t:Name><t:EmailAddress>%s</t:EmailAddress></t:Mailbox></t:%s>' % (
+        tag, escape(name), escape(email), tag)
+
+
+class FakeItem(object):
+    """ One item in a :class:`FakeMailbox`; ``fields`` holds its properties by their EWS element names. """
+
+    def __init__(self, item_id, kind, folder_id, fields):
+        self.id = item_id
+        self.kind = kind
+        self.folder_id = folder_id
+        self.fields = fields
+        self.version = 0
+
+    @property
+    def change_key(self):
+        return u'CQAAABYAAAB%s-%d' % (self.id[-12:], self.version)
+
+    def to_xml(self, shape=u'Default', include_mime_content=False):
+        fields = self.fields
+        head = u'<t:ItemId Id=%s ChangeKey=%s/>' % (quoteattr(self.id), quoteattr(self.change_key))
+        if include_mime_content and self.kind == u'Message':
+            mime = u'Subject: %s\r\nFrom: %s\r\n\r\n%s\r\n' % (fields[u'Subject'], fields[u'FromEmail'], fields[u'Body'])
+            head = u'<t:MimeContent CharacterSet="UTF-8">%s</t:MimeContent>%s' % (
+                base64.b64encode(mime.encode('utf-8')).decode('ascii'), head)
+
+        if shape == u'IdOnly':
+            return u'<t:%s>%s</t:%s>' % (self.kind, head, self.kind)
+
+        parts = [head, u'<t:ParentFolderId Id=%s ChangeKey="AQAAAA=="/>' % quoteattr(self.folder_id)]
+
+        if self.kind == u'CalendarItem':
+            parts.append(u'<t:ItemClass>IPM.Appointment</t:ItemClass>')
+            parts.append(_text(u'Subject', fields[u'Subject']))
+            parts.append(u'<t:Sensitivity>Normal</t:Sensitivity>')
+            parts.append(u'<t:Body BodyType="HTML">%s</t:Body>' % escape(fields[u'Body']))
+            parts.append(_text(u'DateTimeCreated', _format_date(fields[u'DateTimeCreated'])))
+            parts.append(u'<t:ReminderIsSet>true</t:ReminderIsSet><t:ReminderMinutesBeforeStart>15</t:ReminderMinutesBeforeStart>')
+            parts.append(_text(u'LastModifiedTime', _format_date(fields[u'DateTimeCreated'])))
+            parts.append(_text(u'Start', _format_date(fields[u'Start'])))
+            parts.append(_text(u'End', _format_date(fields[u'End'])))
+            parts.append(u'<t:IsAllDayEvent>false</t:IsAllDayEvent><t:LegacyFreeBusyStatus>Busy</t:LegacyFreeBusyStatus>')
+            parts.append(_text(u'Location', fields[u'Location']))
+            parts.append(u'<t:IsCancelled>false</t:IsCancelled><t:CalendarItemType>Single</t:CalendarItemType>')
+            parts.append(_mailbox(u'Organizer', fields[u'OrganizerName'], fields[u'OrganizerEmail']))
+            if fields[u'Attendees']:
+                parts.append(u'<t:RequiredAttendees>')
+                for name, email in fields[u'Attendees']:
+                    parts.append(u'<t:Attendee><t:Mailbox><t:Name>%s</t:Name><t:EmailAddress>%s</t:EmailAddress>'
+                                 u'</t:Mailbox><t:ResponseType>Accept</t:ResponseType></t:Attendee>'
+                                 % (escape(name), escape(email)))
+                parts.append(u'</t:RequiredAttendees>')
+            parts.append(u'<t:TimeZone>(UTC) Coordinated Universal Time</t:TimeZone>')
+
+        elif self.kind == u'Message':
+            parts.append(u'<t:ItemClass>IPM.Note</t:ItemClass>')
+            parts.append(_text(u'Subject', fields[u'Subject']))
+            parts.append(u'<t:Body BodyType="Text">%s</t:Body>' % escape(fields[u'Body']))
+            parts.append(_text(u'DateTimeReceived', _format_date(fields[u'DateTimeReceived'])))
+            parts.append(u'<t:Size>%d</t:Size><t:Importance>Normal</t:Importance>' % (len(fields[u'Body']) + 512))
+            parts.append(u'<t:HasAttachments>false</t:HasAttachments>')
+            parts.append(_text(u'DateTimeSent', _format_date(fields[u'DateTimeReceived'])))
+            parts.append(_text(u'DateTimeCreated', _format_date(fields[u'DateTimeReceived'])))
+            parts.append(u'<t:Culture>en-US</t:Culture>')
+            parts.append(_mailbox(u'Sender', fields[u'FromName'], fields[u'FromEmail']))
+            if fields[u'To']:
+                parts.append(u'<t:ToRecipients>%s</t:ToRecipients>' % u''.join(
+                    u'<t:Mailbox><t:Name>%s</t:Name><t:EmailAddress>%s</t:EmailAddress></t:Mailbox>'
+                    % (escape(name), escape(email)) for name, email in fields[u'To']))
+            parts.append(u'<t:IsRead>%s</t:IsRead>' % (u'true' if fields[u'IsRead'] else u'false'))
+            parts.append(_mailbox(u'From', fields[u'FromName'], fields[u'FromEmail']))
+            parts.append(_text(u'InternetMessageId', u'<%s@fake.example.com>' % self.id[-16:]))
+
+        elif self.kind == u'Contact':
+            parts.append(u'<t:ItemClass>IPM.Contact</t:ItemClass>')
+            parts.append(_text(u'Subject', fields[u'DisplayName']))
+            parts.append(_text(u'FileAs', fields[u'FileAs']))
+            parts.append(_text(u'DisplayName', fields[u'DisplayName']))
+            parts.append(u'<t:CompleteName>%s%s%s</t:CompleteName>' % (
+                _text(u'FirstName', fields[u'FirstName']), _text(u'LastName', fields[u'LastName']),
+                _text(u'FullName', fields[u'DisplayName'])))
+            parts.append(_text(u'CompanyName', fields[u'CompanyName']))
+            parts.append(u'<t:EmailAddresses><t:Entry Key="EmailAddress1">%s</t:Entry></t:EmailAddresses>'
+                         % escape(fields[u'EmailAddress']))
+            parts.append(u'<t:PhoneNumbers><t:Entry Key="BusinessPhone">%s</t:Entry></t:PhoneNumbers>'
+                         % escape(fields[u'BusinessPhone']))
+            parts.append(_text(u'JobTitle', fields[u'JobTitle']))
+            parts.append(_text(u'Department', fields[u'Department']))
+
+        elif self.kind == u'Task':
+            parts.append(u'<t:ItemClass>IPM.Task</t:ItemClass>')
+            parts.append(_text(u'Subject', fields[u'Subject']))
+            parts.append(u'<t:Body BodyType="Text">%s</t:Body>' % escape(fields[u'Body']))
+            parts.append(_text(u'DateTimeCreated', _format_date(fields[u'DateTimeCreated'])))
+            parts.append(_text(u'DueDate', _format_date(fields[u'DueDate'])))
+            parts.append(u'<t:IsComplete>%s</t:IsComplete>' % (u'true' if fields[u'PercentComplete'] == 100 else u'false'))
+            parts.append(u'<t:PercentComplete>%d</t:PercentComplete>' % fields[u'PercentComplete'])
+            parts.append(_text(u'StartDate', _format_date(fields[u'DateTimeCreated'])))
+            parts.append(_text(u'Status', fields[u'Status']))
+
+        return u'<t:%s>%s</t:%s>' % (self.kind, u''.join(parts), self.kind)
+
+
+class FakeMailbox(object):
+    """
+    An in-memory mailbox for :class:`FakeExchangeServer`, filled with ``events`` calendar items, ``messages``
+    in the inbox, ``contacts`` and ``tasks`` made up from a seeded random generator, so the same arguments always
+    give the same mailbox.
+
+    Event ``n`` starts ``n`` hours after ``start`` (the start of 2050 by default) and lasts half an hour; messages
+    are received a minute apart, newest last. Every folder keeps a change log for SyncFolderItems.
+    """
+
+    def __init__(self, events=0, messages=0, contacts=0, tasks=0, start=None, body_size=200, attendees=3, seed=0):
+        self.start = start or datetime(2050, 1, 1, tzinfo=utc)
+        self.body_size = body_size
+        self.attendees = attendees
+
+        self.items = {}
+        self.folders = defaultdict(list)  # folder id -> item ids, in creation order
+        self.changes = defaultdict(list)  # folder id -> [(change type, item id)]
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+        for n in range(events):
+            self.add(u'CalendarItem', self._event_fields(n))
+        for n in range(messages):
+            self.add(u'Message', self._message_fields(n))
+        for n in range(contacts):
+            self.add(u'Contact', self._contact_fields(n))
+        for n in range(tasks):
+            self.add(u'Task', self._task_fields(n))
+
+    def _words(self, count):
+        return u' '.join(self._random.choice(_WORDS) for _ in range(count))
+
+    def _body(self):
+        words = []
+        size = 0
+        while size < self.body_size:
+            word = self._random.choice(_WORDS)
+            words.append(word)
+            size += len(word) + 1
+        return u' '.join(words)
+
+    def _person(self):
+        name = self._random.choice(_NAMES)
+        return name, u'%s@example.com' % name.lower().replace(u' ', u'.')
+
+    def _event_fields(self, n):
+        start = self.start + timedelta(hours=n)
+        organizer = self._person()
+        return {
+            u'Subject': self._words(4).capitalize(),
+            u'Body': self._body(),
+            u'Start': start,
+            u'End': start + timedelta(minutes=30),
+            u'Location': u'Room %d' % self._random.randint(1, 400),
+            u'DateTimeCreated': start - timedelta(days=7),
+            u'OrganizerName': organizer[0],
+            u'OrganizerEmail': organizer[1],
+            u'Attendees': [self._person() for _ in range(self.attendees)],
+        }
+
+    def _message_fields(self, n):
+        sender = self._person()
+        return {
+            u'Subject': self._words(6).capitalize(),
+            u'Body': self._body(),
+            u'DateTimeReceived': self.start + timedelta(minutes=n),
+            u'FromName': sender[0],
+            u'FromEmail': sender[1],
+            u'To': [self._person() for _ in range(self._random.randint(1, 3))],
+            u'IsRead': self._random.random() < 0.5,
+        }
+
+    def _contact_fields(self, n):
+        first, last = self._random.choice(_NAMES).split(u' ', 1)
+        return {
+            u'FirstName': first,
+            u'LastName': u'%s %d' % (last, n),
+            u'DisplayName': u'%s %s %d' % (first, last, n),
+            u'FileAs': u'%s %d, %s' % (last, n, first),
+            u'EmailAddress': u'%s.%s.%d@example.com' % (first.lower(), last.lower(), n),
+            u'CompanyName': u'Example Corp',
+            u'BusinessPhone': u'+1 555 %04d' % n,
+            u'JobTitle': self._words(2).title(),
+            u'Department': self._random.choice(_WORDS).title(),
+        }
+
+    def _task_fields(self, n):
+        return {
+            u'Subject': self._words(3).capitalize(),
+            u'Body': self._body(),
+            u'DateTimeCreated': self.start + timedelta(minutes=n),
+            u'DueDate': self.start + timedelta(days=n % 30 + 1),
+            u'PercentComplete': self._random.choice((0, 25, 50, 100)),
+            u'Status': u'InProgress',
+        }
+
+    def add(self, kind, fields, folder_id=None):
+        """ Adds an item of ``kind`` (``CalendarItem``, ``Message``, ``Contact`` or ``Task``) and returns it. """
+        folder_id = folder_id or DEFAULT_FOLDERS[kind]
+        with self._lock:
+            self._counter += 1
+            item_id = u'AAMkADE2NjVhZjFmLWZha2UtNDVhMi1iZjI0LTA4NjFmM2%sAAA%010d=' % (kind[:4].upper(), self._counter)
+            item = FakeItem(item_id, kind, folder_id, fields)
+            self.items[item_id] = item
+            self.folders[folder_id].append(item_id)
+            self.changes[folder_id].append((u'Create', item_id))
+        return item
+
+    def update(self, item_id, **fields):
+        """ Changes fields of an item, giving it a new change key. """
+        with self._lock:
+            item = self.items[item_id]
+            item.fields.update(fields)
+            item.version += 1
+            self.changes[item.folder_id].append((u'Update', item_id))
+        return item
+
+    def delete(self, item_id):
+        with self._lock:
+            item = self.items.pop(item_id)
+            self.folders[item.folder_id].remove(item_id)
+            self.changes[item.folder_id].append((u'Delete', item_id))
+
+    def get(self, item_id):
+        return self.items.get(item_id)
+
+    def folder_items(self, folder_id):
+        with self._lock:
+            return [self.items[item_id] for item_id in self.folders.get(folder_id, ())]
+
+    def changes_since(self, folder_id, position, limit):
+        """
+        Returns ``(changes, position, last)``: at most ``limit`` of the ``(change type, item, item id)`` logged for
+        ``folder_id`` after ``position``, the position after them, and whether they are the latest ones.
+        """
+        with self._lock:
+            log_entries = self.changes.get(folder_id, [])
+            if position > len(log_entries):
+                raise ValueError(u'Unknown sync position %d' % position)
+            page = [(change, self.items.get(item_id), item_id) for change, item_id in log_entries[position:position + limit]]
+            position += len(page)
+            return page, position, position >= len(log_entries)
+
+
+class FakeExchangeServer(object):
+    """
+    Serves a :class:`FakeMailbox` over HTTP on a thread per connection. Use it as a context manager that returns
+    the EWS URL, or call :meth:`start` and :meth:`stop`. ``port=0`` picks a free port.
+
+    :param latency: Seconds every request waits before it is answered, or a ``(low, high)`` range to pick from.
+    :param max_concurrent: Requests over this many in flight are answered with ``ErrorServerBusy``.
+    :param requests_per_second: Requests over this rate (with bursts of up to a second's worth) are answered
+        with ``ErrorServerBusy``, carrying ``back_off_ms`` as ``BackOffMilliseconds``.
+    :param fault_rate: The share of requests (0 to 1) answered with a fault picked from ``faults`` instead.
+    :param max_page_size: The most items one FindItem page returns, whatever the client asks for.
+    :param compress: Gzip responses for clients that accept it. Gzipped requests are always understood.
+
+    :meth:`inject` queues faults for the next requests, for tests that need them at a given point. Counts of
+    the requests served, by operation and by fault, are kept in ``stats``.
+
+    Calling the server like an httpretty callback, ``server(request, uri, headers)``, answers a request without
+    HTTP; dropped connections become HTTP 500 then.
+    """
+
+    def __init__(self, mailbox=None, host='127.0.0.1', port=0, latency=0, max_concurrent=None,
+                 requests_per_second=None, back_off_ms=1000, fault_rate=0.0, faults=FAULTS, max_page_size=1000,
+                 compress=False, seed=None):
+        self.mailbox = mailbox if mailbox is not None else FakeMailbox()
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.max_concurrent = max_concurrent
+        self.requests_per_second = requests_per_second
+        self.back_off_ms = back_off_ms
+        self.fault_rate = fault_rate
+        self.faults = faults
+        self.max_page_size = max_page_size
+        self.compress = compress
+
+        self.stats = defaultdict(int)
+        self._random = random.Random(seed)
+        self._injected = []
+        self._in_flight = 0
+        self._tokens = float(requests_per_second or 0)
+        self._refilled_at = time.time()
+        self._lock = threading.Lock()
+        self._server = None
+
+        self._operations = {
+            u'FindItem': self._find_item,
+            u'GetItem': self._get_item,
+            u'SyncFolderItems': self._sync_folder_items,
+            u'CreateItem': self._create_item,
+            u'GetUserAvailabilityRequest': self._get_user_availability,
+        }
+
+    @property
+    def url(self):
+        if self._server is None:
+            return None
+        return 'http://%s:%d/EWS/Exchange.asmx' % self._server.server_address[:2]
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    server._count(u'gzip:request')
+                    body = zlib.decompress(body, 31)
+                status, response = server.handle(body)
+                if status is None:
+                    self.close_connection = True
+                    return
+
+                response = response.encode('utf-8')
+                self.send_response(status)
+                if server.compress and 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+                    server._count(u'gzip:response')
+                    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+                    response = compressor.compress(response) + compressor.flush()
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Type', 'text/xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self._server = Server((self.host, self.port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        log.info(u'Fake Exchange server listening on %s', self.url)
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __call__(self, request, uri, headers):
+        status, response = self.handle(request.body)
+        if status is None:
+            return 500, headers, u''
+        return status, headers, response
+
+    def inject(self, fault, count=1):
+        """ Answers the next ``count`` requests with ``fault`` (one of :data:`FAULTS`). """
+        if fault not in FAULTS:
+            raise ValueError(u'Unknown fault %r' % fault)
+        with self._lock:
+            self._injected.extend([fault] * count)
+
+    def handle(self, body):
+        """ Answers the request ``body``; returns ``(status, response)``, or ``(None, None)`` to drop the connection. """
+        if not self._admit():
+            return self._server_busy()
+
+        try:
+            fault = self._pick_fault()
+            if fault == FAULT_SERVER_BUSY:
+                return self._server_busy()
+
+            self._wait()
+            if fault is not None:
+                self._count(u'fault:%s' % fault)
+                if fault == FAULT_HTTP_500:
+                    return 500, u'Internal Server Error'
+                if fault == FAULT_DISCONNECT:
+                    return None, None
+
+            try:
+                request = etree.fromstring(body)
+                operation = request.find(u'{%s}Body' % soap_request.SOAP_NS)[0]
+            except (etree.XMLSyntaxError, IndexError, TypeError):
+                return 500, self._fault(u'ErrorSchemaValidation', u'The request failed schema validation.')
+
+            name = etree.QName(operation).localname
+            self._count(name)
+            handler = self._operations.get(name)
+            if handler is None:
+                return 500, self._fault(u'ErrorInvalidRequest', u'%s is not supported by the fake server.' % name)
+
+            if fault == FAULT_TRANSIENT:
+                response_name = name[:-len(u'Request')] if name.endswith(u'Request') else name
+                return 200, _ENVELOPE % (_RESPONSE % {u'operation': response_name, u'messages': _ERROR % {
+                    u'operation': response_name, u'code': u'ErrorInternalServerTransientError',
+                    u'text': u'An internal server error occurred. Try again later.'}})
+
+            return 200, _ENVELOPE % handler(operation)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _admit(self):
+        """ Counts the request as in flight and returns True, or returns False if it is over a limit. """
+        with self._lock:
+            if self.max_concurrent is not None and self._in_flight >= self.max_concurrent:
+                return False
+            if self.requests_per_second:
+                now = time.time()
+                self._tokens = min(float(self.requests_per_second),
+                                   self._tokens + (now - self._refilled_at) * self.requests_per_second)
+                self._refilled_at = now
+                if self._tokens < 1:
+                    return False
+                self._tokens -= 1
+            self._in_flight += 1
+        return True
+
+    def _server_busy(self):
+        self._count(u'fault:%s' % FAULT_SERVER_BUSY)
+        return 500, self._fault(u'ErrorServerBusy', u'The server cannot service this request right now. Try again later.',
+                                _BACK_OFF % self.back_off_ms)
+
+    def _pick_fault(self):
+        with self._lock:
+            if self._injected:
+                return self._injected.pop(0)
+            if self.fault_rate and self._random.random() < self.fault_rate:
+                return self._random.choice(self.faults)
+        return None
+
+    def _wait(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            with self._lock:
+                latency = self._random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def _fault(self, code, text, extra=u''):
+        return _ENVELOPE % (_FAULT % {u'code': code, u'text': escape(text), u'extra': extra})
+
+    def _folder_id(self, parent):
+        node = parent.find(u't:DistinguishedFolderId', namespaces=soap_request.NAMESPACES)
+        if node is None:
+            node = parent.find(u't:FolderId', namespaces=soap_request.NAMESPACES)
+        return node.get(u'Id')
+
+    def _shape(self, operation):
+        shape = operation.findtext(u'm:ItemShape/t:BaseShape', default=u'Default', namespaces=soap_request.NAMESPACES)
+        if shape == u'IdOnly' and operation.find(u'm:ItemShape/t:AdditionalProperties', namespaces=soap_request.NAMESPACES) is not None:
+            shape = u'Default'
+        return shape
+
+    def _find_item(self, operation):
+        ns = soap_request.NAMESPACES
+        folder_id = self._folder_id(operation.find(u'm:ParentFolderIds', namespaces=ns))
+        items = self.mailbox.folder_items(folder_id)
+        shape = self._shape(operation)
+
+        query = operation.findtext(u'm:QueryString', namespaces=ns)
+        if query:
+            query = query.lower()
+            items = [i for i in items if query in (i.fields.get(u'Subject') or i.fields.get(u'DisplayName') or u'').lower()]
+
+        restriction = operation.find(u'm:Restriction/t:IsGreaterThanOrEqualTo', namespaces=ns)
+        if restriction is not None:
+            field = restriction.find(u't:FieldURI', namespaces=ns).get(u'FieldURI').split(u':')[-1]
+            value = restriction.find(u't:FieldURIOrConstant/t:Constant', namespaces=ns).get(u'Value')
+            since = datetime.strptime(value, DATETIME_FORMAT).replace(tzinfo=utc)
+            items = [i for i in items if i.fields.get(field) is not None and i.fields[field] >= since]
+
+        sort = operation.find(u'm:SortOrder/t:FieldOrder', namespaces=ns)
+        if sort is not None:
+            field = sort.find(u't:FieldURI', namespaces=ns).get(u'FieldURI').split(u':')[-1]
+            items.sort(key=lambda i: i.fields.get(field), reverse=sort.get(u'Order') == u'Descending')
+
+        calendar_view = operation.find(u'm:CalendarView', namespaces=ns)
+        contacts_view = operation.find(u'm:ContactsView', namespaces=ns)
+        paging = operation.find(u'm:IndexedPageItemView', namespaces=ns)
+        offset = 0
+        limit = self.max_page_size
+
+        if calendar_view is not None:
+            start = datetime.strptime(calendar_view.get(u'StartDate'), DATETIME_FORMAT).replace(tzinfo=utc)
+            end = datetime.strptime(calendar_view.get(u'EndDate'), DATETIME_FORMAT).replace(tzinfo=utc)
+            items = sorted((i for i in items if i.fields[u'Start'] < end and i.fields[u'End'] > start),
+                           key=lambda i: i.fields[u'Start'])
+            limit = min(limit, int(calendar_view.get(u'MaxEntriesReturned', limit)))
+        elif contacts_view is not None:
+            initial, final = contacts_view.get(u'InitialName'), contacts_view.get(u'FinalName')
+            items = sorted(items, key=lambda i: i.fields.get(u'FileAs', u''))
+            if initial:
+                items = [i for i in items if i.fields.get(u'FileAs', u'') >= initial]
+            if final:
+                items = [i for i in items if i.fields.get(u'FileAs', u'') <= final]
+            limit = min(limit, int(contacts_view.get(u'MaxEntriesReturned', limit)))
+        elif paging is not None:
+            offset = int(paging.get(u'Offset', 0))
+            limit = min(limit, int(paging.get(u'MaxEntriesReturned', limit)))
+
+        page = items[offset:offset + limit]
+        next_offset = offset + len(page)
+        root = u'<m:RootFolder IndexedPagingOffset="%d" TotalItemsInView="%d" IncludesLastItemInRange="%s"><t:Items>%s</t:Items></m:RootFolder>' % (
+            next_offset, len(items), u'true' if next_offset >= len(items) else u'false',
+            u''.join(item.to_xml(shape) for item in page))
+        return _RESPONSE % {u'operation': u'FindItem', u'messages': _SUCCESS % (u'FindItem', root, u'FindItem')}
+
+    def _get_item(self, operation):
+        ns = soap_request.NAMESPACES
+        shape = self._shape(operation)
+        mime = operation.findtext(u'm:ItemShape/t:IncludeMimeContent', namespaces=ns) == u'true'
+
+        messages = []
+        for item_id in operation.xpath(u'm:ItemIds/t:ItemId/@Id', namespaces=ns):
+            item = self.mailbox.get(item_id)
+            if item is None:
+                messages.append(_ERROR % {u'operation': u'GetItem', u'code': u'ErrorItemNotFound',
+                                          u'text': u'The specified object was not found in the store.'})
+            else:
+                messages.append(_SUCCESS % (u'GetItem', u'<m:Items>%s</m:Items>' % item.to_xml(shape, mime), u'GetItem'))
+        return _RESPONSE % {u'operation': u'GetItem', u'messages': u''.join(messages)}
+
+    def _sync_folder_items(self, operation):
+        ns = soap_request.NAMESPACES
+        folder_id = self._folder_id(operation.find(u'm:SyncFolderId', namespaces=ns))
+        shape = self._shape(operation)
+        state = operation.findtext(u'm:SyncState', namespaces=ns)
+        limit = int(operation.findtext(u'm:MaxChangesReturned', default=u'512', namespaces=ns))
+
+        try:
+            position = int(base64.b64decode(state.encode('ascii')).decode('ascii').rsplit(u':', 1)[1]) if state else 0
+            changes, position, last = self.mailbox.changes_since(folder_id, position, limit)
+        except (ValueError, IndexError, TypeError):
+            return _RESPONSE % {u'operation': u'SyncFolderItems', u'messages': _ERROR % {
+                u'operation': u'SyncFolderItems', u'code': u'ErrorInvalidSyncStateData',
+                u'text': u'Synchronization state data is corrupt or otherwise invalid.'}}
+
+        parts = []
+        for change, item, item_id in changes:
+            if change == u'Delete' or item is None:
+                parts.append(u'<t:Delete><t:ItemId Id=%s/></t:Delete>' % quoteattr(item_id))
+            else:
+                parts.append(u'<t:%s>%s</t:%s>' % (change, item.to_xml(shape), change))
+
+        state = base64.b64encode((u'%s:%d' % (folder_id, position)).encode('utf-8')).decode('ascii')
+        body = u'<m:SyncState>%s</m:SyncState><m:IncludesLastItemInRange>%s</m:IncludesLastItemInRange><m:Changes>%s</m:Changes>' % (
+            state, u'true' if last else u'false', u''.join(parts))
+        return _RESPONSE % {u'operation': u'SyncFolderItems', u'messages': _SUCCESS % (u'SyncFolderItems', body, u'SyncFolderItems')}
+
+    def _create_item(self, operation):
+        ns = soap_request.NAMESPACES
+        saved_folder = operation.find(u'm:SavedItemFolderId', namespaces=ns)
+        folder_id = self._folder_id(saved_folder) if saved_folder is not None else None
+        send_only = operation.get(u'MessageDisposition') == u'SendOnly'
+
+        messages = []
+        for node in operation.find(u'm:Items', namespaces=ns):
+            kind = etree.QName(node).localname
+            if kind not in DEFAULT_FOLDERS:
+                messages.append(_ERROR % {u'operation': u'CreateItem', u'code': u'ErrorInvalidRequest',
+                                          u'text': u'%s items are not supported by the fake server.' % kind})
+                continue
+
+            fields = self._fields_from_request(kind, node)
+            target = folder_id or (u'sentitems' if kind == u'Message' else DEFAULT_FOLDERS[kind])
+            item = self.mailbox.add(kind, fields, target)
+            created = u'' if send_only else item.to_xml(u'IdOnly')
+            messages.append(_SUCCESS % (u'CreateItem', u'<m:Items>%s</m:Items>' % created, u'CreateItem'))
+        return _RESPONSE % {u'operation': u'CreateItem', u'messages': u''.join(messages)}
+
+    def _fields_from_request(self, kind, node):
+        ns = soap_request.NAMESPACES
+        now = datetime.now(utc).replace(microsecond=0)
+
+        def text(path, default=u''):
+            return node.findtext(path, default=default, namespaces=ns) or default
+
+        def date(path, default):
+            value = node.findtext(path, namespaces=ns)
+            return datetime.strptime(value, DATETIME_FORMAT).replace(tzinfo=utc) if value else default
+
+        if kind == u'CalendarItem':
+            start = date(u't:Start', now)
+            return {
+                u'Subject': text(u't:Subject'), u'Body': text(u't:Body'), u'Start': start,
+                u'End': date(u't:End', start + timedelta(minutes=30)), u'Location': text(u't:Location'),
+                u'DateTimeCreated': now, u'OrganizerName': u'Fake Organizer', u'OrganizerEmail': u'organizer@example.com',
+                u'Attendees': [(u'', email) for email in node.xpath(u't:RequiredAttendees/t:Attendee/t:Mailbox/t:EmailAddress/text()', namespaces=ns)],
+            }
+        if kind == u'Message':
+            return {
+                u'Subject': text(u't:Subject'), u'Body': text(u't:Body') or text(u't:MimeContent'), u'DateTimeReceived': now,
+                u'FromName': u'Fake Sender', u'FromEmail': u'sender@example.com', u'IsRead': True,
+                u'To': [(u'', email) for email in node.xpath(u't:ToRecipients/t:Mailbox/t:EmailAddress/text()', namespaces=ns)],
+            }
+        if kind == u'Contact':
+            first, last = text(u't:GivenName'), text(u't:Surname')
+            display = text(u't:DisplayName') or (u'%s %s' % (first, last)).strip()
+            return {
+                u'FirstName': first, u'LastName': last, u'DisplayName': display, u'FileAs': text(u't:FileAs', display),
+                u'EmailAddress': text(u't:EmailAddresses/t:Entry'), u'CompanyName': text(u't:CompanyName'),
+                u'BusinessPhone': u'', u'JobTitle': text(u't:JobTitle'), u'Department': text(u't:Department'),
+            }
+        return {
+            u'Subject': text(u't:Subject'), u'Body': text(u't:Body'), u'DateTimeCreated': now,
+            u'DueDate': date(u't:DueDate', now), u'PercentComplete': 0, u'Status': u'NotStarted',
+        }
+
+    def _get_user_availability(self, operation):
+        ns = soap_request.NAMESPACES
+        window = operation.find(u't:FreeBusyViewOptions/t:TimeWindow', namespaces=ns)
+        start = datetime.strptime(window.findtext(u't:StartTime', namespaces=ns), DATETIME_FORMAT).replace(tzinfo=utc)
+        end = datetime.strptime(window.findtext(u't:EndTime', namespaces=ns), DATETIME_FORMAT).replace(tzinfo=utc)
+
+        # Every attendee is as busy as the fake mailbox's own calendar.
+        busy = u''.join(
+            u'<CalendarEvent><StartTime>%s</StartTime><EndTime>%s</EndTime><BusyType>Busy</BusyType></CalendarEvent>'
+            % (i.fields[u'Start'].strftime(u'%Y-%m-%dT%H:%M:%S'), i.fields[u'End'].strftime(u'%Y-%m-%dT%H:%M:%S'))
+            for i in self.mailbox.folder_items(u'calendar') if i.fields[u'Start'] < end and i.fields[u'End'] > start)
+        view = (
+            u'<FreeBusyResponse><ResponseMessage ResponseClass="Success"><ResponseCode>NoError</ResponseCode></ResponseMessage>'
+            u'<FreeBusyView><FreeBusyViewType xmlns="http://schemas.microsoft.com/exchange/services/2006/types">FreeBusy</FreeBusyViewType>'
+            u'<CalendarEventArray xmlns="http://schemas.microsoft.com/exchange/services/2006/types">%s</CalendarEventArray>'
+            u'</FreeBusyView></FreeBusyResponse>' % busy
+        )
+        count = len(operation.findall(u'm:MailboxDataArray/t:MailboxData', namespaces=ns))
+        return (u'<GetUserAvailabilityResponse xmlns="http://schemas.microsoft.com/exchange/services/2006/messages">'
+                u'<FreeBusyResponseArray>%s</FreeBusyResponseArray></GetUserAvailabilityResponse>' % (view * count))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description=u'Runs a fake Exchange Web Services endpoint.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--events', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--contacts', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0, help=u'seconds added to every request')
+    parser.add_argument('--max-concurrent', type=int, default=None)
+    parser.add_argument('--requests-per-second', type=float, default=None)
+    parser.add_argument('--fault-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mailbox = FakeMailbox(events=args.events, messages=args.messages, contacts=args.contacts, tasks=args.tasks,
+                          seed=args.seed)
+    server = FakeExchangeServer(mailbox, host=args.host, port=args.port, latency=args.latency,
+                                max_concurrent=args.max_concurrent, requests_per_second=args.requests_per_second,
+                                fault_rate=args.fault_rate, seed=args.seed)
+    print(u'Serving a fake Exchange server on %s' % server.start())
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
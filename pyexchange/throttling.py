@@ -0,0 +1,163 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+Client-side throttling, to stay under Exchange's throttling policies (EWSMaxConcurrency, EWSPercentTimeInCAS, ...)
+instead of running into ``ErrorServerBusy``. ::
+
+    governor = Governor(rate=50, max_in_flight=20, mailbox_rate=5, mailbox_max_in_flight=3)
+    connection = ExchangeNTLMAuthConnection(url, username, password, governor=governor)
+
+Limits apply to all requests together and to each mailbox, which the service names in the ``X-AnchorMailbox``
+header when impersonating. When Exchange answers ``ErrorServerBusy`` the connection waits for the back-off
+Exchange asks for and retries (up to the ``retries`` of the request), and the governor halves the rate of the
+mailbox (or of everything, for requests without one), then wins it back a little with every request that goes
+through, so it settles near the highest rate Exchange accepts.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:  # Python 2
+    _monotonic = time.time
+
+
+class TokenBucket(object):
+    """
+    Lets ``rate`` requests a second through on average, with bursts of up to ``burst``. Requests over the rate
+    are not refused: :meth:`reserve` hands out the next free moment, so waiting callers are served in order.
+    """
+
+    def __init__(self, rate, burst=None, clock=_monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """ Takes a token and returns how many seconds to wait before using it. """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class Limiter(object):
+    """
+    A token bucket plus a cap on requests in flight, either of which may be None for no limit.
+
+    With ``adaptive`` set, every :meth:`throttled` call multiplies the rate by ``decrease`` (never below
+    ``min_rate``), and every :meth:`succeeded` call adds ``recovery`` times the configured rate back, up to the
+    configured rate.
+    """
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None, adaptive=True, decrease=0.5, recovery=0.02,
+                 min_rate=0.1, clock=_monotonic, sleep=time.sleep):
+        self.max_rate = rate
+        self.bucket = TokenBucket(rate, burst, clock=clock) if rate else None
+        self.max_in_flight = max_in_flight
+        self.adaptive = adaptive
+        self.decrease = decrease
+        self.recovery = recovery
+        self.min_rate = min_rate
+        self.clock = clock
+        self.sleep = sleep
+
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        """ The rate requests are let through at right now, or None if there is no rate limit. """
+        return self.bucket.rate if self.bucket is not None else None
+
+    def acquire(self):
+        wait = self._paused_until - self.clock()
+        if self.bucket is not None:
+            wait = max(wait, self.bucket.reserve())
+        if wait > 0:
+            self.sleep(wait)
+        if self._slots is not None:
+            self._slots.acquire()
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def throttled(self, back_off):
+        """ Holds every request back for ``back_off`` seconds and slows down. """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.clock() + back_off)
+            if self.adaptive and self.bucket is not None:
+                self.bucket.rate = max(self.min_rate, self.bucket.rate * self.decrease)
+
+    def succeeded(self):
+        if self.adaptive and self.bucket is not None and self.bucket.rate < self.max_rate:
+            with self._lock:
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate * self.recovery)
+
+
+class Governor(object):
+    """
+    Limits the requests of a connection, all together (``rate``, ``burst``, ``max_in_flight``) and per mailbox
+    (``mailbox_rate``, ``mailbox_burst``, ``mailbox_max_in_flight``). Rates are in requests per second; leave a
+    limit as None to not enforce it. Other keyword arguments are passed on to every :class:`Limiter`.
+    """
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None, mailbox_rate=None, mailbox_burst=None,
+                 mailbox_max_in_flight=None, **limiter_options):
+        self.limiter = Limiter(rate, burst, max_in_flight, **limiter_options)
+        self.mailbox_rate = mailbox_rate
+        self.mailbox_burst = mailbox_burst
+        self.mailbox_max_in_flight = mailbox_max_in_flight
+        self.limiter_options = limiter_options
+
+        self._mailboxes = {}
+        self._lock = threading.Lock()
+
+    def mailbox_limiter(self, mailbox):
+        """ The limiter of ``mailbox``, or None if there are no per-mailbox limits or no mailbox. """
+        if mailbox is None or (self.mailbox_rate is None and self.mailbox_max_in_flight is None):
+            return None
+
+        with self._lock:
+            limiter = self._mailboxes.get(mailbox)
+            if limiter is None:
+                limiter = self._mailboxes[mailbox] = Limiter(self.mailbox_rate, self.mailbox_burst,
+                                                             self.mailbox_max_in_flight, **self.limiter_options)
+            return limiter
+
+    @contextmanager
+    def request(self, mailbox=None):
+        """ Waits until a request for ``mailbox`` may go out, and counts it as in flight until the block ends. """
+        limiters = [limiter for limiter in (self.mailbox_limiter(mailbox), self.limiter) if limiter is not None]
+        acquired = []
+        try:
+            for limiter in limiters:
+                limiter.acquire()
+                acquired.append(limiter)
+            yield
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+    def throttled(self, mailbox, back_off):
+        """ Exchange answered ``ErrorServerBusy`` for ``mailbox``, asking to wait ``back_off`` seconds. """
+        (self.mailbox_limiter(mailbox) or self.limiter).throttled(back_off)
+
+    def succeeded(self, mailbox):
+        limiter = self.mailbox_limiter(mailbox)
+        if limiter is not None:
+            limiter.succeeded()
+        self.limiter.succeeded()
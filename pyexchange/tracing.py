@@ -0,0 +1,85 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+Tracing spans around EWS calls, for OpenTelemetry or anything with the same tracer API. ::
+
+    service = Exchange2010Service(connection, tracer=get_tracer())
+
+Every ``send()`` gets an ``EWS <operation>`` span, and each HTTP request under it a ``POST`` span whose trace
+context is sent to Exchange in the ``traceparent`` header; how many of those were retries is recorded on the
+``EWS`` span. Pages fetched in the background and the fan-out
+helpers run in the context of the code that started them, so their spans end up in the same trace.
+
+OpenTelemetry is not required: without it :func:`get_tracer` returns None and no spans are made. Any tracer
+with ``start_as_current_span(name, attributes=...)`` returning spans with ``set_attribute()`` works.
+"""
+import threading
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import propagate, trace
+except ImportError:
+    propagate = trace = None
+
+ATTRIBUTE_OPERATION = u'ews.operation'
+ATTRIBUTE_MAILBOX = u'ews.mailbox'
+ATTRIBUTE_ITEMS = u'ews.items'
+ATTRIBUTE_RESPONSE_CODE = u'ews.response_code'
+ATTRIBUTE_RETRIES = u'ews.retries'
+
+_attempts = threading.local()
+
+
+def get_tracer(name=u'pyexchange'):
+    """ Returns OpenTelemetry's tracer for ``name``, or None if OpenTelemetry is not installed. """
+    if trace is None:
+        return None
+    return trace.get_tracer(name)
+
+
+@contextmanager
+def client_span(tracer, name, attributes):
+    """ Starts a client span named ``name`` as the current span, leaving out attributes that are None. """
+    kwargs = {u'attributes': dict((key, value) for key, value in attributes.items() if value is not None)}
+    if trace is not None:
+        kwargs[u'kind'] = trace.SpanKind.CLIENT
+
+    with tracer.start_as_current_span(name, **kwargs) as span:
+        yield span
+
+
+@contextmanager
+def counting_attempts():
+    """
+    Counts the HTTP requests made by this thread for one EWS call. Yields a one-element list holding the count,
+    updated by :func:`note_attempt`.
+    """
+    outer = getattr(_attempts, 'count', None)
+    _attempts.count = count = [0]
+    try:
+        yield count
+    finally:
+        _attempts.count = outer
+
+
+def note_attempt():
+    count = getattr(_attempts, 'count', None)
+    if count is not None:
+        count[0] += 1
+
+
+def inject_context(headers):
+    """ Adds the current trace context (``traceparent``, ...) to the request ``headers``. """
+    if propagate is not None:
+        propagate.inject(headers)
+
+
+def response_code(response_codes):
+    """ The code to report for a response: the first error in response order if there is one, else NoError. """
+    for code in response_codes:
+        if code != u'NoError':
+            return code
+    return u'NoError' if response_codes else None
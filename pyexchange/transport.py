@@ -0,0 +1,341 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+The HTTP stacks a connection can send its requests with. ::
+
+    connection = ExchangeConnection(url, auth=HTTPBasicAuth(username, password), transport=Urllib3Transport())
+
+:class:`RequestsTransport` is the default and the only one that can do NTLM and Kerberos, which authenticate
+each socket with a handshake. The others take auth that only sets headers, like ``HTTPBasicAuth`` or
+:class:`~pyexchange.connection.BearerAuth`:
+
+- :class:`Urllib3Transport` talks to urllib3's connection pool directly, skipping the per-request work of a
+  requests session.
+- :class:`AsyncTransport` sends requests with an ``httpx.AsyncClient`` (or anything with its ``post``) on an
+  event loop of its own, and offers :meth:`AsyncTransport.post_async` to code already running on an event loop.
+- :class:`~pyexchange.recording.RecordingTransport` and :class:`~pyexchange.recording.ReplayTransport` record
+  traffic to an archive and serve it back.
+
+Bearer tokens (:class:`~pyexchange.connection.BearerAuth`) are fetched again and the request sent once more
+when Exchange answers 401, by every transport.
+
+A transport's ``post`` returns an object with ``status_code``, ``headers``, ``content``, ``text``,
+``iter_content()``, ``raise_for_status()`` and ``close()`` (a ``requests`` response, or :class:`TransportResponse`),
+and raises :class:`TransportError` (or a ``requests`` exception) when there is no response.
+"""
+import functools
+import re
+import threading
+
+import requests
+import requests.adapters
+import urllib3
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+CHARSET_RE = re.compile(r'charset=([\w.-]+)', re.IGNORECASE)
+
+
+class TransportError(Exception):
+    """
+    The request could not be sent or got an HTTP error status; ``response`` is set in the second case. ``sent`` is
+    False when the connection could not even be made.
+    """
+
+    def __init__(self, message, response=None, sent=True):
+        super(TransportError, self).__init__(message)
+        self.response = response
+        self.sent = sent
+
+
+class TransportResponse(object):
+    """ A response from a transport other than :class:`RequestsTransport`. Give it ``content`` or ``chunks``. """
+
+    def __init__(self, status_code, headers=None, content=None, chunks=None, url=None, on_close=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.url = url
+        self._content = content
+        self._chunks = chunks
+        self._on_close = on_close
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b''.join(self._chunks or ())
+            self._chunks = None
+        return self._content
+
+    @property
+    def text(self):
+        match = CHARSET_RE.search(self.headers.get('Content-Type') or self.headers.get('content-type') or '')
+        return self.content.decode(match.group(1) if match else 'utf-8', 'replace')
+
+    def iter_content(self, chunk_size=None):
+        if self._content is not None or self._chunks is None:
+            yield self.content
+            return
+        chunks, self._chunks = self._chunks, None
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise TransportError(u'%d Error for url: %s' % (self.status_code, self.url), response=self)
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+
+class _HeaderRequest(object):
+    """ Just enough of a prepared request for ``requests`` auth objects that only set headers. """
+
+    def __init__(self, headers):
+        self.headers = headers
+
+    def register_hook(self, event, hook):
+        pass
+
+
+class Transport(object):
+    """ Sends the HTTP requests of a connection. """
+
+    def post(self, url, body, headers=None, timeout=30, stream=False):
+        raise NotImplementedError
+
+    def get(self, url, timeout=30):
+        """ A plain GET, used to open and authenticate sockets ahead of time. """
+        raise NotImplementedError
+
+    def after_fork(self):
+        """ Called in a forked child before its first request: drop anything shared with the parent. """
+        pass
+
+    def close(self):
+        pass
+
+    def _auth_headers(self, headers):
+        headers = dict(headers or {})
+        if getattr(self, 'auth', None) is not None:
+            self.auth(_HeaderRequest(headers))
+        return headers
+
+    def _send_authorized(self, send, headers):
+        """ Returns ``send(headers)`` with the auth headers added, once more with a new token after a 401. """
+        response = send(self._auth_headers(headers))
+        if response.status_code == 401 and hasattr(self.auth, 'token'):
+            response.close()
+            self.auth.token(refresh=True)
+            response = send(self._auth_headers(headers))
+        return response
+
+
+class RequestsTransport(Transport):
+    """ Sends requests through a ``requests`` session, with any ``requests`` auth (NTLM, Kerberos, ...). """
+
+    def __init__(self, auth=None, verify=True, pool_size=None):
+        self.auth = auth
+        self.verify = verify
+        self.pool_size = pool_size
+        self.session = None
+        self._lock = threading.Lock()
+
+    def build_session(self):
+        if self.session is not None:
+            return self.session
+
+        with self._lock:
+            if self.session is None:
+                session = requests.Session()
+                session.auth = self.auth
+                if self.pool_size:
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                self.session = session
+        return self.session
+
+    def post(self, url, body, headers=None, timeout=30, stream=False):
+        return self.build_session().post(url, data=body, headers=headers, verify=self.verify, timeout=timeout,
+                                         stream=stream)
+
+    def get(self, url, timeout=30):
+        return self.build_session().get(url, verify=self.verify, timeout=timeout)
+
+    def after_fork(self):
+        # The sockets belong to the parent; drop them without closing, which would end its TLS sessions too.
+        self.session = None
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+
+class Urllib3Transport(Transport):
+    """ Sends requests straight through a urllib3 pool of ``pool_size`` sockets per host. Header auth only. """
+
+    def __init__(self, auth=None, verify=True, pool_size=10):
+        self.auth = auth
+        self.verify = verify
+        self.pool_size = pool_size
+        self.pool = self._build_pool()
+
+    def _build_pool(self):
+        options = {'maxsize': self.pool_size, 'retries': False}
+        if self.verify is False:
+            options['cert_reqs'] = 'CERT_NONE'
+        else:
+            options['cert_reqs'] = 'CERT_REQUIRED'
+            if self.verify is not True:
+                options['ca_certs'] = self.verify
+        return urllib3.PoolManager(**options)
+
+    def _request(self, method, url, body, headers, timeout, stream):
+        try:
+            response = self.pool.request(method, url, body=body, headers=headers, timeout=timeout,
+                                         preload_content=not stream, decode_content=True)
+        except urllib3.exceptions.HTTPError as err:
+            raise TransportError(u'%s' % err, sent=not isinstance(err, urllib3.exceptions.ConnectTimeoutError))
+
+        if stream:
+            return TransportResponse(response.status, dict(response.headers), chunks=self._stream(response), url=url,
+                                     on_close=response.release_conn)
+        return TransportResponse(response.status, dict(response.headers), content=response.data, url=url)
+
+    def _stream(self, response):
+        try:
+            for chunk in response.stream(decode_content=True):
+                yield chunk
+        except urllib3.exceptions.HTTPError as err:
+            raise TransportError(u'%s' % err)
+
+    def post(self, url, body, headers=None, timeout=30, stream=False):
+        return self._send_authorized(lambda headers: self._request('POST', url, body, headers, timeout, stream), headers)
+
+    def get(self, url, timeout=30):
+        return self._send_authorized(lambda headers: self._request('GET', url, None, headers, timeout, False), None)
+
+    def after_fork(self):
+        self.pool = self._build_pool()
+
+    def close(self):
+        self.pool.clear()
+
+
+class AsyncTransport(Transport):
+    """
+    Sends requests with an async HTTP client: ``httpx.AsyncClient`` unless ``client_factory`` makes another
+    one with the same ``post``/``get``. Calls from threads run on an event loop thread owned by the transport, so
+    many threads share one client and its sockets; code on an event loop can await :meth:`post_async` instead.
+    Header auth only; responses are read in full.
+    """
+
+    def __init__(self, auth=None, verify=True, client_factory=None):
+        if asyncio is None:
+            raise ImportError(u'AsyncTransport needs Python 3')
+        if client_factory is None:
+            try:
+                import httpx
+            except ImportError:
+                raise ImportError(u'AsyncTransport needs httpx (pip install httpx) or a client_factory')
+            client_factory = lambda: httpx.AsyncClient(verify=verify)  # noqa: E731
+
+        self.auth = auth
+        self.client_factory = client_factory
+        self.client = None
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever)
+                thread.daemon = True
+                thread.start()
+        return self._loop
+
+    def _client(self):
+        if self.client is None:
+            self.client = self.client_factory()
+        return self.client
+
+    def post_async(self, url, body, headers=None, timeout=30):
+        """
+        Returns a future of the client's POST, for callers already on an event loop. As with :meth:`post`, a 401
+        gets the bearer token refreshed and the request sent once more; the refresh runs on the loop's default
+        executor, since fetching a token blocks.
+        """
+        loop = asyncio.get_event_loop()
+        result = loop.create_future()
+
+        def send():
+            request = self._client().post(url, content=body, headers=self._auth_headers(headers), timeout=timeout)
+            return asyncio.ensure_future(request, loop=loop)
+
+        def failed(future):
+            """ Passes a cancelled or failed step on to ``result``; True if it did. """
+            if result.done():
+                return True
+            if future.cancelled():
+                result.cancel()
+                return True
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+                return True
+            return False
+
+        def sent(future, retry=True):
+            if failed(future):
+                return
+            response = future.result()
+            if retry and response.status_code == 401 and hasattr(self.auth, 'token'):
+                refresh = loop.run_in_executor(None, functools.partial(self.auth.token, refresh=True))
+                refresh.add_done_callback(refreshed)
+            else:
+                result.set_result(response)
+
+        def refreshed(future):
+            if not failed(future):
+                send().add_done_callback(functools.partial(sent, retry=False))
+
+        send().add_done_callback(sent)
+        return result
+
+    def _run(self, request, url):
+        loop = self._start()
+        try:
+            response = asyncio.run_coroutine_threadsafe(request(), loop).result()
+        except Exception as err:
+            raise TransportError(u'%s' % err)
+        return TransportResponse(response.status_code, dict(response.headers), content=response.content, url=url)
+
+    def post(self, url, body, headers=None, timeout=30, stream=False):
+        return self._send_authorized(lambda headers: self._run(
+            lambda: self._client().post(url, content=body, headers=headers, timeout=timeout), url), headers)
+
+    def get(self, url, timeout=30):
+        return self._send_authorized(lambda headers: self._run(
+            lambda: self._client().get(url, headers=headers, timeout=timeout), url), None)
+
+    def after_fork(self):
+        self.client = None
+        self._loop = None
+
+    def close(self):
+        if self._loop is not None:
+            if self.client is not None and hasattr(self.client, 'aclose'):
+                asyncio.run_coroutine_threadsafe(self.client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+        self.client = None
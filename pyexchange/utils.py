@@ -4,8 +4,26 @@ Licensed under the Apache License, Version 2.0 (the "License");?you may not use
 
 Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 """
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+import six
 from pytz import utc
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # Python 2
+    from collections import MutableMapping
+
+try:
+    import contextvars
+except ImportError:  # Python 2
+    contextvars = None
+
 
 def convert_datetime_to_utc(datetime_to_convert):
     if datetime_to_convert is None:
@@ -15,3 +33,193 @@ def convert_datetime_to_utc(datetime_to_convert):
         return datetime_to_convert.astimezone(utc)
     else:
         return utc.localize(datetime_to_convert)
+
+
+class BackgroundCall(object):
+    """
+    Runs ``func(arg)`` on its own thread straight away; :meth:`result` waits for it and returns the value
+    (or re-raises the exception). The call sees a copy of the caller's context variables, so things like the
+    current tracing span carry over to the thread.
+    """
+
+    def __init__(self, func, arg):
+        self._func = func
+        self._arg = arg
+        self._context = contextvars.copy_context() if contextvars is not None else None
+        self._result = None
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            if self._context is not None:
+                self._result = self._context.run(self._func, self._arg)
+            else:
+                self._result = self._func(self._arg)
+        except Exception:
+            self._exc_info = sys.exc_info()
+
+    def result(self):
+        self._thread.join()
+        if self._exc_info is not None:
+            six.reraise(*self._exc_info)
+        return self._result
+
+
+def concurrent_map(func, iterable, max_workers=4):
+    """
+    Like ``map()``, but runs up to ``max_workers`` calls at once on background threads.
+
+    Results are yielded in the same order as ``iterable``, and no more than ``max_workers`` calls are ever
+    in flight, so memory stays bounded however long the input is. With ``max_workers=1`` everything runs
+    on the calling thread.
+    """
+    if max_workers is None or max_workers <= 1:
+        for arg in iterable:
+            yield func(arg)
+        return
+
+    pending = deque()
+    for arg in iterable:
+        pending.append(BackgroundCall(func, arg))
+        if len(pending) >= max_workers:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+class JSONFileStore(MutableMapping):
+    """
+    A small dict-like store persisted to a JSON file, for things like sync states and export checkpoints. ::
+
+        store = JSONFileStore('/var/lib/myapp/exchange-state.json')
+        store['inbox'] = {'offset': 200}
+
+    Every write rewrites the file atomically, so a crash never leaves a half-written file behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                content = f.read()
+            if content.strip():
+                self._data = json.loads(content)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._save()
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+            self._save()
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def _save(self):
+        tmp_path = u'%s.tmp' % self.path
+        with open(tmp_path, 'w') as f:
+            json.dump(self._data, f)
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmp_path, self.path)
+
+
+class ItemCache(object):
+    """
+    A size-bounded LRU cache of parsed items, for :class:`~pyexchange.exchange2010.Exchange2010Service`'s
+    ``item_cache``. ::
+
+        service = Exchange2010Service(connection, item_cache=ItemCache(max_size=5000, ttl=120))
+
+    Entries are keyed by mailbox and item id and remember the change key they were loaded with. For ``ttl``
+    seconds an entry is used as it is; after that the service asks Exchange for the item's current change key
+    (a cheap ``GetItem IdOnly``) and only loads the item again if it changed. The least recently used entries
+    are dropped once there are more than ``max_size``.
+
+    The service drops entries for the items it changes itself; pass notification events to
+    :meth:`invalidate_events` for changes made elsewhere.
+    """
+
+    def __init__(self, max_size=1000, ttl=300, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()  # (mailbox, id) -> [change_key, item, validated_at]
+        self._mailboxes = {}  # id -> mailboxes with an entry for it
+        self._lock = threading.Lock()
+
+    def get(self, mailbox, item_id):
+        """
+        Returns ``(change_key, item, fresh)`` for a cached item, or None. ``fresh`` is False once the entry is
+        older than ``ttl`` and has to be revalidated before use.
+        """
+        with self._lock:
+            entry = self._entries.pop((mailbox, item_id), None)
+            if entry is None:
+                return None
+            self._entries[(mailbox, item_id)] = entry
+
+        return entry[0], entry[1], self.clock() - entry[2] < self.ttl
+
+    def put(self, mailbox, item_id, change_key, item):
+        with self._lock:
+            self._entries.pop((mailbox, item_id), None)
+            self._entries[(mailbox, item_id)] = [change_key, item, self.clock()]
+            self._mailboxes.setdefault(item_id, set()).add(mailbox)
+            while len(self._entries) > self.max_size:
+                (evicted_mailbox, evicted_id), _ = self._entries.popitem(last=False)
+                self._forget(evicted_mailbox, evicted_id)
+
+    def revalidated(self, mailbox, item_id):
+        """ Marks an entry as checked against Exchange just now. """
+        with self._lock:
+            entry = self._entries.get((mailbox, item_id))
+            if entry is not None:
+                entry[2] = self.clock()
+
+    def invalidate(self, item_id, mailbox=None):
+        """ Drops ``item_id`` from ``mailbox``, or from every mailbox if none is given. """
+        with self._lock:
+            mailboxes = list(self._mailboxes.get(item_id, ())) if mailbox is None else [mailbox]
+            for each in mailboxes:
+                if self._entries.pop((each, item_id), None) is not None:
+                    self._forget(each, item_id)
+
+    def _forget(self, mailbox, item_id):
+        mailboxes = self._mailboxes.get(item_id)
+        if mailboxes is not None:
+            mailboxes.discard(mailbox)
+            if not mailboxes:
+                del self._mailboxes[item_id]
+
+    def invalidate_events(self, events):
+        """ Drops the items named in notification events (see :func:`~pyexchange.exchange2010.parse_notification`). """
+        for event in events:
+            for item_id in (event.item_id, event.old_item_id):
+                if item_id is not None:
+                    self.invalidate(item_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._mailboxes.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -1715,3 +1715,317 @@ LIST_EVENTS_RESPONSE = u"""<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/
     </m:FindItemResponse>
   </s:Body>
 </s:Envelope>"""
+
+
+FIND_ITEM_PAGE_RESPONSE = u"""<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:FindItemResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+                        xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:FindItemResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:RootFolder IndexedPagingOffset="{next_offset}" TotalItemsInView="{total}" IncludesLastItemInRange="{last}">
+            <t:Items>{items}</t:Items>
+          </m:RootFolder>
+        </m:FindItemResponseMessage>
+      </m:ResponseMessages>
+    </m:FindItemResponse>
+  </s:Body>
+</s:Envelope>"""
+
+MESSAGE_ID_ONLY = u"""<t:Message><t:ItemId Id="{id}" ChangeKey="ck-{id}"/></t:Message>"""
+
+MESSAGE_ID_RECEIVED = u"""<t:Message><t:ItemId Id="{id}" ChangeKey="ck-{id}"/><t:DateTimeReceived>{received}</t:DateTimeReceived></t:Message>"""
+
+GET_ITEM_SERVER_BUSY_MESSAGE = u"""<m:GetItemResponseMessage ResponseClass="Error">
+  <m:MessageText>The server cannot service this request right now. Try again later.</m:MessageText>
+  <m:ResponseCode>ErrorServerBusy</m:ResponseCode>
+  <m:DescriptiveLinkKey>0</m:DescriptiveLinkKey>
+  <m:Items/>
+</m:GetItemResponseMessage>"""
+
+GET_ITEM_MULTIPLE_RESPONSE = u"""<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:GetItemResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+                       xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>{messages}</m:ResponseMessages>
+    </m:GetItemResponse>
+  </s:Body>
+</s:Envelope>"""
+
+GET_ITEM_MIME_MESSAGE = u"""<m:GetItemResponseMessage ResponseClass="Success">
+  <m:ResponseCode>NoError</m:ResponseCode>
+  <m:Items>
+    <t:Message>
+      <t:MimeContent CharacterSet="UTF-8">{mime}</t:MimeContent>
+      <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+    </t:Message>
+  </m:Items>
+</m:GetItemResponseMessage>"""
+
+GET_ITEM_NOT_FOUND_MESSAGE = u"""<m:GetItemResponseMessage ResponseClass="Error">
+  <m:MessageText>The specified object was not found in the store.</m:MessageText>
+  <m:ResponseCode>ErrorItemNotFound</m:ResponseCode>
+  <m:DescriptiveLinkKey>0</m:DescriptiveLinkKey>
+  <m:Items/>
+</m:GetItemResponseMessage>"""
+
+SYNC_FOLDER_ITEMS_RESPONSE = u"""<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:SyncFolderItemsResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+                               xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:SyncFolderItemsResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:SyncState>{sync_state}</m:SyncState>
+          <m:IncludesLastItemInRange>{last}</m:IncludesLastItemInRange>
+          <m:Changes>{changes}</m:Changes>
+        </m:SyncFolderItemsResponseMessage>
+      </m:ResponseMessages>
+    </m:SyncFolderItemsResponse>
+  </s:Body>
+</s:Envelope>"""
+
+SYNC_CREATE_MESSAGE = u"""<t:Create>
+  <t:Message>
+    <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+    <t:Subject>{subject}</t:Subject>
+    <t:IsRead>false</t:IsRead>
+  </t:Message>
+</t:Create>"""
+
+SYNC_UPDATE_MESSAGE = u"""<t:Update>
+  <t:Message>
+    <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+    <t:Subject>{subject}</t:Subject>
+  </t:Message>
+</t:Update>"""
+
+SYNC_CREATE_CONTACT = u"""<t:Create>
+  <t:Contact>
+    <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+    <t:DisplayName>{name}</t:DisplayName>
+  </t:Contact>
+</t:Create>"""
+
+SYNC_CREATE_TASK = u"""<t:Create>
+  <t:Task>
+    <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+    <t:Subject>{subject}</t:Subject>
+  </t:Task>
+</t:Create>"""
+
+SYNC_DELETE_ITEM = u"""<t:Delete><t:ItemId Id="{id}" ChangeKey="ck-{id}"/></t:Delete>"""
+
+SYNC_READ_FLAG_CHANGE = u"""<t:ReadFlagChange><t:ItemId Id="{id}" ChangeKey="ck-{id}"/><t:IsRead>{is_read}</t:IsRead></t:ReadFlagChange>"""
+
+CONTACT_ITEM = u"""<t:Contact>
+  <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+  <t:DisplayName>{name}</t:DisplayName>
+</t:Contact>"""
+
+TASK_LIST_ITEM = u"""<t:Task>
+  <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+  <t:ParentFolderId Id="tasks-folder" ChangeKey="AQAAAA=="/>
+  <t:Subject>{subject}</t:Subject>
+  <t:DateTimeCreated>2014-05-01T09:30:00Z</t:DateTimeCreated>
+  <t:DueDate>2014-05-14T00:00:00-07:00</t:DueDate>
+  <t:IsComplete>false</t:IsComplete>
+  <t:PercentComplete>50</t:PercentComplete>
+  <t:StartDate>2014-05-02T00:00:00.000Z</t:StartDate>
+  <t:Status>InProgress</t:Status>
+</t:Task>"""
+
+GET_ITEM_TASK_BODY_MESSAGE = u"""<m:GetItemResponseMessage ResponseClass="Success">
+  <m:ResponseCode>NoError</m:ResponseCode>
+  <m:Items>
+    <t:Task>
+      <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+      <t:Body BodyType="Text">Body of {id}</t:Body>
+    </t:Task>
+  </m:Items>
+</m:GetItemResponseMessage>"""
+
+SYNC_FOLDER_HIERARCHY_RESPONSE = u"""<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:SyncFolderHierarchyResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+                                   xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:SyncFolderHierarchyResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:SyncState>{sync_state}</m:SyncState>
+          <m:IncludesLastFolderInRange>{last}</m:IncludesLastFolderInRange>
+          <m:Changes>{changes}</m:Changes>
+        </m:SyncFolderHierarchyResponseMessage>
+      </m:ResponseMessages>
+    </m:SyncFolderHierarchyResponse>
+  </s:Body>
+</s:Envelope>"""
+
+SYNC_FOLDER_CHANGE = u"""<t:{change}>
+  <t:{type}>
+    <t:FolderId Id="{id}" ChangeKey="ck-{id}"/>
+    <t:ParentFolderId Id="{parent}" ChangeKey="ck-{parent}"/>
+    <t:FolderClass>IPF.Note</t:FolderClass>
+    <t:DisplayName>{name}</t:DisplayName>
+  </t:{type}>
+</t:{change}>"""
+
+SYNC_FOLDER_DELETE = u"""<t:Delete><t:FolderId Id="{id}" ChangeKey="ck-{id}"/></t:Delete>"""
+
+FOLDER_OPERATION_RESPONSE = u"""<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:{operation}Response xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+                           xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>{messages}</m:ResponseMessages>
+    </m:{operation}Response>
+  </s:Body>
+</s:Envelope>"""
+
+FOLDER_OPERATION_MESSAGE = u"""<m:{operation}ResponseMessage ResponseClass="{response_class}">
+  <m:ResponseCode>{code}</m:ResponseCode>
+  <m:Folders>{folders}</m:Folders>
+</m:{operation}ResponseMessage>"""
+
+FOLDER_ID_ONLY = u"""<t:Folder><t:FolderId Id="{id}" ChangeKey="ck-{id}"/></t:Folder>"""
+
+PUSH_NOTIFICATION = u"""<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"
+               xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+               xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+  <soap:Header>
+    <t:RequestServerVersion Version="Exchange2010_SP2"/>
+  </soap:Header>
+  <soap:Body>
+    <m:SendNotification>
+      <m:ResponseMessages>
+        <m:SendNotificationResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:Notification>
+            <t:SubscriptionId>{subscription_id}</t:SubscriptionId>
+            <t:PreviousWatermark>{previous_watermark}</t:PreviousWatermark>
+            <t:MoreEvents>false</t:MoreEvents>
+            {events}
+          </m:Notification>
+        </m:SendNotificationResponseMessage>
+      </m:ResponseMessages>
+    </m:SendNotification>
+  </soap:Body>
+</soap:Envelope>"""
+
+PUSH_ITEM_EVENT = u"""<t:{type}>
+  <t:Watermark>{watermark}</t:Watermark>
+  <t:TimeStamp>2014-05-14T10:00:00Z</t:TimeStamp>
+  <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+  <t:ParentFolderId Id="inbox-id" ChangeKey="AQAAAA=="/>
+</t:{type}>"""
+
+PUSH_STATUS_EVENT = u"""<t:StatusEvent><t:Watermark>{watermark}</t:Watermark></t:StatusEvent>"""
+
+PUSH_MOVED_EVENT = u"""<t:MovedEvent>
+  <t:Watermark>{watermark}</t:Watermark>
+  <t:TimeStamp>2014-05-14T10:05:00Z</t:TimeStamp>
+  <t:ItemId Id="{id}" ChangeKey="ck-{id}"/>
+  <t:ParentFolderId Id="archive-id" ChangeKey="AQAAAA=="/>
+  <t:OldItemId Id="old-{id}" ChangeKey="ck-old-{id}"/>
+  <t:OldParentFolderId Id="inbox-id" ChangeKey="AQAAAA=="/>
+</t:MovedEvent>"""
+
+PUSH_FOLDER_EVENT = u"""<t:{type}>
+  <t:Watermark>{watermark}</t:Watermark>
+  <t:TimeStamp>2014-05-14T10:06:00Z</t:TimeStamp>
+  <t:FolderId Id="{id}" ChangeKey="ck-{id}"/>
+  <t:ParentFolderId Id="root-id" ChangeKey="AQAAAA=="/>
+</t:{type}>"""
+
+SUBSCRIBE_RESPONSE = u"""<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:SubscribeResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+                         xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:SubscribeResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:SubscriptionId>{id}</m:SubscriptionId>
+          {watermark}
+        </m:SubscribeResponseMessage>
+      </m:ResponseMessages>
+    </m:SubscribeResponse>
+  </s:Body>
+</s:Envelope>"""
+
+GET_EVENTS_RESPONSE = u"""<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:GetEventsResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+                         xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:GetEventsResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:Notification>
+            <t:SubscriptionId>{subscription_id}</t:SubscriptionId>
+            <t:PreviousWatermark>{previous_watermark}</t:PreviousWatermark>
+            <t:MoreEvents>{more_events}</t:MoreEvents>
+            {events}
+          </m:Notification>
+        </m:GetEventsResponseMessage>
+      </m:ResponseMessages>
+    </m:GetEventsResponse>
+  </s:Body>
+</s:Envelope>"""
+
+SUBSCRIPTION_ERROR_RESPONSE = u"""<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:{operation}Response xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+                           xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:{operation}ResponseMessage ResponseClass="Error">
+          <m:MessageText>The subscription is no longer valid.</m:MessageText>
+          <m:ResponseCode>{code}</m:ResponseCode>
+          <m:DescriptiveLinkKey>0</m:DescriptiveLinkKey>
+          {error_ids}
+        </m:{operation}ResponseMessage>
+      </m:ResponseMessages>
+    </m:{operation}Response>
+  </s:Body>
+</s:Envelope>"""
+
+STREAMING_EVENTS_RESPONSE = u"""<?xml version="1.0" encoding="utf-8"?>
+<soap11:Envelope xmlns:soap11="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap11:Body>
+    <m:GetStreamingEventsResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+                                  xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:GetStreamingEventsResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:Notifications>{notifications}</m:Notifications>
+          <m:ConnectionStatus>{status}</m:ConnectionStatus>
+        </m:GetStreamingEventsResponseMessage>
+      </m:ResponseMessages>
+    </m:GetStreamingEventsResponse>
+  </soap11:Body>
+</soap11:Envelope>"""
+
+STREAMING_NOTIFICATION = u"""<m:Notification>
+  <t:SubscriptionId>{subscription_id}</t:SubscriptionId>
+  {events}
+</m:Notification>"""
+
+GET_ITEM_SUCCESS_MESSAGE = u"""<m:GetItemResponseMessage ResponseClass="Success">
+  <m:ResponseCode>NoError</m:ResponseCode>
+  <m:Items>{items}</m:Items>
+</m:GetItemResponseMessage>"""
+
+
+class FakeClock(object):
+  """ A clock for the ``clock`` and ``sleep`` arguments that only moves when a test (or ``sleep``) moves it. """
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.now += seconds
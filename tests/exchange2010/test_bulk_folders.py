@@ -0,0 +1,145 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import unittest
+import httpretty
+from lxml import etree
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exceptions import FailedExchangeException
+from pyexchange.exchange2010 import soap_request
+from pyexchange.testing import FakeExchangeServer
+from pytest import raises
+
+from .fixtures import *
+
+
+def message(operation, code=u'NoError', folder_id=None):
+  return FOLDER_OPERATION_MESSAGE.format(
+    operation=operation, response_class=u'Success' if code == u'NoError' else u'Error', code=code,
+    folders=FOLDER_ID_ONLY.format(id=folder_id) if folder_id else u'',
+  )
+
+
+class FakeFolderStore(FakeExchangeServer):
+  """ Creates, deletes and moves folders; names starting with "bad" and ids starting with "missing" fail. """
+
+  def __init__(self):
+    super(FakeFolderStore, self).__init__()
+    self.requests = []
+
+  def handle(self, body):
+    body = etree.XML(body)
+    operation = etree.QName(body.xpath(u'//s:Body/*', namespaces=soap_request.NAMESPACES)[0]).localname
+    with self._lock:
+      self.requests.append(body)
+
+    messages = []
+    if operation == u'CreateFolder':
+      parent_id = body.xpath(u'//m:ParentFolderId/*/@Id', namespaces=soap_request.NAMESPACES)[0]
+      for name in body.xpath(u'//m:Folders/*/t:DisplayName/text()', namespaces=soap_request.NAMESPACES):
+        if name.startswith(u'bad'):
+          messages.append(message(operation, code=u'ErrorFolderExists'))
+        else:
+          messages.append(message(operation, folder_id=u'%s/%s' % (parent_id, name)))
+    else:
+      for folder_id in body.xpath(u'//m:FolderIds/t:FolderId/@Id', namespaces=soap_request.NAMESPACES):
+        if folder_id.startswith(u'missing'):
+          messages.append(message(operation, code=u'ErrorFolderNotFound'))
+        elif operation == u'MoveFolder':
+          messages.append(message(operation, folder_id=u'moved-' + folder_id))
+        else:
+          messages.append(message(operation))
+
+    return 200, FOLDER_OPERATION_RESPONSE.format(operation=operation, messages=u''.join(messages))
+
+
+class Test_BulkFolderOperations(unittest.TestCase):
+
+  def _service(self, url=FAKE_EXCHANGE_URL, batch_size=1000):
+    return Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(url=url, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD),
+      batch_size=batch_size,
+    )
+
+  def test_bulk_create_level_by_level(self):
+    store = FakeFolderStore()
+    tree = {
+      u'Projects': {u'Alpha': None, u'Beta': {u'Specs': None}},
+      u'Archive': None,
+      u'HR': {u'Onboarding': None},
+    }
+
+    with store as url:
+      results = self._service(url).folder().bulk_create(tree, parent_id=u'root-id')
+
+    assert results[u'/Projects/Beta/Specs'].id == u'root-id/Projects/Beta/Specs'
+    assert all(r.success for r in results.values())
+    assert len(results) == 7
+    # One request for the top level, one per parent below it.
+    assert len(store.requests) == 1 + 2 + 1
+
+  @httpretty.activate
+  def test_bulk_create_skips_children_of_failed_folders(self):
+    store = FakeFolderStore()
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=store)
+
+    results = self._service().folder().bulk_create({u'bad': {u'Child': {u'Grandchild': None}}, u'Good': None},
+                                                   parent_id=u'inbox', max_workers=1)
+
+    assert results[u'/bad'].response_code == u'ErrorFolderExists'
+    assert results[u'/Good'].success
+    assert not results[u'/bad/Child'].success
+    assert not results[u'/bad/Child/Grandchild'].success
+    assert len(store.requests) == 1
+
+  @httpretty.activate
+  def test_bulk_create_splits_by_batch_size(self):
+    store = FakeFolderStore()
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=store)
+
+    tree = dict((u'Folder %d' % i, None) for i in range(5))
+    results = self._service().folder().bulk_create(tree, parent_id=u'inbox', max_workers=1, batch_size=2)
+
+    assert len(results) == 5
+    assert len(store.requests) == 3
+
+  @httpretty.activate
+  def test_delete_folders(self):
+    store = FakeFolderStore()
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=store)
+
+    folder = self._service().folder().new_folder(display_name=u'x')
+    folder._id = u'folder-1'
+    results = self._service().folder().delete_folders([folder, u'missing-2', u'folder-3'])
+
+    assert [(r.id, r.success) for r in results] == [(u'folder-1', True), (u'missing-2', False), (u'folder-3', True)]
+    assert results[1].response_code == u'ErrorFolderNotFound'
+    assert folder.id is None
+    assert len(store.requests) == 1
+
+  @httpretty.activate
+  def test_move_folders(self):
+    store = FakeFolderStore()
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=store)
+
+    folder = self._service().folder().new_folder(display_name=u'x')
+    folder._id = u'folder-1'
+    results = self._service().folder().move_folders([folder, u'missing-2'], u'archive-id', batch_size=1)
+
+    assert results[0].id == u'moved-folder-1'
+    assert not results[1].success
+    assert folder.id == u'moved-folder-1'
+    assert folder.parent_id == u'archive-id'
+    assert len(store.requests) == 2
+
+  @httpretty.activate
+  def test_missing_response_messages_fail(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=FOLDER_OPERATION_RESPONSE.format(
+      operation=u'DeleteFolder', messages=message(u'DeleteFolder')))
+
+    with raises(FailedExchangeException):
+      self._service().folder().delete_folders([u'folder-1', u'folder-2'])
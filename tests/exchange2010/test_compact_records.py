@@ -0,0 +1,85 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import re
+import unittest
+import httpretty
+import six
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exchange2010 import CalendarEventRecord, ContactRecord, TaskRecord
+
+from .fixtures import *
+from .test_list_tasks import FakeTaskFolder
+
+
+def contact_folder(request, uri, headers):
+  offset = int(re.search(u'Offset="(\\d+)"', request.body.decode('utf-8')).group(1))
+  ids = range(offset, min(offset + 2, 3))
+  return 200, headers, FIND_ITEM_PAGE_RESPONSE.format(
+    next_offset=offset + len(ids), total=3, last=u'true' if offset + len(ids) >= 3 else u'false',
+    items=u''.join(CONTACT_ITEM.format(id=u'c%d' % i, name=u'Contact %d' % i) for i in ids),
+  )
+
+
+class Test_CompactRecords(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      ),
+      batch_size=2,
+    )
+
+  @httpretty.activate
+  def test_contacts(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=contact_folder)
+
+    contacts = list(self.service.contacts().get_all_contacts(compact=True).items)
+
+    assert [(c.id, c.change_key, c.display_name) for c in contacts] == [
+      (u'c0', u'ck-c0', u'Contact 0'), (u'c1', u'ck-c1', u'Contact 1'), (u'c2', u'ck-c2', u'Contact 2'),
+    ]
+    assert all(isinstance(c, ContactRecord) for c in contacts)
+
+  @httpretty.activate
+  def test_tasks_with_bodies(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=FakeTaskFolder(3))
+
+    tasks = list(self.service.tasks().get_all_tasks(load_bodies=True, compact=True).items)
+
+    assert [t.subject for t in tasks] == [u'Task 0', u'Task 1', u'Task 2']
+    assert [t.text_body for t in tasks] == [u'Body of t0', u'Body of t1', u'Body of t2']
+    assert all(isinstance(t, TaskRecord) for t in tasks)
+
+  @httpretty.activate
+  def test_events(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=LIST_EVENTS_RESPONSE)
+
+    event_list = self.service.calendar().list_events(start=TEST_EVENT_LIST_START, end=TEST_EVENT_LIST_END, compact=True)
+
+    assert event_list.count == 3
+    assert event_list.events[0].subject == u'Event Subject 1'
+    assert event_list.event_ids == [e.id for e in event_list.events]
+    assert all(isinstance(e, CalendarEventRecord) for e in event_list.events)
+
+  @httpretty.activate
+  def test_records_are_small_and_hold_no_xml(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=contact_folder)
+
+    contact = next(iter(self.service.contacts().get_all_contacts(compact=True).items))
+
+    assert not hasattr(contact, '__dict__')
+    # lxml "smart" strings would keep the whole response tree alive
+    assert type(contact.id) is six.text_type
+    assert type(contact.display_name) is six.text_type
+    with self.assertRaises(AttributeError):
+      contact.display_name = u'Changed'
@@ -0,0 +1,85 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import unittest
+from datetime import datetime
+import httpretty
+from pytz import utc
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exchange2010 import soap_request
+from pyexchange.testing import FakeExchangeServer, FakeMailbox
+
+from .fixtures import *
+
+
+class Test_Compression(unittest.TestCase):
+
+  def setUp(self):
+    self.mailbox = FakeMailbox(messages=20, body_size=2000)
+    self.server = FakeExchangeServer(self.mailbox, compress=True)
+    self.server.start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def _service(self, **kwargs):
+    compress_requests = kwargs.pop('compress_requests', None)
+    connection = ExchangeNTLMAuthConnection(url=self.server.url, username=FAKE_EXCHANGE_USERNAME,
+                                            password=FAKE_EXCHANGE_PASSWORD, compress_requests=compress_requests)
+    return Exchange2010Service(connection=connection, batch_size=5, **kwargs)
+
+  def test_responses_are_compressed(self):
+    mails = list(self._service().mail().list_mails().items)
+
+    assert len(mails) == 20
+    assert self.server.stats[u'gzip:response'] == self.server.stats[u'FindItem'] + self.server.stats[u'GetItem']
+
+  def test_large_requests_are_compressed(self):
+    service = self._service(compress_requests=1024)
+    event = service.calendar().new_event(subject=u'planning', sensitivity=u'Normal', text_body=u'agenda ' * 400,
+                                         start=datetime(2050, 1, 1, 9, tzinfo=utc), end=datetime(2050, 1, 1, 10, tzinfo=utc))
+    event.create()
+    service.mail().get_mail(self.mailbox.folder_items(u'inbox')[0].id)
+
+    assert self.server.stats[u'gzip:request'] == 1
+    assert self.mailbox.get(event.id).fields[u'Body'] == u'agenda ' * 400
+
+  def test_streamed_responses(self):
+    calls = []
+    service = self._service(stream_responses=True, metrics=calls.append)
+    mails = list(service.mail().list_mails().items)
+
+    assert [mail.subject for mail in mails] == [item.fields[u'Subject'] for item in self.mailbox.folder_items(u'inbox')]
+    assert all(u'parse' not in call.phases and call.response_bytes > 0 for call in calls)
+
+
+class Test_RequestHeaders(unittest.TestCase):
+
+  def setUp(self):
+    self.service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(
+      url=FAKE_EXCHANGE_URL, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD))
+
+  @httpretty.activate
+  def test_caller_headers_are_kept(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=GET_ITEM_MULTIPLE_RESPONSE.format(
+      messages=GET_ITEM_SUCCESS_MESSAGE.format(items=CONTACT_ITEM.format(id=u'a', name=u'A'))))
+
+    self.service.send(soap_request.get_item(exchange_id=u'a'), headers={u'X-Request-Id': u'42'})
+
+    headers = httpretty.last_request().headers
+    assert headers[u'X-Request-Id'] == u'42'
+    assert headers[u'Accept-Encoding'] == u'gzip, deflate'
+    assert headers[u'Accept'] == u'text/xml'
+
+  @httpretty.activate
+  def test_streamed_response_with_control_characters(self):
+    contact = CONTACT_ITEM.format(id=u'a', name=u'A\x0bB')
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=GET_ITEM_MULTIPLE_RESPONSE.format(
+      messages=GET_ITEM_SUCCESS_MESSAGE.format(items=contact)))
+
+    self.service.stream_responses = True
+    assert self.service.contacts().get_contact(u'a').display_name == u'AB'
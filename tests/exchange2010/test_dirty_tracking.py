@@ -0,0 +1,79 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import unittest
+from httpretty import HTTPretty, httprettified
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+
+from .fixtures import *  # noqa
+
+
+class Test_TrackingChanges(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(url=FAKE_EXCHANGE_URL, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD))
+
+  @httprettified
+  def setUp(self):
+    HTTPretty.register_uri(HTTPretty.POST, FAKE_EXCHANGE_URL, body=GET_ITEM_RESPONSE.encode('utf-8'), content_type='text/xml; charset=utf-8')
+    self.event = self.service.calendar().get_event(id=TEST_EVENT.id)
+
+  def test_loaded_event_is_clean(self):
+    assert self.event._dirty_attributes == set()
+
+  def test_changes_are_kept_per_instance(self):
+    first = self.service.calendar().event(subject=u'first')
+    second = self.service.calendar().event(subject=u'second')
+
+    first.location = u'somewhere else'
+    first.add_attendees([u'someone@example.com'])
+
+    assert first._dirty_attributes == set([u'location', u'attendees'])
+    assert second._dirty_attributes == set()
+    assert second.attendees == []
+
+  def test_setting_the_same_value_is_not_a_change(self):
+    self.event.subject = TEST_EVENT.subject
+    assert self.event._dirty_attributes == set()
+
+  def test_setting_the_original_value_again_undoes_the_change(self):
+    self.event.subject = TEST_EVENT_UPDATED.subject
+    assert self.event._is_dirty(u'subject')
+
+    self.event.subject = TEST_EVENT.subject
+    assert not self.event._is_dirty(u'subject')
+
+  def test_changes_in_place_stay_changed(self):
+    self.event.remove_attendees([u'nobody@example.com'])
+    assert self.event._dirty_attributes == set([u'attendees'])
+
+  def test_lists_changed_in_place_and_assigned_are_changed(self):
+    self.event._update_properties({u'tags': [u'a']})
+
+    tags = self.event.tags
+    tags.append(u'b')
+    self.event.tags = tags
+
+    assert self.event._dirty_attributes == set([u'tags'])
+
+  @httprettified
+  def test_update_only_sends_changed_fields(self):
+    HTTPretty.register_uri(HTTPretty.POST, FAKE_EXCHANGE_URL, responses=[
+      HTTPretty.Response(body=GET_ITEM_RESPONSE_ID_ONLY.encode('utf-8'), status=200, content_type='text/xml; charset=utf-8'),
+      HTTPretty.Response(body=UPDATE_ITEM_RESPONSE.encode('utf-8'), status=200, content_type='text/xml; charset=utf-8'),
+    ])
+
+    self.event.subject = TEST_EVENT.subject
+    self.event.location = TEST_EVENT_UPDATED.location
+    self.event.update()
+
+    body = HTTPretty.last_request.body.decode('utf-8')
+    assert u'calendar:Location' in body
+    assert u'item:Subject' not in body
+    assert self.event._dirty_attributes == set()
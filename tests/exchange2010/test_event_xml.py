@@ -0,0 +1,66 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import unittest
+import httpretty
+from pytest import raises
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exchange2010 import soap_request
+
+from .fixtures import *
+
+
+def service_keeping(event_xml):
+  return Exchange2010Service(
+    connection=ExchangeNTLMAuthConnection(
+      url=FAKE_EXCHANGE_URL,
+      username=FAKE_EXCHANGE_USERNAME,
+      password=FAKE_EXCHANGE_PASSWORD,
+    ),
+    event_xml=event_xml,
+  )
+
+
+def subjects(xml):
+  return xml.xpath(u'//t:CalendarItem/t:Subject/text()', namespaces=soap_request.NAMESPACES)
+
+
+class Test_KeepingEventXML(unittest.TestCase):
+
+  @httpretty.activate
+  def test_tree_is_kept_by_default(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=GET_ITEM_RESPONSE)
+
+    event = service_keeping(u'tree').calendar().get_event(id=TEST_EVENT.id)
+
+    assert subjects(event.xml)[0] == event.subject
+
+  @httpretty.activate
+  def test_nothing_is_kept(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=GET_ITEM_RESPONSE)
+
+    event = service_keeping(u'none').calendar().get_event(id=TEST_EVENT.id)
+
+    assert event.xml is None
+    assert event.subject == TEST_EVENT.subject
+
+  @httpretty.activate
+  def test_compressed_xml_is_parsed_on_demand(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=LIST_EVENTS_RESPONSE)
+
+    event_list = service_keeping(u'compressed').calendar().list_events(
+      start=TEST_EVENT_LIST_START, end=TEST_EVENT_LIST_END,
+    )
+    event = event_list.events[0]
+
+    assert isinstance(event._xml_compressed, bytes)
+    assert event._xml is None
+    assert subjects(event.xml) == [u'Event Subject 1']
+
+  def test_unknown_mode(self):
+    with raises(ValueError):
+      service_keeping(u'everything')
@@ -0,0 +1,249 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import base64
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import httpretty
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exceptions import ExchangeServerBusyException
+from pyexchange.export import EMLSink, MaildirSink, MboxSink, iter_base64_decode
+from pyexchange.utils import JSONFileStore
+from pytest import raises
+
+from pyexchange import testing
+
+from .fixtures import *
+
+
+def mime_for(item_id):
+  return (u'Subject: message %s\r\n\r\nFrom the archive\r\nbody of %s\r\n' % (item_id, item_id)).encode('utf-8')
+
+
+class FakeMailbox(object):
+  """ Answers FindItem/GetItem requests for a folder holding ``ids``, two per page. """
+
+  def __init__(self, ids, missing=(), busy=()):
+    self.ids = ids
+    self.missing = missing
+    self.busy = busy
+    self.requests = []
+    self.on_page = None
+
+  def received(self, item_id):
+    return u'2050-01-01T00:00:%02dZ' % int(item_id[2:])
+
+  def __call__(self, request, uri, headers):
+    body = request.body.decode('utf-8')
+    self.requests.append(body)
+
+    if u'FindItem' in body:
+      offset = int(re.search(u'Offset="(\\d+)"', body).group(1))
+      since = re.search(u'Constant Value="([^"]+)"', body)
+      ids = [i for i in self.ids if since is None or self.received(i) >= since.group(1)]
+      page = ids[offset:offset + 2]
+      if self.on_page:
+        self.on_page(page)
+      return 200, headers, FIND_ITEM_PAGE_RESPONSE.format(
+        next_offset=offset + len(page), total=len(ids),
+        last=u'true' if offset + len(page) >= len(ids) else u'false',
+        items=u''.join(MESSAGE_ID_RECEIVED.format(id=i, received=self.received(i)) for i in page),
+      )
+
+    messages = []
+    for item_id in re.findall(u'ItemId Id="([^"]+)"', body):
+      if item_id in self.missing:
+        messages.append(GET_ITEM_NOT_FOUND_MESSAGE)
+      elif item_id in self.busy:
+        messages.append(GET_ITEM_SERVER_BUSY_MESSAGE)
+      else:
+        mime = base64.b64encode(mime_for(item_id)).decode('ascii')
+        messages.append(GET_ITEM_MIME_MESSAGE.format(id=item_id, mime=mime))
+    return 200, headers, GET_ITEM_MULTIPLE_RESPONSE.format(messages=u''.join(messages))
+
+
+class Test_DecodingBase64(unittest.TestCase):
+
+  def test_decodes_in_small_chunks(self):
+    data = os.urandom(1000)
+    encoded = base64.b64encode(data).decode('ascii')
+    assert b''.join(iter_base64_decode(encoded, chunk_size=7)) == data
+
+  def test_ignores_line_breaks(self):
+    data = os.urandom(300)
+    encoded = base64.encodebytes(data).decode('ascii') if hasattr(base64, 'encodebytes') else base64.encodestring(data)
+    assert b''.join(iter_base64_decode(encoded, chunk_size=10)) == data
+
+  def test_empty_content(self):
+    assert list(iter_base64_decode(None)) == []
+
+
+class Test_ExportingMail(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      )
+    )
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  @httpretty.activate
+  def test_export_to_eml(self):
+    mailbox = FakeMailbox([u'id1', u'id2', u'id3'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    sink = EMLSink(self.directory)
+    assert self.service.mail().export(u'inbox', sink, chunk_size=2, max_workers=1) == 3
+
+    for item_id in (u'id1', u'id2', u'id3'):
+      with open(os.path.join(self.directory, sink.filename_for(item_id)), 'rb') as f:
+        assert f.read() == mime_for(item_id)
+
+  @httpretty.activate
+  def test_find_item_is_id_only_and_sorted(self):
+    mailbox = FakeMailbox([u'id1'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    self.service.mail().export(u'inbox', EMLSink(self.directory), max_workers=1)
+
+    assert u'<t:BaseShape>IdOnly</t:BaseShape>' in mailbox.requests[0]
+    assert u'item:DateTimeReceived' in mailbox.requests[0]
+    assert u'<t:IncludeMimeContent>true</t:IncludeMimeContent>' in mailbox.requests[1]
+
+  @httpretty.activate
+  def test_export_to_mbox_quotes_from_lines(self):
+    mailbox = FakeMailbox([u'id1', u'id2'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    path = os.path.join(self.directory, u'archive.mbox')
+    with MboxSink(path) as sink:
+      self.service.mail().export(u'inbox', sink, max_workers=1)
+
+    with open(path, 'rb') as f:
+      content = f.read()
+
+    assert content.count(b'\nFrom MAILER-DAEMON') + content.startswith(b'From MAILER-DAEMON') == 2
+    assert b'\n>From the archive\n' in content
+    assert b'\r' not in content
+
+  @httpretty.activate
+  def test_export_to_maildir(self):
+    mailbox = FakeMailbox([u'id1', u'id2', u'id3'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    self.service.mail().export(u'inbox', MaildirSink(self.directory), chunk_size=1, max_workers=1)
+
+    assert len(os.listdir(os.path.join(self.directory, u'new'))) == 3
+    assert os.listdir(os.path.join(self.directory, u'tmp')) == []
+
+  @httpretty.activate
+  def test_missing_messages_are_skipped(self):
+    mailbox = FakeMailbox([u'id1', u'id2'], missing=[u'id2'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    assert self.service.mail().export(u'inbox', EMLSink(self.directory), max_workers=1) == 1
+
+  @httpretty.activate
+  def test_other_errors_fail_the_export(self):
+    mailbox = FakeMailbox([u'id1', u'id2', u'id3'], busy=[u'id3'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    checkpoint = JSONFileStore(os.path.join(self.directory, u'state.json'))
+    with raises(ExchangeServerBusyException):
+      self.service.mail().export(u'inbox', EMLSink(self.directory), chunk_size=1, max_workers=1, checkpoint=checkpoint)
+    assert checkpoint[u'export:inbox'][u'ids'] == [u'id2']
+
+  @httpretty.activate
+  def test_export_resumes_from_checkpoint(self):
+    mailbox = FakeMailbox([u'id1', u'id2', u'id3'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    checkpoint = JSONFileStore(os.path.join(self.directory, u'state.json'))
+    sink = EMLSink(os.path.join(self.directory, u'eml'))
+    assert self.service.mail().export(u'inbox', sink, chunk_size=1, max_workers=1, checkpoint=checkpoint) == 3
+    state = JSONFileStore(checkpoint.path)[u'export:inbox']
+    assert (state[u'received'], state[u'ids']) == (mailbox.received(u'id3'), [u'id3'])
+
+    # Older messages deleted between runs don't move the resume point.
+    mailbox.ids.remove(u'id1')
+    mailbox.ids.append(u'id4')
+    assert self.service.mail().export(u'inbox', sink, max_workers=1, checkpoint=checkpoint) == 1
+    assert u'id4' in mailbox.requests[-1]
+    assert u'Constant Value="%s"' % mailbox.received(u'id3') in mailbox.requests[-2]
+
+  @httpretty.activate
+  def test_deleting_older_messages_during_export_skips_nothing(self):
+    mailbox = FakeMailbox([u'id1', u'id2', u'id3', u'id4', u'id5'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    def delete_first(page):
+      if u'id1' in mailbox.ids:
+        mailbox.ids.remove(u'id1')
+    mailbox.on_page = delete_first
+
+    sink = EMLSink(self.directory)
+    assert self.service.mail().export(u'inbox', sink, max_workers=1) == 5
+    for item_id in (u'id1', u'id2', u'id3', u'id4', u'id5'):
+      assert os.path.exists(os.path.join(self.directory, sink.filename_for(item_id)))
+
+  @httpretty.activate
+  def test_resumed_mbox_drops_the_interrupted_chunk(self):
+    mailbox = FakeMailbox([u'id1', u'id2', u'id3'], busy=[u'id3'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    path = os.path.join(self.directory, u'archive.mbox')
+    checkpoint = JSONFileStore(os.path.join(self.directory, u'state.json'))
+    with MboxSink(path) as sink:
+      with raises(ExchangeServerBusyException):
+        self.service.mail().export(u'inbox', sink, chunk_size=2, max_workers=1, checkpoint=checkpoint)
+      sink.add_message(u'id3', iter([mime_for(u'id3')]))  # written after the last checkpoint, then interrupted
+
+    mailbox.busy = ()
+    with MboxSink(path) as sink:
+      assert self.service.mail().export(u'inbox', sink, chunk_size=2, max_workers=1, checkpoint=checkpoint) == 1
+
+    with open(path, 'rb') as f:
+      assert re.findall(b'Subject: message (id\\d+)', f.read()) == [b'id1', b'id2', b'id3']
+
+  @httpretty.activate
+  def test_maildir_skips_delivered_messages(self):
+    mailbox = FakeMailbox([u'id1', u'id2'])
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=mailbox)
+
+    self.service.mail().export(u'inbox', MaildirSink(self.directory), max_workers=1)
+    self.service.mail().export(u'inbox', MaildirSink(self.directory), max_workers=1)
+
+    assert len(os.listdir(os.path.join(self.directory, u'new'))) == 2
+
+  def test_concurrent_fetches_keep_folder_order(self):
+    mailbox = testing.FakeMailbox(messages=7)
+
+    path = os.path.join(self.directory, u'archive.mbox')
+    with testing.FakeExchangeServer(mailbox) as url:
+      service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(
+        url=url, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD,
+      ))
+      with MboxSink(path) as sink:
+        assert service.mail().export(u'inbox', sink, chunk_size=1, max_workers=3) == 7
+
+    with open(path, 'rb') as f:
+      subjects = re.findall(b'Subject: (.*)\n', f.read())
+    items = sorted(mailbox.folder_items(u'inbox'), key=lambda item: item.fields[u'DateTimeReceived'])
+    assert subjects == [item.fields[u'Subject'].encode('utf-8') for item in items]
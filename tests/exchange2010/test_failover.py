@@ -0,0 +1,184 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import socket
+import unittest
+from lxml import etree
+from pytest import raises
+from pyexchange import Exchange2010Service
+from pyexchange.connection import Endpoint, ExchangeFailoverConnection, ExchangeNTLMAuthConnection
+from pyexchange.exceptions import ExchangeEndpointException, ExchangeServerBusyException, FailedExchangeException
+from pyexchange.base.soap import S
+from pyexchange.exchange2010 import soap_request
+from pyexchange.testing import FAULT_HTTP_500, FAULT_SERVER_BUSY, FakeExchangeServer, FakeMailbox
+
+from .fixtures import *
+
+
+class Test_FailoverConnection(unittest.TestCase):
+
+  def setUp(self):
+    mailbox = FakeMailbox(messages=2)
+    self.healthy = FakeExchangeServer(mailbox)
+    self.broken = FakeExchangeServer(mailbox, fault_rate=1, faults=(FAULT_HTTP_500,))
+    self.healthy.start()
+    self.broken.start()
+    self.clock = FakeClock()
+
+  def tearDown(self):
+    self.healthy.stop()
+    self.broken.stop()
+
+  def _connection(self, *servers, **kwargs):
+    kwargs.setdefault('clock', self.clock)
+    return ExchangeFailoverConnection([
+      ExchangeNTLMAuthConnection(url=server.url, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD)
+      for server in servers
+    ], **kwargs)
+
+  def _list(self, connection):
+    return list(Exchange2010Service(connection=connection).mail().list_mails().items)
+
+  def _request(self, operation):
+    return etree.tostring(S.Envelope(S.Body(operation)))
+
+  def _closed_port_url(self):
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return u'http://127.0.0.1:%d/EWS/Exchange.asmx' % port
+
+  def test_fails_over_to_a_working_endpoint(self):
+    connection = self._connection(self.broken, self.healthy)
+
+    assert len(self._list(connection)) == 2
+    broken, healthy = connection.endpoints
+    assert broken.failures == 1 and broken.error_rate > 0
+    assert healthy.latency is not None and healthy.state == Endpoint.CLOSED
+
+  def test_circuit_opens_and_probes_after_reset_timeout(self):
+    connection = self._connection(self.broken, self.healthy, failure_threshold=1, reset_timeout=30)
+    broken = connection.endpoints[0]
+
+    self._list(connection)
+    assert broken.state == Endpoint.OPEN
+    requests = self.broken.stats[u'fault:%s' % FAULT_HTTP_500]
+
+    self._list(connection)
+    assert self.broken.stats[u'fault:%s' % FAULT_HTTP_500] == requests
+
+    self.clock.now += 30
+    self.broken.fault_rate = 0
+    self._list(connection)
+    assert broken.state == Endpoint.CLOSED
+    assert broken.failures == 0
+
+  def test_failed_probe_opens_the_circuit_again(self):
+    connection = self._connection(self.broken, self.healthy, failure_threshold=1, reset_timeout=30)
+    self._list(connection)
+
+    self.clock.now += 30
+    self._list(connection)
+    assert connection.endpoints[0].state == Endpoint.OPEN
+    assert connection.endpoints[0].opened_at == self.clock.now
+
+  def test_all_circuits_open_fails_fast(self):
+    connection = self._connection(self.broken, failure_threshold=1)
+
+    with raises(FailedExchangeException):
+      self._list(connection)
+    with raises(FailedExchangeException) as error:
+      self._list(connection)
+    assert u'No healthy' in str(error.value)
+
+  def test_server_busy_is_not_a_failure(self):
+    connection = self._connection(self.healthy, self.broken)
+    self.healthy.inject(FAULT_SERVER_BUSY)
+
+    with raises(ExchangeServerBusyException):
+      self._list(connection)
+    assert connection.endpoints[0].failures == 0
+    assert connection.endpoints[0].in_flight == 0
+
+  def test_writes_that_may_have_been_sent_are_not_sent_again(self):
+    connection = self._connection(self.broken, self.healthy)
+
+    with raises(ExchangeEndpointException):
+      connection.send(self._request(soap_request.M.DeleteItem(soap_request.T.ItemId(Id=u'a'))))
+    assert self.healthy.stats[u'DeleteItem'] == 0
+    assert connection.endpoints[0].failures == 1
+    assert connection.endpoints[1].in_flight == 0
+
+  def test_writes_fail_over_when_the_connection_could_not_be_made(self):
+    connection = ExchangeFailoverConnection([
+      ExchangeNTLMAuthConnection(url=url, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD)
+      for url in (self._closed_port_url(), self.healthy.url)
+    ], clock=self.clock)
+
+    # The fake server has no DeleteItem, so it answers with a SOAP fault.
+    with raises(FailedExchangeException):
+      connection.send(self._request(soap_request.M.DeleteItem(soap_request.T.ItemId(Id=u'a'))))
+    assert self.healthy.stats[u'DeleteItem'] == 1
+    assert connection.endpoints[0].failures == 1
+
+  def test_soap_faults_are_not_failures(self):
+    connection = self._connection(self.healthy, self.broken)
+
+    with raises(FailedExchangeException) as error:
+      connection.send(b'<not-soap/>')
+    assert not isinstance(error.value, ExchangeEndpointException)
+    assert connection.endpoints[0].failures == 0
+    assert connection.endpoints[1].in_flight == 0
+
+  def test_abandoned_streams_release_their_endpoint(self):
+    connection = self._connection(self.healthy, failure_threshold=1)
+    endpoint, = connection.endpoints
+    endpoint.state, endpoint.opened_at = Endpoint.OPEN, self.clock.now - 30
+
+    chunks = connection.stream(self._request(soap_request.get_item(exchange_id=u'a', format=u'IdOnly')))
+    next(chunks)
+    assert endpoint.state == Endpoint.PROBING
+    chunks.close()
+
+    assert endpoint.in_flight == 0
+    assert endpoint.state == Endpoint.OPEN
+
+  def test_streams_fail_over_before_the_first_chunk(self):
+    connection = self._connection(self.broken, self.healthy)
+    body = self._request(soap_request.get_item(exchange_id=u'a', format=u'IdOnly'))
+
+    assert b''.join(connection.stream(body))
+    broken, healthy = connection.endpoints
+    assert broken.failures == 1
+    assert healthy.failures == 0 and healthy.in_flight == 0
+
+  def test_unknown_arguments_are_rejected(self):
+    with raises(TypeError):
+      ExchangeNTLMAuthConnection(url=self.healthy.url, username=FAKE_EXCHANGE_USERNAME,
+                                 password=FAKE_EXCHANGE_PASSWORD, goverenor=None)
+
+  def test_least_latency_routing(self):
+    connection = self._connection(self.healthy, self.broken)
+    fast, slow = connection.endpoints
+    fast.latency, slow.latency = 0.01, 0.5
+
+    assert connection._choose([]) is fast
+    fast.in_flight = 100
+    assert connection._choose([]) is slow
+
+  def test_power_of_two_choices_spreads_requests(self):
+    connection = self._connection(self.healthy, self.healthy, self.healthy, routing=ExchangeFailoverConnection.ROUTING_P2C,
+                                  random_seed=1)
+    for endpoint in connection.endpoints:
+      endpoint.latency = 0.1
+
+    chosen = set()
+    for _ in range(30):
+      endpoint = connection._choose([])
+      chosen.add(endpoint)
+      connection._succeeded(endpoint, 0.1)
+    assert len(chosen) == 3
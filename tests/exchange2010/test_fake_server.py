@@ -0,0 +1,141 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import threading
+import unittest
+from datetime import datetime
+from pytest import raises
+from pytz import utc
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exceptions import ExchangeInternalServerTransientErrorException, FailedExchangeException
+from pyexchange.testing import FAULT_DISCONNECT, FAULT_SERVER_BUSY, FAULT_TRANSIENT, FakeExchangeServer, FakeMailbox
+
+from .fixtures import *  # noqa
+
+
+class Test_FakeExchangeServer(unittest.TestCase):
+  mailbox = None
+  server = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.mailbox = FakeMailbox(events=48, messages=25, contacts=12, tasks=7)
+    cls.server = FakeExchangeServer(cls.mailbox)
+    cls.server.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.stop()
+
+  def setUp(self):
+    self.service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(
+      url=self.server.url, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD,
+    ))
+    self.service.batch_size = 10
+
+  def test_mailboxes_are_the_same_for_the_same_seed(self):
+    first, second = FakeMailbox(messages=3, seed=7), FakeMailbox(messages=3, seed=7)
+    assert [i.fields[u'Subject'] for i in first.folder_items(u'inbox')] == \
+           [i.fields[u'Subject'] for i in second.folder_items(u'inbox')]
+
+  def test_list_mails_pages_through_the_folder(self):
+    before = self.server.stats[u'FindItem']
+    mails = list(self.service.mail().list_mails().items)
+
+    assert len(mails) == 25
+    assert self.server.stats[u'FindItem'] - before == 3
+    assert mails[0].subject == self.mailbox.folder_items(u'inbox')[0].fields[u'Subject']
+    assert mails[0].recipients_to
+
+  def test_list_events_in_a_window(self):
+    events = self.service.calendar().list_events(
+      start=datetime(2050, 1, 1, 0, 0, tzinfo=utc), end=datetime(2050, 1, 1, 12, 0, tzinfo=utc),
+    )
+    assert events.count == 12
+    assert events.contains_all_items
+    assert events.events[0].start == datetime(2050, 1, 1, 0, 0, tzinfo=utc)
+
+  def test_get_event(self):
+    item = self.mailbox.folder_items(u'calendar')[0]
+    event = self.service.calendar().get_event(item.id)
+
+    assert event.subject == item.fields[u'Subject']
+    assert event.change_key == item.change_key
+    assert len(event.attendees) == len(item.fields[u'Attendees'])
+
+  def test_contacts_and_tasks(self):
+    assert len(list(self.service.contacts().get_all_contacts().items)) == 12
+    assert len(list(self.service.tasks().get_all_tasks().items)) == 7
+
+  def test_sync_returns_only_new_changes(self):
+    mailbox = FakeMailbox(messages=5)
+    with FakeExchangeServer(mailbox) as url:
+      service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(url=url, username=u'u', password=u'p'))
+      first = service.mail().sync_items()
+      assert len(first.created) == 5
+
+      item = mailbox.folder_items(u'inbox')[0]
+      mailbox.update(item.id, Subject=u'changed')
+      mailbox.delete(mailbox.folder_items(u'inbox')[1].id)
+
+      second = service.mail().sync_items(sync_state=first.last_sync_state)
+      assert [mail.subject for mail in second.updated] == [u'changed']
+      assert len(second.deleted) == 1
+      assert second.created == []
+
+  def test_create_event(self):
+    mailbox = FakeMailbox()
+    with FakeExchangeServer(mailbox) as url:
+      service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(url=url, username=u'u', password=u'p'))
+      event = service.calendar().new_event(subject=u'planning', sensitivity=u'Normal',
+                                           start=datetime(2050, 1, 1, 9, tzinfo=utc), end=datetime(2050, 1, 1, 10, tzinfo=utc))
+      event.create()
+
+    assert mailbox.get(event.id).fields[u'Subject'] == u'planning'
+
+  def test_user_availability(self):
+    attendees = [{u'email': u'someone@example.com'}]
+    self.service.calendar().get_user_availability(
+      attendees, datetime(2050, 1, 1, 0, 0, tzinfo=utc), datetime(2050, 1, 1, 3, 0, tzinfo=utc),
+    )
+    assert [busy[u'start_time'] for busy in attendees[0][u'busy']] == \
+           [u'2050-01-01T00:00:00', u'2050-01-01T01:00:00', u'2050-01-01T02:00:00']
+
+  def test_injected_faults(self):
+    item_id = self.mailbox.folder_items(u'inbox')[0].id
+
+    self.server.inject(FAULT_TRANSIENT)
+    with raises(ExchangeInternalServerTransientErrorException):
+      self.service.mail().get_mail(item_id)
+
+    for fault in (FAULT_SERVER_BUSY, FAULT_DISCONNECT):
+      self.server.inject(fault)
+      with raises(FailedExchangeException):
+        self.service.mail().get_mail(item_id)
+
+    assert self.service.mail().get_mail(item_id).id == item_id
+
+  def test_too_many_concurrent_requests_are_throttled(self):
+    mailbox = FakeMailbox(messages=1)
+    results = []
+
+    with FakeExchangeServer(mailbox, latency=0.2, max_concurrent=1) as url:
+      def get_mail():
+        service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(url=url, username=u'u', password=u'p'))
+        try:
+          service.mail().get_mail(mailbox.folder_items(u'inbox')[0].id)
+          results.append(u'ok')
+        except FailedExchangeException:
+          results.append(u'busy')
+
+      threads = [threading.Thread(target=get_mail) for _ in range(3)]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [u'busy', u'busy', u'ok']
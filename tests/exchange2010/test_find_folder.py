@@ -99,3 +99,34 @@ class Test_FailingToGetFolders(unittest.TestCase):
 
     with raises(FailedExchangeException):
       self.service.folder().find_folder(parent_id=TEST_FOLDER.id)
+
+
+class Test_ParsingFoundFolders(unittest.TestCase):
+
+  @httpretty.activate
+  def test_folder_properties(self):
+    service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD
+      )
+    )
+    httpretty.register_uri(
+      httpretty.POST, FAKE_EXCHANGE_URL,
+      body=FIND_FOLDER_RESPONSE.encode('utf-8'),
+      content_type='text/xml; charset=utf-8',
+    )
+
+    folders = list(service.folder().find_folder(parent_id=u'AABBCCDDEEFF'))
+
+    assert [f.display_name for f in folders] == [u'classrooms', u'conference', u'conference0', u'conference1']
+    assert [f.folder_type for f in folders] == [u'Folder', u'CalendarFolder', u'CalendarFolder', u'CalendarFolder']
+    assert folders[0].id == u'AAhKNOZAAA='
+    assert folders[0].change_key == u'AhKNOb'
+    assert folders[0].parent_id == u'AABBCCDDEEFF'
+    assert folders[0].child_folder_count == 1
+    assert folders[0].unread_count == 0
+    assert folders[0].folder_class is None
+    assert folders[1].folder_class == u'IPF.Appointment'
+    assert folders[1].effective_rights is None
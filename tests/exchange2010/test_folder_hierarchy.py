@@ -0,0 +1,160 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import httpretty
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.utils import JSONFileStore
+from pytest import raises
+
+from .fixtures import *
+
+
+def create(id, parent, name, type=u'Folder', change=u'Create'):
+  return SYNC_FOLDER_CHANGE.format(change=change, type=type, id=id, parent=parent, name=name)
+
+
+class Counter(object):
+
+  def __init__(self, body):
+    self.body = body
+    self.calls = 0
+
+  def __call__(self, request, uri, headers):
+    self.calls += 1
+    return 200, headers, self.body
+
+
+INITIAL_SYNC = SYNC_FOLDER_HIERARCHY_RESPONSE.format(sync_state=u'state-1', last=u'true', changes=u''.join([
+  create(u'inbox-id', u'root-id', u'Inbox'),
+  create(u'projects-id', u'inbox-id', u'Projects'),
+  create(u'x-id', u'projects-id', u'X'),
+  create(u'calendar-id', u'root-id', u'Calendar', type=u'CalendarFolder'),
+]))
+
+
+class Test_FolderHierarchy(unittest.TestCase):
+
+  def setUp(self):
+    self.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      )
+    )
+
+  @httpretty.activate
+  def test_path_lookup(self):
+    server = Counter(INITIAL_SYNC)
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=server)
+
+    folders = self.service.folder().hierarchy()
+
+    assert folders.get_by_path(u'/Inbox/Projects/X').id == u'x-id'
+    assert folders.get_by_path(u'inbox/projects/').id == u'projects-id'
+    assert folders.path_of(u'x-id') == u'/Inbox/Projects/X'
+    assert folders.get(u'calendar-id').folder_type == u'CalendarFolder'
+    assert sorted(f.id for f in folders.children()) == [u'calendar-id', u'inbox-id']
+    assert server.calls == 1
+
+  @httpretty.activate
+  def test_same_instance_per_service(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=INITIAL_SYNC)
+
+    assert self.service.folder().hierarchy() is self.service.folder().hierarchy()
+    assert self.service.folder().hierarchy(max_age=60) is not self.service.folder().hierarchy()
+    assert self.service.folder().hierarchy(max_age=60).max_age == 60
+
+  @httpretty.activate
+  def test_missing_path_refreshes_incrementally(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, responses=[
+      httpretty.Response(body=INITIAL_SYNC),
+      httpretty.Response(body=SYNC_FOLDER_HIERARCHY_RESPONSE.format(sync_state=u'state-2', last=u'true', changes=u''.join([
+        create(u'y-id', u'projects-id', u'Y'),
+        create(u'x-id', u'inbox-id', u'X renamed', change=u'Update'),
+        SYNC_FOLDER_DELETE.format(id=u'calendar-id'),
+      ]))),
+    ])
+
+    folders = self.service.folder().hierarchy()
+    folders.MISS_REFRESH_INTERVAL = 0
+    assert folders.get_by_path(u'/Inbox/Projects/Y').id == u'y-id'
+
+    body = httpretty.last_request().body.decode('utf-8')
+    assert u'<m:SyncState>state-1</m:SyncState>' in body
+    assert folders.path_of(u'x-id') == u'/Inbox/X renamed'
+    assert folders.get(u'calendar-id') is None
+    assert folders.sync_state == u'state-2'
+
+  @httpretty.activate
+  def test_unknown_path(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=INITIAL_SYNC)
+
+    assert self.service.folder().hierarchy().get_by_path(u'/Nope') is None
+
+  @httpretty.activate
+  def test_misses_refresh_at_most_once_per_interval(self):
+    server = Counter(INITIAL_SYNC)
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=server)
+
+    folders = self.service.folder().hierarchy()
+    folders.refresh()
+    for _ in range(3):
+      assert folders.get_by_path(u'/Nope') is None
+    assert server.calls == 1
+
+    folders.last_refresh -= folders.MISS_REFRESH_INTERVAL
+    assert folders.get_by_path(u'/Nope') is None
+    assert server.calls == 2
+
+  @httpretty.activate
+  def test_ambiguous_path(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=SYNC_FOLDER_HIERARCHY_RESPONSE.format(
+      sync_state=u'state-1', last=u'true', changes=u''.join([
+        create(u'inbox-id', u'root-id', u'Inbox'),
+        create(u'a-id', u'inbox-id', u'Reports'),
+        create(u'b-id', u'inbox-id', u'reports'),
+      ])))
+
+    folders = self.service.folder().hierarchy()
+    with raises(ValueError):
+      folders.get_by_path(u'/Inbox/Reports')
+    assert folders.path_of(u'b-id') == u'/Inbox/reports'
+
+  @httpretty.activate
+  def test_paged_sync(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, responses=[
+      httpretty.Response(body=SYNC_FOLDER_HIERARCHY_RESPONSE.format(sync_state=u'a', last=u'false',
+                                                                    changes=create(u'inbox-id', u'root-id', u'Inbox'))),
+      httpretty.Response(body=SYNC_FOLDER_HIERARCHY_RESPONSE.format(sync_state=u'b', last=u'true',
+                                                                    changes=create(u'sub-id', u'inbox-id', u'Sub'))),
+    ])
+
+    folders = self.service.folder().hierarchy()
+    assert folders.path_of(u'sub-id') == u'/Inbox/Sub'
+    assert folders.sync_state == u'b'
+
+  @httpretty.activate
+  def test_persisted_tree(self):
+    directory = tempfile.mkdtemp()
+    try:
+      server = Counter(INITIAL_SYNC)
+      httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=server)
+      store = JSONFileStore(os.path.join(directory, u'folders.json'))
+      self.service.folder().hierarchy(state_store=store).refresh()
+
+      other_service = Exchange2010Service(connection=self.service.connection)
+      folders = other_service.folder().hierarchy(state_store=JSONFileStore(store.path))
+
+      assert folders.get_by_path(u'/Inbox/Projects/X').id == u'x-id'
+      assert server.calls == 1
+    finally:
+      shutil.rmtree(directory)
@@ -0,0 +1,173 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import re
+import unittest
+import httpretty
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exchange2010 import NotificationEvent, soap_request
+from pyexchange.exceptions import FailedExchangeException
+from pyexchange.utils import ItemCache
+from pytest import raises
+
+from .fixtures import *
+
+
+class FakeContacts(object):
+  """ Answers GetItem for contacts whose change key is ``ck-<id>`` with ``versions[id]`` appended. """
+
+  def __init__(self):
+    self.versions = {}
+    self.requests = []
+
+  def __call__(self, request, uri, headers):
+    body = request.body.decode('utf-8')
+    self.requests.append(body)
+
+    item_id = re.search(u'ItemId Id="([^"]+)"', body).group(1)
+    contact = CONTACT_ITEM.format(id=item_id, name=u'Contact %s' % item_id)
+    contact = contact.replace(u'ck-%s' % item_id, u'ck-%s%s' % (item_id, self.versions.get(item_id, u'')))
+    return 200, headers, GET_ITEM_MULTIPLE_RESPONSE.format(messages=GET_ITEM_SUCCESS_MESSAGE.format(items=contact))
+
+  def shapes(self):
+    return re.findall(u'<t:BaseShape>(\\w+)</t:BaseShape>', u''.join(self.requests))
+
+
+class Test_ItemCache(unittest.TestCase):
+
+  def test_least_recently_used_items_are_dropped(self):
+    cache = ItemCache(max_size=2)
+    cache.put(None, u'a', u'ck', 1)
+    cache.put(None, u'b', u'ck', 2)
+    cache.get(None, u'a')
+    cache.put(None, u'c', u'ck', 3)
+
+    assert cache.get(None, u'b') is None
+    assert cache.get(None, u'a')[1] == 1
+    assert len(cache) == 2
+
+  def test_entries_go_stale_after_ttl(self):
+    clock = FakeClock()
+    cache = ItemCache(ttl=60, clock=clock)
+    cache.put(u'jdoe@example.com', u'a', u'ck', 1)
+
+    clock.now += 61
+    assert cache.get(u'jdoe@example.com', u'a') == (u'ck', 1, False)
+
+    cache.revalidated(u'jdoe@example.com', u'a')
+    assert cache.get(u'jdoe@example.com', u'a') == (u'ck', 1, True)
+
+  def test_invalidate_in_every_mailbox(self):
+    cache = ItemCache()
+    cache.put(u'jdoe@example.com', u'a', u'ck', 1)
+    cache.put(u'alice@example.com', u'a', u'ck', 2)
+
+    cache.invalidate_events([NotificationEvent(u'sub', u'modified', u'wm', None, u'a', u'ck', None, None, None, False)])
+
+    assert len(cache) == 0
+
+  def test_mailboxes_are_forgotten_with_their_entries(self):
+    cache = ItemCache(max_size=2)
+    for i in range(10):
+      cache.put(u'user%d@example.com' % i, u'id%d' % i, u'ck', i)
+    cache.invalidate(u'id9')
+
+    assert len(cache._mailboxes) == 1
+
+
+class Test_CachedGetItem(unittest.TestCase):
+
+  def setUp(self):
+    self.clock = FakeClock()
+    self.contacts = FakeContacts()
+    self.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      ),
+      item_cache=ItemCache(max_size=10, ttl=60, clock=self.clock),
+    )
+
+  @httpretty.activate
+  def test_repeated_gets_are_served_from_the_cache(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.contacts)
+
+    first = self.service.contacts().get_contact(u'a')
+    first.display_name = u'Changed locally'
+    second = self.service.contacts().get_contact(u'a')
+
+    assert self.contacts.shapes() == [u'AllProperties']
+    assert second is not first
+    assert second.display_name == u'Contact a'
+    assert second.service is self.service
+
+  @httpretty.activate
+  def test_stale_entry_with_same_change_key_is_revalidated(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.contacts)
+
+    self.service.contacts().get_contact(u'a')
+    self.clock.now += 61
+    self.service.contacts().get_contact(u'a')
+    self.service.contacts().get_contact(u'a')
+
+    assert self.contacts.shapes() == [u'AllProperties', u'IdOnly']
+
+  @httpretty.activate
+  def test_stale_entry_with_new_change_key_is_reloaded(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.contacts)
+
+    self.service.contacts().get_contact(u'a')
+    self.contacts.versions[u'a'] = u'-2'
+    self.clock.now += 61
+    contact = self.service.contacts().get_contact(u'a')
+
+    assert self.contacts.shapes() == [u'AllProperties', u'IdOnly', u'AllProperties']
+    assert contact.change_key == u'ck-a-2'
+
+  @httpretty.activate
+  def test_writes_invalidate_items(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.contacts)
+
+    self.service.contacts().get_contact(u'a')
+    self.service.send(soap_request.M.DeleteItem(soap_request.T.ItemId(Id=u'a')), check_for_errors=False)
+    self.service.contacts().get_contact(u'a')
+
+    assert self.contacts.shapes().count(u'AllProperties') == 2
+
+  @httpretty.activate
+  def test_items_read_during_a_write_are_invalidated(self):
+    def write(request, uri, headers):
+      # Another thread reads the item while the write is in flight.
+      self.service.item_cache.put(None, u'a', u'ck-a', object())
+      return 200, headers, GET_ITEM_MULTIPLE_RESPONSE.format(messages=u'')
+
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=write)
+    self.service.send(soap_request.M.DeleteItem(soap_request.T.ItemId(Id=u'a')), check_for_errors=False)
+
+    assert self.service.item_cache.get(None, u'a') is None
+
+  @httpretty.activate
+  def test_failed_writes_invalidate_items(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.contacts)
+    self.service.contacts().get_contact(u'a')
+
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, status=500, body=u'')
+    with raises(FailedExchangeException):
+      self.service.send(soap_request.M.DeleteItem(soap_request.T.ItemId(Id=u'a')), retries=0)
+
+    assert self.service.item_cache.get(None, u'a') is None
+
+  @httpretty.activate
+  def test_without_cache_every_get_is_sent(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.contacts)
+    self.service.item_cache = None
+
+    self.service.contacts().get_contact(u'a')
+    self.service.contacts().get_contact(u'a')
+
+    assert self.contacts.shapes() == [u'AllProperties', u'AllProperties']
@@ -0,0 +1,114 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import re
+import unittest
+from datetime import date, datetime
+import httpretty
+from pytz import utc
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+
+from .fixtures import *
+
+
+class FakeTaskFolder(object):
+
+  def __init__(self, count):
+    self.count = count
+    self.requests = []
+
+  def __call__(self, request, uri, headers):
+    body = request.body.decode('utf-8')
+    self.requests.append(body)
+
+    if u'FindItem' in body:
+      offset = int(re.search(u'Offset="(\\d+)"', body).group(1))
+      ids = range(offset, min(offset + 2, self.count))
+      return 200, headers, FIND_ITEM_PAGE_RESPONSE.format(
+        next_offset=offset + len(ids), total=self.count,
+        last=u'true' if offset + len(ids) >= self.count else u'false',
+        items=u''.join(TASK_LIST_ITEM.format(id=u't%d' % i, subject=u'Task %d' % i) for i in ids),
+      )
+
+    messages = [GET_ITEM_TASK_BODY_MESSAGE.format(id=i) for i in re.findall(u'ItemId Id="([^"]+)"', body)]
+    return 200, headers, GET_ITEM_MULTIPLE_RESPONSE.format(messages=u''.join(messages))
+
+
+class Test_ListingTasks(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      ),
+      batch_size=2,
+    )
+
+  @httpretty.activate
+  def test_one_request_per_page(self):
+    folder = FakeTaskFolder(3)
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=folder)
+
+    tasks = list(self.service.tasks().get_all_tasks().items)
+
+    assert [t.subject for t in tasks] == [u'Task 0', u'Task 1', u'Task 2']
+    assert len(folder.requests) == 2
+    assert all(u'FindItem' in r for r in folder.requests)
+    assert u'FieldURI="task:DueDate"' in folder.requests[0]
+
+  @httpretty.activate
+  def test_properties_are_parsed(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=FakeTaskFolder(1))
+
+    task = next(self.service.tasks().get_all_tasks().items)
+
+    assert task.due_date == date(2014, 5, 14)
+    assert task.start_date == date(2014, 5, 2)
+    assert task.created_at == datetime(2014, 5, 1, 9, 30, tzinfo=utc)
+    assert task.percent_complete == 50
+    assert task.is_complete is False
+    assert task.text_body is None
+
+  @httpretty.activate
+  def test_load_body_on_demand(self):
+    folder = FakeTaskFolder(1)
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=folder)
+
+    task = next(self.service.tasks().get_all_tasks().items)
+    task.load_body()
+
+    assert task.text_body == u'Body of t0'
+    assert task.subject == u'Task 0'
+    assert u'FieldURI="item:Body"' in folder.requests[-1]
+
+  @httpretty.activate
+  def test_load_bodies_per_page(self):
+    folder = FakeTaskFolder(3)
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=folder)
+
+    tasks = list(self.service.tasks().get_all_tasks(load_bodies=True).items)
+
+    assert [t.text_body for t in tasks] == [u'Body of t0', u'Body of t1', u'Body of t2']
+    assert tasks[2].due_date == date(2014, 5, 14)
+    assert len(folder.requests) == 4
+
+
+class Test_ParsingDates(unittest.TestCase):
+
+  def test_date_formats(self):
+    service = Exchange2010Service(connection=None)
+    for text in (u'2014-05-14', u'2014-05-14Z', u'2014-05-14+02:00', u'2014-05-14T00:00:00Z',
+                 u'2014-05-14T00:00:00-07:00', u'2014-05-14T23:00:00.000Z'):
+      assert service._parse_date_value(text) == date(2014, 5, 14)
+
+  def test_rejects_garbage(self):
+    service = Exchange2010Service(connection=None)
+    self.assertRaises(ValueError, service._parse_date_value, u'next tuesday')
@@ -0,0 +1,120 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import unittest
+import httpretty
+from pytest import raises
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exceptions import ExchangeItemNotFoundException
+from pyexchange.metrics import PHASES, MetricsRegistry, SOAPCall
+
+from .fixtures import *
+
+
+class Test_Metrics(unittest.TestCase):
+
+  def setUp(self):
+    self.calls = []
+    self.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      ),
+      metrics=self.calls.append,
+    )
+
+  @httpretty.activate
+  def test_every_phase_is_timed(self):
+    response = GET_ITEM_MULTIPLE_RESPONSE.format(messages=GET_ITEM_SUCCESS_MESSAGE.format(
+      items=CONTACT_ITEM.format(id=u'a', name=u'A') + CONTACT_ITEM.format(id=u'b', name=u'B')))
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=response)
+
+    self.service.contacts().get_contact(u'a')
+
+    call, = self.calls
+    assert call.operation == u'GetItem'
+    assert tuple(call.phases) == PHASES
+    assert all(seconds >= 0 for seconds in call.phases.values())
+    assert call.request_bytes == len(httpretty.last_request().body)
+    assert call.response_bytes == len(response.encode('utf-8'))
+    assert call.items == 2
+    assert call.response_codes == {u'NoError': 1}
+    assert call.error is None
+
+  @httpretty.activate
+  def test_response_bytes_are_the_bytes_received(self):
+    response = GET_ITEM_MULTIPLE_RESPONSE.format(messages=GET_ITEM_SUCCESS_MESSAGE.format(
+      items=CONTACT_ITEM.format(id=u'a', name=u'Ren\xe9e')))
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=response.encode('iso-8859-1'),
+                           content_type='text/xml; charset=iso-8859-1')
+
+    contact = self.service.contacts().get_contact(u'a')
+
+    assert contact.display_name == u'Ren\xe9e'
+    assert self.calls[0].response_bytes == len(response.encode('iso-8859-1'))
+
+  @httpretty.activate
+  def test_failed_calls_are_recorded(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL,
+                           body=GET_ITEM_MULTIPLE_RESPONSE.format(messages=GET_ITEM_NOT_FOUND_MESSAGE))
+
+    with raises(ExchangeItemNotFoundException):
+      self.service.contacts().get_contact(u'a')
+
+    call, = self.calls
+    assert call.response_codes == {u'ErrorItemNotFound': 1}
+    assert call.error == u'ExchangeItemNotFoundException'
+    assert u'check' not in call.phases
+
+  @httpretty.activate
+  def test_a_failing_hook_does_not_fail_the_request(self):
+    def hook(call):
+      raise ValueError(u'broken')
+
+    self.service.metrics = hook
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=GET_ITEM_MULTIPLE_RESPONSE.format(
+      messages=GET_ITEM_SUCCESS_MESSAGE.format(items=CONTACT_ITEM.format(id=u'a', name=u'A'))))
+
+    assert self.service.contacts().get_contact(u'a').display_name == u'A'
+
+
+class Test_MetricsRegistry(unittest.TestCase):
+
+  def observe(self, registry, operation=u'FindItem', network=0.02, codes=None, error=None):
+    registry.observe(SOAPCall(operation=operation, phases={u'network': network, u'parse': 0.001}, request_bytes=100,
+                              response_bytes=2000, items=10, response_codes=codes or {u'NoError': 1}, error=error))
+
+  def test_counters_and_histograms(self):
+    registry = MetricsRegistry(buckets=(0.01, 0.1))
+    self.observe(registry)
+    self.observe(registry, network=0.5, codes={u'ErrorServerBusy': 1}, error=u'FailedExchangeException')
+    self.observe(registry, operation=u'GetItem')
+
+    assert registry.value(u'pyexchange_requests') == 3
+    assert registry.value(u'pyexchange_requests', operation=u'FindItem') == 2
+    assert registry.value(u'pyexchange_response_bytes', operation=u'FindItem') == 4000
+    assert registry.value(u'pyexchange_items') == 30
+    assert registry.value(u'pyexchange_response_codes', code=u'ErrorServerBusy') == 1
+    assert registry.value(u'pyexchange_errors', operation=u'FindItem') == 1
+    assert registry.value(u'pyexchange_request_duration_seconds', operation=u'FindItem', phase=u'network') == (0.52, 2)
+
+  def test_expose_openmetrics_text(self):
+    registry = MetricsRegistry(buckets=(0.01, 0.1))
+    self.observe(registry)
+
+    text = registry.expose()
+    assert u'# TYPE pyexchange_requests counter' in text
+    assert u'pyexchange_requests_total{operation="FindItem"} 1' in text
+    assert u'pyexchange_response_codes_total{operation="FindItem",code="NoError"} 1' in text
+    assert u'pyexchange_request_duration_seconds_bucket{operation="FindItem",phase="network",le="0.01"} 0' in text
+    assert u'pyexchange_request_duration_seconds_bucket{operation="FindItem",phase="network",le="0.1"} 1' in text
+    assert u'pyexchange_request_duration_seconds_count{operation="FindItem",phase="total"} 1' in text
+    assert text.endswith(u'# EOF\n')
+
+    registry.reset()
+    assert registry.value(u'pyexchange_requests') == 0
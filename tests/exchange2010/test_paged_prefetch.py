@@ -0,0 +1,113 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import re
+import threading
+import unittest
+import httpretty
+from pyexchange import Exchange2010Service
+from pyexchange.exchange2010 import soap_request
+from pyexchange.connection import ExchangeNTLMAuthConnection
+
+from pyexchange.testing import FakeExchangeServer, FakeMailbox
+
+from .fixtures import *
+
+
+class FakeContactFolder(object):
+  """ Answers FindItem requests for ``count`` contacts, honouring MaxEntriesReturned and Offset. """
+
+  def __init__(self, count, report_total=True):
+    self.count = count
+    self.report_total = report_total
+    self.offsets = []
+    self._lock = threading.Lock()
+
+  def __call__(self, request, uri, headers):
+    body = request.body.decode('utf-8')
+    offset = int(re.search(u'Offset="(\\d+)"', body).group(1))
+    limit = int(re.search(u'MaxEntriesReturned="(\\d+)"', body).group(1))
+    with self._lock:
+      self.offsets.append(offset)
+
+    ids = range(offset, min(offset + limit, self.count))
+    response = FIND_ITEM_PAGE_RESPONSE.format(
+      next_offset=offset + len(ids), total=self.count,
+      last=u'true' if offset + len(ids) >= self.count else u'false',
+      items=u''.join(CONTACT_ITEM.format(id=u'c%d' % i, name=u'Contact %d' % i) for i in ids),
+    )
+    if not self.report_total:
+      response = response.replace(u' TotalItemsInView="%d"' % self.count, u'')
+    return 200, headers, response
+
+
+class NoTotalServer(FakeExchangeServer):
+  """ Leaves TotalItemsInView out of FindItem responses, as Exchange does for some views. """
+
+  def handle(self, body):
+    status, response = super(NoTotalServer, self).handle(body)
+    return status, re.sub(u' TotalItemsInView="\\d+"', u'', response or u'')
+
+
+class Test_PrefetchingPages(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      ),
+      batch_size=3,
+    )
+
+  def _service_for(self, url):
+    return Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(url=url, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD),
+      batch_size=3,
+    )
+
+  def _names(self, prefetch):
+    return [c.display_name for c in self.service.contacts().get_all_contacts(prefetch=prefetch).items]
+
+  @httpretty.activate
+  def test_without_prefetch(self):
+    folder = FakeContactFolder(10)
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=folder)
+
+    assert self._names(0) == [u'Contact %d' % i for i in range(10)]
+    assert folder.offsets == [0, 3, 6, 9]
+
+  def test_prefetch_keeps_order(self):
+    mailbox = FakeMailbox(contacts=10)
+
+    with FakeExchangeServer(mailbox) as url:
+      service = self._service_for(url)
+      names = [c.display_name for c in service.contacts().get_all_contacts(prefetch=2).items]
+
+    assert names == [item.fields[u'DisplayName'] for item in mailbox.folder_items(u'contacts')]
+
+  def test_prefetch_without_total(self):
+    server = NoTotalServer(FakeMailbox(contacts=7))
+
+    def build_body(offset):
+      return soap_request.find_items(folder_id=u'contacts', limit=3, offset=offset)
+
+    with server as url:
+      pages = list(self._service_for(url)._send_paged(build_body, prefetch=2))
+
+    assert len(pages) == 3
+    assert server.stats[u'FindItem'] == 3
+
+  @httpretty.activate
+  def test_single_page(self):
+    folder = FakeContactFolder(2)
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=folder)
+
+    assert self._names(4) == [u'Contact 0', u'Contact 1']
+    assert folder.offsets == [0]
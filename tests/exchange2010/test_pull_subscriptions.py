@@ -0,0 +1,280 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import re
+import unittest
+import httpretty
+from pytest import raises
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeBaseConnection, ExchangeNTLMAuthConnection
+from pyexchange.exceptions import ExchangeSubscriptionExpiredException
+
+from .fixtures import *
+
+
+def item_event(item_id, watermark, type=u'NewMailEvent'):
+  return PUSH_ITEM_EVENT.format(type=type, id=item_id, watermark=watermark)
+
+
+class FakeSubscriptions(object):
+  """ Answers Subscribe/GetEvents/Unsubscribe requests. ``events[id]`` lists the GetEvents pages still to hand out. """
+
+  def __init__(self):
+    self.events = {}
+    self.expired = set()
+    self.requests = []
+    self.count = 0
+
+  def __call__(self, request, uri, headers):
+    body = request.body.decode('utf-8')
+    self.requests.append(body)
+
+    if re.search(u'<m:Subscribe[ >]', body):
+      self.count += 1
+      subscription_id = u'sub-%d' % self.count
+      self.events[subscription_id] = []
+      watermark = u'<m:Watermark>wm-%s</m:Watermark>' % subscription_id
+      return 200, headers, SUBSCRIBE_RESPONSE.format(id=subscription_id, watermark=watermark)
+
+    subscription_id = re.search(u'<m:SubscriptionId>([^<]+)</m:SubscriptionId>', body).group(1)
+    if subscription_id in self.expired:
+      return 200, headers, SUBSCRIPTION_ERROR_RESPONSE.format(
+        operation=u'GetEvents', code=u'ErrorExpiredSubscription', error_ids=u'',
+      )
+
+    if re.search(u'<m:Unsubscribe[ >]', body):
+      return 200, headers, FOLDER_OPERATION_RESPONSE.format(operation=u'Unsubscribe', messages=(
+        u'<m:UnsubscribeResponseMessage ResponseClass="Success"><m:ResponseCode>NoError</m:ResponseCode>'
+        u'</m:UnsubscribeResponseMessage>'))
+
+    watermark = re.search(u'<m:Watermark>([^<]+)</m:Watermark>', body).group(1)
+    pages = self.events.get(subscription_id, [])
+    events = pages.pop(0) if pages else PUSH_STATUS_EVENT.format(watermark=watermark)
+    return 200, headers, GET_EVENTS_RESPONSE.format(subscription_id=subscription_id, previous_watermark=watermark,
+                                                    more_events=u'true' if pages else u'false', events=events)
+
+
+class ChunkedConnection(ExchangeBaseConnection):
+  """ Hands out ``body`` a few bytes at a time, like a slow streaming response. """
+
+  def __init__(self, body, chunk_size=7):
+    self.body = body.encode('utf-8')
+    self.chunk_size = chunk_size
+    self.requests = []
+
+  def stream(self, body, headers=None, timeout=30, retries=2):
+    self.requests.append(body.decode('utf-8'))
+    for start in range(0, len(self.body), self.chunk_size):
+      yield self.body[start:start + self.chunk_size]
+
+
+def streamed(*envelopes):
+  return u'\r\n'.join(envelopes)
+
+
+class Test_PullSubscriptions(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      )
+    )
+
+  def setUp(self):
+    self.server = FakeSubscriptions()
+
+  @httpretty.activate
+  def test_subscribe_pull(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+
+    subscription = self.service.notifications().subscribe_pull([u'inbox'], [u'new_mail'], timeout=10, watermark=u'wm-0')
+
+    assert subscription == (u'sub-1', u'wm-sub-1')
+    assert u'<t:EventType>NewMailEvent</t:EventType>' in self.server.requests[0]
+    assert u'<t:Watermark>wm-0</t:Watermark>' in self.server.requests[0]
+    assert u'<t:Timeout>10</t:Timeout>' in self.server.requests[0]
+
+  @httpretty.activate
+  def test_subscribe_push_resumes_from_watermark(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+
+    self.service.notifications().subscribe_push([u'inbox'], u'all', u'http://example.com/', watermark=u'wm-0')
+
+    assert u'<t:Watermark>wm-0</t:Watermark><t:StatusFrequency>' in self.server.requests[0]
+
+  @httpretty.activate
+  def test_get_events(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+    self.server.events[u'sub-1'] = [item_event(u'a', u'wm-1') + item_event(u'b', u'wm-2', u'DeletedEvent')]
+
+    notification = self.service.notifications().get_events(u'sub-1', u'wm-0')
+
+    assert notification.watermark == u'wm-2'
+    assert [(e.event_type, e.item_id) for e in notification.events] == [(u'new_mail', u'a'), (u'deleted', u'b')]
+
+  @httpretty.activate
+  def test_expired_subscription(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+    self.server.expired.add(u'sub-1')
+
+    with raises(ExchangeSubscriptionExpiredException):
+      self.service.notifications().get_events(u'sub-1', u'wm-0')
+
+  @httpretty.activate
+  def test_unsubscribe_ignores_expired_subscriptions(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+    self.server.expired.add(u'sub-1')
+
+    self.service.notifications().unsubscribe(u'sub-1')
+    self.service.notifications().unsubscribe(u'sub-2')
+
+    assert re.search(u'<m:Unsubscribe[^>]*><m:SubscriptionId>sub-2</m:SubscriptionId></m:Unsubscribe>', self.server.requests[1])
+
+
+class Test_StreamingSubscriptions(unittest.TestCase):
+
+  def test_envelopes_are_parsed_as_they_arrive(self):
+    notification = STREAMING_NOTIFICATION.format(subscription_id=u'sub-1', events=item_event(u'a', u'wm-1'))
+    connection = ChunkedConnection(streamed(
+      STREAMING_EVENTS_RESPONSE.format(notifications=notification, status=u'OK'),
+      STREAMING_EVENTS_RESPONSE.format(notifications=u'', status=u'OK'),
+      STREAMING_EVENTS_RESPONSE.format(notifications=notification.replace(u'sub-1', u'sub-2'), status=u'Closed'),
+      STREAMING_EVENTS_RESPONSE.format(notifications=notification, status=u'OK'),
+    ))
+
+    notifications = Exchange2010Service(connection).notifications().get_streaming_events([u'sub-1', u'sub-2'])
+
+    assert [n.subscription_id for n in notifications] == [u'sub-1', u'sub-2']
+    assert u'<t:SubscriptionId>sub-1</t:SubscriptionId><t:SubscriptionId>sub-2</t:SubscriptionId>' in connection.requests[0]
+    assert u'<m:ConnectionTimeout>1</m:ConnectionTimeout>' in connection.requests[0]
+
+  def test_expired_subscriptions_are_named(self):
+    connection = ChunkedConnection(SUBSCRIPTION_ERROR_RESPONSE.format(
+      operation=u'GetStreamingEvents', code=u'ErrorSubscriptionNotFound',
+      error_ids=u'<m:ErrorSubscriptionIds><m:SubscriptionId>sub-2</m:SubscriptionId></m:ErrorSubscriptionIds>',
+    ))
+
+    with raises(ExchangeSubscriptionExpiredException) as err:
+      list(Exchange2010Service(connection).notifications().get_streaming_events([u'sub-1', u'sub-2']))
+
+    assert err.value.subscription_ids == [u'sub-2']
+
+
+class Test_NotificationLoop(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      )
+    )
+
+  def setUp(self):
+    self.server = FakeSubscriptions()
+    self.handled = []
+    self.state = {}
+
+  def handler(self, key, events):
+    self.handled.append((key, [e.item_id for e in events]))
+
+  def loop(self, **kwargs):
+    return self.service.notifications().listen(self.handler, state_store=self.state, max_workers=1, **kwargs)
+
+  @httpretty.activate
+  def test_events_of_every_subscription_are_handled(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+
+    loop = self.loop()
+    loop.add(u'inbox', [u'inbox'])
+    loop.add(u'calendar', [u'calendar'])
+    self.server.events[u'sub-1'] = [item_event(u'a', u'wm-1'), item_event(u'b', u'wm-2')]
+    self.server.events[u'sub-2'] = [item_event(u'c', u'wm-3') + PUSH_STATUS_EVENT.format(watermark=u'wm-4')]
+
+    assert loop.poll() == 3
+    assert self.handled == [(u'inbox', [u'a']), (u'inbox', [u'b']), (u'calendar', [u'c'])]
+    assert self.state == {
+      u'subscription:inbox': {u'id': u'sub-1', u'watermark': u'wm-2'},
+      u'subscription:calendar': {u'id': u'sub-2', u'watermark': u'wm-4'},
+    }
+
+  @httpretty.activate
+  def test_resumes_stored_subscription(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+    self.state[u'subscription:inbox'] = {u'id': u'sub-9', u'watermark': u'wm-8'}
+
+    loop = self.loop()
+    loop.add(u'inbox', [u'inbox'])
+    loop.poll()
+
+    assert len(self.server.requests) == 1
+    assert u'<m:Watermark>wm-8</m:Watermark>' in self.server.requests[0]
+
+  @httpretty.activate
+  def test_resubscribes_from_last_watermark_when_expired(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+    self.state[u'subscription:inbox'] = {u'id': u'sub-9', u'watermark': u'wm-8'}
+    self.server.expired.add(u'sub-9')
+
+    loop = self.loop()
+    loop.add(u'inbox', [u'inbox'])
+    loop.poll()
+
+    assert u'<t:Watermark>wm-8</t:Watermark>' in self.server.requests[1]
+    assert self.state[u'subscription:inbox'][u'id'] == u'sub-1'
+
+  @httpretty.activate
+  def test_failed_handler_keeps_watermark(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+
+    def handler(key, events):
+      raise ValueError(u'database is down')
+
+    loop = self.service.notifications().listen(handler, state_store=self.state, max_workers=1)
+    loop.add(u'inbox', [u'inbox'])
+    self.server.events[u'sub-1'] = [item_event(u'a', u'wm-1'), item_event(u'b', u'wm-2')]
+
+    assert loop.poll() == 0
+    assert self.state[u'subscription:inbox'][u'watermark'] == u'wm-sub-1'
+
+  @httpretty.activate
+  def test_remove_unsubscribes(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=self.server)
+
+    loop = self.loop()
+    loop.add(u'inbox', [u'inbox'])
+    loop.remove(u'inbox')
+
+    assert u'Unsubscribe' in self.server.requests[-1]
+    assert self.state == {}
+    assert loop.keys() == []
+
+  def test_streaming_subscriptions_share_a_connection(self):
+    connection = ChunkedConnection(streamed(
+      STREAMING_EVENTS_RESPONSE.format(status=u'OK', notifications=u''.join([
+        STREAMING_NOTIFICATION.format(subscription_id=u'sub-1', events=item_event(u'a', u'wm-1')),
+        STREAMING_NOTIFICATION.format(subscription_id=u'sub-2', events=item_event(u'b', u'wm-2')),
+      ])),
+      STREAMING_EVENTS_RESPONSE.format(notifications=u'', status=u'Closed'),
+    ))
+    self.state[u'subscription:inbox'] = {u'id': u'sub-1', u'watermark': None}
+    self.state[u'subscription:calendar'] = {u'id': u'sub-2', u'watermark': None}
+
+    loop = Exchange2010Service(connection).notifications().listen(self.handler, streaming=True, state_store=self.state)
+    loop.add(u'inbox', [u'inbox'])
+    loop.add(u'calendar', [u'calendar'])
+
+    assert loop.poll() == 2
+    assert self.handled == [(u'inbox', [u'a']), (u'calendar', [u'b'])]
+    assert len(connection.requests) == 1
@@ -0,0 +1,70 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import unittest
+from datetime import datetime
+from pytz import utc
+from pyexchange import Exchange2010Service
+from pyexchange.exchange2010 import parse_notification
+
+from .fixtures import *
+
+BODY = PUSH_NOTIFICATION.format(subscription_id=u'sub-1', previous_watermark=u'wm-0', events=u''.join([
+  PUSH_ITEM_EVENT.format(type=u'NewMailEvent', id=u'a', watermark=u'wm-1'),
+  PUSH_MOVED_EVENT.format(id=u'b', watermark=u'wm-2'),
+  PUSH_FOLDER_EVENT.format(type=u'CreatedEvent', id=u'folder-1', watermark=u'wm-3'),
+  PUSH_ITEM_EVENT.format(type=u'ModifiedEvent', id=u'a', watermark=u'wm-4'),
+  PUSH_STATUS_EVENT.format(watermark=u'wm-5'),
+])).encode('utf-8')
+
+
+class Test_ParsingPushNotifications(unittest.TestCase):
+
+  def test_events_in_document_order(self):
+    notification, = parse_notification(BODY)
+
+    assert notification.subscription_id == u'sub-1'
+    assert notification.previous_watermark == u'wm-0'
+    assert notification.watermark == u'wm-5'
+    assert notification.more_events is False
+    assert [e.event_type for e in notification.events] == [u'new_mail', u'moved', u'created', u'modified', u'status']
+    assert [e.watermark for e in notification.events] == [u'wm-1', u'wm-2', u'wm-3', u'wm-4', u'wm-5']
+
+  def test_event_fields(self):
+    new_mail, moved, folder_created, _, status = parse_notification(BODY)[0].events
+
+    assert new_mail.item_id == u'a'
+    assert new_mail.change_key == u'ck-a'
+    assert new_mail.parent_folder_id == u'inbox-id'
+    assert new_mail.timestamp == datetime(2014, 5, 14, 10, 0, tzinfo=utc)
+    assert new_mail.subscription_id == u'sub-1'
+
+    assert moved.old_item_id == u'old-b'
+    assert moved.old_parent_folder_id == u'inbox-id'
+    assert moved.parent_folder_id == u'archive-id'
+
+    assert folder_created.is_folder
+    assert folder_created.item_id == u'folder-1'
+
+    assert status.item_id is None
+
+  def test_legacy_dict(self):
+    events = Exchange2010Service(connection=None).notifications().parse_push_notification(BODY)
+
+    assert events[u'new_mail'] == [u'a']
+    assert events[u'modified'] == [u'a']
+    assert events[u'created'] == []
+    assert events[u'deleted'] == []
+    assert events[u'moved'] == {
+      u'item_id': [u'b'], u'old_item_id': [u'old-b'],
+      u'parent_folder': [u'archive-id'], u'old_parent_folder': [u'inbox-id'],
+    }
+
+  def test_legacy_dict_without_moves(self):
+    body = PUSH_NOTIFICATION.format(subscription_id=u'sub-1', previous_watermark=u'wm-0', events=u'').encode('utf-8')
+    events = Exchange2010Service(connection=None).notifications().parse_push_notification(body)
+
+    assert events[u'moved'] == []
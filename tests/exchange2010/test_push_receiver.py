@@ -0,0 +1,210 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import io
+import socket
+import threading
+import unittest
+
+from pyexchange.push import PushNotificationReceiver, parse_notification
+
+from .fixtures import *
+
+try:
+  import asyncio
+except ImportError:
+  asyncio = None
+
+
+def notification(subscription_id=u'sub-1', events=()):
+  return PUSH_NOTIFICATION.format(
+    subscription_id=subscription_id, previous_watermark=u'wm-0',
+    events=u''.join(PUSH_ITEM_EVENT.format(type=t, id=i, watermark=u'wm-%s' % i) for t, i in events),
+  ).encode('utf-8')
+
+
+class Collector(object):
+
+  def __init__(self):
+    self.batches = []
+    self.done = threading.Event()
+
+  def __call__(self, events):
+    self.batches.append(events)
+    self.done.set()
+
+
+class Test_PushNotificationReceiver(unittest.TestCase):
+
+  def setUp(self):
+    self.handler = Collector()
+    self.receiver = PushNotificationReceiver(self.handler, window=60, max_batch_size=3, max_workers=1)
+
+  def tearDown(self):
+    self.receiver.close()
+
+  def test_parse_notification(self):
+    result = parse_notification(notification(events=[(u'NewMailEvent', u'a'), (u'DeletedEvent', u'b')]))
+
+    assert len(result) == 1
+    assert result[0].subscription_id == u'sub-1'
+    assert result[0].previous_watermark == u'wm-0'
+    assert result[0].watermark == u'wm-b'
+    assert [(e.event_type, e.item_id) for e in result[0].events] == [(u'new_mail', u'a'), (u'deleted', u'b')]
+
+  def test_answers_ok_and_tracks_watermark(self):
+    response = self.receiver.receive(notification(events=[(u'NewMailEvent', u'a')]))
+
+    assert b'<SubscriptionStatus>OK</SubscriptionStatus>' in response
+    assert b'SendNotificationResult' in response
+    self.receiver.close()
+    assert self.receiver.watermarks[u'sub-1'] == u'wm-a'
+
+  def test_watermark_is_saved_after_the_handler_returns(self):
+    started, release = threading.Event(), threading.Event()
+
+    def handler(events):
+      started.set()
+      release.wait(5)
+
+    receiver = PushNotificationReceiver(handler, window=60, max_batch_size=1, max_workers=2)
+    try:
+      receiver.receive(notification(events=[(u'NewMailEvent', u'a')]))
+      receiver.flush()
+      assert started.wait(5)
+      assert u'sub-1' not in receiver.watermarks
+    finally:
+      release.set()
+      receiver.close()
+    assert receiver.watermarks[u'sub-1'] == u'wm-a'
+
+  def test_watermark_stays_put_when_the_handler_raises(self):
+    def handler(events):
+      if events[0].item_id == u'b':
+        raise ValueError(u'handler failed')
+
+    receiver = PushNotificationReceiver(handler, window=60, max_batch_size=1, max_workers=1)
+    receiver.receive(notification(events=[(u'NewMailEvent', u'a')]))
+    receiver.flush()
+    receiver.receive(notification(events=[(u'NewMailEvent', u'b')]))
+    receiver.flush()
+    receiver.receive(notification(events=[(u'NewMailEvent', u'c')]))
+    receiver.close()
+
+    assert receiver.watermarks == {u'sub-1': u'wm-a'}
+
+  def test_status_events_only_move_the_watermark(self):
+    body = PUSH_NOTIFICATION.format(subscription_id=u'sub-1', previous_watermark=u'wm-0',
+                                    events=PUSH_STATUS_EVENT.format(watermark=u'wm-status')).encode('utf-8')
+    self.receiver.receive(body)
+    self.receiver.close()
+
+    assert self.receiver.watermarks[u'sub-1'] == u'wm-status'
+    assert self.handler.batches == []
+
+  def test_duplicates_are_coalesced(self):
+    self.receiver.receive(notification(events=[(u'ModifiedEvent', u'a'), (u'ModifiedEvent', u'b')]))
+    self.receiver.receive(notification(events=[(u'ModifiedEvent', u'a'), (u'DeletedEvent', u'a')]))
+    self.receiver.close()
+
+    events = [e for batch in self.handler.batches for e in batch]
+    assert sorted((e.event_type, e.item_id) for e in events) == [
+      (u'deleted', u'a'), (u'modified', u'a'), (u'modified', u'b'),
+    ]
+
+  def test_full_batches_are_handed_over_straight_away(self):
+    self.receiver.receive(notification(events=[(u'CreatedEvent', i) for i in (u'a', u'b', u'c', u'd')]))
+
+    assert self.handler.done.wait(5)
+    assert [e.item_id for e in self.handler.batches[0]] == [u'a', u'b', u'c']
+
+    self.receiver.close()
+    assert [len(batch) for batch in self.handler.batches] == [3, 1]
+
+  def test_unsubscribe(self):
+    self.receiver.unsubscribe(u'sub-1')
+
+    assert b'<SubscriptionStatus>Unsubscribe</SubscriptionStatus>' in self.receiver.receive(notification())
+    assert b'<SubscriptionStatus>OK</SubscriptionStatus>' in self.receiver.receive(notification(u'sub-2'))
+
+  def test_accept(self):
+    self.receiver.accept = lambda subscription_id: subscription_id == u'known'
+
+    assert b'Unsubscribe' in self.receiver.receive(notification(u'unknown', events=[(u'NewMailEvent', u'a')]))
+    assert u'unknown' not in self.receiver.watermarks
+
+  def test_wsgi_app(self):
+    body = notification(events=[(u'NewMailEvent', u'a')])
+    statuses = []
+    environ = {
+      'REQUEST_METHOD': 'POST',
+      'CONTENT_LENGTH': str(len(body)),
+      'wsgi.input': io.BytesIO(body),
+    }
+
+    response = b''.join(self.receiver.wsgi_app(environ, lambda status, headers: statuses.append(status)))
+
+    assert statuses == ['200 OK']
+    assert b'<SubscriptionStatus>OK</SubscriptionStatus>' in response
+
+  def test_wsgi_app_rejects_malformed_content_length(self):
+    statuses = []
+    environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': 'lots', 'wsgi.input': io.BytesIO(b'')}
+    self.receiver.wsgi_app(environ, lambda status, headers: statuses.append(status))
+    assert statuses == ['400 Bad Request']
+
+  def test_wsgi_app_rejects_get(self):
+    statuses = []
+    self.receiver.wsgi_app({'REQUEST_METHOD': 'GET'}, lambda status, headers: statuses.append(status))
+    assert statuses == ['405 Method Not Allowed']
+
+  def _post_to_asyncio_server(self, request):
+    loop = asyncio.new_event_loop()
+    try:
+      server = loop.run_until_complete(self.receiver.create_asyncio_server(host='127.0.0.1', port=0, loop=loop))
+      port = server.sockets[0].getsockname()[1]
+
+      def client():
+        sock = socket.create_connection(('127.0.0.1', port))
+        # Send in two pieces to exercise buffering.
+        sock.sendall(request[:50])
+        sock.sendall(request[50:])
+        data = b''
+        while True:
+          chunk = sock.recv(4096)
+          if not chunk:
+            break
+          data += chunk
+        sock.close()
+        return data
+
+      response = loop.run_until_complete(loop.run_in_executor(None, client))
+      server.close()
+      loop.run_until_complete(server.wait_closed())
+    finally:
+      loop.close()
+    return response
+
+  @unittest.skipIf(asyncio is None, 'asyncio is not available')
+  def test_asyncio_server(self):
+    body = notification(events=[(u'NewMailEvent', u'a')])
+    response = self._post_to_asyncio_server(
+      b'POST /ews HTTP/1.1\r\nHost: localhost\r\nContent-Length: ' + str(len(body)).encode('ascii') +
+      b'\r\nConnection: close\r\n\r\n' + body
+    )
+
+    assert response.startswith(b'HTTP/1.1 200 OK')
+    assert b'<SubscriptionStatus>OK</SubscriptionStatus>' in response
+    self.receiver.close()
+    assert self.receiver.watermarks[u'sub-1'] == u'wm-a'
+
+  @unittest.skipIf(asyncio is None, 'asyncio is not available')
+  def test_asyncio_server_rejects_malformed_content_length(self):
+    response = self._post_to_asyncio_server(
+      b'POST /ews HTTP/1.1\r\nHost: localhost\r\nContent-Length: lots\r\n\r\n' + notification()
+    )
+
+    assert response.startswith(b'HTTP/1.1 400 Bad Request')
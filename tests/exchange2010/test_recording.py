@@ -0,0 +1,140 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from pytest import raises
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeConnection, ExchangeNTLMAuthConnection
+from pyexchange.exceptions import ExchangeServerBusyException, FailedExchangeException
+from pyexchange.recording import REPLAY_ORIGINAL_TIMING, RecordingTransport, Redactor, ReplayTransport, read_archive
+from pyexchange.testing import FAULT_SERVER_BUSY, FakeExchangeServer, FakeMailbox
+from pyexchange.transport import RequestsTransport, Transport, TransportResponse
+
+from .fixtures import *
+
+
+class Test_Recording(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, u'inbox.ews.gz')
+    self.mailbox = FakeMailbox(messages=12, seed=3)
+    self.server = FakeExchangeServer(self.mailbox, compress=True)
+    self.server.start()
+
+  def tearDown(self):
+    self.server.stop()
+    shutil.rmtree(self.directory)
+
+  def _record(self, workload, compress_requests=None, **kwargs):
+    with RecordingTransport(RequestsTransport(), self.path) as transport:
+      connection = ExchangeNTLMAuthConnection(url=self.server.url, username=FAKE_EXCHANGE_USERNAME,
+                                              password=FAKE_EXCHANGE_PASSWORD, transport=transport,
+                                              compress_requests=compress_requests)
+      result = workload(Exchange2010Service(connection=connection, batch_size=5, **kwargs))
+    self.server.stop()
+    return result
+
+  def _service(self, replay, **kwargs):
+    return Exchange2010Service(connection=ExchangeConnection(self.server.url, transport=replay), batch_size=5, **kwargs)
+
+  def _list_mails(self, service):
+    return [(mail.id, mail.subject, mail.sender) for mail in service.mail().list_mails().items]
+
+  def _get_mail(self, service):
+    return service.mail().get_mail(self.mailbox.folder_items(u'inbox')[0].id).subject
+
+  def test_replay_gives_the_redacted_responses(self):
+    recorded = self._record(self._list_mails)
+    replay = ReplayTransport(self.path)
+
+    replayed = self._list_mails(self._service(replay))
+    assert self._list_mails(self._service(replay)) == replayed
+
+    assert [mail_id for mail_id, _, _ in replayed] == [mail_id for mail_id, _, _ in recorded]
+    assert [subject for _, subject, _ in replayed] == [u'x' * len(subject) for _, subject, _ in recorded]
+    assert all(sender.endswith(u'@example.invalid>') for _, _, sender in replayed)
+    assert replay.stats[u'FindItem'] == 2 * self.server.stats[u'FindItem']
+    assert replay.stats[u'missing'] == 0
+
+  def test_streamed_and_compressed_requests(self):
+    recorded = self._record(self._list_mails, compress_requests=1, stream_responses=True)
+    replay = ReplayTransport(self.path)
+
+    assert len(self._list_mails(self._service(replay, stream_responses=True))) == len(recorded)
+    assert all(record[u'response'] for record in read_archive(self.path))
+    assert replay.stats[u'missing'] == 0
+
+  def test_archive_is_redacted(self):
+    self._record(self._list_mails)
+    records = read_archive(self.path)
+
+    operations = [record[u'operation'] for record in records]
+    assert operations.count(u'FindItem') == self.server.stats[u'FindItem']
+    assert operations.count(u'GetItem') == self.server.stats[u'GetItem']
+    archive = u''.join(record[u'request'] + record[u'response'] for record in records)
+    for item in self.mailbox.folder_items(u'inbox'):
+      assert item.fields[u'Subject'] not in archive
+      assert item.fields[u'FromEmail'] not in archive
+    assert u'@example.invalid' in archive
+
+  def test_errors_are_replayed(self):
+    def workload(service):
+      self.server.inject(FAULT_SERVER_BUSY)
+      with raises(ExchangeServerBusyException):
+        self._get_mail(service)
+      return self._get_mail(service)
+
+    subject = self._record(workload)
+    service = self._service(ReplayTransport(self.path))
+
+    with raises(ExchangeServerBusyException):
+      self._get_mail(service)
+    assert self._get_mail(service) == u'x' * len(subject)
+
+  def test_original_timing(self):
+    self.server.latency = 0.05
+    self._record(self._list_mails)
+    waits = []
+    replay = ReplayTransport(self.path, timing=REPLAY_ORIGINAL_TIMING, speed=2, sleep=waits.append)
+
+    self._list_mails(self._service(replay))
+
+    assert len(waits) == len(read_archive(self.path))
+    assert all(0.025 <= wait < 1 for wait in waits)
+
+  def test_abandoned_streams_are_recorded(self):
+    class ChunkedTransport(Transport):
+      def post(self, url, body, headers=None, timeout=30, stream=False):
+        return TransportResponse(200, {}, chunks=iter([b'<first/>', b'<second/>']), url=url)
+
+    with RecordingTransport(ChunkedTransport(), self.path) as recording:
+      response = recording.post(self.server.url, b'<m:GetStreamingEvents/>', stream=True)
+      chunks = response.iter_content()
+      assert next(chunks) == b'<first/>'
+      chunks.close()
+
+    assert [record[u'response'] for record in read_archive(self.path)] == [u'<first/>']
+
+  def test_unrecorded_requests_fail(self):
+    self._record(self._list_mails)
+    service = self._service(ReplayTransport(self.path))
+
+    with raises(FailedExchangeException):
+      service.calendar().get_event(u'never-recorded')
+
+
+def test_redaction_is_stable():
+
+  redactor = Redactor()
+  text = u'<t:Subject>Lunch with Ann</t:Subject><t:EmailAddress>ann@example.com</t:EmailAddress><t:Id>42</t:Id>'
+
+  assert redactor(text) == redactor(text)
+  assert redactor(text).startswith(u'<t:Subject>xxxxxxxxxxxxxx</t:Subject><t:EmailAddress>user-')
+  assert redactor(text).endswith(u'@example.invalid</t:EmailAddress><t:Id>42</t:Id>')
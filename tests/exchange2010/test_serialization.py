@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import json
+import pickle
+import unittest
+from datetime import date, datetime
+from httpretty import HTTPretty, httprettified
+from pytest import raises
+from pytz import utc
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exchange2010 import Exchange2010ContactItem, Exchange2010MailItem, Exchange2010TaskItem
+from pyexchange.serialization import SCHEMA_VERSION, _packb, _unpackb, from_bytes, from_json, packb, unpackb
+
+from .fixtures import *  # noqa
+
+
+class Test_SerializingItems(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(url=FAKE_EXCHANGE_URL, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD))
+
+  @httprettified
+  def setUp(self):
+    HTTPretty.register_uri(HTTPretty.POST, FAKE_EXCHANGE_URL, body=GET_ITEM_RESPONSE.encode('utf-8'), content_type='text/xml; charset=utf-8')
+    self.event = self.service.calendar().get_event(id=TEST_EVENT.id)
+
+  def assert_same_event(self, event):
+    assert event.id == TEST_EVENT.id
+    assert event.change_key == TEST_EVENT.change_key
+    assert event.subject == TEST_EVENT.subject
+    assert event.start == TEST_EVENT.start
+    assert event.end == TEST_EVENT.end
+    assert event.organizer == self.event.organizer
+    assert sorted(event.attendees) == sorted(self.event.attendees)
+    assert sorted(event.resources) == sorted(self.event.resources)
+    assert event.service is self.service
+    assert event._dirty_attributes == set()
+
+  def test_event_as_json(self):
+    document = json.loads(self.event.as_json())
+    assert document[u'type'] == u'event'
+    assert document[u'version'] == SCHEMA_VERSION
+    assert document[u'data'][u'subject'] == TEST_EVENT.subject
+
+    self.assert_same_event(from_json(self.event.as_json(), service=self.service))
+
+  def test_event_as_bytes(self):
+    self.assert_same_event(from_bytes(self.event.as_bytes(), service=self.service))
+
+  def test_loaded_event_tracks_changes(self):
+    event = from_bytes(self.event.as_bytes(), service=self.service)
+    event.location = u'somewhere else'
+    assert event._dirty_attributes == set([u'location'])
+
+  def test_pickled_event_keeps_unsaved_changes(self):
+    self.event.subject = u'changed'
+    event = pickle.loads(pickle.dumps(self.event))
+
+    assert event.service is None
+    assert event.subject == u'changed'
+    assert event._dirty_attributes == set([u'subject'])
+
+  def test_contact_round_trip(self):
+    contact = Exchange2010ContactItem(self.service, first_name=u'Jöhn', birthday=date(1980, 2, 29),
+                                      physical_addresses=[{u'city': u'Mountain View'}])
+    for loaded in (from_json(contact.as_json()), from_bytes(contact.as_bytes())):
+      assert isinstance(loaded, Exchange2010ContactItem)
+      assert loaded.first_name == u'Jöhn'
+      assert loaded.birthday == date(1980, 2, 29)
+      assert loaded.physical_addresses == [{u'city': u'Mountain View'}]
+
+  def test_mail_round_trip(self):
+    received = datetime(2014, 5, 14, 7, 0, 0, 123456, tzinfo=utc)
+    mail = Exchange2010MailItem(self.service, subject=u'hello', received=received, size=12345,
+                                recipients_to=[{u'name': u'Jane', u'email': u'jane@example.com'}])
+    for loaded in (from_json(mail.as_json()), from_bytes(mail.as_bytes())):
+      assert loaded.subject == u'hello'
+      assert loaded.received == received
+      assert loaded.size == 12345
+      assert loaded.recipients_to == mail.recipients_to
+      assert loaded.recipients_cc == []
+
+  def test_naive_datetimes_are_taken_as_utc(self):
+    task = Exchange2010TaskItem(self.service, subject=u'file taxes', created_at=datetime(2014, 4, 1, 9, 30))
+    assert from_bytes(task.as_bytes()).created_at == datetime(2014, 4, 1, 9, 30, tzinfo=utc)
+
+  def test_older_schema_versions_load_with_new_fields_empty(self):
+    data = packb([u'task', SCHEMA_VERSION, [u'id', u'ck', u'tasks', u'file taxes']])
+    task = from_bytes(data)
+    assert task.subject == u'file taxes'
+    assert task.due_date is None
+
+  def test_newer_schema_versions_are_refused(self):
+    with raises(ValueError):
+      from_bytes(packb([u'task', SCHEMA_VERSION + 1, []]))
+
+  def test_unknown_types_are_refused(self):
+    with raises(ValueError):
+      from_json(u'{"type": "folder", "version": 1, "data": {}}')
+
+
+class Test_MessagePack(unittest.TestCase):
+
+  def test_known_encodings(self):
+    assert _packb([None, True, False, 1, -1, 200, -200, 70000]) == b'\x98\xc0\xc3\xc2\x01\xff\xcc\xc8\xd1\xff\x38\xce\x00\x01\x11\x70'
+    assert _packb({u'a': u'é'}) == b'\x81\xa1a\xa2\xc3\xa9'
+    assert _packb(b'\x00\x01') == b'\xc4\x02\x00\x01'
+
+  def test_round_trip(self):
+    value = [0, 127, 128, 2 ** 40, -33, -2 ** 40, 1.5, u'x' * 40, u'y' * 300, b'z' * 70000, list(range(20)),
+             dict((u'k%d' % i, i) for i in range(20)), {u'nested': [None, {u'deep': True}]}]
+    assert _unpackb(_packb(value)) == value
+    assert unpackb(packb(value)) == value
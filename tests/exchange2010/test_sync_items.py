@@ -0,0 +1,114 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import unittest
+import httpretty
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+
+from .fixtures import *
+
+
+def sync_response(sync_state, last, *changes):
+  return SYNC_FOLDER_ITEMS_RESPONSE.format(sync_state=sync_state, last=last, changes=u''.join(changes))
+
+
+class Test_SyncingMail(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      )
+    )
+
+  @httpretty.activate
+  def test_changes_are_collected_across_pages(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, responses=[
+      httpretty.Response(body=sync_response(u'state1', u'false',
+                                            SYNC_CREATE_MESSAGE.format(id=u'id1', subject=u'first'),
+                                            SYNC_DELETE_ITEM.format(id=u'id0'))),
+      httpretty.Response(body=sync_response(u'state2', u'true',
+                                            SYNC_UPDATE_MESSAGE.format(id=u'id2', subject=u'second'),
+                                            SYNC_READ_FLAG_CHANGE.format(id=u'id3', is_read=u'true'))),
+    ])
+
+    changes = self.service.mail().sync_items()
+
+    assert [mail.subject for mail in changes.created] == [u'first']
+    assert [mail.id for mail in changes.updated] == [u'id2']
+    assert changes.deleted == [u'id0']
+    assert changes.read_flag_changes == [(u'id3', True)]
+    assert changes.last_sync_state == u'state2'
+    assert changes.contains_all_items
+
+    last_body = httpretty.last_request().body.decode('utf-8')
+    assert u'<m:SyncState>state1</m:SyncState>' in last_body
+    assert u'<t:DistinguishedFolderId Id="inbox"/>' in last_body
+
+  @httpretty.activate
+  def test_sync_state_is_persisted_in_the_store(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=sync_response(u'state9', u'true'))
+    store = {}
+
+    self.service.mail().sync_items(state_store=store)
+    assert store == {u'sync::inbox': u'state9'}
+
+    self.service.mail().sync_items(state_store=store)
+    assert u'<m:SyncState>state9</m:SyncState>' in httpretty.last_request().body.decode('utf-8')
+
+  @httpretty.activate
+  def test_sync_state_is_not_saved_until_committed(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=sync_response(u'state9', u'true'))
+    store = {u'sync::inbox': u'state8'}
+
+    from pyexchange.exchange2010 import Exchange2010FolderSync, Exchange2010MailItem
+    sync = Exchange2010FolderSync(self.service, u'inbox', u'Message', Exchange2010MailItem, state_store=store)
+    sync.sync(commit=False)
+
+    assert u'<m:SyncState>state8</m:SyncState>' in httpretty.last_request().body.decode('utf-8')
+    assert store[u'sync::inbox'] == u'state8'
+    sync.commit()
+    assert store[u'sync::inbox'] == u'state9'
+
+
+class Test_SyncingContactsAndTasks(unittest.TestCase):
+  service = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(
+        url=FAKE_EXCHANGE_URL,
+        username=FAKE_EXCHANGE_USERNAME,
+        password=FAKE_EXCHANGE_PASSWORD,
+      )
+    )
+
+  @httpretty.activate
+  def test_contacts(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL,
+                           body=sync_response(u'state1', u'true', SYNC_CREATE_CONTACT.format(id=u'c1', name=u'Ada')))
+
+    changes = self.service.contacts().sync_items()
+
+    assert [contact.display_name for contact in changes.created] == [u'Ada']
+    assert u'<t:DistinguishedFolderId Id="contacts"/>' in httpretty.last_request().body.decode('utf-8')
+
+  @httpretty.activate
+  def test_tasks(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL,
+                           body=sync_response(u'state1', u'true', SYNC_CREATE_TASK.format(id=u't1', subject=u'Do it'),
+                                              SYNC_DELETE_ITEM.format(id=u't0')))
+
+    changes = self.service.tasks().sync_items()
+
+    assert [task.subject for task in changes.created] == [u'Do it']
+    assert changes.deleted == [u't0']
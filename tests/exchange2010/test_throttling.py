@@ -0,0 +1,154 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import threading
+import time
+import unittest
+import httpretty
+from pytest import raises
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exceptions import ExchangeServerBusyException
+from pyexchange.exchange2010 import soap_request
+from pyexchange.testing import FAULT_SERVER_BUSY, FakeExchangeServer, FakeMailbox
+from pyexchange.throttling import Governor, Limiter, TokenBucket
+
+from .fixtures import *
+
+
+class Test_TokenBucket(unittest.TestCase):
+
+  def test_bursts_then_spaces_requests_out(self):
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock)
+
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    clock.now += 1.0
+    assert bucket.reserve() == 0.5
+
+
+class Test_Limiter(unittest.TestCase):
+
+  def test_throttling_pauses_and_halves_the_rate(self):
+    clock = FakeClock()
+    limiter = Limiter(rate=10, burst=10, clock=clock, sleep=clock.sleep)
+
+    limiter.throttled(2.0)
+    assert limiter.rate == 5
+
+    limiter.acquire()
+    assert clock.now == 1002.0
+
+  def test_rate_recovers_after_successes(self):
+    limiter = Limiter(rate=10, recovery=0.1)
+    limiter.throttled(0)
+    limiter.throttled(0)
+    assert limiter.rate == 2.5
+
+    for _ in range(5):
+      limiter.succeeded()
+    assert limiter.rate == 7.5
+    for _ in range(5):
+      limiter.succeeded()
+    assert limiter.rate == 10
+
+  def test_rate_never_drops_below_min_rate(self):
+    limiter = Limiter(rate=1, min_rate=0.4)
+    limiter.throttled(0)
+    limiter.throttled(0)
+    assert limiter.rate == 0.4
+
+
+class Test_Governor(unittest.TestCase):
+
+  def test_in_flight_limit_per_mailbox(self):
+    governor = Governor(mailbox_max_in_flight=2)
+    in_flight = {u'a': 0, u'b': 0}
+    peak = {u'a': 0, u'b': 0}
+    lock = threading.Lock()
+
+    def work(mailbox):
+      with governor.request(mailbox):
+        with lock:
+          in_flight[mailbox] += 1
+          peak[mailbox] = max(peak[mailbox], in_flight[mailbox])
+        time.sleep(0.02)
+        with lock:
+          in_flight[mailbox] -= 1
+
+    threads = [threading.Thread(target=work, args=(mailbox,)) for mailbox in u'ab' * 5]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    assert peak == {u'a': 2, u'b': 2}
+
+  def test_throttling_slows_only_that_mailbox(self):
+    governor = Governor(rate=100, mailbox_rate=10)
+    governor.throttled(u'a', 0)
+
+    assert governor.mailbox_limiter(u'a').rate == 5
+    assert governor.mailbox_limiter(u'b').rate == 10
+    assert governor.limiter.rate == 100
+    assert governor.mailbox_limiter(None) is None
+
+
+class Test_ServerBusy(unittest.TestCase):
+
+  def _service(self, url, governor=None):
+    return Exchange2010Service(connection=ExchangeNTLMAuthConnection(
+      url=url, username=FAKE_EXCHANGE_USERNAME, password=FAKE_EXCHANGE_PASSWORD, governor=governor,
+    ), impersonate_smtp=u'jdoe@example.com')
+
+  def test_busy_without_governor_raises_with_back_off(self):
+    server = FakeExchangeServer(FakeMailbox(messages=1), back_off_ms=250)
+    with server as url:
+      server.inject(FAULT_SERVER_BUSY)
+      with raises(ExchangeServerBusyException) as error:
+        list(self._service(url).mail().list_mails().items)
+
+    assert error.value.back_off == 0.25
+
+  def test_governor_backs_off_and_retries(self):
+    governor = Governor(mailbox_rate=100)
+    server = FakeExchangeServer(FakeMailbox(messages=3), back_off_ms=50)
+    with server as url:
+      server.inject(FAULT_SERVER_BUSY, count=2)
+      started = time.time()
+      mails = list(self._service(url, governor).mail().list_mails().items)
+
+    assert len(mails) == 3
+    assert time.time() - started >= 0.1
+    assert governor.mailbox_limiter(u'jdoe@example.com').rate < 100
+
+  def test_governor_gives_up_after_retries(self):
+    server = FakeExchangeServer(FakeMailbox(messages=1), back_off_ms=1)
+    with server as url:
+      server.inject(FAULT_SERVER_BUSY, count=10)
+      service = self._service(url, Governor())
+      with raises(ExchangeServerBusyException):
+        service.send(soap_request.find_items(folder_id=u'inbox'), retries=1)
+      assert server.stats[u'fault:%s' % FAULT_SERVER_BUSY] == 2
+
+  def test_streamed_responses_are_retried_too(self):
+    server = FakeExchangeServer(FakeMailbox(messages=1), back_off_ms=1)
+    with server as url:
+      server.inject(FAULT_SERVER_BUSY, count=10)
+      service = self._service(url, Governor())
+      service.stream_responses = True
+      with raises(ExchangeServerBusyException):
+        service.send(soap_request.find_items(folder_id=u'inbox'), retries=3)
+      assert server.stats[u'fault:%s' % FAULT_SERVER_BUSY] == 4
+
+  @httpretty.activate
+  def test_impersonated_requests_name_the_anchor_mailbox(self):
+    httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=GET_ITEM_MULTIPLE_RESPONSE.format(
+      messages=GET_ITEM_SUCCESS_MESSAGE.format(items=CONTACT_ITEM.format(id=u'a', name=u'A'))))
+
+    self._service(FAKE_EXCHANGE_URL).contacts().get_contact(u'a')
+
+    assert httpretty.last_request().headers[u'X-AnchorMailbox'] == u'jdoe@example.com'
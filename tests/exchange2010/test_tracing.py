@@ -0,0 +1,139 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import contextvars
+import threading
+import unittest
+from collections import OrderedDict
+from contextlib import contextmanager
+from pytest import raises
+from pyexchange import Exchange2010Service
+from pyexchange.connection import ExchangeNTLMAuthConnection
+from pyexchange.exceptions import ExchangeItemNotFoundException
+from pyexchange.testing import FAULT_SERVER_BUSY, FakeExchangeServer, FakeMailbox
+from pyexchange.throttling import Governor
+from pyexchange.tracing import response_code
+
+from .fixtures import *
+
+CURRENT_SPAN = contextvars.ContextVar('current_span', default=None)
+
+
+class FakeSpan(object):
+
+  def __init__(self, name, attributes, parent):
+    self.name = name
+    self.attributes = dict(attributes)
+    self.parent = parent
+    self.error = None
+
+  def set_attribute(self, key, value):
+    self.attributes[key] = value
+
+
+class FakeTracer(object):
+  """ Just enough of the OpenTelemetry tracer API to see which spans were made and how they nest. """
+
+  def __init__(self):
+    self.spans = []
+    self._lock = threading.Lock()
+
+  @contextmanager
+  def start_as_current_span(self, name, attributes=None, kind=None):
+    span = FakeSpan(name, attributes or {}, CURRENT_SPAN.get())
+    with self._lock:
+      self.spans.append(span)
+    token = CURRENT_SPAN.set(span)
+    try:
+      yield span
+    except Exception as err:
+      span.error = type(err).__name__
+      raise
+    finally:
+      CURRENT_SPAN.reset(token)
+
+  def named(self, name):
+    return [span for span in self.spans if span.name == name]
+
+
+class Test_Tracing(unittest.TestCase):
+  server = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.server = FakeExchangeServer(FakeMailbox(contacts=10))
+    cls.server.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.stop()
+
+  def setUp(self):
+    self.tracer = FakeTracer()
+    self.service = Exchange2010Service(
+      connection=ExchangeNTLMAuthConnection(url=self.server.url, username=FAKE_EXCHANGE_USERNAME,
+                                            password=FAKE_EXCHANGE_PASSWORD),
+      batch_size=3, impersonate_smtp=u'jdoe@example.com', tracer=self.tracer,
+    )
+
+  def test_spans_for_operation_and_http_request(self):
+    contacts = list(self.service.contacts().get_all_contacts().items)
+
+    ews, post = self.tracer.named(u'EWS FindItem')[0], self.tracer.named(u'POST')[0]
+    assert ews.attributes[u'ews.operation'] == u'FindItem'
+    assert ews.attributes[u'ews.mailbox'] == u'jdoe@example.com'
+    assert ews.attributes[u'ews.items'] == 3
+    assert ews.attributes[u'ews.response_code'] == u'NoError'
+    assert post.parent is ews
+    assert post.attributes[u'http.status_code'] == 200
+    assert len(self.tracer.named(u'EWS FindItem')) == 4
+    assert len(contacts) == 10
+
+  def test_prefetched_pages_stay_in_the_callers_trace(self):
+    with self.tracer.start_as_current_span(u'handle request') as root:
+      contacts = list(self.service.contacts().get_all_contacts(prefetch=2).items)
+
+    assert len(contacts) == 10
+    pages = self.tracer.named(u'EWS FindItem')
+    assert len(pages) == 4
+    assert all(page.parent is root for page in pages)
+
+  def test_retries_are_recorded_on_the_span(self):
+    server = FakeExchangeServer(FakeMailbox(contacts=1), back_off_ms=1)
+    with server as url:
+      service = Exchange2010Service(
+        connection=ExchangeNTLMAuthConnection(url=url, username=FAKE_EXCHANGE_USERNAME,
+                                              password=FAKE_EXCHANGE_PASSWORD, governor=Governor()),
+        tracer=self.tracer,
+      )
+      server.inject(FAULT_SERVER_BUSY, count=2)
+      list(service.contacts().get_all_contacts().items)
+
+    ews, = self.tracer.named(u'EWS FindItem')
+    assert ews.attributes[u'ews.retries'] == 2
+    assert [post.parent for post in self.tracer.named(u'POST')] == [ews] * 3
+
+  def test_failed_calls_are_marked_on_the_span(self):
+    with raises(ExchangeItemNotFoundException):
+      self.service.contacts().get_contact(u'no-such-contact')
+
+    ews, = self.tracer.named(u'EWS GetItem')
+    assert ews.error == u'ExchangeItemNotFoundException'
+    assert ews.attributes[u'ews.retries'] == 0
+
+  def test_no_tracer_no_spans(self):
+    service = Exchange2010Service(connection=ExchangeNTLMAuthConnection(url=self.server.url, username=u'u', password=u'p'))
+    assert service.tracer is None and service.connection.tracer is None
+    assert len(list(service.contacts().get_all_contacts().items)) == 10
+
+
+def test_response_code_is_the_first_error_in_the_response():
+
+  codes = OrderedDict([(u'NoError', 2), (u'ErrorItemNotFound', 1), (u'ErrorAccessDenied', 1)])
+
+  assert response_code(codes) == u'ErrorItemNotFound'
+  assert response_code(OrderedDict([(u'NoError', 1)])) == u'NoError'
+  assert response_code({}) is None
@@ -0,0 +1,131 @@
+"""
+(c) 2013 LinkedIn Corp. All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License");?you may not use this file except in compliance with the License. You may obtain a copy of the License at  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+import asyncio
+import unittest
+import httpretty
+from mock import MagicMock
+from requests.auth import HTTPBasicAuth
+from pyexchange import Exchange2010Service
+from pyexchange.connection import BearerAuth, ExchangeConnection, ExchangeOAuthConnection
+from pyexchange.testing import FakeExchangeServer, FakeMailbox
+from pyexchange.transport import AsyncTransport, Transport, TransportResponse, Urllib3Transport
+
+from .fixtures import *
+
+
+class Test_Transports(unittest.TestCase):
+
+  def setUp(self):
+    self.mailbox = FakeMailbox(messages=12)
+    self.server = FakeExchangeServer(self.mailbox, compress=True)
+    self.server.start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def _subjects(self, connection, **kwargs):
+    service = Exchange2010Service(connection=connection, batch_size=5, **kwargs)
+    return [mail.subject for mail in service.mail().list_mails().items]
+
+  def _expected(self):
+    return [item.fields[u'Subject'] for item in self.mailbox.folder_items(u'inbox')]
+
+  def test_urllib3(self):
+    connection = ExchangeConnection(self.server.url, auth=HTTPBasicAuth(FAKE_EXCHANGE_USERNAME, FAKE_EXCHANGE_PASSWORD),
+                                    transport=Urllib3Transport())
+
+    assert self._subjects(connection) == self._expected()
+    assert self._subjects(connection, stream_responses=True) == self._expected()
+    assert connection.transport.auth is connection.auth
+    assert self.server.stats[u'gzip:response'] > 0
+
+
+class Test_AsyncTransport(unittest.TestCase):
+
+  def test_requests_run_on_the_event_loop(self):
+    client = MagicMock()
+    client.post.side_effect = lambda url, **kwargs: asyncio.sleep(0, result=MagicMock(
+      status_code=200, headers={u'Content-Type': u'text/xml; charset=utf-8'}, content=u'ok'.encode('utf-8')))
+    client.aclose.side_effect = lambda: asyncio.sleep(0)
+    transport = AsyncTransport(auth=HTTPBasicAuth(u'user', u'secret'), client_factory=lambda: client)
+    connection = ExchangeConnection(FAKE_EXCHANGE_URL, transport=transport)
+
+    try:
+      assert connection.send(b'yo', headers={u'Accept': u'text/xml'}) == u'ok'
+    finally:
+      transport.close()
+
+    headers = client.post.call_args[1][u'headers']
+    assert headers[u'Accept'] == u'text/xml'
+    assert headers[u'Authorization'].startswith(u'Basic ')
+
+  def test_post_async_refreshes_bearer_tokens(self):
+    tokens = iter(['expired', 'fresh'])
+    seen = []
+
+    def post(url, **kwargs):
+      seen.append(kwargs[u'headers'][u'Authorization'])
+      return asyncio.sleep(0, result=MagicMock(status_code=401 if len(seen) == 1 else 200))
+
+    client = MagicMock()
+    client.post.side_effect = post
+    transport = AsyncTransport(auth=BearerAuth(lambda: next(tokens)), client_factory=lambda: client)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+      response = loop.run_until_complete(transport.post_async(FAKE_EXCHANGE_URL, b'yo'))
+    finally:
+      asyncio.set_event_loop(None)
+      loop.close()
+
+    assert response.status_code == 200
+    assert seen == ['Bearer expired', 'Bearer fresh']
+
+
+@httpretty.activate
+def test_urllib3_refreshes_bearer_tokens():
+
+  tokens = iter(['expired', 'fresh'])
+  seen = []
+
+  def respond(request, uri, headers):
+    seen.append(request.headers['Authorization'])
+    return (401 if len(seen) == 1 else 200), headers, "ok"
+
+  httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=respond)
+
+  connection = ExchangeOAuthConnection(url=FAKE_EXCHANGE_URL, token_provider=lambda: next(tokens),
+                                       transport=Urllib3Transport())
+
+  assert connection.send(b'yo') == 'ok'
+  assert seen == ['Bearer expired', 'Bearer fresh']
+
+
+def test_forked_process_resets_the_transport():
+
+  class OkTransport(Transport):
+    def post(self, url, body, headers=None, timeout=30, stream=False):
+      return TransportResponse(200, {}, content=b'ok', url=url)
+
+  transport = OkTransport()
+  transport.after_fork = MagicMock()
+  connection = ExchangeConnection(FAKE_EXCHANGE_URL, transport=transport)
+  connection.send(b'yo')
+
+  connection._pid = -1  # as if this process had been forked after the first request
+  connection.send(b'yo again')
+
+  transport.after_fork.assert_called_once_with()
+  assert connection.transport is transport
+
+
+def test_response_text_uses_the_charset():
+
+  response = TransportResponse(200, {u'Content-Type': u'text/xml; charset=iso-8859-1'}, chunks=iter([b'caf', b'\xe9']))
+
+  assert response.text == u'caf\xe9'
@@ -5,10 +5,13 @@ Licensed under the Apache License, Version 2.0 (the "License");?you may not use
 Unless required by applicable law or agreed to in writing, software?distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 """
 import httpretty
+import requests
 import unittest
 from mock import patch, MagicMock, call
-from pytest import raises
-from pyexchange.connection import ExchangeNTLMAuthConnection
+from pytest import raises, warns
+from requests.auth import HTTPBasicAuth
+from requests_ntlm import HttpNtlmAuth
+from pyexchange.connection import ExchangeBasicAuthConnection, ExchangeKerberosAuthConnection, ExchangeNTLMAuthConnection, ExchangeOAuthConnection
 from pyexchange.exceptions import *
 
 from .fixtures import *
@@ -82,3 +85,113 @@ def test_session_is_cached():
 
     # assert we only get called once, after that it's cached
     manager.MockSession.assert_called_once_with()
+
+
+@httpretty.activate
+def test_forked_process_gets_its_own_session():
+
+  httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL,
+                           status=200,
+                           body="", )
+
+  connection = ExchangeNTLMAuthConnection(url=FAKE_EXCHANGE_URL,
+                                          username=FAKE_EXCHANGE_USERNAME,
+                                          password=FAKE_EXCHANGE_PASSWORD)
+  connection.send("test")
+  parent_session = connection.session
+
+  connection._pid = -1  # as if this process had been forked after the first request
+  connection.send("test again")
+
+  assert connection.session is not parent_session
+  connection.send("and again")
+  assert connection.build_session() is connection.session
+
+
+@httpretty.activate
+def test_warm_up_authenticates_the_pool():
+
+  httpretty.register_uri(httpretty.GET, FAKE_EXCHANGE_URL,
+                           status=200,
+                           body="", )
+
+  connection = ExchangeBasicAuthConnection(url=FAKE_EXCHANGE_URL,
+                                           username=FAKE_EXCHANGE_USERNAME,
+                                           password=FAKE_EXCHANGE_PASSWORD,
+                                           pool_size=3)
+
+  assert connection.warm_up() == 3
+  assert httpretty.last_request().headers['Authorization'].startswith('Basic ')
+
+
+@httpretty.activate
+def test_oauth_token_is_refreshed_when_rejected():
+
+  tokens = iter(['expired', 'fresh'])
+  seen = []
+
+  def respond(request, uri, headers):
+    seen.append(request.headers['Authorization'])
+    return (401 if len(seen) == 1 else 200), headers, "ok"
+
+  httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL, body=respond)
+
+  connection = ExchangeOAuthConnection(url=FAKE_EXCHANGE_URL, token_provider=lambda: next(tokens))
+
+  assert connection.send(b'yo') == 'ok'
+  assert connection.send(b'yo again') == 'ok'
+  assert seen == ['Bearer expired', 'Bearer fresh', 'Bearer fresh']
+
+
+def test_oauth_needs_a_token():
+
+  with raises(ValueError):
+    ExchangeOAuthConnection(url=FAKE_EXCHANGE_URL)
+
+
+def test_kerberos_needs_requests_kerberos():
+
+  with patch('pyexchange.connection.HTTPKerberosAuth', None):
+    with raises(ImportError):
+      ExchangeKerberosAuthConnection(url=FAKE_EXCHANGE_URL)
+
+
+@httpretty.activate
+def test_assigned_session_is_used():
+
+  httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL,
+                           status=200,
+                           body="", )
+
+  session = requests.Session()
+  session.headers['X-Custom'] = 'yes'
+  connection = ExchangeNTLMAuthConnection(url=FAKE_EXCHANGE_URL,
+                                          username=FAKE_EXCHANGE_USERNAME,
+                                          password=FAKE_EXCHANGE_PASSWORD)
+  connection.session = session
+  connection.send("test")
+
+  assert connection.session is session
+  assert httpretty.last_request().headers['X-Custom'] == 'yes'
+
+
+@httpretty.activate
+def test_deprecated_password_manager_names():
+
+  httpretty.register_uri(httpretty.POST, FAKE_EXCHANGE_URL,
+                           status=200,
+                           body="", )
+
+  connection = ExchangeNTLMAuthConnection(url=FAKE_EXCHANGE_URL,
+                                          username=FAKE_EXCHANGE_USERNAME,
+                                          password=FAKE_EXCHANGE_PASSWORD)
+
+  with warns(DeprecationWarning):
+    assert isinstance(connection.build_password_manager(), HttpNtlmAuth)
+  with warns(DeprecationWarning):
+    connection.password_manager = HTTPBasicAuth(FAKE_EXCHANGE_USERNAME, FAKE_EXCHANGE_PASSWORD)
+  connection.send("test")
+
+  assert httpretty.last_request().headers['Authorization'].startswith('Basic ')
+  with warns(DeprecationWarning):
+    assert connection.handler is connection.session